@@ -0,0 +1,85 @@
+"""
+Benchmark : filtres allergènes / additifs par sous-chaînes vs index bitmap.
+
+Construit un catalogue synthétique en rééchantillonnant le jeu
+OpenFoodFacts transformé (schéma compact appliqué) et compare, pour
+quelques requêtes d'exclusion :
+    - la recherche de sous-chaînes sur ``allergens`` / ``ingredients_text``
+      (``str.contains`` par ligne, comme l'ancien filtre de l'explorateur)
+    - ``ProductRecommender.healthier_mask`` sans index (valeurs distinctes)
+    - ``BitmapIndex.exclude`` : ET bit à bit sur les bitsets
+
+Rapporte aussi le temps de construction et la taille de l'index.
+
+Usage:
+    python -m benchmarks.bench_bitmap_index --rows 1000000
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from src.config.paths import PROCESSED_DIR
+from src.enricher.bitmap_index import BitmapIndex
+from src.enricher.schema import apply_schema
+from src.ia.recommender import ProductRecommender
+
+QUERIES = [
+    ("sans gluten", ["gluten"], []),
+    ("sans gluten / sans lait", ["gluten", "milk"], []),
+    ("sans lait / œufs / soja, sans E330", ["milk", "eggs", "soybeans"], ["e330"]),
+]
+
+
+def synthetic_catalogue(rows: int, seed: int = 0) -> pd.DataFrame:
+    df = pd.read_parquet(PROCESSED_DIR / "off_transformed.parquet")
+    rng = np.random.default_rng(seed)
+    return df.iloc[rng.integers(0, len(df), rows)].reset_index(drop=True)
+
+
+def scan(df: pd.DataFrame, allergens, additives) -> np.ndarray:
+    """Ancien filtre : sous-chaînes ligne par ligne."""
+    keep = np.ones(len(df), dtype=bool)
+    for term in allergens:
+        keep &= ~df["allergens"].astype(str).str.contains(term, case=False, na=False).to_numpy()
+    for term in additives:
+        pattern = rf"\b{term[0]}[\s-]?{term[1:]}\b"
+        keep &= ~df["ingredients_text"].astype(str).str.contains(pattern, case=False, na=False).to_numpy()
+    return keep
+
+
+def timed(fn, repeat: int = 3):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    df = apply_schema(synthetic_catalogue(args.rows))
+    t_build, index = timed(lambda: BitmapIndex.from_frame(df), repeat=1)
+    print(f"{len(df):,} produits · index : {len(index.allergens)} allergènes, "
+          f"{len(index.additives)} additifs, {index.bits.shape[1]} mot(s) de 64 bits, "
+          f"{index.bits.nbytes / 2**20:.1f} Mo, construit en {t_build:.2f} s\n")
+
+    print(f"{'requête':36s} | {'sous-chaînes':>12s} | {'valeurs distinctes':>18s} | {'bitmap':>9s} | {'gain':>6s}")
+    for label, allergens, additives in QUERIES:
+        t_scan, expected = timed(lambda: scan(df, allergens, additives))
+        t_mask, _ = timed(lambda: ProductRecommender.healthier_mask(
+            df, max_nutriscore=None, exclude_allergens=allergens, exclude_additives=additives))
+        t_bitmap, found = timed(lambda: index.exclude(allergens + additives))
+        # Les sous-chaînes confondent « nuts » et « peanuts » : comparaison sur ces requêtes seulement
+        same = "" if (expected == found).all() else " (écart)"
+        print(f"{label:36s} | {t_scan * 1e3:9.1f} ms | {t_mask * 1e3:15.1f} ms | "
+              f"{t_bitmap * 1e3:6.2f} ms | x{t_scan / t_bitmap:5.0f}{same}")
+
+
+if __name__ == "__main__":
+    main()
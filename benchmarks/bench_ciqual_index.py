@@ -0,0 +1,81 @@
+"""
+Benchmark : recherche CIQUAL et outils du chatbot.
+
+Construit l'index CIQUAL et les outils de recherche sur les jeux
+transformés, puis mesure pour une série de questions types :
+    - CiqualIndex.context_block (bloc de références joint au prompt)
+    - CatalogueTools.execute (appel d'outil du modèle)
+
+Usage:
+    python -m benchmarks.bench_ciqual_index --repeat 200
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from src.config.paths import PROCESSED_DIR
+from src.ia.catalogue_tools import CatalogueTools
+from src.ia.ciqual_index import CiqualIndex
+from src.ia.prompt_budget import count_tokens
+
+QUESTIONS = [
+    "Quels yaourts ont moins de 5 g de sucre ?",
+    "Le saumon est-il riche en protéines ?",
+    "Combien de calories dans une banane ?",
+    "Quels légumes sont riches en fibres ?",
+    "Un fromage pauvre en matière grasse ?",
+    "Pain complet ou baguette ?",
+]
+
+TOOL_CALLS = [
+    ("search_products", {"query": "yaourt", "max": {"sugars": 5}, "sort_by": "sugars"}),
+    ("search_products", {"category": "chocolats", "nutriscore": ["a", "b", "c"]}),
+    ("search_ciqual", {"category": "légumes", "min": {"fiber": 3}, "sort_by": "fiber", "descending": True}),
+]
+
+
+def latencies(fn, repeat: int) -> np.ndarray:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return np.array(samples) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("-k", type=int, default=5)
+    args = parser.parse_args()
+
+    ciqual = pd.read_parquet(PROCESSED_DIR / "ciqual_transformed.parquet")
+    products = pd.read_parquet(PROCESSED_DIR / "off_transformed.parquet")
+
+    start = time.perf_counter()
+    index = CiqualIndex(ciqual)
+    t_index = time.perf_counter() - start
+    start = time.perf_counter()
+    tools = CatalogueTools(products=products, ciqual=ciqual)
+    t_tools = time.perf_counter() - start
+    print(f"Construction : index CIQUAL {t_index:.2f} s ({len(index.df):,} aliments) · "
+          f"outils {t_tools:.2f} s")
+
+    print("\nBloc de références CIQUAL")
+    for question in QUESTIONS:
+        ms = latencies(lambda: index.context_block(question, k=args.k), args.repeat)
+        block = index.context_block(question, k=args.k)
+        print(f"  p50 {np.percentile(ms, 50):5.2f} ms | p99 {np.percentile(ms, 99):5.2f} ms | "
+              f"{count_tokens(block):3d} tokens | {question}")
+
+    print("\nAppels d'outils")
+    for name, arguments in TOOL_CALLS:
+        ms = latencies(lambda: tools.execute(name, arguments), args.repeat)
+        print(f"  p50 {np.percentile(ms, 50):5.2f} ms | p99 {np.percentile(ms, 99):5.2f} ms | "
+              f"{name} {arguments}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Benchmark : jointure OFF × CIQUAL sur chaînes vs clés entières projetées.
+
+Construit un catalogue synthétique en rééchantillonnant le jeu
+OpenFoodFacts transformé ; une part des noms est remplacée par des noms
+d'aliments CIQUAL (casse et ponctuation variées) pour que la jointure
+apparie réellement des produits. Compare :
+
+    - l'ancienne jointure : clé chaîne par ligne, ``merge`` de toute la
+      table CIQUAL (suffixes ``_off`` / ``_ciqual``)
+    - ``enrich_off_with_ciqual`` : noms factorisés, ``alim_code`` par
+      produit, table de référence projetée stockée à part
+
+Rapporte le temps de jointure, la mémoire du résultat et la taille des
+fichiers Parquet écrits.
+
+Usage:
+    python -m benchmarks.bench_ciqual_join --rows 1000000 --matched 0.3
+"""
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from src.config.paths import PROCESSED_DIR
+from src.enricher.ciqual_join import CIQUAL_ID
+from src.enricher.enrich_data import enrich_off_with_ciqual
+from src.enricher.schema import apply_schema
+
+
+def synthetic_catalogue(rows: int, ciqual: pd.DataFrame, matched: float, seed: int = 0) -> pd.DataFrame:
+    df = pd.read_parquet(PROCESSED_DIR / "off_transformed.parquet")
+    rng = np.random.default_rng(seed)
+    df = df.iloc[rng.integers(0, len(df), rows)].reset_index(drop=True)
+    replace = rng.random(rows) < matched
+    names = ciqual["alim_nom_fr"].dropna().to_numpy(dtype=object)
+    picked = pd.Series(names[rng.integers(0, len(names), replace.sum())])
+    # Variantes de saisie : majuscules, virgules retirées
+    picked = picked.where(rng.random(len(picked)) < 0.5, picked.str.upper().str.replace(",", ""))
+    df.loc[replace, "product_name"] = picked.to_numpy()
+    return df
+
+
+def legacy_join(df_off: pd.DataFrame, df_ciqual: pd.DataFrame) -> pd.DataFrame:
+    """Jointure d'origine (clé chaîne ligne par ligne, toutes les colonnes CIQUAL)."""
+    pattern = r"[^a-zàâçéèêëîïôûùüÿñæœ ]"
+    df_off = df_off.assign(
+        product_name_norm=df_off["product_name"].astype(str).str.lower().str.replace(pattern, "", regex=True)
+    )
+    df_ciqual = df_ciqual.assign(
+        food_name_norm=df_ciqual["alim_nom_fr"].astype(str).str.lower().str.replace(pattern, "", regex=True)
+    )
+    return df_off.merge(
+        df_ciqual, left_on="product_name_norm", right_on="food_name_norm",
+        how="left", suffixes=("_off", "_ciqual"),
+    )
+
+
+def parquet_size(df: pd.DataFrame, path: Path) -> float:
+    df.to_parquet(path, engine="pyarrow", index=False)
+    return path.stat().st_size / 2**20
+
+
+def mb(df: pd.DataFrame) -> float:
+    return df.memory_usage(deep=True).sum() / 2**20
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--matched", type=float, default=0.3)
+    args = parser.parse_args()
+
+    ciqual = apply_schema(pd.read_parquet(PROCESSED_DIR / "ciqual_transformed.parquet"))
+    off = apply_schema(synthetic_catalogue(args.rows, ciqual, args.matched))
+    print(f"Catalogue synthétique : {len(off):,} produits · CIQUAL : {len(ciqual):,} aliments "
+          f"({len(ciqual.columns)} colonnes)\n")
+
+    start = time.perf_counter()
+    legacy = legacy_join(off, ciqual)
+    t_legacy = time.perf_counter() - start
+
+    start = time.perf_counter()
+    enriched, lookup = enrich_off_with_ciqual(off, ciqual)
+    t_new = time.perf_counter() - start
+
+    with tempfile.TemporaryDirectory() as tmp:
+        size_legacy = parquet_size(legacy, Path(tmp) / "legacy.parquet")
+        size_new = parquet_size(enriched, Path(tmp) / "enriched.parquet")
+        size_lookup = parquet_size(lookup, Path(tmp) / "lookup.parquet")
+
+    print(f"{'':26s} | {'temps':>8s} | {'colonnes':>8s} | {'mémoire':>10s} | {'Parquet':>9s}")
+    print(f"{'jointure chaînes (merge)':26s} | {t_legacy:6.2f} s | {len(legacy.columns):8d} | "
+          f"{mb(legacy):7.0f} Mo | {size_legacy:6.1f} Mo")
+    print(f"{'clés entières + référence':26s} | {t_new:6.2f} s | {len(enriched.columns):8d} | "
+          f"{mb(enriched):7.0f} Mo | {size_new:6.1f} Mo (+ référence {size_lookup:.2f} Mo, "
+          f"{len(lookup.columns) - 1} colonnes)")
+    # L'ancienne clé retire les chiffres : « Lait à 1,2 % » et « Lait à 12 % »
+    # se confondent, et les noms CIQUAL en double dupliquent des produits
+    print(f"\nLignes en sortie : chaînes {len(legacy):,} · clés entières {len(enriched):,}")
+    print(f"Produits appariés : chaînes {legacy['alim_nom_fr'].notna().sum():,} · "
+          f"clés entières {enriched[CIQUAL_ID].notna().sum():,}")
+
+
+if __name__ == "__main__":
+    main()
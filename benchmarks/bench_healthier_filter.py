@@ -0,0 +1,90 @@
+"""
+Benchmark : filtre "produits plus sains" liste de dicts vs vectorisé.
+
+Construit un catalogue synthétique en rééchantillonnant le jeu
+OpenFoodFacts transformé, puis compare :
+    - ProductRecommender.filter_healthier_products (liste de dicts)
+    - une compréhension de liste appliquant toutes les contraintes
+    - ProductRecommender.filter_healthier_frame (passe vectorisée)
+
+Usage:
+    python -m benchmarks.bench_healthier_filter --rows 1000000
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from src.config.paths import PROCESSED_DIR
+from src.ia.recommender import ProductRecommender
+
+CONSTRAINTS = {
+    "max_nutriscore": "B",
+    "max_nova": 3,
+    "max_additives": 2,
+    "exclude_allergens": ["milk"],
+    "preferences": {"sans_gluten": True},
+}
+
+
+def synthetic_catalogue(rows: int, seed: int = 0) -> pd.DataFrame:
+    df = pd.read_parquet(PROCESSED_DIR / "off_transformed.parquet")
+    rng = np.random.default_rng(seed)
+    return df.iloc[rng.integers(0, len(df), rows)].reset_index(drop=True)
+
+
+def list_filter(products, max_nutriscore, max_nova, max_additives,
+                exclude_allergens, preferences):
+    """Équivalent des contraintes en compréhension de liste (référence)."""
+    allowed = ["A", "B", "C", "D", "E"][:["A", "B", "C", "D", "E"].index(max_nutriscore) + 1]
+    excluded = list(exclude_allergens)
+    if preferences.get("sans_gluten"):
+        excluded.append("gluten")
+    return [
+        p for p in products
+        if isinstance(p.get("nutriscore_grade"), str)
+        and p["nutriscore_grade"].upper() in allowed
+        and p.get("nova_group") is not None and p["nova_group"] <= max_nova
+        and p.get("additives_n") is not None and p["additives_n"] <= max_additives
+        and not any(a in (p.get("allergens") or "").lower() for a in excluded)
+    ]
+
+
+def timed(fn, repeat: int = 3):
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    df = synthetic_catalogue(args.rows)
+    start = time.perf_counter()
+    records = df.to_dict(orient="records")
+    t_records = time.perf_counter() - start
+    print(f"Catalogue synthétique : {len(df):,} produits")
+    print(f"Conversion en liste de dicts (non comptée ci-dessous) : {t_records:.3f} s")
+
+    t_simple, simple = timed(lambda: ProductRecommender.filter_healthier_products(records))
+    t_list, listed = timed(lambda: list_filter(records, **CONSTRAINTS))
+    t_frame_simple, frame_simple = timed(lambda: ProductRecommender.filter_healthier_frame(df))
+    t_frame, frame = timed(lambda: ProductRecommender.filter_healthier_frame(df, **CONSTRAINTS))
+
+    assert len(simple) == len(frame_simple)
+    assert len(listed) == len(frame)
+
+    print(f"Nutri-Score seul  | liste : {t_simple:7.3f} s | vectorisé : {t_frame_simple:7.3f} s "
+          f"| x{t_simple / t_frame_simple:5.1f} | {len(frame_simple):,} produits")
+    print(f"Toutes contraintes | liste : {t_list:7.3f} s | vectorisé : {t_frame:7.3f} s "
+          f"| x{t_list / t_frame:5.1f} | {len(frame):,} produits")
+
+
+if __name__ == "__main__":
+    main()
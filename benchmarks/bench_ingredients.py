@@ -0,0 +1,72 @@
+"""
+Benchmark : analyse des listes d'ingrédients.
+
+Construit une colonne de textes d'ingrédients en rééchantillonnant le jeu
+OpenFoodFacts transformé ; une part des lignes reçoit une variante unique
+(pourcentage modifié) pour simuler un catalogue où les listes identiques
+sont fréquentes sans être la règle. Compare :
+    - ``parse_ingredients`` ligne par ligne
+    - ``parse_ingredients_column`` : textes distincts seulement, pool de
+      processus, puis second appel servi par le cache
+
+Usage:
+    python -m benchmarks.bench_ingredients --rows 1000000 --unique 0.05
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+import utils.transformer as transformer
+from src.config.paths import PROCESSED_DIR
+
+
+def synthetic_texts(rows: int, unique: float, seed: int = 0) -> pd.Series:
+    texts = pd.read_parquet(PROCESSED_DIR / "off_transformed.parquet")["ingredients_text"]
+    rng = np.random.default_rng(seed)
+    texts = texts.iloc[rng.integers(0, len(texts), rows)].reset_index(drop=True)
+    variant = rng.random(rows) < unique
+    suffix = pd.Series(rng.integers(0, 10_000, variant.sum())).map(lambda n: f", sel {n / 100:.2f} %")
+    texts[variant] = texts[variant].fillna("") + suffix.to_numpy()
+    return texts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--unique", type=float, default=0.05)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--sample", type=int, default=50_000,
+                        help="lignes analysées une par une (extrapolé au total)")
+    args = parser.parse_args()
+
+    texts = synthetic_texts(args.rows, args.unique)
+    print(f"{len(texts):,} textes ({texts.nunique():,} distincts)\n")
+
+    sample = texts.iloc[:args.sample]
+    start = time.perf_counter()
+    sample.map(transformer.parse_ingredients)
+    t_rows = (time.perf_counter() - start) * len(texts) / len(sample)
+
+    transformer._PARSE_CACHE.clear()
+    start = time.perf_counter()
+    parsed = transformer.parse_ingredients_column(texts, workers=args.workers)
+    t_column = time.perf_counter() - start
+
+    start = time.perf_counter()
+    transformer.parse_ingredients_column(texts, workers=args.workers)
+    t_cached = time.perf_counter() - start
+
+    start = time.perf_counter()
+    table = transformer.ingredients_table(pd.DataFrame({"code": texts.index.astype(str), "ingredients_parsed": parsed}))
+    t_arrow = time.perf_counter() - start
+
+    print(f"Ligne par ligne (extrapolé)   : {t_rows:7.2f} s")
+    print(f"Textes distincts + pool       : {t_column:7.2f} s | x{t_rows / t_column:5.1f}")
+    print(f"Second appel (cache)          : {t_cached:7.2f} s | x{t_rows / t_cached:5.1f}")
+    print(f"Colonne liste Arrow           : {t_arrow:7.2f} s | {table.nbytes / 2**20:.0f} Mo")
+
+
+if __name__ == "__main__":
+    main()
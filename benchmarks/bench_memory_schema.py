@@ -0,0 +1,66 @@
+"""
+Benchmark : occupation mémoire avant / après le schéma compact.
+
+Pour chaque jeu existant (OFF transformé, CIQUAL transformé, OFF enrichi)
+puis pour un catalogue synthétique obtenu en rééchantillonnant le jeu
+OpenFoodFacts transformé, mesure les octets par ligne (``memory_usage``
+profond) des types lus tels quels puis après
+``src.enricher.schema.apply_schema``.
+
+Usage:
+    python -m benchmarks.bench_memory_schema --rows 1000000
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from src.config.paths import ENRICHED_DIR, PROCESSED_DIR
+from src.enricher.schema import apply_schema, memory_report
+
+DATASETS = {
+    "OFF transformé": PROCESSED_DIR / "off_transformed.parquet",
+    "CIQUAL transformé": PROCESSED_DIR / "ciqual_transformed.parquet",
+    "OFF enrichi": ENRICHED_DIR / "off_enriched.parquet",
+}
+
+
+def synthetic_catalogue(rows: int, seed: int = 0) -> pd.DataFrame:
+    df = pd.read_parquet(PROCESSED_DIR / "off_transformed.parquet")
+    rng = np.random.default_rng(seed)
+    return df.iloc[rng.integers(0, len(df), rows)].reset_index(drop=True)
+
+
+def summary(label: str, before: pd.DataFrame) -> pd.DataFrame:
+    start = time.perf_counter()
+    after = apply_schema(before)
+    elapsed = time.perf_counter() - start
+    report = memory_report(before, after)
+    total = report.loc["TOTAL"]
+    print(f"{label:28s} | {len(before):>9,} lignes | "
+          f"{total['bytes_before']:8.1f} -> {total['bytes_after']:7.1f} o/ligne | "
+          f"x{total['ratio']:4.1f} | "
+          f"{total['bytes_before'] * len(before) / 2**20:8.1f} -> "
+          f"{total['bytes_after'] * len(before) / 2**20:7.1f} Mo | "
+          f"compaction {elapsed:.2f} s")
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    for label, path in DATASETS.items():
+        if path.exists():
+            summary(label, pd.read_parquet(path))
+
+    report = summary(f"Synthétique ({args.rows:,})", synthetic_catalogue(args.rows))
+
+    print("\nDétail par colonne (catalogue synthétique, octets par ligne)")
+    print(report.round(2).to_string())
+
+
+if __name__ == "__main__":
+    main()
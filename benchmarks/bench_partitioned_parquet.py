@@ -0,0 +1,108 @@
+"""
+Benchmark : lecture filtrée Parquet monolithique vs jeu partitionné.
+
+Construit un catalogue synthétique en rééchantillonnant le jeu
+OpenFoodFacts transformé, l'écrit :
+    - en un seul fichier Parquet (paramètres par défaut, comme
+      ``enrich_data.main``)
+    - en jeu partitionné (``src.enricher.dataset_store.write_dataset``)
+
+puis compare, pour quelques filtres types de l'explorateur, la lecture
+du fichier unique (filtres pandas après chargement, puis ``filters=`` de
+``pd.read_parquet``) et ``read_dataset`` avec élagage des partitions et
+des groupes de lignes.
+
+Usage:
+    python -m benchmarks.bench_partitioned_parquet --rows 1000000
+"""
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from src.config.paths import PROCESSED_DIR
+from src.enricher.dataset_store import category_root, read_dataset, scan_plan, write_dataset
+
+QUERIES = {
+    "Nutri-Score A/B, sucres ≤ 5 g": [("nutriscore_grade", "in", ["a", "b"]), ("sugars_100g", "<=", 5)],
+    "Catégorie snacks": [("category_root", "==", "snacks")],
+    "Snacks, sucres ≤ 10 g": [("category_root", "==", "snacks"), ("sugars_100g", "<=", 10)],
+    "Sel ≥ 1.5 g": [("salt_100g", ">=", 1.5)],
+}
+
+
+def synthetic_catalogue(rows: int, seed: int = 0) -> pd.DataFrame:
+    df = pd.read_parquet(PROCESSED_DIR / "off_transformed.parquet")
+    rng = np.random.default_rng(seed)
+    return df.iloc[rng.integers(0, len(df), rows)].reset_index(drop=True)
+
+
+def pandas_mask(df: pd.DataFrame, filters) -> pd.Series:
+    mask = pd.Series(True, index=df.index)
+    for column, op, value in filters:
+        col = df[column]
+        mask &= {
+            "==": lambda: col == value,
+            "in": lambda: col.isin(value),
+            "<=": lambda: col <= value,
+            ">=": lambda: col >= value,
+        }[op]()
+    return mask
+
+
+def timed(fn, repeat: int = 3):
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--row-group-size", type=int, default=64_000)
+    args = parser.parse_args()
+
+    df = synthetic_catalogue(args.rows)
+    # Colonnes de partition aussi présentes dans le fichier unique (filtres identiques)
+    df["category_root"] = category_root(df["categories"])
+    df["nutriscore_grade"] = df["nutriscore_grade"].str.lower().fillna("unknown")
+    print(f"Catalogue synthétique : {len(df):,} produits")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        mono = Path(tmp) / "off.parquet"
+        start = time.perf_counter()
+        df.to_parquet(mono, engine="pyarrow", index=False)
+        t_mono = time.perf_counter() - start
+
+        root = Path(tmp) / "off_dataset"
+        start = time.perf_counter()
+        written = write_dataset(df, root, row_group_size=args.row_group_size)
+        t_part = time.perf_counter() - start
+
+        print(f"Écriture fichier unique : {t_mono:.2f} s · "
+              f"partitionné : {t_part:.2f} s ({written['files']} fichiers, "
+              f"{written['row_groups']} groupes de lignes)\n")
+
+        for label, filters in QUERIES.items():
+            t_full, full = timed(lambda: (lambda d: d[pandas_mask(d, filters)])(pd.read_parquet(mono)))
+            t_pushdown, pushed = timed(lambda: pd.read_parquet(mono, filters=filters))
+            t_dataset, pruned = timed(lambda: read_dataset(root, filters))
+            plan = scan_plan(root, filters)
+
+            assert len(full) == len(pushed) == len(pruned)
+            print(f"{label:32s} | {len(pruned):>9,} lignes")
+            print(f"  fichier unique + pandas : {t_full:7.3f} s")
+            print(f"  fichier unique, filters : {t_pushdown:7.3f} s")
+            print(f"  partitionné             : {t_dataset:7.3f} s | x{t_full / t_dataset:5.1f} | "
+                  f"{plan['files_scanned']}/{plan['files']} fichiers, "
+                  f"{plan['row_groups_scanned']}/{plan['row_groups']} groupes de lignes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Benchmark : position d'un produit dans sa catégorie, parcours vs centiles.
+
+Construit un catalogue synthétique en rééchantillonnant le jeu
+OpenFoodFacts transformé (schéma compact, Nutri-Score recalculé) et
+compare, pour le taux de sucres :
+    - le parcours à la demande : produits de la catégorie retrouvés par
+      ``str.contains`` puis comparaison des valeurs
+    - ``PercentileTables.rank`` : dichotomie dans les centiles précalculés,
+      pour un produit puis pour tout le catalogue en un lot
+
+Rapporte le temps de calcul des tables, leur taille et l'écart au rang
+exact sur un échantillon.
+
+Usage:
+    python -m benchmarks.bench_percentiles --rows 1000000
+"""
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from src.config.paths import PROCESSED_DIR
+from src.enricher.nutriscore import add_nutriscore_columns
+from src.enricher.percentiles import CATALOGUE, PercentileTables
+from src.enricher.schema import apply_schema
+from src.enricher.taxonomy import Taxonomy
+
+COLUMN = "sugars_100g"
+
+
+def synthetic_catalogue(rows: int, seed: int = 0) -> pd.DataFrame:
+    df = pd.read_parquet(PROCESSED_DIR / "off_transformed.parquet")
+    rng = np.random.default_rng(seed)
+    return df.iloc[rng.integers(0, len(df), rows)].reset_index(drop=True)
+
+
+def scan_rank(df: pd.DataFrame, label: str, value: float) -> float:
+    """Rang par parcours de la catégorie (ancienne approche)."""
+    members = df["categories"].astype(object).str.contains(label, case=False, regex=False, na=False)
+    values = df.loc[members, COLUMN].astype(float).dropna().to_numpy()
+    return float((values < value).mean() * 100)
+
+
+def exact_rank(values: np.ndarray, value: float) -> float:
+    """Rang exact (rang moyen des ex aequo, comme les tables)."""
+    values = values[~np.isnan(values)]
+    return float(((values < value).mean() + (values <= value).mean()) * 50)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--sample", type=int, default=20)
+    args = parser.parse_args()
+
+    df = apply_schema(add_nutriscore_columns(synthetic_catalogue(args.rows)))
+    taxonomy = Taxonomy.from_frame(df)
+
+    start = time.perf_counter()
+    tables = PercentileTables.from_frame(df, taxonomy)
+    t_build = time.perf_counter() - start
+    with tempfile.TemporaryDirectory() as tmp:
+        size = tables.save(Path(tmp) / "percentiles.parquet")["bytes"]
+    print(f"{len(df):,} produits · tables : {len(tables.keys)} catégories × {len(tables.columns)} colonnes, "
+          f"calculées en {t_build:.2f} s, {size / 2**10:.0f} Ko\n")
+
+    categories = tables.categories_for(df["categories"])
+    rng = np.random.default_rng(1)
+    sample = [i for i in rng.permutation(len(df)) if categories[i] != CATALOGUE][:args.sample]
+
+    start = time.perf_counter()
+    for i in sample:
+        scan_rank(df, tables.label(categories[i]), float(df[COLUMN].iloc[i]))
+    t_scan = (time.perf_counter() - start) / len(sample)
+
+    start = time.perf_counter()
+    approx = [tables.rank_product(df.iloc[i].to_dict())["percentiles"].get(COLUMN, np.nan) for i in sample]
+    t_product = (time.perf_counter() - start) / len(sample)
+
+    start = time.perf_counter()
+    batch = tables.rank(COLUMN, df[COLUMN].to_numpy(dtype=np.float64), categories)
+    t_batch = time.perf_counter() - start
+
+    # Précision : rang exact sur les mêmes produits (membres de la catégorie dans la taxonomie)
+    sugars = df[COLUMN].to_numpy(dtype=np.float64)
+    exact = [exact_rank(sugars[taxonomy.members(taxonomy.id_of(tables.keys[categories[i]]))], sugars[i])
+             for i in sample]
+    gap = np.nanmax(np.abs(np.array(approx) - np.array(exact)))
+    print(f"Parcours par requête (str.contains)  : {t_scan * 1e3:9.1f} ms / produit")
+    print(f"rank_product (toutes les colonnes)   : {t_product * 1e3:9.3f} ms / produit | x{t_scan / t_product:.0f}")
+    print(f"rank par lot ({len(df):,} produits) : {t_batch:9.2f} s ({t_batch / len(df) * 1e6:.2f} µs / produit)")
+    print(f"Écart maximal au rang exact ({len(sample)} produits) : {gap:.1f} centiles")
+    print(f"Produits classés : {np.isfinite(batch).sum():,}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""
+Benchmark : mémoire par processus, Parquet décodé vs Arrow IPC projeté.
+
+Construit un catalogue synthétique en rééchantillonnant le jeu
+OpenFoodFacts transformé, l'écrit en Parquet et en Arrow IPC
+(``src.enricher.arrow_store.publish_ipc``), puis lance N processus
+« workers » simultanés qui chargent la table comme l'application :
+
+    - parquet : ``pd.read_parquet`` + schéma compact (copie privée)
+    - arrow   : ``open_ipc`` (projection mémoire partagée)
+
+Chaque worker parcourt les colonnes (pages effectivement lues) puis
+relève son RSS, sa part anonyme (privée), sa part fichier (cache de pages
+partagé) et son PSS (mémoire partagée divisée entre les processus qui la
+projettent). Le temps de chargement est celui d'un processus neuf ; le
+cache de pages du système n'est pas vidé.
+
+Mesure aussi le coût d'un succès de cache : ``st.cache_data`` renvoie une
+copie dé-sérialisée, ``st.cache_resource`` le même objet.
+
+Usage:
+    python -m benchmarks.bench_shared_arrow --rows 500000 --workers 4
+"""
+import argparse
+import multiprocessing as mp
+import pickle
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from src.config.paths import PROCESSED_DIR
+from src.enricher.arrow_store import open_ipc, publish_ipc
+from src.enricher.schema import apply_schema
+
+
+def synthetic_catalogue(rows: int, seed: int = 0) -> pd.DataFrame:
+    df = pd.read_parquet(PROCESSED_DIR / "off_transformed.parquet")
+    rng = np.random.default_rng(seed)
+    return df.iloc[rng.integers(0, len(df), rows)].reset_index(drop=True)
+
+
+def process_memory() -> dict:
+    """RSS, parts anonyme / fichier et PSS du processus courant, en Mo (Linux)."""
+    fields = {}
+    for name in ("/proc/self/status", "/proc/self/smaps_rollup"):
+        try:
+            with open(name) as f:
+                for line in f:
+                    key, _, value = line.partition(":")
+                    if value.strip().endswith("kB"):
+                        fields[key] = int(value.split()[0]) / 1024
+        except OSError:
+            pass
+    return {
+        "rss": fields.get("VmRSS", float("nan")),
+        "anon": fields.get("RssAnon", float("nan")),
+        "file": fields.get("RssFile", float("nan")),
+        "pss": fields.get("Pss", float("nan")),
+        "peak": fields.get("VmHWM", float("nan")),
+    }
+
+
+def touch(df: pd.DataFrame) -> float:
+    """Lit toutes les valeurs (comme un filtre ou un tri de l'explorateur)."""
+    total = 0.0
+    for col in df.columns:
+        series = df[col]
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            total += float(series.cat.codes.sum())
+        elif pd.api.types.is_numeric_dtype(series):
+            total += float(series.sum())
+        else:
+            total += float(series.str.len().sum())
+    return total
+
+
+def worker(mode: str, path: str, barrier, queue):
+    baseline = process_memory()
+    start = time.perf_counter()
+    df = open_ipc(Path(path)) if mode == "arrow" else apply_schema(pd.read_parquet(path))
+    load = time.perf_counter() - start
+    touch(df)
+    barrier.wait(timeout=600)  # tous les workers ont leur table en mémoire en même temps
+    memory = process_memory()
+    queue.put({"load": load, **{k: memory[k] - baseline[k] for k in memory}})
+    barrier.wait(timeout=600)
+
+
+def run(mode: str, path: Path, workers: int):
+    ctx = mp.get_context("spawn")
+    barrier, queue = ctx.Barrier(workers), ctx.Queue()
+    processes = [
+        ctx.Process(target=worker, args=(mode, str(path), barrier, queue))
+        for _ in range(workers)
+    ]
+    for p in processes:
+        p.start()
+    results = [queue.get(timeout=900) for _ in processes]
+    for p in processes:
+        p.join()
+    return pd.DataFrame(results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=500_000)
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    df = synthetic_catalogue(args.rows)
+    print(f"Catalogue synthétique : {len(df):,} produits · {args.workers} workers\n")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        parquet = Path(tmp) / "off.parquet"
+        arrow = Path(tmp) / "off.arrow"
+        df.to_parquet(parquet, engine="pyarrow", index=False)
+        published = publish_ipc(df, arrow)
+        print(f"Parquet : {parquet.stat().st_size / 2**20:.0f} Mo · "
+              f"Arrow IPC : {published['bytes'] / 2**20:.0f} Mo\n")
+
+        for mode, path in [("parquet", parquet), ("arrow", arrow)]:
+            r = run(mode, path, args.workers)
+            print(f"{mode:8s} | chargement {r['load'].mean():5.2f} s | "
+                  f"pic {r['peak'].mean():6.0f} Mo | "
+                  f"RSS {r['rss'].mean():6.0f} Mo (privé {r['anon'].mean():5.0f}, "
+                  f"fichier {r['file'].mean():5.0f}) | PSS {r['pss'].mean():6.0f} Mo | "
+                  f"total {args.workers} workers ≈ {r['pss'].sum():6.0f} Mo")
+
+        frame = open_ipc(arrow)
+        start = time.perf_counter()
+        pickle.loads(pickle.dumps(frame, protocol=pickle.HIGHEST_PROTOCOL))
+        t_copy = time.perf_counter() - start
+        print(f"\nSuccès de cache : cache_data (copie) {t_copy * 1000:.0f} ms · "
+              f"cache_resource (même objet) 0 ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Benchmark : panneau « Statistiques », describe exact vs esquisses fusionnées.
+
+Construit un catalogue synthétique en rééchantillonnant le jeu
+OpenFoodFacts transformé (schéma compact appliqué) et compare, pour une
+vue filtrée sur des grades Nutri-Score :
+    - le calcul exact de l'explorateur : ``describe(include="all")`` et
+      ``value_counts`` de l'histogramme sur les lignes filtrées
+    - ``SketchStore.merge`` + ``describe`` / ``histogram`` : fusion des
+      esquisses des partitions retenues
+
+Rapporte aussi le temps de construction, la taille du fichier écrit et
+l'écart des statistiques approchées au calcul exact.
+
+Usage:
+    python -m benchmarks.bench_sketches --rows 1000000
+"""
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from src.config.paths import PROCESSED_DIR
+from src.enricher.schema import apply_schema
+from src.enricher.sketches import SketchStore
+
+GRADES = ["a", "b"]
+COLUMN = "sugars_100g"
+
+
+def synthetic_catalogue(rows: int, seed: int = 0) -> pd.DataFrame:
+    df = pd.read_parquet(PROCESSED_DIR / "off_transformed.parquet")
+    rng = np.random.default_rng(seed)
+    return df.iloc[rng.integers(0, len(df), rows)].reset_index(drop=True)
+
+
+def timed(fn, repeat: int = 3):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def exact_panel(df: pd.DataFrame, columns):
+    """Ancienne approche : filtre puis parcours des lignes retenues."""
+    view = df[df["nutriscore_grade"].astype("string").str.lower().isin(GRADES).to_numpy()]
+    return view[columns].describe(include="all").transpose(), view[COLUMN].dropna().value_counts().head(40)
+
+
+def sketch_panel(store: SketchStore, columns):
+    """Esquisses des partitions retenues fusionnées."""
+    view = store.merge({"nutriscore_grade": GRADES})
+    return view.describe(columns), view.histogram(COLUMN)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    df = apply_schema(synthetic_catalogue(args.rows))
+    columns = [c for c in df.columns if c not in ("code", "ingredients_parsed")]
+
+    t_build, store = timed(lambda: SketchStore.from_frame(df), repeat=1)
+    with tempfile.TemporaryDirectory() as tmp:
+        saved = store.save(Path(tmp) / "sketches.parquet")
+    print(f"{len(df):,} produits · {saved['partitions']} partitions × {saved['columns']} colonnes, "
+          f"calculées en {t_build:.2f} s, {saved['bytes'] / 2**10:.0f} Ko\n")
+
+    t_exact, (exact, _) = timed(lambda: exact_panel(df, columns))
+    t_sketch, (approx, _) = timed(lambda: sketch_panel(store, columns))
+    print(f"Statistiques des grades {', '.join(GRADES).upper()}")
+    print(f"  describe + value_counts : {t_exact * 1e3:8.1f} ms")
+    print(f"  esquisses fusionnées    : {t_sketch * 1e3:8.1f} ms | x{t_exact / t_sketch:.0f}\n")
+
+    # Écarts relatifs au calcul exact
+    for field in ["mean", "50%", "75%"]:
+        gap = abs(float(approx.loc[COLUMN, field]) / float(exact.loc[COLUMN, field]) - 1)
+        print(f"  {COLUMN} {field:<5} : écart {gap * 100:.2f} %")
+    text = [c for c in columns if not pd.api.types.is_numeric_dtype(df[c])]
+    gaps = [abs(approx.loc[c, "unique"] / exact.loc[c, "unique"] - 1) for c in text if exact.loc[c, "unique"]]
+    print(f"  valeurs distinctes ({len(gaps)} colonnes texte) : écart maximal {max(gaps, default=0) * 100:.1f} %")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Benchmark : requêtes par catégorie sur chaînes vs taxonomie indexée.
+
+Construit un catalogue synthétique en rééchantillonnant le jeu
+OpenFoodFacts transformé (schéma compact appliqué) et compare :
+    - « tous les produits de Biscuits » : ``str.contains`` sur la colonne
+      ``categories`` vs ``Taxonomy.members``
+    - sucres moyens par catégorie : découpage des chaînes + ``explode`` +
+      ``groupby`` vs ``Taxonomy.aggregate``
+
+Rapporte aussi le temps de construction et la taille du fichier écrit.
+
+Usage:
+    python -m benchmarks.bench_taxonomy --rows 1000000
+"""
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from src.config.paths import PROCESSED_DIR
+from src.enricher.schema import apply_schema
+from src.enricher.taxonomy import Taxonomy
+
+CATEGORY = "Biscuits"
+
+
+def synthetic_catalogue(rows: int, seed: int = 0) -> pd.DataFrame:
+    df = pd.read_parquet(PROCESSED_DIR / "off_transformed.parquet")
+    rng = np.random.default_rng(seed)
+    return df.iloc[rng.integers(0, len(df), rows)].reset_index(drop=True)
+
+
+def timed(fn, repeat: int = 3):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def exploded_means(df: pd.DataFrame) -> pd.Series:
+    """Ancienne approche : chaque chaîne redécoupée ligne par ligne."""
+    parts = df["categories"].astype(str).str.split(",").explode().str.strip()
+    return df["sugars_100g"].astype(float).reindex(parts.index).groupby(parts.to_numpy()).mean()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    df = apply_schema(synthetic_catalogue(args.rows))
+    t_build, taxonomy = timed(lambda: Taxonomy.from_frame(df), repeat=1)
+    with tempfile.TemporaryDirectory() as tmp:
+        saved = taxonomy.save(Path(tmp) / "taxonomy.parquet")
+        t_load, _ = timed(lambda: Taxonomy.load(Path(tmp) / "taxonomy.parquet"))
+
+    print(f"{len(df):,} produits · {len(taxonomy):,} catégories, {int((taxonomy.parents < 0).sum())} racines, "
+          f"{len(taxonomy.indices):,} appartenances")
+    print(f"Construction {t_build:.2f} s · fichier {saved['bytes'] / 2**20:.1f} Mo, relu en {t_load:.2f} s\n")
+
+    # La sous-chaîne compte aussi « Biscuits and cakes », « Biscuits apéritifs »… hors de la sous-arborescence
+    category = taxonomy.id_of(CATEGORY)
+    t_scan, scanned = timed(lambda: df["categories"].astype(str).str.contains(CATEGORY, case=False).to_numpy())
+    t_members, members = timed(lambda: taxonomy.members(category, descendants=True))
+    print(f"Produits sous « {CATEGORY} »")
+    print(f"  str.contains          : {t_scan * 1e3:8.1f} ms ({scanned.sum():,} produits)")
+    print(f"  Taxonomy.members      : {t_members * 1e3:8.2f} ms ({len(members):,} produits) | x{t_scan / t_members:.0f}")
+
+    sugars = df["sugars_100g"].to_numpy(dtype=np.float64)
+    t_explode, _ = timed(lambda: exploded_means(df), repeat=1)
+    t_aggregate, _ = timed(lambda: taxonomy.aggregate(sugars))
+    print("Sucres moyens par catégorie")
+    print(f"  split + explode       : {t_explode * 1e3:8.1f} ms")
+    print(f"  Taxonomy.aggregate    : {t_aggregate * 1e3:8.1f} ms | x{t_explode / t_aggregate:.0f}")
+
+
+if __name__ == "__main__":
+    main()
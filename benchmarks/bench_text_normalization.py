@@ -0,0 +1,92 @@
+"""
+Benchmark : normalisation des noms ligne par ligne vs par valeur distincte.
+
+Compare, sur les noms d'un catalogue synthétique obtenu en rééchantillonnant
+le jeu OpenFoodFacts transformé :
+    - l'ancienne clé de l'enrichissement (regex ``.str`` sur chaque ligne)
+    - l'ancienne clé de l'application (NFKD + encode/decode + regex sur
+      chaque ligne)
+    - ``src.enricher.text.normalize_series`` : colonne factorisée, valeurs
+      distinctes normalisées, cache vide puis cache chaud
+
+et compte les correspondances OFF × CIQUAL obtenues par chaque clé.
+
+Usage:
+    python -m benchmarks.bench_text_normalization --rows 1000000
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from src.config.paths import PROCESSED_DIR
+from src.enricher.text import cache_info, normalize_name, normalize_series
+
+
+def synthetic_catalogue(rows: int, seed: int = 0) -> pd.DataFrame:
+    df = pd.read_parquet(PROCESSED_DIR / "off_transformed.parquet")
+    rng = np.random.default_rng(seed)
+    return df.iloc[rng.integers(0, len(df), rows)].reset_index(drop=True)
+
+
+def enricher_key(s: pd.Series) -> pd.Series:
+    """Ancienne clé de ``enrich_off_with_ciqual``."""
+    return s.astype(str).str.lower().str.replace(r"[^a-zàâçéèêëîïôûùüÿñæœ ]", "", regex=True)
+
+
+def app_key(s: pd.Series) -> pd.Series:
+    """Ancienne clé ``normalize_text`` de ``streamlit.py``."""
+    return (
+        s.fillna("")
+        .str.lower()
+        .str.normalize("NFKD")
+        .str.encode("ascii", errors="ignore")
+        .str.decode("utf-8")
+        .str.replace(r"[^a-z0-9 ]", "", regex=True)
+        .str.strip()
+    )
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    names = synthetic_catalogue(args.rows)["product_name"]
+    ciqual = pd.read_parquet(PROCESSED_DIR / "ciqual_transformed.parquet")["alim_nom_fr"]
+    print(f"{len(names):,} noms ({names.nunique():,} distincts)\n")
+
+    t_enricher, k_enricher = timed(lambda: enricher_key(names))
+    t_app, k_app = timed(lambda: app_key(names))
+    normalize_name.cache_clear()
+    t_cold, k_shared = timed(lambda: normalize_series(names))
+    t_warm, _ = timed(lambda: normalize_series(names))
+    categorical = names.astype("category")
+    t_category, _ = timed(lambda: normalize_series(categorical))
+
+    print(f"Clé enrichissement (par ligne) : {t_enricher:6.3f} s")
+    print(f"Clé application (par ligne)    : {t_app:6.3f} s")
+    print(f"normalize_series, cache vide   : {t_cold:6.3f} s | x{t_app / t_cold:5.1f}")
+    print(f"normalize_series, cache chaud  : {t_warm:6.3f} s | x{t_app / t_warm:5.1f}")
+    print(f"normalize_series, catégorielle : {t_category:6.3f} s")
+    print(f"Cache : {cache_info()}")
+
+    print("\nProduits appariés à CIQUAL")
+    for label, key, food_key in [
+        ("enrichissement", k_enricher, enricher_key(ciqual)),
+        ("application", k_app, app_key(ciqual)),
+        ("clé partagée", k_shared, normalize_series(ciqual)),
+    ]:
+        print(f"  {label:15s} : {key.isin(set(food_key) - {''}).sum():>9,}")
+    print(f"  Clés identiques enrichissement / application : {(k_enricher == k_app).mean():.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,376 @@
+"""
+Serveur LLM factice compatible OpenAI et Ollama, 100 % local.
+
+Simule un fournisseur pour mesurer la couche ``src/ia`` sans réseau ni
+modèle : latence avant le premier token, débit de génération (tokens/s)
+et injection d'erreurs sont configurables.
+
+Routes :
+    - OpenAI : ``POST /v1/chat/completions`` (JSON ou SSE si ``stream``)
+    - Ollama : ``POST /api/generate``, ``POST /api/chat`` (JSON ou NDJSON),
+      ``GET /api/tags``, ``GET /api/ps``, ``POST /api/show`` ; le chargement
+      du modèle en mémoire (``--load-time``) et sa durée de résidence
+      (``keep_alive``) sont simulés
+    - ``GET /stats`` : compteurs du serveur
+
+Usage:
+    python -m benchmarks.fake_llm_server --port 11500 --latency 0.3 --token-rate 40
+    OLLAMA_API_BASE=http://127.0.0.1:11500 streamlit run streamlit.py
+"""
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterator
+
+from src.ia.ollama_runtime import model_tag, parse_keep_alive
+
+WORDS = (
+    "Ce produit présente un profil nutritionnel moyen avec une teneur élevée en sucres "
+    "et en graisses saturées mais un apport correct en fibres et en protéines il est "
+    "préférable de le consommer occasionnellement et de privilégier des alternatives "
+    "moins transformées au Nutri-Score plus favorable"
+).split()
+
+MODELS = ["mistral:latest", "llama3:latest"]
+
+
+@dataclass
+class FakeLLMConfig:
+    """
+    Comportement simulé du fournisseur.
+
+    Attributes:
+        latency: Délai avant le premier token (secondes)
+        jitter: Variation aléatoire uniforme ajoutée à la latence (secondes)
+        token_rate: Débit de génération (tokens/s, 0 = instantané)
+        completion_tokens: Longueur des réponses (bornée par ``max_tokens``)
+        error_rate: Probabilité qu'une requête échoue
+        error_status: Code HTTP renvoyé en cas d'échec injecté
+        load_time: Chargement du modèle en mémoire (Ollama, secondes)
+        keep_alive: Résidence par défaut après une requête (secondes)
+        seed: Graine du générateur aléatoire
+    """
+
+    latency: float = 0.2
+    jitter: float = 0.05
+    token_rate: float = 50.0
+    completion_tokens: int = 60
+    error_rate: float = 0.0
+    error_status: int = 500
+    load_time: float = 0.0
+    keep_alive: float = 300.0
+    seed: int = 0
+
+
+class FakeLLMServer:
+    """Serveur HTTP factice lancé dans un thread (``with FakeLLMServer() as srv``)."""
+
+    def __init__(self, config: FakeLLMConfig = None, host: str = "127.0.0.1", port: int = 0):
+        self.config = config or FakeLLMConfig()
+        self._random = random.Random(self.config.seed)
+        self._lock = threading.Lock()
+        self.counters = {"requests": 0, "streamed": 0, "errors": 0, "tokens": 0,
+                         "loads": 0, "load_requests": 0}
+        self._resident: Dict[str, float] = {}
+        self._load_lock = threading.Lock()
+
+        handler = type("Handler", (_Handler,), {"server_state": self})
+        self.httpd = ThreadingHTTPServer((host, port), handler)
+        self.httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeLLMServer":
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self) -> "FakeLLMServer":
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self.counters)
+
+    # --------------------------------------------------
+    # Simulation
+    # --------------------------------------------------
+    def _count(self, key: str, n: int = 1):
+        with self._lock:
+            self.counters[key] += n
+
+    def resident_models(self) -> Dict[str, float]:
+        """Modèles en mémoire et leur date d'expiration (horloge monotone)."""
+        now = time.monotonic()
+        with self._lock:
+            return {m: exp for m, exp in self._resident.items() if exp > now}
+
+    def ensure_loaded(self, model: str, keep_alive: Any = None) -> bool:
+        """Charge le modèle s'il n'est pas résident ; retourne True si chargement."""
+        model = model_tag(model)
+        loaded = False
+        with self._load_lock:
+            if model not in self.resident_models():
+                self._count("loads")
+                time.sleep(self.config.load_time)
+                loaded = True
+            seconds = parse_keep_alive(self.config.keep_alive if keep_alive is None else keep_alive)
+            with self._lock:
+                self._resident[model] = time.monotonic() + seconds
+        return loaded
+
+    def should_fail(self) -> bool:
+        with self._lock:
+            return self._random.random() < self.config.error_rate
+
+    def first_token_delay(self) -> float:
+        with self._lock:
+            return max(0.0, self.config.latency + self._random.uniform(0, self.config.jitter))
+
+    def tokens(self, max_tokens: Any) -> Iterator[str]:
+        """Génère la réponse mot à mot au débit configuré."""
+        n = self.config.completion_tokens
+        if isinstance(max_tokens, int) and max_tokens > 0:
+            n = min(n, max_tokens)
+        interval = 1.0 / self.config.token_rate if self.config.token_rate > 0 else 0.0
+        for i in range(n):
+            if i and interval:
+                time.sleep(interval)
+            yield (" " if i else "") + WORDS[i % len(WORDS)]
+        self._count("tokens", n)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server_state: FakeLLMServer
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    # --------------------------------------------------
+    # Réponses
+    # --------------------------------------------------
+    def _json(self, payload: Dict[str, Any], status: int = 200):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _start_stream(self, content_type: str):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+    def _chunk(self, data: str):
+        raw = data.encode("utf-8")
+        self.wfile.write(f"{len(raw):X}\r\n".encode("ascii") + raw + b"\r\n")
+        self.wfile.flush()
+
+    def _end_stream(self):
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+    def _read_body(self) -> Dict[str, Any]:
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b"{}"
+        try:
+            return json.loads(raw or b"{}")
+        except json.JSONDecodeError:
+            return {}
+
+    # --------------------------------------------------
+    # Routes
+    # --------------------------------------------------
+    def do_GET(self):
+        if self.path.rstrip("/") == "/api/tags":
+            self._json({"models": [{"name": m, "model": m} for m in MODELS]})
+        elif self.path.rstrip("/") == "/api/ps":
+            self._json({"models": [
+                {"name": m, "model": m, "expires_in": round(exp - time.monotonic(), 1)}
+                for m, exp in self.server_state.resident_models().items()
+            ]})
+        elif self.path.rstrip("/") == "/stats":
+            self._json(self.server_state.stats())
+        else:
+            self._json({"error": "not found"}, status=404)
+
+    def do_POST(self):
+        path = self.path.rstrip("/")
+        body = self._read_body()
+
+        if path == "/api/show":
+            self._json({"modelfile": "", "parameters": "", "template": "{{ .Prompt }}",
+                        "details": {"family": "fake"}, "model_info": {}})
+            return
+
+        routes = {
+            "/v1/chat/completions": self._openai,
+            "/chat/completions": self._openai,
+            "/api/generate": self._ollama,
+            "/api/chat": self._ollama,
+        }
+        route = routes.get(path)
+        if route is None:
+            self._json({"error": "not found"}, status=404)
+            return
+
+        state = self.server_state
+        ollama = path.startswith("/api/")
+
+        # Requête sans prompt : chargement du modèle uniquement (préchargement)
+        if ollama and not body.get("prompt") and not body.get("messages"):
+            state._count("load_requests")
+            state.ensure_loaded(body.get("model", "mistral"), body.get("keep_alive"))
+            self._json({"model": body.get("model"), "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ"),
+                        "response": "", "done": True, "done_reason": "load"})
+            return
+
+        state._count("requests")
+        if state.should_fail():
+            state._count("errors")
+            status = state.config.error_status
+            self._json({"error": {"message": "erreur injectée", "code": status}}, status=status)
+            return
+
+        if ollama:
+            state.ensure_loaded(body.get("model", "mistral"), body.get("keep_alive"))
+        time.sleep(state.first_token_delay())
+        route(path, body)
+
+    def _openai(self, path: str, body: Dict[str, Any]):
+        state = self.server_state
+        model = body.get("model", "fake")
+        created = int(time.time())
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        prompt_tokens = sum(len(str(m.get("content", "")).split()) for m in body.get("messages", []))
+
+        if not body.get("stream"):
+            text = "".join(state.tokens(body.get("max_tokens")))
+            completion_tokens = len(text.split())
+            self._json({
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": text}}],
+                "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                          "total_tokens": prompt_tokens + completion_tokens},
+            })
+            return
+
+        state._count("streamed")
+        self._start_stream("text/event-stream")
+        for token in state.tokens(body.get("max_tokens")):
+            chunk = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}],
+            }
+            self._chunk(f"data: {json.dumps(chunk)}\n\n")
+        final = {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": created,
+            "model": model,
+            "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+        }
+        self._chunk(f"data: {json.dumps(final)}\n\n")
+        self._chunk("data: [DONE]\n\n")
+        self._end_stream()
+
+    def _ollama(self, path: str, body: Dict[str, Any]):
+        state = self.server_state
+        model = body.get("model", "mistral")
+        chat = path == "/api/chat"
+        options = body.get("options") or {}
+        max_tokens = options.get("num_predict", body.get("max_tokens"))
+        prompt = body.get("prompt") or " ".join(
+            str(m.get("content", "")) for m in body.get("messages", [])
+        )
+
+        def message(text: str, done: bool) -> Dict[str, Any]:
+            payload = {"model": model, "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ"),
+                       "done": done}
+            if chat:
+                payload["message"] = {"role": "assistant", "content": text}
+            else:
+                payload["response"] = text
+            return payload
+
+        if body.get("stream") is False:
+            text = "".join(state.tokens(max_tokens))
+            payload = message(text, True)
+            payload.update({"prompt_eval_count": len(prompt.split()),
+                            "eval_count": len(text.split()), "done_reason": "stop"})
+            self._json(payload)
+            return
+
+        state._count("streamed")
+        self._start_stream("application/x-ndjson")
+        count = 0
+        for token in state.tokens(max_tokens):
+            count += 1
+            self._chunk(json.dumps(message(token, False)) + "\n")
+        final = message("", True)
+        final.update({"prompt_eval_count": len(prompt.split()), "eval_count": count,
+                      "done_reason": "stop"})
+        self._chunk(json.dumps(final) + "\n")
+        self._end_stream()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serveur LLM factice (OpenAI / Ollama)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11500)
+    parser.add_argument("--latency", type=float, default=0.2, help="Délai avant le 1er token (s)")
+    parser.add_argument("--jitter", type=float, default=0.05, help="Variation de latence (s)")
+    parser.add_argument("--token-rate", type=float, default=50.0, help="Tokens par seconde")
+    parser.add_argument("--tokens", type=int, default=60, help="Tokens par réponse")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Probabilité d'erreur")
+    parser.add_argument("--error-status", type=int, default=500, help="Code HTTP des erreurs")
+    parser.add_argument("--load-time", type=float, default=0.0, help="Chargement du modèle (s)")
+    parser.add_argument("--keep-alive", type=float, default=300.0, help="Résidence par défaut (s)")
+    args = parser.parse_args()
+
+    config = FakeLLMConfig(
+        latency=args.latency,
+        jitter=args.jitter,
+        token_rate=args.token_rate,
+        completion_tokens=args.tokens,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        load_time=args.load_time,
+        keep_alive=args.keep_alive,
+    )
+    server = FakeLLMServer(config, host=args.host, port=args.port)
+    print(f"Serveur LLM factice sur {server.url} (Ctrl+C pour arrêter)")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,294 @@
+"""
+Test de charge de la couche IA contre le serveur LLM factice.
+
+Lance ``benchmarks.fake_llm_server`` en local (ou utilise un serveur déjà
+démarré via ``--base-url``), fait pointer ``LLMManager`` dessus puis
+simule N utilisateurs concurrents qui enchaînent des requêtes sur
+``NutritionChatbot``, ``ProductAnalyzer`` et ``ProductRecommender``.
+Rapporte le débit, le taux de succès et les latences p50/p95/p99 (et le
+délai avant le premier token en streaming). Aucun accès réseau.
+
+Usage:
+    python -m benchmarks.load_test --users 20 --requests 10 --scenario mixed
+    python -m benchmarks.load_test --users 50 --scenario chat --stream --error-rate 0.05
+    python -m benchmarks.load_test --provider openai --latency 0.5 --token-rate 30
+    python -m benchmarks.load_test --identical   # requêtes identiques (regroupement)
+"""
+import os
+
+# Table de prix LiteLLM embarquée : pas de téléchargement au démarrage
+os.environ.setdefault("LITELLM_LOCAL_MODEL_COST_MAP", "True")
+
+import argparse
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from benchmarks.fake_llm_server import FakeLLMConfig, FakeLLMServer
+from src.ia.chatbot import NutritionChatbot
+from src.ia.llm_manager import LLMManager
+from src.ia.product_analyzer import ProductAnalyzer
+from src.ia.recommender import ProductRecommender
+from src.ia.singleflight import SingleFlight
+from src.ia.telemetry import LLMTelemetry
+
+SCENARIOS = ["chat", "analyze", "recommend"]
+
+QUESTIONS = [
+    "C'est quoi le Nutri-Score exactement ?",
+    "Les additifs de ce produit sont-ils préoccupants ?",
+    "Comment composer un repas équilibré ?",
+    "Quels sont les allergènes les plus courants ?",
+]
+
+PRODUCTS = [
+    {"code": "3017620422003", "product_name": "Pâte à tartiner", "nutriscore_grade": "e",
+     "nova_group": 4, "energy_kcal_100g": 539, "sugars_100g": 56.3, "fat_100g": 30.9,
+     "saturated_fat_100g": 10.6, "salt_100g": 0.107, "additives_tags": ["en:e322"]},
+    {"code": "3033490004743", "product_name": "Yaourt nature", "nutriscore_grade": "a",
+     "nova_group": 1, "energy_kcal_100g": 58, "sugars_100g": 4.1, "fat_100g": 1.5,
+     "saturated_fat_100g": 1.0, "salt_100g": 0.12},
+    {"code": "3175680011480", "product_name": "Biscuits au chocolat", "nutriscore_grade": "d",
+     "nova_group": 4, "energy_kcal_100g": 502, "sugars_100g": 32.0, "fat_100g": 24.0,
+     "saturated_fat_100g": 12.0, "salt_100g": 0.6, "additives_tags": ["en:e500", "en:e476"]},
+]
+
+
+# ===============================
+# CONFIGURATION DE LA COUCHE IA
+# ===============================
+def build_llm(base_url: str, provider: str = "ollama", warm_up: bool = True) -> LLMManager:
+    """
+    ``LLMManager`` isolé (télémétrie et regroupement propres) pointant sur
+    ``base_url`` ; avec Ollama, attend la fin du préchargement.
+    """
+    os.environ["OLLAMA_API_BASE"] = base_url
+    if provider == "openai":
+        os.environ["OPENAI_API_BASE"] = f"{base_url}/v1"
+        os.environ["OPENAI_API_KEY"] = "fake"
+
+    llm = LLMManager(flight=SingleFlight(), telemetry=LLMTelemetry(), warm_up=warm_up)
+    if provider == "openai":
+        llm.default_model = "openai/gpt-3.5-turbo"
+    llm.fallback_models = [llm.default_model]
+
+    runtime = llm._runtime(llm.default_model)
+    if warm_up and runtime is not None:
+        runtime.warm_up_async().join()
+    return llm
+
+
+# ===============================
+# SCÉNARIOS
+# ===============================
+class VirtualUser:
+    """Un utilisateur simulé : enchaîne ses requêtes et mesure chacune."""
+
+    def __init__(self, user_id: int, llm: LLMManager, stream: bool, identical: bool):
+        self.user_id = user_id
+        self.stream = stream
+        self.identical = identical
+        self.session_id = f"user-{user_id}"
+        self.chatbot = NutritionChatbot(llm_manager=llm)
+        self.analyzer = ProductAnalyzer(llm_manager=llm)
+        self.recommender = ProductRecommender(llm_manager=llm)
+
+    def _suffix(self, i: int) -> str:
+        return "" if self.identical else f" (utilisateur {self.user_id}, requête {i})"
+
+    def run(self, scenario: str, i: int) -> Dict[str, Any]:
+        product = dict(PRODUCTS[i % len(PRODUCTS)])
+        product["product_name"] += self._suffix(i)
+        start = time.perf_counter()
+        ttft = None
+
+        if scenario == "chat":
+            question = QUESTIONS[i % len(QUESTIONS)] + self._suffix(i)
+            context = {"current_product": product}
+            if self.stream:
+                stats: Dict[str, Any] = {}
+                for _ in self.chatbot.chat_stream(question, context, stats, self.session_id):
+                    pass
+                success, ttft = stats["success"], stats["ttft"]
+            else:
+                success = self.chatbot.chat(question, context, session_id=self.session_id)["success"]
+        elif scenario == "analyze":
+            success = self.analyzer.analyze(product)["success"]
+        else:
+            candidates = [p for p in PRODUCTS if p["code"] != product["code"]]
+            success = self.recommender.recommend(product, candidates, {"bio": True})["success"]
+
+        return {
+            "scenario": scenario,
+            "success": success,
+            "latency": time.perf_counter() - start,
+            "ttft": ttft,
+        }
+
+
+def run_load(
+    llm: LLMManager,
+    users: int = 10,
+    requests_per_user: int = 5,
+    scenario: str = "mixed",
+    stream: bool = False,
+    identical: bool = False
+) -> Dict[str, Any]:
+    """
+    Lance ``users`` utilisateurs concurrents et agrège leurs mesures.
+
+    Returns:
+        Rapport : durée, débit global et statistiques par scénario
+    """
+    scenarios = SCENARIOS if scenario == "mixed" else [scenario]
+    virtual_users = [VirtualUser(u, llm, stream, identical) for u in range(users)]
+    barrier = threading.Barrier(users)
+
+    def user_loop(user: VirtualUser) -> List[Dict[str, Any]]:
+        barrier.wait()
+        return [
+            user.run(scenarios[(user.user_id + i) % len(scenarios)], i)
+            for i in range(requests_per_user)
+        ]
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=users) as pool:
+        results = [r for rs in pool.map(user_loop, virtual_users) for r in rs]
+    elapsed = time.perf_counter() - start
+
+    report = {
+        "users": users,
+        "requests": len(results),
+        "elapsed_s": elapsed,
+        "throughput_rps": len(results) / elapsed if elapsed else 0.0,
+        "scenarios": {},
+    }
+    for name in scenarios + ["total"]:
+        rows = [r for r in results if name in ("total", r["scenario"])]
+        if rows:
+            report["scenarios"][name] = summarize(rows, elapsed)
+    return report
+
+
+def summarize(rows: List[Dict[str, Any]], elapsed: float) -> Dict[str, Any]:
+    latencies = np.array([r["latency"] for r in rows])
+    ttfts = np.array([r["ttft"] for r in rows if r["ttft"] is not None])
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    summary = {
+        "requests": len(rows),
+        "success_rate": float(np.mean([r["success"] for r in rows])),
+        "throughput_rps": len(rows) / elapsed if elapsed else 0.0,
+        "p50_s": float(p50),
+        "p95_s": float(p95),
+        "p99_s": float(p99),
+    }
+    if len(ttfts):
+        t50, t95, t99 = np.percentile(ttfts, [50, 95, 99])
+        summary.update({"ttft_p50_s": float(t50), "ttft_p95_s": float(t95), "ttft_p99_s": float(t99)})
+    return summary
+
+
+def print_report(report: Dict[str, Any]):
+    print(
+        f"\n{report['users']} utilisateurs · {report['requests']} requêtes en "
+        f"{report['elapsed_s']:.2f} s → {report['throughput_rps']:.1f} req/s"
+    )
+    header = f"{'scénario':<10}{'n':>6}{'succès':>9}{'req/s':>8}{'p50':>8}{'p95':>8}{'p99':>8}{'ttft p95':>10}"
+    print(header)
+    print("-" * len(header))
+    for name, s in report["scenarios"].items():
+        ttft = f"{s['ttft_p95_s']:.3f}" if "ttft_p95_s" in s else "-"
+        print(
+            f"{name:<10}{s['requests']:>6}{s['success_rate']:>9.1%}{s['throughput_rps']:>8.1f}"
+            f"{s['p50_s']:>8.3f}{s['p95_s']:>8.3f}{s['p99_s']:>8.3f}{ttft:>10}"
+        )
+
+
+# ===============================
+# MAIN
+# ===============================
+def main():
+    parser = argparse.ArgumentParser(description="Test de charge de la couche IA (hors ligne)")
+    parser.add_argument("--users", type=int, default=10, help="Utilisateurs concurrents")
+    parser.add_argument("--requests", type=int, default=5, help="Requêtes par utilisateur")
+    parser.add_argument("--scenario", choices=SCENARIOS + ["mixed"], default="mixed")
+    parser.add_argument("--stream", action="store_true", help="Chat en streaming (mesure le TTFT)")
+    parser.add_argument("--identical", action="store_true", help="Requêtes identiques entre utilisateurs")
+    parser.add_argument("--provider", choices=["ollama", "openai"], default="ollama")
+    parser.add_argument("--base-url", default=None, help="Serveur déjà lancé (sinon serveur factice local)")
+    parser.add_argument("--latency", type=float, default=0.2, help="Délai avant le 1er token (s)")
+    parser.add_argument("--jitter", type=float, default=0.05, help="Variation de latence (s)")
+    parser.add_argument("--token-rate", type=float, default=50.0, help="Tokens par seconde")
+    parser.add_argument("--tokens", type=int, default=60, help="Tokens par réponse")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Probabilité d'erreur")
+    parser.add_argument("--load-time", type=float, default=0.0, help="Chargement du modèle (s)")
+    parser.add_argument("--no-warm-up", action="store_true", help="Sans préchargement Ollama")
+    parser.add_argument("--json", type=str, default=None, help="Écrit le rapport JSON dans ce fichier")
+    args = parser.parse_args()
+
+    server: Optional[FakeLLMServer] = None
+    base_url = args.base_url
+    if base_url is None:
+        server = FakeLLMServer(FakeLLMConfig(
+            latency=args.latency,
+            jitter=args.jitter,
+            token_rate=args.token_rate,
+            completion_tokens=args.tokens,
+            error_rate=args.error_rate,
+            load_time=args.load_time,
+        )).start()
+        base_url = server.url
+
+    try:
+        llm = build_llm(base_url, args.provider, warm_up=not args.no_warm_up)
+        print(f"Modèle : {llm.default_model} via {base_url}")
+        report = run_load(
+            llm,
+            users=args.users,
+            requests_per_user=args.requests,
+            scenario=args.scenario,
+            stream=args.stream,
+            identical=args.identical,
+        )
+        report["single_flight"] = llm.flight.stats()
+        runtime = llm._runtime(llm.default_model)
+        if runtime is not None:
+            report["ollama"] = runtime.stats()
+            report["ollama"]["cold_start"] = sum(
+                s["cold_start_seconds"]["count"] for s in llm.telemetry.snapshot()["series"]
+            )
+        if server is not None:
+            report["server"] = server.stats()
+    finally:
+        if server is not None:
+            server.stop()
+
+    print_report(report)
+    server_stats = report.get("server", {})
+    print(
+        f"\nRequêtes reçues par le serveur : {server_stats.get('requests', '?')}"
+        f" · erreurs injectées : {server_stats.get('errors', '?')}"
+        f" · regroupées côté client : {report['single_flight']['shared']}"
+    )
+    if "ollama" in report:
+        ollama = report["ollama"]
+        print(
+            f"Ollama : {ollama['cold_start']} requêtes à froid · "
+            f"concurrence max {ollama['max_concurrency']} · "
+            f"file max {ollama['max_queue_depth']} · "
+            f"attente cumulée {ollama['queue_wait_seconds']:.2f} s"
+        )
+
+    if args.json:
+        report["telemetry"] = llm.telemetry.snapshot()
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"Rapport écrit dans {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+import pandas as pd
+import streamlit as st
+
+from src.ia.llm_manager import SHARED_FLIGHT
+from src.ia.ollama_runtime import runtimes
+from src.ia.scheduler import PRIORITIES, SCHEDULER
+from src.ia.telemetry import TELEMETRY
+
+# ============================================================
+# Configuration
+# ============================================================
+st.set_page_config(layout="wide", page_title="Diagnostics IA")
+st.title("Diagnostics des appels LLM")
+st.caption("Mesures agrégées depuis le démarrage du serveur Streamlit, par modèle et par composant.")
+
+
+def fmt_seconds(value):
+    return None if value is None else round(value, 3)
+
+
+snapshot = TELEMETRY.snapshot()
+
+# ============================================================
+# Synthèse
+# ============================================================
+if not snapshot["series"]:
+    st.info("Aucun appel LLM enregistré pour l'instant.")
+else:
+    rows = []
+    for s in snapshot["series"]:
+        latency, ttft = s["latency_seconds"], s["ttft_seconds"]
+        rows.append({
+            "Modèle": s["model"],
+            "Appelant": s["caller"],
+            "Appels": s["requests"],
+            "Échecs": s["failures"],
+            "Reprises": s["retries"],
+            "Tokens prompt": s["prompt_tokens"],
+            "Tokens réponse": s["completion_tokens"],
+            "Coût ($)": s["cost_usd"],
+            "Latence moy. (s)": fmt_seconds(latency["avg"]),
+            "p50 (s)": fmt_seconds(latency["p50"]),
+            "p95 (s)": fmt_seconds(latency["p95"]),
+            "p99 (s)": fmt_seconds(latency["p99"]),
+            "1er token p50 (s)": fmt_seconds(ttft["p50"]),
+            "1er token p95 (s)": fmt_seconds(ttft["p95"]),
+            "À froid": s["cold_start_seconds"]["count"],
+            "À froid moy. (s)": fmt_seconds(s["cold_start_seconds"]["avg"]),
+            "À chaud moy. (s)": fmt_seconds(s["warm_start_seconds"]["avg"]),
+        })
+    table = pd.DataFrame(rows)
+
+    c1, c2, c3, c4 = st.columns(4)
+    c1.metric("Appels", int(table["Appels"].sum()))
+    c2.metric("Échecs", int(table["Échecs"].sum()))
+    c3.metric("Tokens", int(table["Tokens prompt"].sum() + table["Tokens réponse"].sum()))
+    c4.metric("Coût estimé", f"{table['Coût ($)'].sum():.4f} $")
+
+    st.dataframe(table, use_container_width=True, hide_index=True)
+
+    st.subheader("Distribution des latences")
+    buckets = pd.DataFrame({
+        f"{s['model']} · {s['caller']}": s["latency_seconds"]["buckets"]
+        for s in snapshot["series"]
+    })
+    st.bar_chart(buckets.diff().fillna(buckets.iloc[[0]]))
+
+# ============================================================
+# Regroupement des appels identiques
+# ============================================================
+st.subheader("Appels regroupés")
+flight = SHARED_FLIGHT.stats()
+c1, c2, c3 = st.columns(3)
+c1.metric("Requêtes envoyées", flight["executions"])
+c2.metric("Réponses partagées", flight["shared"])
+c3.metric("En cours", flight["in_flight"])
+
+# ============================================================
+# File d'attente par fournisseur
+# ============================================================
+st.subheader("File d'attente")
+scheduler = SCHEDULER.stats()
+if not scheduler:
+    st.caption("Aucun appel ordonnancé pour l'instant.")
+else:
+    st.dataframe(
+        pd.DataFrame([
+            {
+                "Fournisseur": provider,
+                "Actifs": f"{s['active']} / {s['limit']}",
+                **{f"En file · {p}": s["queue_depth"][p] for p in PRIORITIES},
+                "File max.": s["max_queue_depth"],
+                **{f"Attente moy. {p} (s)": fmt_seconds(s["avg_wait_seconds"][p]) for p in PRIORITIES},
+            }
+            for provider, s in scheduler.items()
+        ]),
+        use_container_width=True,
+        hide_index=True
+    )
+
+# ============================================================
+# Ollama local
+# ============================================================
+for runtime in runtimes():
+    stats = runtime.stats()
+    st.subheader(f"Ollama · {stats['model']}")
+    c1, c2, c3, c4, c5 = st.columns(5)
+    c1.metric("En mémoire", "oui" if stats["warm"] else "non")
+    c2.metric(
+        "Préchargement",
+        "-" if stats["last_load_seconds"] is None else f"{stats['last_load_seconds']:.1f} s"
+    )
+    c3.metric("Requêtes actives", f"{stats['active']} / {stats['max_concurrency']}")
+    c4.metric("En file", stats["queue_depth"], help=f"Maximum observé : {stats['max_queue_depth']}")
+    c5.metric(
+        "Attente moy.",
+        f"{stats['queue_wait_seconds'] / stats['requests']:.2f} s" if stats["requests"] else "-"
+    )
+    st.caption(
+        f"keep_alive {stats['keep_alive']} · {stats['touches']} renouvellements · "
+        f"{stats['warmup_failures']} échecs de préchargement"
+    )
+
+# ============================================================
+# Exports
+# ============================================================
+st.subheader("Exports")
+prometheus = TELEMETRY.to_prometheus() + SCHEDULER.to_prometheus()
+c1, c2, c3 = st.columns(3)
+c1.download_button(
+    "Format Prometheus",
+    prometheus,
+    file_name="llm_metrics.prom",
+    mime="text/plain"
+)
+c2.download_button(
+    "Instantané JSON",
+    TELEMETRY.to_json(),
+    file_name="llm_metrics.json",
+    mime="application/json"
+)
+if c3.button("Réinitialiser les mesures"):
+    TELEMETRY.reset()
+    st.rerun()
+
+with st.expander("Texte Prometheus"):
+    st.code(prometheus, language="text")
@@ -12,6 +12,7 @@ Usage:
     python pipeline.py
 """
 
+import os
 import subprocess
 import sys
 
@@ -36,6 +37,12 @@ OPENFOODFACTS_CATEGORIES = [
     "boisson",
 ]
 
+# Pré-génération des analyses IA (en arrière-plan dans Streamlit, en
+# priorité basse par rapport aux utilisateurs, reprise automatique)
+PREGENERATE_ANALYSES = True
+PREGENERATE_LIMIT = 200
+PREGENERATE_CONCURRENCY = 4
+
 # ========================================
 
 
@@ -132,7 +139,16 @@ def run_pipeline():
     print("ÉTAPE 5 : Lancement de Streamlit")
     print("=" * 60)
 
-    subprocess.run(["streamlit", "run", "streamlit.py"])
+    # Les analyses sont générées en tâche de fond par Streamlit, dans la
+    # même file d'attente LLM que les utilisateurs (priorité la plus basse) :
+    # elles sont servies dès qu'elles sont disponibles, les autres en direct.
+    env = dict(os.environ)
+    if PREGENERATE_ANALYSES:
+        print("→ Pré-génération des analyses IA en arrière-plan")
+        env["PREGENERATE_LIMIT"] = str(PREGENERATE_LIMIT)
+        env["PREGENERATE_CONCURRENCY"] = str(PREGENERATE_CONCURRENCY)
+
+    subprocess.run(["streamlit", "run", "streamlit.py"], env=env)
 
     print("\n" + "=" * 60)
     print("PIPELINE TERMINÉ 🎉")
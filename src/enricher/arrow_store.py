@@ -0,0 +1,94 @@
+"""
+Fichiers Arrow IPC partagés entre les processus de l'application.
+
+Chaque processus Streamlit qui lit un Parquet décode sa propre copie des
+tables. Le pipeline publie en plus un fichier Arrow IPC non compressé,
+écrit en un seul bloc par colonne ; l'application le projette en mémoire
+(``mmap``) en lecture seule :
+
+    - les buffers des colonnes lourdes (textes en chaînes Arrow, nutriments
+      en float32) restent ceux du fichier : N processus partagent une seule
+      copie dans le cache de pages du système
+    - seuls les codes des catégories et les entiers nullables sont
+      recopiés (1 à 4 octets par ligne)
+
+Les valeurs manquantes des nutriments sont écrites comme NaN et non comme
+nulls Arrow : une colonne sans masque de validité se convertit en tableau
+NumPy sans copie.
+"""
+import os
+from pathlib import Path
+from typing import Any, Dict
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from .schema import STRING, apply_schema
+
+# Chaînes Arrow relues telles quelles (pas de conversion en objets Python)
+_STRING_TYPES = {pa.string(): STRING, pa.large_string(): STRING}
+
+
+def _table(df: pd.DataFrame) -> pa.Table:
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    for i, name in enumerate(table.column_names):
+        column = df[name]
+        if column.dtype in (np.float32, np.float64):
+            # NaN conservés comme valeurs : colonne sans masque de validité
+            table = table.set_column(
+                i, table.field(i), pa.array(column.to_numpy(), from_pandas=False)
+            )
+    return table.combine_chunks()
+
+
+def publish_ipc(df: pd.DataFrame, path: Path) -> Dict[str, Any]:
+    """
+    Écrit ``df`` (schéma compact appliqué) en fichier Arrow IPC.
+
+    Le fichier est écrit à côté puis renommé : un processus qui le projette
+    déjà garde l'ancienne version jusqu'à son prochain chargement.
+
+    Returns:
+        Compteurs : rows, bytes
+    """
+    path = Path(path)
+    table = _table(apply_schema(df))
+    tmp = path.with_name(path.name + ".tmp")
+    with pa.OSFile(str(tmp), "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(tmp, path)
+    return {"rows": table.num_rows, "bytes": path.stat().st_size}
+
+
+def open_ipc(path: Path) -> pd.DataFrame:
+    """
+    Projette un fichier Arrow IPC en DataFrame (lecture seule, sans copie).
+
+    Les colonnes texte et float32 pointent dans le fichier projeté : le
+    DataFrame ne doit pas être modifié en place.
+    """
+    source = pa.memory_map(str(path), "r")
+    table = pa.ipc.open_file(source).read_all()
+    return table.to_pandas(types_mapper=_STRING_TYPES.get, split_blocks=True)
+
+
+def ipc_path(parquet_path: Path) -> Path:
+    """Fichier Arrow publié à côté d'un Parquet (``off.parquet`` -> ``off.arrow``)."""
+    return Path(parquet_path).with_suffix(".arrow")
+
+
+def load_frame(parquet_path: Path) -> pd.DataFrame:
+    """
+    Charge une table du pipeline : fichier Arrow projeté s'il a été publié
+    (et n'est pas plus ancien que le Parquet), sinon Parquet décodé.
+    """
+    parquet_path = Path(parquet_path)
+    arrow_path = ipc_path(parquet_path)
+    if arrow_path.exists() and (
+        not parquet_path.exists()
+        or arrow_path.stat().st_mtime >= parquet_path.stat().st_mtime
+    ):
+        return open_ipc(arrow_path)
+    return apply_schema(pd.read_parquet(parquet_path))
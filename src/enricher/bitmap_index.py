@@ -0,0 +1,237 @@
+"""
+Index bitmap des allergènes et additifs.
+
+Filtrer le catalogue sur « sans gluten / sans lait » revenait à chercher
+des sous-chaînes dans la colonne ``allergens`` de chaque produit. Ici,
+chaque allergène et chaque additif connu reçoit un bit, et chaque produit
+un bitset compact (mots ``uint64``, une ligne par produit) :
+
+    - allergènes : étiquettes OFF de la colonne ``allergens``, sans préfixe
+      de langue (``en:milk`` → ``milk``)
+    - additifs : numéros E relevés dans ``ingredients_text`` (``E 471``,
+      ``e330`` → ``e471``, ``e330``)
+
+Une exclusion ou une inclusion sur plusieurs termes devient un ET bit à
+bit avec un masque, puis une réduction sur quelques mots : aucune chaîne
+n'est relue à la requête. Les colonnes texte sont factorisées à la
+construction, chaque valeur distincte n'est découpée qu'une fois.
+
+L'index est construit par le pipeline, écrit en Parquet (un mot par
+colonne, vocabulaire dans les métadonnées) et réaligné sur les codes-barres
+du catalogue au chargement.
+"""
+import json
+import os
+import re
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+WORD_BITS = 64
+
+# Numéros E dans un texte d'ingrédients (« E471 », « e 330 », « E-150d »)
+_ADDITIVE = re.compile(r"\b[eE][\s-]?(\d{3,4}[a-i]?)\b")
+_ADDITIVE_TERM = re.compile(r"e\d{3,4}[a-i]?")
+
+_METADATA_KEY = b"vocabulary"
+
+
+def normalize_term(term: str) -> str:
+    """Terme de requête dans la forme du vocabulaire (``en:Milk`` → ``milk``, ``E 330`` → ``e330``)."""
+    term = str(term).split(":")[-1].strip().lower()
+    compact = re.sub(r"[\s-]", "", term)
+    return compact if _ADDITIVE_TERM.fullmatch(compact) else term
+
+
+def allergen_tags(value) -> List[str]:
+    """Allergènes d'une valeur de la colonne ``allergens`` (liste OFF séparée par des virgules)."""
+    if not isinstance(value, str):
+        return []
+    return [t for t in (normalize_term(p) for p in value.split(",")) if t]
+
+
+def additive_tags(text) -> List[str]:
+    """Additifs (numéros E) cités dans un texte d'ingrédients."""
+    if not isinstance(text, str):
+        return []
+    return [f"e{n.lower()}" for n in _ADDITIVE.findall(text)]
+
+
+def is_additive(term: str) -> bool:
+    return _ADDITIVE_TERM.fullmatch(term) is not None
+
+
+def _distinct_tags(s: pd.Series, extract) -> tuple:
+    """Codes des lignes et étiquettes de chaque valeur distincte."""
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        codes, uniques = s.cat.codes.to_numpy(), s.cat.categories
+    else:
+        codes, uniques = pd.factorize(s)
+    return codes, [extract(u) for u in uniques]
+
+
+class BitmapIndex:
+    """
+    Bitsets allergènes / additifs alignés sur les lignes d'un catalogue.
+
+    ``bits[i, w]`` contient les bits ``64 * w`` à ``64 * w + 63`` du
+    produit ``i`` ; le bit ``j`` correspond à ``vocabulary[j]``.
+    """
+
+    def __init__(self, vocabulary: Sequence[str], bits: np.ndarray, codes: Optional[np.ndarray] = None):
+        self.vocabulary = list(vocabulary)
+        self.bits = np.ascontiguousarray(bits, dtype=np.uint64).reshape(len(bits), -1)
+        self.codes = codes
+        self.positions = {term: j for j, term in enumerate(self.vocabulary)}
+
+    def __len__(self) -> int:
+        return len(self.bits)
+
+    @property
+    def allergens(self) -> List[str]:
+        return [t for t in self.vocabulary if not is_additive(t)]
+
+    @property
+    def additives(self) -> List[str]:
+        return [t for t in self.vocabulary if is_additive(t)]
+
+    # ------------------------------------------------------------------
+    # Construction
+    # ------------------------------------------------------------------
+    @classmethod
+    def from_frame(
+        cls,
+        df: pd.DataFrame,
+        allergen_col: str = "allergens",
+        text_col: str = "ingredients_text",
+        code_col: str = "code"
+    ) -> "BitmapIndex":
+        """
+        Construit l'index d'un catalogue.
+
+        Les colonnes absentes sont ignorées (aucun bit posé).
+        """
+        sources = [
+            _distinct_tags(df[col], extract)
+            for col, extract in [(allergen_col, allergen_tags), (text_col, additive_tags)]
+            if col in df.columns
+        ]
+
+        # Vocabulaire : allergènes puis additifs, chacun trié
+        terms = {t for _, tags in sources for value in tags for t in value}
+        vocabulary = sorted(t for t in terms if not is_additive(t)) + sorted(t for t in terms if is_additive(t))
+        positions = {term: j for j, term in enumerate(vocabulary)}
+        words = max(1, -(-len(vocabulary) // WORD_BITS))
+
+        bits = np.zeros((len(df), words), dtype=np.uint64)
+        for codes, tags in sources:
+            # Un bitset par valeur distincte (+ une ligne vide pour les manquants)
+            distinct = np.zeros((len(tags) + 1, words), dtype=np.uint64)
+            for i, value in enumerate(tags):
+                for term in value:
+                    j = positions[term]
+                    distinct[i, j // WORD_BITS] |= np.uint64(1) << np.uint64(j % WORD_BITS)
+            bits |= distinct[codes]
+
+        codes = df[code_col].astype(str).to_numpy(dtype=object) if code_col in df.columns else None
+        return cls(vocabulary, bits, codes)
+
+    # ------------------------------------------------------------------
+    # Requêtes
+    # ------------------------------------------------------------------
+    def term_mask(self, terms: Iterable[str]) -> np.ndarray:
+        """Masque (un mot par colonne de ``bits``) des termes connus de ``terms``."""
+        mask = np.zeros(self.bits.shape[1], dtype=np.uint64)
+        for term in terms:
+            j = self.positions.get(normalize_term(term))
+            if j is not None:
+                mask[j // WORD_BITS] |= np.uint64(1) << np.uint64(j % WORD_BITS)
+        return mask
+
+    def any_of(self, terms: Iterable[str]) -> np.ndarray:
+        """Produits contenant au moins un des termes."""
+        mask = self.term_mask(terms)
+        if not mask.any():
+            return np.zeros(len(self), dtype=bool)
+        return (self.bits & mask).any(axis=1)
+
+    def exclude(self, terms: Iterable[str]) -> np.ndarray:
+        """Produits ne contenant aucun des termes (un terme inconnu n'exclut rien)."""
+        return ~self.any_of(terms)
+
+    def include(self, terms: Iterable[str]) -> np.ndarray:
+        """Produits contenant tous les termes (un terme inconnu n'est contenu nulle part)."""
+        terms = [normalize_term(t) for t in terms]
+        if any(t not in self.positions for t in terms):
+            return np.zeros(len(self), dtype=bool)
+        mask = self.term_mask(terms)
+        return ((self.bits & mask) == mask).all(axis=1)
+
+    def counts(self) -> Dict[str, int]:
+        """Nombre de produits par terme."""
+        per_bit = np.unpackbits(self.bits.view(np.uint8), axis=1, bitorder="little").sum(axis=0)
+        return {term: int(per_bit[j]) for j, term in enumerate(self.vocabulary)}
+
+    def terms(self, row: int) -> List[str]:
+        """Termes d'un produit (par position)."""
+        flags = np.unpackbits(self.bits[row].view(np.uint8), bitorder="little")
+        return [self.vocabulary[j] for j in np.flatnonzero(flags[:len(self.vocabulary)])]
+
+    def align(self, codes: pd.Series) -> "BitmapIndex":
+        """
+        Index réordonné sur les codes-barres ``codes``.
+
+        Les produits absents de l'index n'ont aucun bit posé.
+        """
+        if self.codes is None:
+            raise ValueError("Index construit sans codes-barres")
+        codes = codes.astype(str).to_numpy(dtype=object)
+        if len(codes) == len(self.codes) and (codes == self.codes).all():
+            return self
+        position = pd.Index(self.codes).get_indexer(codes)
+        bits = np.where((position >= 0)[:, None], self.bits[np.maximum(position, 0)], np.uint64(0))
+        return BitmapIndex(self.vocabulary, bits, codes)
+
+    # ------------------------------------------------------------------
+    # Persistance
+    # ------------------------------------------------------------------
+    def save(self, path: Path) -> Dict[str, int]:
+        """
+        Écrit l'index en Parquet (écriture à côté puis renommage).
+
+        Returns:
+            Compteurs : rows, terms, bytes
+        """
+        path = Path(path)
+        columns = {"code": pa.array(self.codes, type=pa.string())} if self.codes is not None else {}
+        columns.update({f"w{w}": pa.array(self.bits[:, w]) for w in range(self.bits.shape[1])})
+        table = pa.table(columns).replace_schema_metadata({_METADATA_KEY: json.dumps(self.vocabulary)})
+
+        tmp = path.with_name(path.name + ".tmp")
+        pq.write_table(table, tmp)
+        os.replace(tmp, path)
+        return {"rows": len(self), "terms": len(self.vocabulary), "bytes": path.stat().st_size}
+
+    @classmethod
+    def load(cls, path: Path) -> "BitmapIndex":
+        table = pq.read_table(path)
+        vocabulary = json.loads(table.schema.metadata[_METADATA_KEY])
+        words = [name for name in table.column_names if name != "code"]
+        bits = np.column_stack([table.column(w).to_numpy() for w in words]) if len(table) else \
+            np.zeros((0, len(words)), dtype=np.uint64)
+        codes = table.column("code").to_numpy(zero_copy_only=False) if "code" in table.column_names else None
+        return cls(vocabulary, bits, codes)
+
+
+def load_index(path: Path, df: pd.DataFrame) -> BitmapIndex:
+    """
+    Index aligné sur ``df`` : fichier du pipeline s'il existe, sinon construit.
+    """
+    path = Path(path)
+    if path.exists() and "code" in df.columns:
+        return BitmapIndex.load(path).align(df["code"])
+    return BitmapIndex.from_frame(df)
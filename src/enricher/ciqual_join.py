@@ -0,0 +1,97 @@
+"""
+Jointure OpenFoodFacts × CIQUAL sur clés entières.
+
+L'ancienne jointure fusionnait les deux tables sur le nom normalisé en
+chaîne et recopiait les ~70 colonnes CIQUAL dans chaque produit apparié.
+Ici :
+
+    - les noms sont factorisés : la correspondance est établie une fois
+      par nom distinct, puis propagée aux lignes par codes entiers
+    - chaque produit ne reçoit que l'identifiant ``alim_code`` de
+      l'aliment CIQUAL correspondant (premier aliment du même nom)
+    - la partie CIQUAL est projetée sur un sous-ensemble de nutriments et
+      stockée une seule fois, en table de référence indexée par
+      ``alim_code`` (``attach_ciqual`` la rattache à la demande)
+"""
+from typing import List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from .text import factorize_names
+
+CIQUAL_ID = "alim_code"
+
+# Colonnes d'identification gardées dans la table de référence
+CIQUAL_LABELS = ["alim_nom_fr", "alim_grp_nom_fr", "alim_ssgrp_nom_fr"]
+
+# Sous-ensemble de nutriments projeté (configurable)
+CIQUAL_NUTRIENTS = [
+    "energie, règlement ue n° 1169/2011 (kcal/100 g)",
+    "eau (g/100 g)",
+    "protéines, n x facteur de jones (g/100 g)",
+    "glucides (g/100 g)",
+    "sucres (g/100 g)",
+    "lipides (g/100 g)",
+    "ag saturés (g/100 g)",
+    "fibres alimentaires (g/100 g)",
+    "sel chlorure de sodium (g/100 g)",
+    "calcium (mg/100 g)",
+    "fer (mg/100 g)",
+]
+
+
+def ciqual_lookup(df_ciqual: pd.DataFrame, nutrients: Sequence[str] = CIQUAL_NUTRIENTS) -> pd.DataFrame:
+    """
+    Table de référence CIQUAL : une ligne par ``alim_code``, colonnes projetées.
+
+    Les nutriments absents de la table sont ignorés.
+    """
+    columns = [CIQUAL_ID] + [c for c in CIQUAL_LABELS + list(nutrients) if c in df_ciqual.columns]
+    lookup = df_ciqual[columns].dropna(subset=[CIQUAL_ID])
+    return lookup.drop_duplicates(subset=CIQUAL_ID).sort_values(CIQUAL_ID).reset_index(drop=True)
+
+
+def match_ciqual(names: pd.Series, df_ciqual: pd.DataFrame) -> pd.Series:
+    """
+    ``alim_code`` de l'aliment CIQUAL de même nom normalisé, par ligne.
+
+    Returns:
+        Série ``Int32`` alignée sur ``names`` (manquante sans correspondance)
+    """
+    codes, keys = factorize_names(names)
+    food_codes, food_keys = factorize_names(df_ciqual["alim_nom_fr"])
+
+    # Premier aliment de chaque clé CIQUAL (clé vide exclue)
+    row_keys = pd.Series(food_keys[food_codes])
+    first = row_keys[row_keys != ""].drop_duplicates()
+
+    # Correspondance par nom distinct, puis par ligne via les codes entiers
+    position = pd.Index(first.to_numpy()).get_indexer(keys)
+    food_row = np.where(position >= 0, first.index.to_numpy()[position], -1)[codes]
+
+    ids = pd.to_numeric(df_ciqual[CIQUAL_ID], errors="coerce").to_numpy(dtype=np.float64)
+    matched = np.where(food_row >= 0, ids[np.maximum(food_row, 0)], np.nan)
+    return pd.Series(matched, index=names.index, name=CIQUAL_ID).astype("Int32")
+
+
+def attach_ciqual(
+    df: pd.DataFrame,
+    lookup: pd.DataFrame,
+    columns: Optional[List[str]] = None
+) -> pd.DataFrame:
+    """
+    Rattache des colonnes de la table de référence aux produits, par ``alim_code``.
+
+    Les colonnes ajoutées sont préfixées ``ciqual_`` lorsque le nom existe déjà.
+    """
+    columns = [c for c in (columns or lookup.columns) if c != CIQUAL_ID]
+    position = pd.Index(lookup[CIQUAL_ID]).get_indexer(df[CIQUAL_ID])
+    found = position >= 0
+
+    attached = {}
+    for col in columns:
+        values = lookup[col].take(np.maximum(position, 0)).where(found)
+        name = f"ciqual_{col}" if col in df.columns else col
+        attached[name] = values.set_axis(df.index)
+    return df.assign(**attached)
@@ -0,0 +1,205 @@
+"""
+Stockage Parquet partitionné des jeux OpenFoodFacts.
+
+Les fichiers monolithiques obligent chaque lecteur à tout décoder. Ce
+module écrit un jeu de données Parquet au format Hive :
+
+    off_transformed/
+        category_root=snacks/nutriscore_grade=a/part-0.parquet
+        ...
+
+    - partitions par catégorie racine (premier niveau de ``categories``,
+      les plus fréquentes seulement) et par grade Nutri-Score
+    - lignes triées dans chaque partition par les nutriments les plus
+      filtrés, pour des statistiques min/max serrées par groupe de lignes
+    - groupes de lignes de taille fixe, statistiques écrites
+
+À la lecture, les filtres écartent d'abord les partitions (chemin), puis
+les groupes de lignes dont les statistiques excluent le prédicat ; seules
+les lignes restantes sont décodées.
+"""
+import shutil
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from .text import normalize_series
+
+PARTITION_COLS = ["category_root", "nutriscore_grade"]
+
+# Nutriments les plus filtrés (explorateur, recommandations), par priorité de tri
+SORT_COLS = ["sugars_100g", "salt_100g", "saturated_fat_100g", "energy_kcal_100g"]
+
+ROW_GROUP_SIZE = 64_000
+
+# Au-delà, les catégories racines les moins fréquentes sont regroupées
+MAX_CATEGORY_PARTITIONS = 16
+OTHER_CATEGORY = "autres"
+
+Filter = Tuple[str, str, Any]
+
+
+# ============================================================
+# Écriture
+# ============================================================
+def category_root(categories: pd.Series, max_partitions: int = MAX_CATEGORY_PARTITIONS) -> pd.Series:
+    """
+    Catégorie racine normalisée (``Produits laitiers`` → ``produits-laitiers``).
+
+    Seules les ``max_partitions`` racines les plus fréquentes sont gardées,
+    les autres (et les produits sans catégorie) deviennent ``autres``.
+    """
+    first = categories.astype("string").fillna("").str.split(",", n=1).str[0]
+    roots = normalize_series(first).str.replace(" ", "-").replace("", OTHER_CATEGORY)
+    kept = roots.value_counts().index[:max_partitions]
+    return roots.where(roots.isin(kept), OTHER_CATEGORY)
+
+
+def partition_keys(df: pd.DataFrame, max_category_partitions: int = MAX_CATEGORY_PARTITIONS) -> pd.DataFrame:
+    """Clés de partition de chaque ligne : catégorie racine et grade Nutri-Score (``unknown`` si absent)."""
+    return pd.DataFrame({
+        "category_root": category_root(
+            df.get("categories", pd.Series("", index=df.index)), max_category_partitions
+        ),
+        "nutriscore_grade": (
+            df.get("nutriscore_grade", pd.Series(None, index=df.index, dtype=object))
+            .astype("string").str.lower().fillna("unknown")
+        ),
+    }, index=df.index)
+
+
+def write_dataset(
+    df: pd.DataFrame,
+    root: Path,
+    sort_by: Sequence[str] = SORT_COLS,
+    row_group_size: int = ROW_GROUP_SIZE,
+    max_category_partitions: int = MAX_CATEGORY_PARTITIONS
+) -> Dict[str, int]:
+    """
+    Écrit ``df`` en jeu Parquet partitionné sous ``root`` (remplacé en entier).
+
+    Args:
+        df: Produits OpenFoodFacts (colonnes ``categories`` et
+            ``nutriscore_grade`` attendues)
+        root: Dossier du jeu de données
+        sort_by: Colonnes de tri dans chaque partition
+        row_group_size: Lignes par groupe de lignes
+        max_category_partitions: Nombre maximal de catégories racines
+
+    Returns:
+        Compteurs : rows, files, row_groups
+    """
+    root = Path(root)
+    df = df.copy()
+    df[PARTITION_COLS] = partition_keys(df, max_category_partitions)
+
+    keys = PARTITION_COLS + [c for c in sort_by if c in df.columns]
+    df = df.sort_values(keys, na_position="last", kind="stable").reset_index(drop=True)
+    table = pa.Table.from_pandas(df, preserve_index=False)
+
+    # Écriture dans un dossier temporaire puis bascule : pas de partition périmée
+    tmp = root.with_name(root.name + ".tmp")
+    if tmp.exists():
+        shutil.rmtree(tmp)
+    ds.write_dataset(
+        table,
+        tmp,
+        format="parquet",
+        partitioning=ds.partitioning(table.select(PARTITION_COLS).schema, flavor="hive"),
+        file_options=ds.ParquetFileFormat().make_write_options(
+            compression="zstd", write_statistics=True
+        ),
+        min_rows_per_group=row_group_size,
+        max_rows_per_group=row_group_size,
+        max_rows_per_file=0,
+        preserve_order=True,
+        existing_data_behavior="overwrite_or_ignore",
+    )
+    if root.exists():
+        shutil.rmtree(root)
+    tmp.rename(root)
+
+    files = list(root.rglob("*.parquet"))
+    return {
+        "rows": len(df),
+        "files": len(files),
+        "row_groups": sum(pq.ParquetFile(f).metadata.num_row_groups for f in files),
+    }
+
+
+# ============================================================
+# Lecture
+# ============================================================
+def open_dataset(root: Path) -> ds.Dataset:
+    """Jeu de données partitionné (clés de partition lues comme chaînes)."""
+    partitioning = ds.partitioning(
+        pa.schema([(c, pa.string()) for c in PARTITION_COLS]), flavor="hive"
+    )
+    return ds.dataset(Path(root), format="parquet", partitioning=partitioning)
+
+
+_OPERATORS = {
+    "==": lambda f, v: f == v,
+    "!=": lambda f, v: f != v,
+    "<": lambda f, v: f < v,
+    "<=": lambda f, v: f <= v,
+    ">": lambda f, v: f > v,
+    ">=": lambda f, v: f >= v,
+    "in": lambda f, v: f.isin(list(v)),
+    "not in": lambda f, v: ~f.isin(list(v)),
+}
+
+
+def filter_expression(filters: Optional[List[Filter]]) -> Optional[pc.Expression]:
+    """
+    Conjonction de prédicats ``(colonne, opérateur, valeur)``.
+
+    Opérateurs : ``==``, ``!=``, ``<``, ``<=``, ``>``, ``>=``, ``in``, ``not in``
+    (même syntaxe que le paramètre ``filters`` de ``pd.read_parquet``).
+    """
+    expression = None
+    for column, op, value in filters or []:
+        if op not in _OPERATORS:
+            raise ValueError(f"Opérateur de filtre inconnu : {op}")
+        predicate = _OPERATORS[op](ds.field(column), value)
+        expression = predicate if expression is None else expression & predicate
+    return expression
+
+
+def read_dataset(
+    root: Path,
+    filters: Optional[List[Filter]] = None,
+    columns: Optional[List[str]] = None
+) -> pd.DataFrame:
+    """Lit les lignes du jeu partitionné qui satisfont ``filters``."""
+    dataset = open_dataset(root)
+    table = dataset.to_table(columns=columns, filter=filter_expression(filters))
+    return table.to_pandas()
+
+
+def scan_plan(root: Path, filters: Optional[List[Filter]] = None) -> Dict[str, int]:
+    """
+    Partitions et groupes de lignes lus pour ``filters`` (sans lire les données).
+
+    Returns:
+        files, files_scanned, row_groups, row_groups_scanned
+    """
+    dataset = open_dataset(root)
+    expression = filter_expression(filters)
+    fragments = list(dataset.get_fragments())
+    if expression is None:
+        kept, row_groups = fragments, sum(f.metadata.num_row_groups for f in fragments)
+    else:
+        kept = list(dataset.get_fragments(filter=expression))
+        row_groups = sum(len(f.split_by_row_group(expression, schema=dataset.schema)) for f in kept)
+    return {
+        "files": len(fragments),
+        "files_scanned": len(kept),
+        "row_groups": sum(f.metadata.num_row_groups for f in fragments),
+        "row_groups_scanned": row_groups,
+    }
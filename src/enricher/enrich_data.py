@@ -1,6 +1,18 @@
 from pathlib import Path
+from typing import Sequence, Tuple
+
 import pandas as pd
 
+from .arrow_store import ipc_path, publish_ipc
+from .bitmap_index import BitmapIndex
+from .ciqual_join import CIQUAL_ID, CIQUAL_NUTRIENTS, ciqual_lookup, match_ciqual
+from .dataset_store import write_dataset
+from .nutriscore import add_nutriscore_columns
+from .percentiles import PercentileTables
+from .schema import apply_schema
+from .sketches import SketchStore
+from .taxonomy import Taxonomy
+
 # ===============================
 # CONFIG PATHS (data/ à la racine)
 # ===============================
@@ -13,57 +25,80 @@ ENRICHED_DIR = DATA_DIR / "enriched"
 OFF_CSV = PROCESSED_DIR / "openfoodfacts_products_clean.csv"
 CIQUAL_CSV = PROCESSED_DIR / "ciqual_aliments_clean.csv"
 
+# Ingrédients structurés (utils.transformer), joints par code-barres
+OFF_INGREDIENTS = PROCESSED_DIR / "off_ingredients.parquet"
+
 OFF_PARQUET = PROCESSED_DIR / "off_transformed.parquet"
 CIQUAL_PARQUET = PROCESSED_DIR / "ciqual_transformed.parquet"
 
+# Bitsets allergènes / additifs par produit (filtres de l'explorateur et du recommandeur)
+OFF_BITMAP = PROCESSED_DIR / "off_bitmap.parquet"
+
+# Taxonomie des catégories (identifiants, hiérarchie, appartenance CSR)
+OFF_TAXONOMY = PROCESSED_DIR / "off_taxonomy.parquet"
+
+# Esquisses fusionnables par partition (statistiques approchées de l'explorateur)
+OFF_SKETCHES = PROCESSED_DIR / "off_sketches.parquet"
+
 OUTPUT_FILE = ENRICHED_DIR / "off_enriched.parquet"
 
+# Valeurs CIQUAL des produits appariés, stockées une fois (référencées par alim_code)
+CIQUAL_LOOKUP = ENRICHED_DIR / "ciqual_lookup.parquet"
+
+# Centiles des nutriments et scores par catégorie (classement sans parcours)
+CATEGORY_PERCENTILES = ENRICHED_DIR / "category_percentiles.parquet"
+
+# Jeux partitionnés (catégorie racine / Nutri-Score) pour les lectures filtrées
+OFF_DATASET = PROCESSED_DIR / "off_transformed"
+ENRICHED_DATASET = ENRICHED_DIR / "off_enriched"
+
 
 # ===============================
 # ENRICHMENT LOGIC
 # ===============================
-def compute_energy_density(row):
+def compute_energy_density(df: pd.DataFrame) -> pd.Series:
     """kcal pour 100g"""
-    return row.get("energy_kcal_100g")
+    return pd.to_numeric(df["energy_kcal_100g"], errors="coerce")
 
 
-def compute_protein_ratio(row):
-    """protéines / énergie"""
-    energy = row.get("energy_kcal_100g", 0)
-    if energy and energy > 0:
-        return row.get("proteins_100g", 0) / energy
-    return None
+def compute_protein_ratio(df: pd.DataFrame) -> pd.Series:
+    """protéines / énergie (manquant si une valeur manque ou si l'énergie est nulle)"""
+    energy = pd.to_numeric(df["energy_kcal_100g"], errors="coerce")
+    proteins = pd.to_numeric(df["proteins_100g"], errors="coerce")
+    return (proteins / energy).where(energy > 0)
 
 
-def enrich_off_with_ciqual(df_off: pd.DataFrame, df_ciqual: pd.DataFrame) -> pd.DataFrame:
-    """Enrichit OpenFoodFacts avec CIQUAL via une jointure sur le nom normalisé."""
+def attach_ingredients(df_off: pd.DataFrame, path: Path = OFF_INGREDIENTS) -> pd.DataFrame:
+    """Ajoute la colonne liste ``ingredients_parsed`` si l'étape de transformation l'a produite."""
+    if not path.exists():
+        return df_off
+    parsed = pd.read_parquet(path).drop_duplicates(subset="code").set_index("code")["ingredients_parsed"]
+    return df_off.assign(ingredients_parsed=df_off["code"].astype(str).map(parsed))
 
-    df_off["product_name_norm"] = (
-        df_off["product_name"]
-        .astype(str)
-        .str.lower()
-        .str.replace(r"[^a-zàâçéèêëîïôûùüÿñæœ ]", "", regex=True)
-    )
 
-    df_ciqual["food_name_norm"] = (
-        df_ciqual["alim_nom_fr"]
-        .astype(str)
-        .str.lower()
-        .str.replace(r"[^a-zàâçéèêëîïôûùüÿñæœ ]", "", regex=True)
-    )
+def enrich_off_with_ciqual(
+    df_off: pd.DataFrame,
+    df_ciqual: pd.DataFrame,
+    nutrients: Sequence[str] = CIQUAL_NUTRIENTS
+) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Enrichit OpenFoodFacts avec CIQUAL via le nom normalisé.
 
-    df = df_off.merge(
-        df_ciqual,
-        left_on="product_name_norm",
-        right_on="food_name_norm",
-        how="left",
-        suffixes=("_off", "_ciqual"),
-    )
+    Chaque produit reçoit l'``alim_code`` de l'aliment correspondant ; les
+    valeurs CIQUAL (projetées sur ``nutrients``) restent dans la table de
+    référence renvoyée à côté, restreinte aux aliments appariés.
+
+    Returns:
+        ``(produits enrichis, table de référence CIQUAL)``
+    """
+    df = df_off.assign(**{CIQUAL_ID: match_ciqual(df_off["product_name"], df_ciqual)})
+    lookup = ciqual_lookup(df_ciqual, nutrients)
+    lookup = lookup[lookup[CIQUAL_ID].isin(df[CIQUAL_ID].dropna())].reset_index(drop=True)
 
-    df["energy_density"] = df.apply(compute_energy_density, axis=1)
-    df["protein_ratio"] = df.apply(compute_protein_ratio, axis=1)
+    df["energy_density"] = compute_energy_density(df)
+    df["protein_ratio"] = compute_protein_ratio(df)
 
-    return df
+    return df, lookup
 
 
 # ===============================
@@ -77,9 +112,9 @@ def main():
     if not OFF_CSV.exists() or not CIQUAL_CSV.exists():
         raise FileNotFoundError("Fichiers CSV transformés manquants")
 
-    # --- CSV → DataFrame
-    df_off = pd.read_csv(OFF_CSV)
-    df_ciqual = pd.read_csv(CIQUAL_CSV)
+    # --- CSV → DataFrame (schéma compact : catégories, float32, entiers nullables)
+    df_off = attach_ingredients(apply_schema(pd.read_csv(OFF_CSV, dtype={"code": str})))
+    df_ciqual = apply_schema(pd.read_csv(CIQUAL_CSV))
 
     # --- Sauvegarde Parquet (PROCESSED)
     PROCESSED_DIR.mkdir(parents=True, exist_ok=True)
@@ -89,8 +124,32 @@ def main():
 
     print("→ Conversion CSV → Parquet terminée (processed/)")
 
+    # Fichiers Arrow projetés en mémoire par l'application (partagés entre processus)
+    for df, path in [(df_off, OFF_PARQUET), (df_ciqual, CIQUAL_PARQUET)]:
+        published = publish_ipc(df, ipc_path(path))
+        print(f"→ Arrow IPC : {ipc_path(path)} ({published['bytes'] / 2**20:.1f} Mo)")
+
+    written = write_dataset(df_off, OFF_DATASET)
+    print(f"→ Jeu partitionné : {OFF_DATASET} ({written['files']} fichiers)")
+
+    saved = BitmapIndex.from_frame(df_off).save(OFF_BITMAP)
+    print(f"→ Index allergènes / additifs : {OFF_BITMAP} ({saved['terms']} termes)")
+
+    taxonomy = Taxonomy.from_frame(df_off)
+    saved = taxonomy.save(OFF_TAXONOMY)
+    print(f"→ Taxonomie des catégories : {OFF_TAXONOMY} ({saved['categories']} catégories)")
+
+    saved = SketchStore.from_frame(df_off).save(OFF_SKETCHES)
+    print(f"→ Esquisses statistiques : {OFF_SKETCHES} ({saved['partitions']} partitions)")
+
     # --- Enrichissement
-    df_enriched = enrich_off_with_ciqual(df_off, df_ciqual)
+    df_enriched, lookup = enrich_off_with_ciqual(df_off, df_ciqual)
+    matched = int(df_enriched[CIQUAL_ID].notna().sum())
+    print(f"→ Jointure CIQUAL : {matched} produits appariés ({len(lookup)} aliments CIQUAL distincts)")
+    df_enriched = apply_schema(add_nutriscore_columns(df_enriched))
+
+    mismatches = int(df_enriched["ns_grade_mismatch"].sum())
+    print(f"→ Nutri-Score recalculé ({mismatches} écarts avec le grade stocké)")
 
     # --- Sauvegarde Parquet enrichi
     ENRICHED_DIR.mkdir(parents=True, exist_ok=True)
@@ -102,6 +161,18 @@ def main():
     )
 
     print(f"→ Dataset enrichi sauvegardé : {OUTPUT_FILE}")
+    publish_ipc(df_enriched, ipc_path(OUTPUT_FILE))
+
+    lookup.to_parquet(CIQUAL_LOOKUP, engine="pyarrow", index=False)
+    print(f"→ Table de référence CIQUAL : {CIQUAL_LOOKUP} ({len(lookup.columns) - 1} colonnes)")
+
+    # Lignes du catalogue enrichi dans l'ordre d'OFF : la taxonomie s'applique telle quelle
+    saved = PercentileTables.from_frame(df_enriched, taxonomy).save(CATEGORY_PERCENTILES)
+    print(f"→ Centiles par catégorie : {CATEGORY_PERCENTILES} ({saved['categories']} catégories, "
+          f"{saved['columns']} colonnes)")
+
+    written = write_dataset(df_enriched, ENRICHED_DATASET)
+    print(f"→ Jeu enrichi partitionné : {ENRICHED_DATASET} ({written['files']} fichiers)")
     print(f"→ Lignes : {len(df_enriched)}")
 
 
@@ -0,0 +1,219 @@
+"""
+Calcul local et vectorisé du Nutri-Score (grille 2017).
+
+Recalcule les points Nutri-Score de tout le catalogue en une passe NumPy
+à partir des nutriments pour 100 g, sans appel LLM :
+
+    - points négatifs (N) : énergie, sucres, acides gras saturés, sodium
+    - points positifs (P) : fibres, protéines (fruits/légumes non
+      renseignés dans nos données, comptés 0)
+    - score = N - P, les protéines n'étant pas comptées si N >= 11
+      (sauf pour les fromages)
+    - boissons : grille spécifique énergie / sucres et seuils de classes
+"""
+from typing import Any, Dict
+
+import numpy as np
+import pandas as pd
+
+KCAL_TO_KJ = 4.184
+
+# Seuils « strictement supérieur à » : points = nombre de seuils dépassés
+THRESHOLDS = {
+    "energy": np.array([335, 670, 1005, 1340, 1675, 2010, 2345, 2680, 3015, 3350]),
+    "sugars": np.array([4.5, 9, 13.5, 18, 22.5, 27, 31, 36, 40, 45]),
+    "saturated_fat": np.array([1, 2, 3, 4, 5, 6, 7, 8, 9, 10]),
+    "sodium": np.array([90, 180, 270, 360, 450, 540, 630, 720, 810, 900]),
+    "fiber": np.array([0.9, 1.9, 2.8, 3.7, 4.7]),
+    "proteins": np.array([1.6, 3.2, 4.8, 6.4, 8.0]),
+}
+
+BEVERAGE_THRESHOLDS = {
+    "energy": np.array([0, 30, 60, 90, 120, 150, 180, 210, 240, 270]),
+    "sugars": np.array([0, 1.5, 3, 4.5, 6, 7.5, 9, 10.5, 12, 13.5]),
+}
+
+# Bornes hautes des classes A à D (au-delà : E)
+FOOD_GRADE_BOUNDS = np.array([-1, 2, 10, 18])
+BEVERAGE_GRADE_BOUNDS = np.array([-np.inf, 1, 5, 9])
+GRADES = np.array(["a", "b", "c", "d", "e"])
+
+BEVERAGE_PATTERN = r"\b(?:boissons?|beverages?|jus|juices?|sodas?|eaux?|waters?)\b"
+WATER_PATTERN = r"\b(?:eaux? minérales?|eaux? de source|mineral waters?|spring waters?)\b"
+CHEESE_PATTERN = r"\b(?:fromages?|cheeses?)\b"
+
+# Catégories « chapeau » qui mentionnent les boissons sans en être
+UMBRELLA_PATTERN = (
+    r"aliments et boissons à base de végétaux|plant-based foods and beverages"
+    r"|alimentos y bebidas de origen vegetal|aliments-et-boissons-à-base-de-végétaux"
+)
+
+# Colonnes ajoutées au catalogue
+POINT_COLUMNS = [
+    "ns_points_energy",
+    "ns_points_sugars",
+    "ns_points_saturated_fat",
+    "ns_points_sodium",
+    "ns_points_fiber",
+    "ns_points_proteins",
+]
+
+
+def _points(values: np.ndarray, thresholds: np.ndarray) -> np.ndarray:
+    return np.searchsorted(thresholds, values, side="left").astype(np.int8)
+
+
+def _numeric(df: pd.DataFrame, col: str) -> np.ndarray:
+    if col not in df.columns:
+        return np.full(len(df), np.nan)
+    values = pd.to_numeric(df[col], errors="coerce")
+    if values.dtype == np.float32:
+        return _decimal(values.to_numpy())
+    return values.to_numpy(dtype=np.float64)
+
+
+def _decimal(values: np.ndarray) -> np.ndarray:
+    """
+    float32 -> float64 arrondi à 7 chiffres significatifs.
+
+    Schéma compact : float32(3.7) vaut 3.7000000477, qui dépasserait à tort
+    le seuil 3.7 ; on retrouve la valeur décimale saisie.
+    """
+    values = values.astype(np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        exponent = np.floor(np.log10(np.abs(values)))
+    scale = 10.0 ** (6 - np.where(np.isfinite(exponent), exponent, 0))
+    return np.round(values * scale) / scale
+
+
+def _category_flag(df: pd.DataFrame, pattern: str) -> np.ndarray:
+    """Vrai si les catégories correspondent au motif (évalué par valeur distincte)."""
+    if "categories" not in df.columns:
+        return np.zeros(len(df), dtype=bool)
+    codes, uniques = pd.factorize(df["categories"])
+    hits = (
+        pd.Series(uniques, dtype=object)
+        .str.lower()
+        .str.replace(UMBRELLA_PATTERN, "", regex=True)
+        .str.contains(pattern, regex=True, na=False)
+        .to_numpy(dtype=bool)
+    )
+    return np.append(hits, False)[codes]
+
+
+def compute_nutriscore(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Calcule le détail du Nutri-Score pour chaque ligne du catalogue.
+
+    Args:
+        df: Catalogue OFF transformé (colonnes ``*_100g``, ``categories``,
+            ``nutriscore_grade``)
+
+    Returns:
+        DataFrame aligné sur ``df`` avec les points par composante, les
+        totaux négatif/positif, ``ns_score``, ``ns_grade_computed`` et
+        ``ns_grade_mismatch`` (grade stocké différent du grade recalculé).
+        Le score est manquant si énergie, sucres, AGS ou sel manquent.
+    """
+    energy_kj = _numeric(df, "energy_kcal_100g") * KCAL_TO_KJ
+    sugars = _numeric(df, "sugars_100g")
+    saturated_fat = _numeric(df, "saturated_fat_100g")
+    sodium_mg = _numeric(df, "salt_100g") * 400
+    fiber = np.nan_to_num(_numeric(df, "fiber_100g"), nan=0.0)
+    proteins = np.nan_to_num(_numeric(df, "proteins_100g"), nan=0.0)
+
+    beverage = _category_flag(df, BEVERAGE_PATTERN)
+    water = beverage & _category_flag(df, WATER_PATTERN)
+    cheese = _category_flag(df, CHEESE_PATTERN)
+
+    points = {
+        "energy": np.where(
+            beverage,
+            _points(energy_kj, BEVERAGE_THRESHOLDS["energy"]),
+            _points(energy_kj, THRESHOLDS["energy"])
+        ),
+        "sugars": np.where(
+            beverage,
+            _points(sugars, BEVERAGE_THRESHOLDS["sugars"]),
+            _points(sugars, THRESHOLDS["sugars"])
+        ),
+        "saturated_fat": _points(saturated_fat, THRESHOLDS["saturated_fat"]),
+        "sodium": _points(sodium_mg, THRESHOLDS["sodium"]),
+        "fiber": _points(fiber, THRESHOLDS["fiber"]),
+        "proteins": _points(proteins, THRESHOLDS["proteins"]),
+    }
+
+    negative = (
+        points["energy"] + points["sugars"]
+        + points["saturated_fat"] + points["sodium"]
+    ).astype(np.int16)
+    proteins_counted = (negative < 11) | cheese
+    positive = (
+        points["fiber"] + np.where(proteins_counted, points["proteins"], 0)
+    ).astype(np.int16)
+
+    score = (negative - positive).astype(np.float64)
+    complete = ~(
+        np.isnan(energy_kj) | np.isnan(sugars)
+        | np.isnan(saturated_fat) | np.isnan(sodium_mg)
+    )
+    score[~complete] = np.nan
+
+    grade_idx = np.where(
+        beverage,
+        np.searchsorted(BEVERAGE_GRADE_BOUNDS, score, side="left"),
+        np.searchsorted(FOOD_GRADE_BOUNDS, score, side="left")
+    )
+    grade_idx[water] = 0
+    grades = GRADES[np.minimum(grade_idx, 4)]
+    # Dtype explicite : marqueur d'absence pd.NA quelle que soit la version de pandas
+    computed = pd.Series(grades, index=df.index, dtype="string").where(complete)
+
+    stored = (
+        df["nutriscore_grade"].astype("string").str.lower().to_numpy(dtype=object, na_value=None)
+        if "nutriscore_grade" in df.columns
+        else np.full(len(df), None, dtype=object)
+    )
+    comparable = complete & np.isin(stored, GRADES)
+
+    def nullable(values: np.ndarray) -> pd.arrays.IntegerArray:
+        return pd.arrays.IntegerArray(values, mask=~complete)
+
+    result = pd.DataFrame(
+        {f"ns_points_{name}": nullable(values) for name, values in points.items()},
+        index=df.index
+    )
+    result["ns_proteins_counted"] = proteins_counted
+    result["ns_negative_points"] = nullable(negative)
+    result["ns_positive_points"] = nullable(positive)
+    result["ns_score"] = score
+    result["ns_grade_computed"] = computed
+    result["ns_grade_mismatch"] = comparable & (stored != grades)
+    return result
+
+
+def add_nutriscore_columns(df: pd.DataFrame) -> pd.DataFrame:
+    """Ajoute le détail du Nutri-Score recalculé au catalogue."""
+    breakdown = compute_nutriscore(df)
+    return pd.concat([df.drop(columns=breakdown.columns, errors="ignore"), breakdown], axis=1)
+
+
+def nutriscore_breakdown(product: Dict[str, Any]) -> Dict[str, Any]:
+    """Détail structuré du Nutri-Score d'un seul produit."""
+    row = compute_nutriscore(pd.DataFrame([product])).iloc[0]
+    if pd.isna(row["ns_score"]):
+        return {"computable": False}
+
+    return {
+        "computable": True,
+        "score": int(row["ns_score"]),
+        "grade": row["ns_grade_computed"],
+        "stored_grade": product.get("nutriscore_grade"),
+        "mismatch": bool(row["ns_grade_mismatch"]),
+        "negative_points": int(row["ns_negative_points"]),
+        "positive_points": int(row["ns_positive_points"]),
+        "proteins_counted": bool(row["ns_proteins_counted"]),
+        "points": {
+            col.removeprefix("ns_points_"): int(row[col]) for col in POINT_COLUMNS
+        },
+    }
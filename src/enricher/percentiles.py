@@ -0,0 +1,274 @@
+"""
+Tables de centiles par catégorie.
+
+Dire « ce chocolat fait partie des 10 % les plus sucrés des chocolats »
+demandait de parcourir la catégorie à chaque requête. Le pipeline calcule
+ici, une fois, pour chaque catégorie de la taxonomie assez fournie et pour
+chaque nutriment / score, les 101 centiles (0 à 100) de la distribution :
+
+    - stockage compact : ``float32``, une liste de taille fixe par
+      (catégorie, colonne), plus une ligne « tout le catalogue »
+    - classement en O(log n) : recherche dichotomique dans les centiles,
+      interpolation linéaire entre deux points (rang moyen pour les
+      valeurs répétées, fréquentes sur les scores entiers)
+    - classement par lot vectorisé : la dichotomie avance en parallèle
+      pour tous les produits, chacun dans sa catégorie
+
+La catégorie de référence d'un produit est la plus précise (la plus
+profonde dans la taxonomie) parmi les siennes qui ont au moins
+``MIN_PRODUCTS`` produits ; à défaut, le catalogue entier.
+"""
+import json
+import os
+import warnings
+from pathlib import Path
+from typing import Any, Dict, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from .taxonomy import Taxonomy, split_categories
+
+# Nutriments et scores classés (colonnes absentes ignorées)
+PERCENTILE_COLUMNS = [
+    "energy_kcal_100g",
+    "fat_100g",
+    "saturated_fat_100g",
+    "sugars_100g",
+    "fiber_100g",
+    "proteins_100g",
+    "salt_100g",
+    "additives_n",
+    "ns_score",
+]
+
+QUANTILES = np.linspace(0, 100, 101)
+
+# En dessous, une catégorie n'a pas de table (centiles trop bruités)
+MIN_PRODUCTS = 10
+
+CATALOGUE = -1
+CATALOGUE_LABEL = "tout le catalogue"
+
+_METADATA_KEY = b"percentiles"
+
+
+class PercentileTables:
+    """
+    Centiles par catégorie et par colonne.
+
+    ``quantiles[c, j]`` contient les 101 centiles de la colonne
+    ``columns[j]`` dans la catégorie ``c`` ; la dernière ligne est celle du
+    catalogue entier (``CATALOGUE``).
+    """
+
+    def __init__(
+        self,
+        keys: Sequence[str],
+        labels: Sequence[str],
+        depths: np.ndarray,
+        counts: np.ndarray,
+        columns: Sequence[str],
+        quantiles: np.ndarray
+    ):
+        self.keys = list(keys)
+        self.labels = list(labels) + [CATALOGUE_LABEL]
+        self.depths = np.asarray(depths, dtype=np.int16)
+        self.counts = np.asarray(counts, dtype=np.int64)
+        self.columns = list(columns)
+        self.quantiles = np.asarray(quantiles, dtype=np.float32)
+        self.ids = {key: i for i, key in enumerate(self.keys)}
+
+    # ------------------------------------------------------------------
+    # Construction
+    # ------------------------------------------------------------------
+    @classmethod
+    def from_frame(
+        cls,
+        df: pd.DataFrame,
+        taxonomy: Optional[Taxonomy] = None,
+        columns: Sequence[str] = PERCENTILE_COLUMNS,
+        min_products: int = MIN_PRODUCTS
+    ) -> "PercentileTables":
+        """
+        Calcule les tables d'un catalogue.
+
+        Args:
+            df: Produits (lignes alignées sur ``taxonomy``)
+            taxonomy: Taxonomie des catégories (construite si absente)
+            columns: Colonnes classées
+            min_products: Produits minimum par catégorie
+        """
+        taxonomy = taxonomy or Taxonomy.from_frame(df)
+        columns = [c for c in columns if c in df.columns]
+        values = np.column_stack(
+            [pd.to_numeric(df[c], errors="coerce").to_numpy(dtype=np.float64) for c in columns]
+        ) if columns else np.empty((len(df), 0))
+
+        kept = np.flatnonzero(taxonomy.counts() >= min_products)
+        quantiles = np.full((len(kept) + 1, len(columns), len(QUANTILES)), np.nan, dtype=np.float32)
+        for i, category in enumerate(kept):
+            quantiles[i] = _column_quantiles(values[taxonomy.members(category)])
+        quantiles[-1] = _column_quantiles(values)
+
+        depths = np.array([len(taxonomy.path(c)) - 1 for c in kept], dtype=np.int16)
+        return cls(
+            [taxonomy.keys[c] for c in kept],
+            [taxonomy.labels[c] for c in kept],
+            depths,
+            np.append(taxonomy.counts()[kept], len(df)),
+            columns,
+            quantiles,
+        )
+
+    # ------------------------------------------------------------------
+    # Catégorie de référence
+    # ------------------------------------------------------------------
+    def category_of(self, categories: Any) -> int:
+        """Catégorie de référence d'une chaîne ``categories`` OFF (``CATALOGUE`` à défaut)."""
+        ids = [self.ids[key] for key, _ in split_categories(categories) if key in self.ids]
+        if not ids:
+            return CATALOGUE
+        # La plus profonde, puis la moins fournie (la plus spécifique)
+        return min(ids, key=lambda c: (-self.depths[c], self.counts[c], c))
+
+    def categories_for(self, categories: pd.Series) -> np.ndarray:
+        """Catégorie de référence de chaque ligne (une fois par chaîne distincte)."""
+        codes, uniques = pd.factorize(categories)
+        distinct = np.array([self.category_of(u) for u in uniques] + [CATALOGUE], dtype=np.int32)
+        return distinct[codes]
+
+    def label(self, category: int) -> str:
+        return self.labels[category]
+
+    # ------------------------------------------------------------------
+    # Classement
+    # ------------------------------------------------------------------
+    def rank(self, column: str, values, categories) -> np.ndarray:
+        """
+        Centile (0 à 100) de chaque valeur dans sa catégorie.
+
+        Args:
+            column: Colonne classée
+            values: Valeurs (scalaire ou tableau)
+            categories: Catégorie de référence de chaque valeur (``CATALOGUE`` accepté)
+
+        Returns:
+            Centiles ``float64`` (NaN si la valeur ou la table manque)
+        """
+        values = np.atleast_1d(np.asarray(values, dtype=np.float64))
+        categories = np.broadcast_to(np.asarray(categories, dtype=np.int64), values.shape)
+        if column not in self.columns:
+            return np.full(values.shape, np.nan)
+
+        # Une table (catégories × centiles) par colonne, indexée par la catégorie de chaque valeur
+        table = self.quantiles[:, self.columns.index(column)].astype(np.float64)
+        lower = _search(table, categories, values, side="left")
+        upper = _search(table, categories, values, side="right")
+
+        # Entre deux centiles : interpolation linéaire
+        n = table.shape[1]
+        below, above = np.clip(lower - 1, 0, n - 1), np.clip(lower, 0, n - 1)
+        low, high = table[categories, below], table[categories, above]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            position = below + np.where(high > low, (values - low) / (high - low), 0.0)
+
+        # Égale à un ou plusieurs centiles : rang moyen des points égaux ; hors bornes : 0 ou 100
+        position = np.where(upper > lower, (lower + upper - 1) / 2, position)
+        position = np.where((upper == lower) & (lower == 0), 0.0, position)
+        position = np.where((upper == lower) & (lower == n), n - 1.0, position)
+        percent = position * 100 / (n - 1)
+        return np.where(np.isnan(values) | np.isnan(table[categories, 0]), np.nan, percent)
+
+    def rank_product(self, product: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Position d'un produit dans sa catégorie de référence, par colonne.
+
+        Returns:
+            ``{"category": libellé, "count": produits, "percentiles": {colonne: centile}}``
+            (colonnes sans valeur omises)
+        """
+        category = self.category_of(product.get("categories"))
+        nutriments = product.get("nutriments") or {}
+        percentiles = {}
+        for column in self.columns:
+            try:
+                value = float(product.get(column, nutriments.get(column)))
+            except (TypeError, ValueError):
+                continue
+            percent = self.rank(column, value, category)[0]
+            if not np.isnan(percent):
+                percentiles[column] = float(percent)
+        return {"category": self.label(category), "count": int(self.counts[category]), "percentiles": percentiles}
+
+    # ------------------------------------------------------------------
+    # Persistance
+    # ------------------------------------------------------------------
+    def save(self, path: Path) -> Dict[str, int]:
+        """
+        Écrit les tables en Parquet (écriture à côté puis renommage).
+
+        Returns:
+            Compteurs : categories, columns, bytes
+        """
+        path = Path(path)
+        flat = pa.array(self.quantiles.reshape(-1), type=pa.float32())
+        table = pa.table({
+            "key": pa.array(self.keys + [None], type=pa.string()),
+            "label": pa.array(self.labels, type=pa.string()),
+            "depth": pa.array(np.append(self.depths, -1).astype(np.int16)),
+            "products": pa.array(self.counts),
+            "quantiles": pa.FixedSizeListArray.from_arrays(flat, len(self.columns) * len(QUANTILES)),
+        })
+        table = table.replace_schema_metadata({_METADATA_KEY: json.dumps({"columns": self.columns})})
+
+        tmp = path.with_name(path.name + ".tmp")
+        pq.write_table(table, tmp)
+        os.replace(tmp, path)
+        return {"categories": len(self.keys), "columns": len(self.columns), "bytes": path.stat().st_size}
+
+    @classmethod
+    def load(cls, path: Path) -> "PercentileTables":
+        table = pq.read_table(path)
+        columns = json.loads(table.schema.metadata[_METADATA_KEY])["columns"]
+        flat = table.column("quantiles").combine_chunks().flatten().to_numpy(zero_copy_only=False)
+        return cls(
+            table.column("key").to_pylist()[:-1],
+            table.column("label").to_pylist()[:-1],
+            table.column("depth").to_numpy()[:-1],
+            table.column("products").to_numpy(),
+            columns,
+            flat.reshape(len(table), len(columns), len(QUANTILES)),
+        )
+
+
+def _column_quantiles(values: np.ndarray) -> np.ndarray:
+    """Centiles de chaque colonne (NaN ignorés), forme ``(colonnes, 101)``."""
+    if not values.size:
+        return np.full((values.shape[1], len(QUANTILES)), np.nan)
+    with warnings.catch_warnings():
+        # Colonne entièrement manquante dans la catégorie : centiles NaN
+        warnings.simplefilter("ignore", RuntimeWarning)
+        return np.nanpercentile(values, QUANTILES, axis=0).T
+
+
+def _search(table: np.ndarray, rows: np.ndarray, values: np.ndarray, side: str) -> np.ndarray:
+    """``searchsorted`` de chaque valeur dans la ligne ``rows`` de ``table``, vectorisé (dichotomie en parallèle)."""
+    lo = np.zeros(len(values), dtype=np.int64)
+    hi = np.full(len(values), table.shape[1], dtype=np.int64)
+    for _ in range(int(np.ceil(np.log2(table.shape[1] + 1)))):
+        active = lo < hi
+        mid = (lo + hi) // 2
+        pivot = table[rows, np.minimum(mid, table.shape[1] - 1)]
+        right = (pivot < values) if side == "left" else (pivot <= values)
+        lo = np.where(active & right, mid + 1, lo)
+        hi = np.where(active & ~right, mid, hi)
+    return lo
+
+
+def load_tables(path: Path) -> Optional[PercentileTables]:
+    """Tables publiées par le pipeline, ``None`` si absentes."""
+    path = Path(path)
+    return PercentileTables.load(path) if path.exists() else None
@@ -0,0 +1,296 @@
+"""
+Étape 3 bis : pré-génération hors ligne des analyses IA des produits.
+
+Génère à l'avance l'analyse ``ProductAnalyzer.analyze`` des produits du
+catalogue enrichi et la stocke dans un fichier Parquet indexé par
+``code``, que Streamlit sert directement (génération en direct seulement
+en cas d'absence).
+
+    - reprise : les produits déjà analysés sont ignorés
+    - concurrence limitée : ``--concurrency`` appels LLM simultanés
+    - points de contrôle : les résultats sont écrits par lots dans
+      ``analyses_parts/`` puis compactés en fin de traitement
+    - exécution unique : un verrou système sur ``analyses.lock`` écarte
+      les lancements concurrents (pipeline relancé, plusieurs processus
+      Streamlit)
+
+Lancée par le pipeline, la pré-génération tourne dans un thread du
+processus Streamlit (``start_background``) : ses appels passent par la
+même file d'attente que ceux des utilisateurs, en priorité ``batch``, et
+ne les retardent donc pas. Exécutée à part en ligne de commande, elle a
+sa propre file et concurrence l'interface pour le serveur LLM.
+
+Usage:
+    python -m src.enricher.pregenerate_analyses --limit 200 --concurrency 4
+"""
+import argparse
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+from uuid import uuid4
+
+import pandas as pd
+
+from .enrich_data import CATEGORY_PERCENTILES, ENRICHED_DIR, OUTPUT_FILE
+from .percentiles import load_tables
+
+ANALYSES_FILE = ENRICHED_DIR / "analyses.parquet"
+PARTS_DIR = ENRICHED_DIR / "analyses_parts"
+LOCK_FILE = ENRICHED_DIR / "analyses.lock"
+
+# Colonne de popularité OFF utilisée pour traiter d'abord les produits les plus vus
+POPULARITY_COLUMN = "unique_scans_n"
+
+COLUMNS = ["code", "product_name", "analysis", "model_used", "prompt_tokens", "generated_at"]
+
+
+# ===============================
+# CLÉS / LECTURE
+# ===============================
+def code_key(code: Any) -> Optional[str]:
+    """Clé texte d'un code-barres (les codes lus en float perdent leur ``.0``)."""
+    if code is None or (isinstance(code, float) and code != code):
+        return None
+    if isinstance(code, float) and code.is_integer():
+        code = int(code)
+    return str(code).strip() or None
+
+
+def load_analyses(path: Path = ANALYSES_FILE, parts_dir: Path = PARTS_DIR) -> pd.DataFrame:
+    """Charge les analyses déjà générées (fichier compacté + lots en cours)."""
+    frames = [pd.read_parquet(p) for p in [path] if p.exists()]
+    if parts_dir.exists():
+        frames += [pd.read_parquet(p) for p in sorted(parts_dir.glob("part-*.parquet"))]
+    if not frames:
+        return pd.DataFrame(columns=COLUMNS)
+    df = pd.concat(frames, ignore_index=True)
+    return df.drop_duplicates(subset="code", keep="last").reset_index(drop=True)
+
+
+def analyses_by_code(path: Path = ANALYSES_FILE, parts_dir: Path = PARTS_DIR) -> Dict[str, Dict[str, Any]]:
+    """Analyses indexées par code pour un accès direct."""
+    df = load_analyses(path, parts_dir)
+    return df.set_index("code").to_dict(orient="index")
+
+
+def select_products(df: pd.DataFrame, limit: Optional[int] = None) -> pd.DataFrame:
+    """Produits à analyser, les plus populaires d'abord si l'information existe."""
+    df = df.assign(code=df["code"].map(code_key)).dropna(subset=["code"])
+    df = df.drop_duplicates(subset="code")
+    if POPULARITY_COLUMN in df.columns:
+        df = df.sort_values(POPULARITY_COLUMN, ascending=False, kind="stable")
+    return df.head(limit) if limit else df
+
+
+# ===============================
+# ÉCRITURE
+# ===============================
+def _write_atomic(df: pd.DataFrame, path: Path, tmp_dir: Path):
+    # Fichier temporaire hors du dossier des lots : une écriture interrompue
+    # n'y laisse rien que la lecture ou le compactage devraient gérer
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_dir.mkdir(parents=True, exist_ok=True)
+    tmp = tmp_dir / f".{path.stem}-{uuid4().hex}.tmp"
+    df.to_parquet(tmp, engine="pyarrow", index=False)
+    tmp.replace(path)
+
+
+def _write_part(rows: List[Dict[str, Any]], parts_dir: Path):
+    # Nom unique, horodaté pour que l'ordre des noms suive celui des écritures
+    name = f"part-{time.time_ns():020d}-{uuid4().hex[:8]}.parquet"
+    _write_atomic(pd.DataFrame(rows, columns=COLUMNS), parts_dir / name, parts_dir.parent)
+
+
+def compact(path: Path = ANALYSES_FILE, parts_dir: Path = PARTS_DIR) -> int:
+    """Fusionne les lots dans le fichier final trié par code et supprime les lots."""
+    df = load_analyses(path, parts_dir).sort_values("code").reset_index(drop=True)
+    _write_atomic(df, path, path.parent)
+    if parts_dir.exists():
+        shutil.rmtree(parts_dir)
+    # Temporaires laissés par une exécution interrompue
+    for tmp in parts_dir.parent.glob(".part-*.tmp"):
+        tmp.unlink(missing_ok=True)
+    return len(df)
+
+
+@contextmanager
+def single_run(lock_path: Path = LOCK_FILE) -> Iterator[None]:
+    """
+    Verrou d'exécution unique de la pré-génération.
+
+    Verrou système (``flock``) sur le fichier : il est rendu à la fermeture,
+    y compris si le processus meurt, sans verrou périmé à reprendre. Le pid
+    du détenteur y est écrit pour le diagnostic.
+
+    Raises:
+        RuntimeError: Une autre pré-génération est en cours
+    """
+    lock_path.parent.mkdir(parents=True, exist_ok=True)
+    fd = os.open(lock_path, os.O_CREAT | os.O_RDWR)
+    try:
+        try:
+            _lock_file(fd)
+        except OSError:
+            holder = lock_path.read_text().strip() or "inconnu"
+            raise RuntimeError(f"Pré-génération déjà en cours (pid {holder})") from None
+
+        os.ftruncate(fd, 0)
+        os.write(fd, str(os.getpid()).encode())
+        try:
+            yield
+        finally:
+            os.ftruncate(fd, 0)
+    finally:
+        # La fermeture libère le verrou ; le fichier reste en place pour
+        # qu'un autre processus ne verrouille jamais un fichier remplacé
+        os.close(fd)
+
+
+def _lock_file(fd: int):
+    """Verrou exclusif non bloquant (OSError s'il est déjà pris)."""
+    try:
+        import fcntl
+    except ImportError:  # Windows
+        import msvcrt
+        msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+    else:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+
+# ===============================
+# GÉNÉRATION
+# ===============================
+def pregenerate(
+    products: pd.DataFrame,
+    analyzer=None,
+    concurrency: int = 4,
+    checkpoint_every: int = 20,
+    path: Path = ANALYSES_FILE,
+    parts_dir: Path = PARTS_DIR
+) -> Dict[str, int]:
+    """
+    Génère les analyses manquantes.
+
+    Args:
+        products: Produits à analyser (colonne ``code`` obligatoire)
+        analyzer: Instance de ``ProductAnalyzer`` (créée si absente)
+        concurrency: Nombre maximal d'appels LLM simultanés
+        checkpoint_every: Nombre d'analyses par lot écrit sur disque
+        path: Fichier Parquet final
+        parts_dir: Dossier des lots intermédiaires
+
+    Returns:
+        Compteurs : generated, skipped, failed, total
+    """
+    if analyzer is None:
+        from ..ia.product_analyzer import ProductAnalyzer
+        analyzer = ProductAnalyzer(priority="batch", percentiles=load_tables(CATEGORY_PERCENTILES))
+
+    done = set(load_analyses(path, parts_dir)["code"])
+    records = [
+        r for r in products.to_dict(orient="records")
+        if code_key(r.get("code")) not in done
+    ]
+    stats = {"generated": 0, "skipped": len(products) - len(records), "failed": 0,
+             "total": len(products)}
+
+    pending: List[Dict[str, Any]] = []
+    start = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = {pool.submit(analyzer.analyze, r): r for r in records}
+        for future in as_completed(futures):
+            product = futures[future]
+            result = future.result()
+
+            if not result.get("success"):
+                stats["failed"] += 1
+                continue
+
+            pending.append({
+                "code": code_key(product.get("code")),
+                "product_name": product.get("product_name"),
+                "analysis": result["analysis"],
+                "model_used": result["model_used"],
+                "prompt_tokens": result.get("prompt_tokens"),
+                "generated_at": datetime.now(timezone.utc).isoformat(),
+            })
+            stats["generated"] += 1
+
+            if len(pending) >= checkpoint_every:
+                _write_part(pending, parts_dir)
+                pending = []
+                rate = stats["generated"] / (time.perf_counter() - start)
+                print(f"  -> {stats['generated']}/{len(records)} analyses ({rate:.2f}/s)")
+
+    if pending:
+        _write_part(pending, parts_dir)
+
+    return stats
+
+
+# ===============================
+# MAIN
+# ===============================
+def run(limit: Optional[int] = None, concurrency: int = 4, analyzer=None) -> Dict[str, int]:
+    """Analyse les produits du catalogue enrichi puis compacte les lots."""
+    if not OUTPUT_FILE.exists():
+        raise FileNotFoundError("Dataset enrichi manquant (lancer l'étape 3)")
+
+    products = select_products(pd.read_parquet(OUTPUT_FILE), limit)
+    with single_run():
+        stats = pregenerate(products, analyzer=analyzer, concurrency=concurrency)
+        stats["available"] = compact()
+    return stats
+
+
+def start_background(
+    limit: Optional[int] = None,
+    concurrency: int = 4,
+    analyzer=None
+) -> threading.Thread:
+    """
+    Lance la pré-génération dans un thread du processus courant.
+
+    Les appels LLM passent par l'ordonnanceur partagé du processus (priorité
+    ``batch`` de l'analyseur par défaut) : les requêtes des utilisateurs
+    sont servies avant eux.
+    """
+    def target():
+        try:
+            stats = run(limit, concurrency, analyzer)
+            print(f"→ Pré-génération terminée : {stats['generated']} analyses ({stats['available']} disponibles)")
+        except Exception as e:
+            print(f"→ Pré-génération interrompue : {e}")
+
+    thread = threading.Thread(target=target, name="pregenerate-analyses", daemon=True)
+    thread.start()
+    return thread
+
+
+def main(limit: Optional[int] = None, concurrency: int = 4):
+    print("\n" + "=" * 60)
+    print("ÉTAPE 3 bis : Pré-génération des analyses IA")
+    print("=" * 60)
+
+    stats = run(limit, concurrency)
+
+    print(
+        f"→ {stats['generated']} générées, {stats['skipped']} déjà présentes, "
+        f"{stats['failed']} échecs"
+    )
+    print(f"→ Analyses disponibles : {stats['available']} ({ANALYSES_FILE})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pré-génération des analyses IA")
+    parser.add_argument("--limit", type=int, default=None, help="Nombre de produits")
+    parser.add_argument("--concurrency", type=int, default=4, help="Appels LLM simultanés")
+    args = parser.parse_args()
+    main(limit=args.limit, concurrency=args.concurrency)
@@ -0,0 +1,123 @@
+"""
+Schéma compact des tables OpenFoodFacts et CIQUAL.
+
+Après transformation, toutes les colonnes sont en ``float64`` ou en objets
+Python (une chaîne par cellule). Ce module applique au chargement des
+types explicites :
+
+    - codes-barres et textes quasi uniques (noms, ingrédients, marques,
+      listes de catégories) : chaînes Arrow (``string[pyarrow]``), le
+      code-barres restant une chaîne (zéros de tête conservés)
+    - colonnes à peu de valeurs distinctes (grades, allergènes, groupes
+      CIQUAL) : catégories pandas (dictionnaire + codes entiers)
+    - nutriments : ``float32``
+    - NOVA, scores encodés, compteurs et codes de groupes : entiers
+      nullables (``Int8`` / ``Int16`` / ``Int32``)
+
+``memory_report`` mesure l'occupation mémoire par ligne avant / après.
+"""
+import re
+from typing import Any, Dict, Optional
+
+import pandas as pd
+
+STRING = pd.StringDtype("pyarrow")
+
+# Colonnes connues -> type compact
+SCHEMA: Dict[str, Any] = {
+    # OpenFoodFacts
+    "code": STRING,
+    "product_name": STRING,
+    "ingredients_text": STRING,
+    "image_url": STRING,
+    # Marques et listes de catégories : presque une valeur par produit, un
+    # dictionnaire ne ferait que doubler les chaînes
+    "brands": STRING,
+    "categories": STRING,
+    "allergens": "category",
+    "nutriscore_grade": "category",
+    "ecoscore_grade": "category",
+    "nova_group": "Int8",
+    "nutriscore_numeric": "Int8",
+    "ecoscore_numeric": "Int8",
+    "additives_n": "Int16",
+    # CIQUAL
+    "alim_code": "Int32",
+    "alim_nom_fr": STRING,
+    "alim_nom_sci": STRING,
+    "alim_grp_code": "Int8",
+    "alim_ssgrp_code": "Int16",
+    "alim_ssssgrp_code": "Int32",
+    "alim_grp_nom_fr": "category",
+    "alim_ssgrp_nom_fr": "category",
+    "alim_ssssgrp_nom_fr": "category",
+    # Colonnes d'enrichissement
+    "product_name_norm": STRING,
+    "ns_score": "Int8",
+    "ns_grade_computed": "category",
+}
+
+# Nutriments pour 100 g (OFF : ``sugars_100g`` ; CIQUAL : ``sucres (g/100 g)``)
+NUTRIENT_PATTERN = re.compile(r"_100g$|/100 ?g\)")
+
+
+def target_dtype(column: str) -> Optional[Any]:
+    """Type compact d'une colonne, ``None`` si elle n'est pas couverte."""
+    if column in SCHEMA:
+        return SCHEMA[column]
+    if NUTRIENT_PATTERN.search(column):
+        return "float32"
+    return None
+
+
+def _cast(series: pd.Series, dtype: Any) -> pd.Series:
+    if dtype == "category" or dtype is STRING:
+        if pd.api.types.is_float_dtype(series) and series.isna().all():
+            # Colonne texte vide lue comme float (alim_ssssgrp_nom_fr, alim_nom_sci)
+            return pd.Series(pd.NA, index=series.index, dtype=STRING).astype(dtype)
+        if pd.api.types.is_float_dtype(series) and dtype is STRING:
+            # Code-barres lu comme nombre : 3.017e12 -> "3017000000000"
+            series = series.astype("Int64")
+        return series.astype(STRING).astype(dtype)
+    if dtype in ("Int8", "Int16", "Int32"):
+        return pd.to_numeric(series, errors="coerce").round().astype(dtype)
+    return pd.to_numeric(series, errors="coerce").astype(dtype)
+
+
+def apply_schema(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Applique le schéma compact aux colonnes connues de ``df``.
+
+    Les colonnes non couvertes sont laissées telles quelles ; une colonne
+    déjà au bon type n'est pas copiée.
+    """
+    columns = {}
+    for column in df.columns:
+        dtype = target_dtype(column)
+        if dtype is None or df[column].dtype == dtype:
+            continue
+        columns[column] = _cast(df[column], dtype)
+    return df.assign(**columns) if columns else df
+
+
+def memory_report(before: pd.DataFrame, after: pd.DataFrame) -> pd.DataFrame:
+    """
+    Octets par ligne, colonne par colonne, avant et après compaction.
+
+    Returns:
+        Colonnes ``dtype_before``, ``dtype_after``, ``bytes_before``,
+        ``bytes_after``, ``ratio`` ; une ligne ``TOTAL`` en fin de tableau
+    """
+    rows = max(len(before), 1)
+    usage_before = before.memory_usage(deep=True, index=False) / rows
+    usage_after = after.memory_usage(deep=True, index=False) / rows
+
+    report = pd.DataFrame({
+        "dtype_before": before.dtypes.astype(str),
+        "dtype_after": after.dtypes.reindex(before.columns).astype(str),
+        "bytes_before": usage_before,
+        "bytes_after": usage_after.reindex(before.columns),
+    })
+    report.loc["TOTAL"] = ["", "", usage_before.sum(), usage_after.sum()]
+    report["ratio"] = report["bytes_before"] / report["bytes_after"]
+    return report
@@ -0,0 +1,447 @@
+"""
+Esquisses statistiques fusionnables par partition.
+
+Le panneau « Statistiques » de l'explorateur recalculait
+``describe(include="all")`` et un histogramme sur la table filtrée à chaque
+rafraîchissement, comptage des valeurs distinctes des colonnes texte
+compris. Le pipeline calcule ici, pour chaque partition du catalogue
+(catégorie racine × grade Nutri-Score, les mêmes que le jeu partitionné)
+et chaque colonne, des résumés de taille fixe qui se fusionnent :
+
+    - moments : effectif, somme, somme des carrés, min, max (exacts)
+    - t-digest : centroïdes (moyenne, poids) pour les quantiles, fusion
+      par concaténation puis recompression
+    - HyperLogLog : registres ``uint8`` pour le nombre de valeurs
+      distinctes, fusion par maximum
+    - histogramme à bornes fixes (communes à toutes les partitions),
+      fusion par somme
+    - valeurs les plus fréquentes (colonnes texte), fusion par somme des
+      comptes
+
+Une vue filtrée sur des clés de partition se résume en fusionnant quelques
+dizaines d'esquisses : le coût ne dépend pas du nombre de lignes.
+"""
+import json
+import os
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from .dataset_store import MAX_CATEGORY_PARTITIONS, PARTITION_COLS, partition_keys
+
+DIGEST_COMPRESSION = 100
+HLL_PRECISION = 12
+HISTOGRAM_BINS = 40
+TOP_VALUES = 32
+
+NUMERIC = "numeric"
+TEXT = "text"
+
+_METADATA_KEY = b"sketches"
+
+
+# ============================================================
+# t-digest
+# ============================================================
+class TDigest:
+    """
+    Quantiles approchés : centroïdes triés (moyenne, poids).
+
+    La compression regroupe les centroïdes voisins dont la position
+    cumulée tombe dans le même intervalle unité de la fonction d'échelle
+    ``k(q) = δ / 2π · asin(2q - 1)`` : petits centroïdes aux extrémités,
+    gros au centre, au plus ~δ centroïdes.
+    """
+
+    def __init__(self, means: np.ndarray, weights: np.ndarray, compression: int = DIGEST_COMPRESSION):
+        self.means = np.asarray(means, dtype=np.float64)
+        self.weights = np.asarray(weights, dtype=np.float64)
+        self.compression = compression
+
+    @classmethod
+    def from_values(cls, values: np.ndarray, compression: int = DIGEST_COMPRESSION) -> "TDigest":
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        return cls(*_compress(values, np.ones(len(values)), compression), compression)
+
+    @classmethod
+    def merge_all(cls, digests: Iterable["TDigest"], compression: int = DIGEST_COMPRESSION) -> "TDigest":
+        digests = list(digests)
+        means = np.concatenate([d.means for d in digests]) if digests else np.empty(0)
+        weights = np.concatenate([d.weights for d in digests]) if digests else np.empty(0)
+        return cls(*_compress(means, weights, compression), compression)
+
+    @property
+    def total(self) -> float:
+        return float(self.weights.sum())
+
+    def quantile(self, q, low: float = np.nan, high: float = np.nan) -> np.ndarray:
+        """
+        Quantiles ``q`` (entre 0 et 1), interpolés entre centres de centroïdes.
+
+        ``low`` / ``high`` (min et max exacts) bornent les extrémités.
+        """
+        q = np.atleast_1d(np.asarray(q, dtype=np.float64))
+        if not len(self.means):
+            return np.full(q.shape, np.nan)
+        centers = np.cumsum(self.weights) - self.weights / 2
+        ranks, means = centers, self.means
+        if not np.isnan(low):
+            ranks, means = np.append(0.0, ranks), np.append(low, means)
+        if not np.isnan(high):
+            ranks, means = np.append(ranks, self.total), np.append(means, high)
+        return np.interp(q * self.total, ranks, means)
+
+
+def _compress(means: np.ndarray, weights: np.ndarray, compression: int) -> tuple:
+    if not len(means):
+        return np.empty(0), np.empty(0)
+    order = np.argsort(means, kind="stable")
+    means, weights = means[order], weights[order]
+    total = weights.sum()
+
+    # Intervalle unité de k au centre de chaque centroïde : même intervalle = même groupe
+    position = (np.cumsum(weights) - weights / 2) / total
+    k = np.floor(compression / (2 * np.pi) * np.arcsin(np.clip(2 * position - 1, -1, 1)))
+    starts = np.flatnonzero(np.r_[True, k[1:] != k[:-1]])
+
+    merged_weights = np.add.reduceat(weights, starts)
+    merged_means = np.add.reduceat(means * weights, starts) / merged_weights
+    return merged_means, merged_weights
+
+
+# ============================================================
+# HyperLogLog
+# ============================================================
+class HyperLogLog:
+    """Nombre de valeurs distinctes approché (2^p registres, erreur ~1.04/√2^p)."""
+
+    def __init__(self, registers: Optional[np.ndarray] = None, precision: int = HLL_PRECISION):
+        self.precision = precision
+        self.registers = (
+            np.zeros(1 << precision, dtype=np.uint8) if registers is None
+            else np.asarray(registers, dtype=np.uint8)
+        )
+
+    @classmethod
+    def from_hashes(cls, hashes: np.ndarray, precision: int = HLL_PRECISION) -> "HyperLogLog":
+        sketch = cls(precision=precision)
+        if len(hashes):
+            hashes = np.asarray(hashes, dtype=np.uint64)
+            index = (hashes >> np.uint64(64 - precision)).astype(np.int64)
+            rest = hashes & np.uint64((1 << (64 - precision)) - 1)
+            # Rang du premier bit à 1 dans les 64 - p bits restants
+            _, exponent = np.frexp(rest.astype(np.float64))
+            rank = np.where(rest > 0, 64 - precision - exponent + 1, 64 - precision + 1)
+            np.maximum.at(sketch.registers, index, rank.astype(np.uint8))
+        return sketch
+
+    @classmethod
+    def merge_all(cls, sketches: Iterable["HyperLogLog"], precision: int = HLL_PRECISION) -> "HyperLogLog":
+        merged = cls(precision=precision)
+        for sketch in sketches:
+            np.maximum(merged.registers, sketch.registers, out=merged.registers)
+        return merged
+
+    def estimate(self) -> float:
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / np.sum(np.ldexp(1.0, -self.registers.astype(np.int64)))
+        zeros = int((self.registers == 0).sum())
+        if raw <= 2.5 * m and zeros:
+            # Petites cardinalités : comptage linéaire des registres vides
+            return m * np.log(m / zeros)
+        return float(raw)
+
+
+def value_hashes(s: pd.Series) -> np.ndarray:
+    """
+    Hachage 64 bits des valeurs non manquantes, identique d'une partition à l'autre.
+
+    Les valeurs distinctes sont hachées une fois (colonne factorisée) ; les
+    nombres sont hachés en ``float64`` quel que soit leur type de stockage.
+    """
+    if pd.api.types.is_numeric_dtype(s) and not pd.api.types.is_bool_dtype(s):
+        values = pd.to_numeric(s, errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan)
+        return pd.util.hash_array(values[~np.isnan(values)])
+    codes, uniques = pd.factorize(s)
+    hashed = pd.util.hash_array(np.asarray(uniques.astype(str), dtype=object))
+    return hashed[codes[codes >= 0]]
+
+
+# ============================================================
+# Esquisse d'une colonne
+# ============================================================
+class ColumnSketch:
+    """Résumé fusionnable d'une colonne sur un ensemble de lignes."""
+
+    def __init__(
+        self,
+        kind: str,
+        count: int,
+        moments: Optional[np.ndarray] = None,
+        digest: Optional[TDigest] = None,
+        hll: Optional[HyperLogLog] = None,
+        histogram: Optional[np.ndarray] = None,
+        top: Optional[Dict[str, int]] = None
+    ):
+        self.kind = kind
+        self.count = count
+        # somme, somme des carrés, min, max
+        self.moments = moments if moments is not None else np.array([0.0, 0.0, np.nan, np.nan])
+        self.digest = digest or TDigest(np.empty(0), np.empty(0))
+        self.hll = hll or HyperLogLog()
+        self.histogram = histogram
+        self.top = top or {}
+
+    @classmethod
+    def from_series(cls, s: pd.Series, kind: str, edges: Optional[np.ndarray] = None) -> "ColumnSketch":
+        hll = HyperLogLog.from_hashes(value_hashes(s))
+        if kind == NUMERIC:
+            values = pd.to_numeric(s, errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan)
+            values = values[~np.isnan(values)]
+            moments = np.array([
+                values.sum(), np.square(values).sum(),
+                values.min() if len(values) else np.nan, values.max() if len(values) else np.nan,
+            ])
+            histogram = _histogram(values, edges)
+            return cls(kind, len(values), moments, TDigest.from_values(values), hll, histogram)
+
+        counts = s.astype(str).where(s.notna()).value_counts()
+        return cls(kind, int(counts.sum()), hll=hll, top=counts.head(TOP_VALUES).to_dict())
+
+    @classmethod
+    def merge_all(cls, sketches: Sequence["ColumnSketch"]) -> "ColumnSketch":
+        kind = sketches[0].kind
+        filled = [s.moments for s in sketches if s.count and not np.isnan(s.moments[2])]
+        moments = np.array([
+            sum(s.moments[0] for s in sketches),
+            sum(s.moments[1] for s in sketches),
+            min(m[2] for m in filled) if filled else np.nan,
+            max(m[3] for m in filled) if filled else np.nan,
+        ])
+        histogram = None
+        if sketches[0].histogram is not None:
+            histogram = np.sum([s.histogram for s in sketches], axis=0)
+        top: Dict[str, int] = {}
+        for sketch in sketches:
+            for value, n in sketch.top.items():
+                top[value] = top.get(value, 0) + n
+        return cls(
+            kind,
+            sum(s.count for s in sketches),
+            moments,
+            TDigest.merge_all(s.digest for s in sketches),
+            HyperLogLog.merge_all(s.hll for s in sketches),
+            histogram,
+            top,
+        )
+
+    def describe(self) -> Dict[str, Any]:
+        """Mêmes champs que ``DataFrame.describe(include="all")`` (valeurs approchées)."""
+        stats = {"count": float(self.count), "unique": round(self.hll.estimate())}
+        if self.kind == TEXT:
+            if self.top:
+                value, freq = max(self.top.items(), key=lambda item: item[1])
+                stats.update(top=value, freq=freq)
+            return stats
+
+        total, squares, low, high = self.moments
+        if self.count:
+            mean = total / self.count
+            variance = (squares - self.count * mean ** 2) / (self.count - 1) if self.count > 1 else np.nan
+            q25, q50, q75 = self.digest.quantile([0.25, 0.5, 0.75], low, high)
+            stats.update(mean=mean, std=np.sqrt(max(variance, 0.0)) if self.count > 1 else np.nan,
+                         min=low, **{"25%": q25, "50%": q50, "75%": q75}, max=high)
+        return stats
+
+
+def _histogram(values: np.ndarray, edges: Optional[np.ndarray]) -> Optional[np.ndarray]:
+    """Comptes par classe ; les valeurs hors bornes vont dans la première / dernière classe."""
+    if edges is None:
+        return None
+    clipped = np.clip(values, edges[0], edges[-1])
+    return np.histogram(clipped, bins=edges)[0].astype(np.int64)
+
+
+def _edges(s: pd.Series, bins: int) -> np.ndarray:
+    values = pd.to_numeric(s, errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan)
+    low, high = (np.nanmin(values), np.nanmax(values)) if (~np.isnan(values)).any() else (0.0, 1.0)
+    if low == high:
+        high = low + 1.0
+    return np.linspace(low, high, bins + 1)
+
+
+def column_kind(s: pd.Series) -> Optional[str]:
+    """Type d'esquisse d'une colonne (``None`` si non résumable : listes, structures)."""
+    if pd.api.types.is_numeric_dtype(s) and not pd.api.types.is_bool_dtype(s):
+        return NUMERIC
+    if isinstance(s.dtype, pd.CategoricalDtype) or pd.api.types.is_string_dtype(s) and \
+            pd.api.types.infer_dtype(s, skipna=True) in ("string", "empty"):
+        return TEXT
+    if pd.api.types.is_bool_dtype(s):
+        return TEXT
+    return None
+
+
+# ============================================================
+# Esquisses d'un catalogue
+# ============================================================
+class SketchStore:
+    """
+    Esquisses par partition et par colonne.
+
+    ``partitions`` contient une ligne par partition (clés ``PARTITION_COLS``
+    et nombre de lignes) ; ``sketches[i][colonne]`` est l'esquisse de la
+    partition ``i``.
+    """
+
+    def __init__(
+        self,
+        partitions: pd.DataFrame,
+        sketches: List[Dict[str, ColumnSketch]],
+        kinds: Dict[str, str],
+        edges: Dict[str, np.ndarray]
+    ):
+        self.partitions = partitions.reset_index(drop=True)
+        self.sketches = sketches
+        self.kinds = kinds
+        self.edges = edges
+
+    @classmethod
+    def from_frame(
+        cls,
+        df: pd.DataFrame,
+        columns: Optional[Sequence[str]] = None,
+        bins: int = HISTOGRAM_BINS,
+        max_category_partitions: int = MAX_CATEGORY_PARTITIONS
+    ) -> "SketchStore":
+        """Calcule les esquisses de ``df`` (une passe par partition et par colonne)."""
+        kinds = {}
+        for column in columns or df.columns:
+            kind = column_kind(df[column])
+            if kind is not None:
+                kinds[column] = kind
+        edges = {c: _edges(df[c], bins) for c, kind in kinds.items() if kind == NUMERIC}
+
+        keys = partition_keys(df, max_category_partitions)
+        groups = keys.groupby(PARTITION_COLS, sort=True, observed=True).indices
+        partitions = pd.DataFrame(list(groups), columns=PARTITION_COLS)
+        partitions["rows"] = [len(rows) for rows in groups.values()]
+
+        sketches = [
+            {c: ColumnSketch.from_series(df[c].iloc[rows], kind, edges.get(c)) for c, kind in kinds.items()}
+            for rows in groups.values()
+        ]
+        return cls(partitions, sketches, kinds, edges)
+
+    def select(self, filters: Optional[Dict[str, Sequence[str]]] = None) -> np.ndarray:
+        """Partitions dont les clés figurent dans ``filters`` (``{clé: valeurs}``)."""
+        keep = np.ones(len(self.partitions), dtype=bool)
+        for key, values in (filters or {}).items():
+            if values:
+                keep &= self.partitions[key].isin([str(v).lower() for v in values]).to_numpy()
+        return np.flatnonzero(keep)
+
+    def merge(self, filters: Optional[Dict[str, Sequence[str]]] = None) -> "SketchView":
+        """Esquisses fusionnées des partitions sélectionnées."""
+        selected = self.select(filters)
+        merged = {
+            column: ColumnSketch.merge_all([self.sketches[i][column] for i in selected])
+            for column in self.kinds
+        } if len(selected) else {}
+        return SketchView(int(self.partitions["rows"].to_numpy()[selected].sum()), merged, self.edges)
+
+    # ------------------------------------------------------------------
+    # Persistance
+    # ------------------------------------------------------------------
+    def save(self, path: Path) -> Dict[str, int]:
+        """
+        Écrit les esquisses en Parquet (une ligne par partition et colonne).
+
+        Returns:
+            Compteurs : partitions, columns, bytes
+        """
+        path = Path(path)
+        records = []
+        for i, partition in self.partitions.iterrows():
+            for column, sketch in self.sketches[i].items():
+                records.append({
+                    **{key: partition[key] for key in PARTITION_COLS},
+                    "rows": int(partition["rows"]),
+                    "column": column,
+                    "count": sketch.count,
+                    "moments": sketch.moments.tolist(),
+                    "digest_means": sketch.digest.means.tolist(),
+                    "digest_weights": sketch.digest.weights.tolist(),
+                    "hll": sketch.hll.registers.tobytes(),
+                    "histogram": None if sketch.histogram is None else sketch.histogram.tolist(),
+                    "top_values": list(sketch.top),
+                    "top_counts": list(sketch.top.values()),
+                })
+        table = pa.Table.from_pylist(records)
+        meta = {"kinds": self.kinds, "edges": {c: e.tolist() for c, e in self.edges.items()}}
+        table = table.replace_schema_metadata({_METADATA_KEY: json.dumps(meta)})
+
+        tmp = path.with_name(path.name + ".tmp")
+        pq.write_table(table, tmp)
+        os.replace(tmp, path)
+        return {"partitions": len(self.partitions), "columns": len(self.kinds), "bytes": path.stat().st_size}
+
+    @classmethod
+    def load(cls, path: Path) -> "SketchStore":
+        table = pq.read_table(path)
+        meta = json.loads(table.schema.metadata[_METADATA_KEY])
+        kinds = meta["kinds"]
+        edges = {c: np.asarray(e) for c, e in meta["edges"].items()}
+
+        partitions, sketches, index = [], [], {}
+        for record in table.to_pylist():
+            key = tuple(record[k] for k in PARTITION_COLS)
+            if key not in index:
+                index[key] = len(partitions)
+                partitions.append({**dict(zip(PARTITION_COLS, key)), "rows": record["rows"]})
+                sketches.append({})
+            sketches[index[key]][record["column"]] = ColumnSketch(
+                kinds[record["column"]],
+                record["count"],
+                np.asarray(record["moments"], dtype=np.float64),
+                TDigest(np.asarray(record["digest_means"]), np.asarray(record["digest_weights"])),
+                HyperLogLog(np.frombuffer(record["hll"], dtype=np.uint8).copy()),
+                None if record["histogram"] is None else np.asarray(record["histogram"], dtype=np.int64),
+                dict(zip(record["top_values"], record["top_counts"])),
+            )
+        return cls(pd.DataFrame(partitions, columns=PARTITION_COLS + ["rows"]), sketches, kinds, edges)
+
+
+class SketchView:
+    """Esquisses fusionnées d'une vue (ensemble de partitions)."""
+
+    def __init__(self, rows: int, sketches: Dict[str, ColumnSketch], edges: Dict[str, np.ndarray]):
+        self.rows = rows
+        self.sketches = sketches
+        self.edges = edges
+
+    def describe(self, columns: Optional[Sequence[str]] = None) -> pd.DataFrame:
+        """Équivalent approché de ``df[columns].describe(include="all").transpose()``."""
+        columns = [c for c in (columns or self.sketches) if c in self.sketches]
+        fields = ["count", "unique", "top", "freq", "mean", "std", "min", "25%", "50%", "75%", "max"]
+        stats = pd.DataFrame([self.sketches[c].describe() for c in columns], index=columns)
+        return stats.reindex(columns=[f for f in fields if f in stats.columns]).astype(object)
+
+    def histogram(self, column: str) -> pd.Series:
+        """Comptes par classe (bornes fixes), indexés par la borne inférieure de la classe."""
+        sketch = self.sketches.get(column)
+        if sketch is None or sketch.histogram is None:
+            return pd.Series(dtype=np.int64)
+        return pd.Series(sketch.histogram, index=pd.Index(self.edges[column][:-1], name=column))
+
+
+def load_sketches(path: Path) -> Optional[SketchStore]:
+    """Esquisses publiées par le pipeline, ``None`` si absentes."""
+    path = Path(path)
+    return SketchStore.load(path) if path.exists() else None
@@ -0,0 +1,325 @@
+"""
+Taxonomie des catégories OpenFoodFacts.
+
+La colonne ``categories`` est une chaîne séparée par des virgules
+(« Snacks,Snacks sucrés,Biscuits et gâteaux,Biscuits ») redécoupée partout
+où elle sert. Ce module la transforme une fois en index :
+
+    - identifiants entiers : une catégorie par clé normalisée (sans préfixe
+      de langue ``en:`` / ``fr:``, ``normalize_name``), numérotée dans
+      l'ordre des clés
+    - hiérarchie parent / enfants : OFF liste les catégories de la plus
+      large à la plus précise ; le parent d'une catégorie est celle qui la
+      précède le plus souvent, parmi les catégories citées en moyenne plus
+      tôt qu'elle (cet ordre strict garantit un arbre sans cycle)
+    - appartenance au format CSR : ``indptr`` / ``indices`` donnent les
+      lignes produits de chaque catégorie (triées), ``product_indptr`` /
+      ``product_categories`` les catégories de chaque produit
+
+« Tous les produits sous Biscuits » ou un agrégat par catégorie coûtent
+alors O(membres), sans relire de chaînes. Les chaînes distinctes sont
+découpées une seule fois (colonne factorisée).
+
+Le pipeline écrit la taxonomie en Parquet (une ligne par catégorie, membres
+en colonne liste : c'est directement le CSR) avec une empreinte des
+codes-barres ; l'application la reconstruit si le catalogue a changé.
+"""
+import json
+import os
+import re
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from .text import normalize_name
+
+NO_PARENT = -1
+
+_LANGUAGE_PREFIX = re.compile(r"^[a-z]{2}:", re.IGNORECASE)
+
+_METADATA_KEY = b"taxonomy"
+
+
+def split_categories(value) -> List[tuple]:
+    """``(clé, libellé)`` des catégories d'une chaîne OFF, dans l'ordre, sans doublon."""
+    if not isinstance(value, str):
+        return []
+    seen, parts = set(), []
+    for part in value.split(","):
+        label = _LANGUAGE_PREFIX.sub("", part.strip()).strip()
+        key = normalize_name(label)
+        if key and key not in seen:
+            seen.add(key)
+            parts.append((key, label))
+    return parts
+
+
+def rows_fingerprint(codes: pd.Series) -> str:
+    """Empreinte de l'ordre des codes-barres (les lignes de l'index en dépendent)."""
+    hashed = pd.util.hash_pandas_object(codes.astype(str).reset_index(drop=True), index=True)
+    return f"{len(codes)}-{int(hashed.sum()) & 0xFFFFFFFFFFFFFFFF:016x}"
+
+
+def _csr(groups: np.ndarray, values: np.ndarray, size: int) -> tuple:
+    """CSR (``indptr``, ``indices``) de ``values`` regroupées par ``groups``."""
+    order = np.argsort(groups, kind="stable")
+    indptr = np.zeros(size + 1, dtype=np.int64)
+    np.cumsum(np.bincount(groups, minlength=size), out=indptr[1:])
+    return indptr, values[order]
+
+
+class Taxonomy:
+    """
+    Catégories, hiérarchie et appartenance des produits.
+
+    Les lignes produits sont des positions dans le catalogue indexé.
+    """
+
+    def __init__(
+        self,
+        keys: Sequence[str],
+        labels: Sequence[str],
+        parents: np.ndarray,
+        indptr: np.ndarray,
+        indices: np.ndarray,
+        n_products: int,
+        fingerprint: Optional[str] = None
+    ):
+        self.keys = list(keys)
+        self.labels = list(labels)
+        self.parents = np.asarray(parents, dtype=np.int32)
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.indices = np.asarray(indices, dtype=np.int32)
+        self.n_products = n_products
+        self.fingerprint = fingerprint
+        self.ids = {key: i for i, key in enumerate(self.keys)}
+
+        # Enfants (CSR inverse des parents)
+        has_parent = np.flatnonzero(self.parents >= 0).astype(np.int32)
+        self.child_indptr, self.child_ids = _csr(self.parents[has_parent], has_parent, len(self))
+
+        # Catégories de chaque produit (CSR transposé de l'appartenance)
+        entry_category = np.repeat(np.arange(len(self), dtype=np.int32), np.diff(self.indptr))
+        self.product_indptr, self.product_categories = _csr(self.indices, entry_category, n_products)
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    # ------------------------------------------------------------------
+    # Construction
+    # ------------------------------------------------------------------
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, col: str = "categories", code_col: str = "code") -> "Taxonomy":
+        """Construit la taxonomie des produits de ``df``."""
+        s = df[col]
+        if isinstance(s.dtype, pd.CategoricalDtype):
+            codes, uniques = s.cat.codes.to_numpy(), s.cat.categories
+        else:
+            codes, uniques = pd.factorize(s)
+        split = [split_categories(u) for u in uniques]
+        weights = np.bincount(codes[codes >= 0], minlength=len(uniques))
+
+        labels: Dict[str, str] = {}
+        for parts in split:
+            for key, label in parts:
+                labels.setdefault(key, label)
+        keys = sorted(labels)
+        ids = {key: i for i, key in enumerate(keys)}
+
+        # Catégories de chaque chaîne distincte (CSR), puis de chaque produit
+        lengths = np.array([len(p) for p in split] + [0], dtype=np.int64)
+        flat = np.array([ids[k] for parts in split for k, _ in parts], dtype=np.int32)
+        starts = np.concatenate([[0], np.cumsum(lengths)])
+
+        row_lengths = lengths[codes]
+        total = int(row_lengths.sum())
+        row_starts = np.repeat(starts[codes] - np.concatenate([[0], np.cumsum(row_lengths)[:-1]]), row_lengths)
+        entries = flat[row_starts + np.arange(total)]
+        rows = np.repeat(np.arange(len(df), dtype=np.int32), row_lengths)
+        indptr, indices = _csr(entries, rows, len(keys))
+
+        parents = cls._parents(split, weights, ids, np.diff(indptr))
+        fingerprint = rows_fingerprint(df[code_col]) if code_col in df.columns else None
+        return cls(keys, [labels[k] for k in keys], parents, indptr, indices, len(df), fingerprint)
+
+    @staticmethod
+    def _parents(split: List[list], weights: np.ndarray, ids: Dict[str, int], counts: np.ndarray) -> np.ndarray:
+        """Parent de chaque catégorie : prédécesseur le plus fréquent parmi les catégories de rang inférieur."""
+        position_sum = np.zeros(len(ids))
+        predecessors: Dict[tuple, int] = {}
+        for parts, weight in zip(split, weights):
+            if not weight:
+                continue
+            previous = NO_PARENT
+            for position, (key, _) in enumerate(parts):
+                current = ids[key]
+                position_sum[current] += position * weight
+                if previous != NO_PARENT:
+                    predecessors[(previous, current)] = predecessors.get((previous, current), 0) + int(weight)
+                previous = current
+
+        # Ordre strict : position moyenne plus précoce, puis plus de produits, puis identifiant
+        mean_position = position_sum / np.maximum(counts, 1)
+        rank = np.empty(len(ids), dtype=np.int64)
+        rank[np.lexsort((np.arange(len(ids)), -counts, mean_position))] = np.arange(len(ids))
+
+        parents = np.full(len(ids), NO_PARENT, dtype=np.int32)
+        best = np.zeros(len(ids), dtype=np.int64)
+        for (previous, current), weight in predecessors.items():
+            if rank[previous] < rank[current] and (
+                weight > best[current] or (weight == best[current] and rank[previous] < rank[parents[current]])
+            ):
+                parents[current], best[current] = previous, weight
+        return parents
+
+    # ------------------------------------------------------------------
+    # Requêtes
+    # ------------------------------------------------------------------
+    def id_of(self, name: str) -> Optional[int]:
+        """Identifiant d'une catégorie par nom (« en:Biscuits », « biscuits »…)."""
+        return self.ids.get(normalize_name(_LANGUAGE_PREFIX.sub("", str(name).strip())))
+
+    def matching(self, terms: Iterable[str], whole_words: bool = False) -> List[int]:
+        """
+        Catégories dont la clé contient un des termes (normalisés).
+
+        Avec ``whole_words``, un terme doit couvrir des mots entiers de la
+        clé (« egg » ne désigne pas « eggplant »).
+        """
+        terms = [normalize_name(t) for t in terms]
+        terms = [t for t in terms if t]
+        if whole_words:
+            terms = [f" {t} " for t in terms]
+            return [i for i, key in enumerate(self.keys) if any(t in f" {key} " for t in terms)]
+        return [i for i, key in enumerate(self.keys) if any(t in key for t in terms)]
+
+    def children(self, category: int) -> np.ndarray:
+        return self.child_ids[self.child_indptr[category]:self.child_indptr[category + 1]]
+
+    def descendants(self, category: int) -> np.ndarray:
+        """La catégorie et toutes ses sous-catégories."""
+        found, frontier = [np.array([category], dtype=np.int32)], np.array([category], dtype=np.int32)
+        while len(frontier):
+            frontier = np.concatenate([self.children(c) for c in frontier])
+            found.append(frontier)
+        return np.concatenate(found)
+
+    def path(self, category: int) -> List[int]:
+        """Ancêtres de la racine jusqu'à la catégorie."""
+        path = [category]
+        while self.parents[path[-1]] != NO_PARENT:
+            path.append(int(self.parents[path[-1]]))
+        return path[::-1]
+
+    def counts(self) -> np.ndarray:
+        """Nombre de produits par catégorie."""
+        return np.diff(self.indptr)
+
+    def members(self, category: int, descendants: bool = False) -> np.ndarray:
+        """Lignes des produits d'une catégorie (et de ses sous-catégories), triées."""
+        if not descendants:
+            return self.indices[self.indptr[category]:self.indptr[category + 1]]
+        ids = self.descendants(category)
+        if len(ids) == 1:
+            return self.members(category)
+        return np.unique(np.concatenate([self.members(c) for c in ids]))
+
+    def mask(self, categories: Iterable[int], descendants: bool = False) -> np.ndarray:
+        """Masque des produits appartenant à au moins une des catégories."""
+        mask = np.zeros(self.n_products, dtype=bool)
+        for category in categories:
+            mask[self.members(category, descendants)] = True
+        return mask
+
+    def categories_of(self, row: int) -> np.ndarray:
+        """Catégories d'un produit (par position)."""
+        return self.product_categories[self.product_indptr[row]:self.product_indptr[row + 1]]
+
+    def aggregate(self, values: np.ndarray, how: str = "mean") -> np.ndarray:
+        """
+        Agrégat d'une colonne numérique par catégorie (NaN ignorés), en O(appartenances).
+
+        Args:
+            values: Valeurs alignées sur les produits
+            how: ``"mean"``, ``"sum"`` ou ``"count"``
+        """
+        values = np.asarray(values, dtype=np.float64)[self.indices]
+        valid = ~np.isnan(values)
+        entry_category = np.repeat(np.arange(len(self)), self.counts())
+        count = np.bincount(entry_category[valid], minlength=len(self))
+        if how == "count":
+            return count
+        total = np.bincount(entry_category[valid], weights=values[valid], minlength=len(self))
+        if how == "sum":
+            return total
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(count > 0, total / count, np.nan)
+
+    def frame(self) -> pd.DataFrame:
+        """Une ligne par catégorie : identifiant, clé, libellé, parent, profondeur, produits."""
+        return pd.DataFrame({
+            "category_id": np.arange(len(self), dtype=np.int32),
+            "key": self.keys,
+            "label": self.labels,
+            "parent_id": self.parents,
+            "depth": [len(self.path(i)) - 1 for i in range(len(self))],
+            "products": self.counts(),
+        })
+
+    # ------------------------------------------------------------------
+    # Persistance
+    # ------------------------------------------------------------------
+    def save(self, path: Path) -> Dict[str, int]:
+        """
+        Écrit la taxonomie en Parquet (écriture à côté puis renommage).
+
+        Returns:
+            Compteurs : categories, memberships, bytes
+        """
+        path = Path(path)
+        table = pa.table({
+            "category_id": pa.array(np.arange(len(self), dtype=np.int32)),
+            "key": pa.array(self.keys, type=pa.string()),
+            "label": pa.array(self.labels, type=pa.string()),
+            "parent_id": pa.array(self.parents),
+            "members": pa.ListArray.from_arrays(pa.array(self.indptr.astype(np.int32)), pa.array(self.indices)),
+        })
+        meta = {"n_products": self.n_products, "fingerprint": self.fingerprint}
+        table = table.replace_schema_metadata({_METADATA_KEY: json.dumps(meta)})
+
+        tmp = path.with_name(path.name + ".tmp")
+        pq.write_table(table, tmp)
+        os.replace(tmp, path)
+        return {"categories": len(self), "memberships": len(self.indices), "bytes": path.stat().st_size}
+
+    @classmethod
+    def load(cls, path: Path) -> "Taxonomy":
+        table = pq.read_table(path)
+        meta = json.loads(table.schema.metadata[_METADATA_KEY])
+        members = table.column("members").combine_chunks()
+        return cls(
+            table.column("key").to_pylist(),
+            table.column("label").to_pylist(),
+            table.column("parent_id").to_numpy(),
+            members.offsets.to_numpy(),
+            members.values.to_numpy(),
+            meta["n_products"],
+            meta["fingerprint"],
+        )
+
+
+def load_taxonomy(path: Path, df: pd.DataFrame) -> Taxonomy:
+    """
+    Taxonomie alignée sur ``df`` : fichier du pipeline s'il correspond aux
+    mêmes produits dans le même ordre, sinon reconstruite.
+    """
+    path = Path(path)
+    if path.exists() and "code" in df.columns:
+        taxonomy = Taxonomy.load(path)
+        if taxonomy.fingerprint == rows_fingerprint(df["code"]):
+            return taxonomy
+    return Taxonomy.from_frame(df)
@@ -0,0 +1,65 @@
+"""
+Normalisation des noms de produits et d'aliments.
+
+Une seule définition de la clé de jointure pour le pipeline d'enrichissement
+et l'application : minuscules, sans accents, ponctuation remplacée par des
+espaces, espaces simplifiés (« Pâte à tartiner, 13% » → ``pate a tartiner 13``).
+
+Les noms se répètent beaucoup dans les catalogues : une colonne est d'abord
+factorisée, seules ses valeurs distinctes sont normalisées (avec un cache
+mémoïsé partagé entre les appels), puis les codes sont ramenés aux lignes.
+"""
+import re
+import unicodedata
+from functools import lru_cache
+from typing import Tuple
+
+import numpy as np
+import pandas as pd
+
+CACHE_SIZE = 1 << 18
+
+_NON_ALNUM = re.compile(r"[^a-z0-9]+")
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def normalize_name(text: str) -> str:
+    """Clé normalisée d'un nom (valeur mémoïsée)."""
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = text.encode("ascii", errors="ignore").decode("ascii")
+    return _NON_ALNUM.sub(" ", text).strip()
+
+
+def factorize_names(s: pd.Series) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Codes entiers des lignes et clé normalisée de chaque valeur distincte.
+
+    Returns:
+        ``(codes, keys)`` : ``keys[codes]`` donne la clé de chaque ligne ;
+        la dernière clé (chaîne vide) est celle des valeurs manquantes (-1)
+    """
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        codes, uniques = s.cat.codes.to_numpy(), s.cat.categories
+    else:
+        codes, uniques = pd.factorize(s)
+    keys = np.array([normalize_name(str(u)) for u in uniques] + [""], dtype=object)
+    return codes, keys
+
+
+def normalize_series(s: pd.Series) -> pd.Series:
+    """
+    Normalise une colonne de noms, une fois par valeur distincte.
+
+    Les valeurs manquantes donnent une chaîne vide.
+
+    Returns:
+        Série de chaînes (objets) alignée sur ``s``
+    """
+    codes, keys = factorize_names(s)
+    return pd.Series(keys[codes], index=s.index, name=s.name)
+
+
+def cache_info() -> dict:
+    """Succès / échecs du cache de normalisation."""
+    info = normalize_name.cache_info()
+    return {"hits": info.hits, "misses": info.misses, "size": info.currsize}
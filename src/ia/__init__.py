@@ -15,7 +15,15 @@ from .llm_manager import LLMManager
 from .product_analyzer import ProductAnalyzer
 from .recommender import ProductRecommender
 from .chatbot import NutritionChatbot
+from .catalogue_tools import CatalogueTools
+from .ciqual_index import CiqualIndex
 from .prompts import NutritionPrompts
+from .conversation_store import ConversationStore
+from .nutrient_index import NutrientIndex
+from .semantic_cache import SemanticCache
+from .singleflight import SingleFlight
+from .telemetry import LLMTelemetry
+from .scheduler import LLMScheduler
 
 __version__ = "1.0.0"
 __all__ = [
@@ -23,7 +31,15 @@ __all__ = [
     "ProductAnalyzer",
     "ProductRecommender", 
     "NutritionChatbot",
-    "NutritionPrompts"
+    "CatalogueTools",
+    "CiqualIndex",
+    "NutritionPrompts",
+    "ConversationStore",
+    "NutrientIndex",
+    "SemanticCache",
+    "SingleFlight",
+    "LLMTelemetry",
+    "LLMScheduler"
 ]
 
 # Configuration par défaut
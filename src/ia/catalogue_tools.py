@@ -0,0 +1,349 @@
+"""
+Outils de recherche locaux appelables par le chatbot.
+
+Le modèle peut interroger le catalogue OpenFoodFacts transformé et la
+table CIQUAL (texte, catégorie, plages de nutriments) au lieu de répondre
+de mémoire. Les recherches sont servies par des index construits une fois
+au chargement :
+
+    - index inversé des termes (nom, marque, catégories) avec recherche
+      par préfixe sur le vocabulaire trié
+    - valeurs nutritionnelles triées par colonne : une plage est résolue
+      par deux recherches dichotomiques
+
+Une requête coûte donc quelques fractions de milliseconde, négligeables
+devant l'appel au modèle.
+"""
+import bisect
+import json
+import time
+from typing import Any, Dict, List, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+from .semantic_cache import normalize_question
+
+# Nutriments exposés au modèle (pour 100 g) -> colonne de chaque table
+OFF_NUTRIENTS = {
+    "energy_kcal": "energy_kcal_100g",
+    "fat": "fat_100g",
+    "saturated_fat": "saturated_fat_100g",
+    "carbohydrates": "carbohydrates_100g",
+    "sugars": "sugars_100g",
+    "fiber": "fiber_100g",
+    "proteins": "proteins_100g",
+    "salt": "salt_100g",
+}
+
+CIQUAL_NUTRIENTS = {
+    "energy_kcal": "energie, règlement ue n° 1169/2011 (kcal/100 g)",
+    "fat": "lipides (g/100 g)",
+    "saturated_fat": "ag saturés (g/100 g)",
+    "carbohydrates": "glucides (g/100 g)",
+    "sugars": "sucres (g/100 g)",
+    "fiber": "fibres alimentaires (g/100 g)",
+    "proteins": "protéines, n x facteur de jones (g/100 g)",
+    "salt": "sel chlorure de sodium (g/100 g)",
+}
+
+# Mots vides ignorés dans les requêtes textuelles
+STOPWORDS = {
+    "a", "au", "aux", "avec", "d", "de", "des", "du", "en", "et", "l", "la",
+    "le", "les", "ou", "pour", "sans", "sur", "un", "une",
+}
+
+MAX_RESULTS = 10
+
+
+def terms(text: Any) -> List[str]:
+    """Termes indexés d'un texte (normalisés, sans mots vides, pluriel simple retiré)."""
+    if not isinstance(text, str):
+        return []
+    result = []
+    for word in normalize_question(text).split():
+        if word in STOPWORDS or len(word) < 2:
+            continue
+        if len(word) > 3 and word[-1] in "sx":
+            word = word[:-1]
+        result.append(word)
+    return result
+
+
+class TableIndex:
+    """
+    Index en mémoire d'une table de produits ou d'aliments.
+
+    Chaque filtre (texte, catégorie, plage de nutriment, valeur exacte)
+    produit un ensemble de lignes ; la recherche renvoie leur intersection.
+    """
+
+    def __init__(
+        self,
+        df: pd.DataFrame,
+        text_cols: List[str],
+        category_cols: List[str],
+        nutrients: Dict[str, str],
+        display_cols: List[str],
+        grade_col: Optional[str] = None
+    ):
+        """
+        Args:
+            df: Table source (une ligne par produit ou aliment)
+            text_cols: Colonnes interrogées par la recherche textuelle
+            category_cols: Colonnes interrogées par le filtre de catégorie
+            nutrients: Nom exposé -> colonne nutritionnelle
+            display_cols: Colonnes renvoyées en plus des nutriments
+            grade_col: Colonne du Nutri-Score (filtre par grade), si présente
+        """
+        self.df = df.reset_index(drop=True)
+        self.nutrients = {k: c for k, c in nutrients.items() if c in self.df.columns}
+        self.display_cols = [c for c in display_cols if c in self.df.columns]
+        self.grade_col = grade_col if grade_col in self.df.columns else None
+
+        self.text = self._inverted_index([c for c in text_cols + category_cols if c in self.df.columns])
+        self.categories = self._inverted_index([c for c in category_cols if c in self.df.columns])
+
+        self.values: Dict[str, np.ndarray] = {}
+        self.order: Dict[str, np.ndarray] = {}
+        self.sorted: Dict[str, np.ndarray] = {}
+        for key, col in self.nutrients.items():
+            values = pd.to_numeric(self.df[col], errors="coerce").to_numpy(dtype=np.float64)
+            valid = np.flatnonzero(~np.isnan(values))
+            order = valid[np.argsort(values[valid], kind="stable")]
+            self.values[key] = values
+            self.order[key] = order
+            self.sorted[key] = values[order]
+
+        self.columns = {c: self.df[c].to_numpy() for c in self.display_cols}
+        self.grades = (
+            self.df[self.grade_col].astype(str).str.lower().to_numpy()
+            if self.grade_col else None
+        )
+
+    def _inverted_index(self, cols: List[str]) -> Dict[str, Any]:
+        postings: Dict[str, set] = {}
+        for col in cols:
+            for i, text in enumerate(self.df[col]):
+                for term in terms(text):
+                    postings.setdefault(term, set()).add(i)
+        return {
+            "postings": {t: np.fromiter(sorted(ids), dtype=np.int64) for t, ids in postings.items()},
+            "vocabulary": sorted(postings),
+        }
+
+    @staticmethod
+    def _match(index: Dict[str, Any], term: str) -> np.ndarray:
+        """Lignes contenant un terme commençant par ``term``."""
+        vocabulary = index["vocabulary"]
+        start = bisect.bisect_left(vocabulary, term)
+        stop = bisect.bisect_left(vocabulary, term + "\uffff", lo=start)
+        if stop - start == 1:
+            return index["postings"][vocabulary[start]]
+        return np.unique(np.concatenate(
+            [index["postings"][t] for t in vocabulary[start:stop]] or [np.zeros(0, dtype=np.int64)]
+        ))
+
+    def nutrient_range(
+        self,
+        nutrient: str,
+        minimum: Optional[float] = None,
+        maximum: Optional[float] = None
+    ) -> np.ndarray:
+        """Lignes dont le nutriment est compris dans [minimum, maximum]."""
+        values = self.sorted[nutrient]
+        lo = 0 if minimum is None else np.searchsorted(values, minimum, side="left")
+        hi = len(values) if maximum is None else np.searchsorted(values, maximum, side="right")
+        return self.order[nutrient][lo:hi]
+
+    def search(
+        self,
+        query: Optional[str] = None,
+        category: Optional[str] = None,
+        minimum: Optional[Dict[str, float]] = None,
+        maximum: Optional[Dict[str, float]] = None,
+        grades: Optional[List[str]] = None,
+        sort_by: Optional[str] = None,
+        descending: bool = False,
+        limit: int = 5
+    ) -> Dict[str, Any]:
+        """
+        Recherche combinant tous les filtres fournis.
+
+        Returns:
+            ``{"count": nombre total de correspondances, "rows": positions}``
+            limité à ``limit`` lignes
+        """
+        for key in list(minimum or {}) + list(maximum or {}) + ([sort_by] if sort_by else []):
+            if key not in self.nutrients:
+                raise ValueError(f"Nutriment inconnu : {key} (attendu : {', '.join(self.nutrients)})")
+
+        selected = np.ones(len(self.df), dtype=bool)
+
+        def keep(rows: np.ndarray):
+            mask = np.zeros(len(self.df), dtype=bool)
+            mask[rows] = True
+            selected[:] &= mask
+
+        for term in terms(query):
+            keep(self._match(self.text, term))
+        for term in terms(category):
+            keep(self._match(self.categories, term))
+        for key in set(minimum or {}) | set(maximum or {}):
+            keep(self.nutrient_range(key, (minimum or {}).get(key), (maximum or {}).get(key)))
+        if grades and self.grades is not None:
+            selected &= np.isin(self.grades, [str(g).lower() for g in grades])
+
+        rows = np.flatnonzero(selected)
+        if sort_by:
+            values = self.values[sort_by][rows]
+            # Valeurs manquantes en fin de liste dans les deux sens
+            key = np.where(np.isnan(values), np.inf, -values if descending else values)
+            rows = rows[np.argsort(key, kind="stable")]
+
+        limit = max(1, min(int(limit), MAX_RESULTS))
+        return {"count": int(len(rows)), "rows": rows[:limit]}
+
+    def records(self, rows: np.ndarray) -> List[Dict[str, Any]]:
+        """Lignes au format compact renvoyé au modèle (nutriments arrondis, sans vides)."""
+        records = []
+        for i in rows:
+            record = {c: _scalar(self.columns[c][i]) for c in self.display_cols}
+            for key, values in self.values.items():
+                record[key] = None if np.isnan(values[i]) else round(float(values[i]), 1)
+            records.append({k: v for k, v in record.items() if v is not None})
+        return records
+
+
+def _scalar(value: Any) -> Any:
+    if value is None or value is pd.NA or (isinstance(value, (float, np.floating)) and np.isnan(value)):
+        return None
+    return value.item() if hasattr(value, "item") else value
+
+
+def _search_parameters(nutrients: List[str], with_grades: bool) -> Dict[str, Any]:
+    nutrient_bounds = {
+        "type": "object",
+        "properties": {n: {"type": "number"} for n in nutrients},
+        "additionalProperties": False,
+    }
+    properties = {
+        "query": {"type": "string", "description": "Mots du nom recherché (ex. « yaourt nature »)"},
+        "category": {"type": "string", "description": "Catégorie ou groupe d'aliments"},
+        "min": {**nutrient_bounds, "description": "Valeurs minimales pour 100 g"},
+        "max": {**nutrient_bounds, "description": "Valeurs maximales pour 100 g"},
+        "sort_by": {"type": "string", "enum": nutrients, "description": "Nutriment de tri"},
+        "descending": {"type": "boolean", "description": "Tri décroissant"},
+        "limit": {"type": "integer", "minimum": 1, "maximum": MAX_RESULTS},
+    }
+    if with_grades:
+        properties["nutriscore"] = {
+            "type": "array",
+            "items": {"type": "string", "enum": ["a", "b", "c", "d", "e"]},
+            "description": "Grades Nutri-Score acceptés",
+        }
+    return {"type": "object", "properties": properties}
+
+
+class CatalogueTools:
+    """
+    Outils exposés au modèle (format « tools » OpenAI, relayé par LiteLLM).
+
+    ``search_products`` interroge le catalogue OpenFoodFacts,
+    ``search_ciqual`` la table de référence CIQUAL.
+    """
+
+    def __init__(
+        self,
+        products: Optional[pd.DataFrame] = None,
+        ciqual: Optional[pd.DataFrame] = None
+    ):
+        """
+        Args:
+            products: Catalogue OpenFoodFacts transformé
+            ciqual: Table CIQUAL transformée
+
+        Une table absente (ou non chargée) n'expose pas d'outil.
+        """
+        self.indexes: Dict[str, TableIndex] = {}
+        if products is not None and "product_name" in products.columns:
+            self.indexes["search_products"] = TableIndex(
+                products,
+                text_cols=["product_name", "brands"],
+                category_cols=["categories"],
+                nutrients=OFF_NUTRIENTS,
+                display_cols=["product_name", "brands", "nutriscore_grade", "nova_group"],
+                grade_col="nutriscore_grade",
+            )
+        if ciqual is not None and "alim_nom_fr" in ciqual.columns:
+            self.indexes["search_ciqual"] = TableIndex(
+                ciqual,
+                text_cols=["alim_nom_fr"],
+                category_cols=["alim_grp_nom_fr", "alim_ssgrp_nom_fr"],
+                nutrients=CIQUAL_NUTRIENTS,
+                display_cols=["alim_nom_fr", "alim_ssgrp_nom_fr"],
+            )
+        self.counters = {"calls": 0, "errors": 0, "seconds": 0.0}
+
+    def specs(self) -> List[Dict[str, Any]]:
+        """Description des outils disponibles, à passer en ``tools=``."""
+        descriptions = {
+            "search_products": (
+                "Recherche des produits du catalogue OpenFoodFacts par nom, "
+                "catégorie, plages de nutriments (pour 100 g) et Nutri-Score."
+            ),
+            "search_ciqual": (
+                "Recherche des aliments génériques de la table de référence "
+                "CIQUAL par nom, groupe et plages de nutriments (pour 100 g)."
+            ),
+        }
+        return [
+            {
+                "type": "function",
+                "function": {
+                    "name": name,
+                    "description": descriptions[name],
+                    "parameters": _search_parameters(list(index.nutrients), index.grades is not None),
+                },
+            }
+            for name, index in self.indexes.items()
+        ]
+
+    def execute(self, name: str, arguments: Union[str, Dict[str, Any], None]) -> str:
+        """
+        Exécute un appel d'outil et retourne le résultat en JSON compact.
+
+        Les erreurs (outil inconnu, arguments invalides) sont renvoyées au
+        modèle sous la forme ``{"error": ...}`` plutôt que levées.
+        """
+        start = time.perf_counter()
+        self.counters["calls"] += 1
+        try:
+            if name not in self.indexes:
+                raise ValueError(f"Outil inconnu : {name}")
+            args = json.loads(arguments or "{}") if isinstance(arguments, str) else dict(arguments or {})
+            index = self.indexes[name]
+            found = index.search(
+                query=args.get("query"),
+                category=args.get("category"),
+                minimum=args.get("min"),
+                maximum=args.get("max"),
+                grades=args.get("nutriscore"),
+                sort_by=args.get("sort_by"),
+                descending=bool(args.get("descending", False)),
+                limit=args.get("limit", 5),
+            )
+            result = {"count": found["count"], "results": index.records(found["rows"])}
+        except Exception as e:
+            self.counters["errors"] += 1
+            result = {"error": str(e)}
+        finally:
+            self.counters["seconds"] += time.perf_counter() - start
+        return json.dumps(result, ensure_ascii=False, separators=(",", ":"))
+
+    def stats(self) -> Dict[str, Any]:
+        calls = self.counters["calls"]
+        return {
+            **self.counters,
+            "avg_ms": 1000 * self.counters["seconds"] / calls if calls else 0.0,
+        }
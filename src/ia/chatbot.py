@@ -1,30 +1,200 @@
 """
 Chatbot conversationnel pour répondre aux questions sur la nutrition.
 """
-from typing import Dict, List, Optional, Any
+import time
+from typing import Dict, Iterator, List, Optional, Any, Tuple
+from .catalogue_tools import CatalogueTools
+from .ciqual_index import CiqualIndex
+from .conversation_store import ConversationStore
 from .llm_manager import LLMManager
+from .prompt_budget import count_message_tokens, fit_history, truncate_to_tokens
 from .prompts import NutritionPrompts
+from .semantic_cache import SemanticCache
+
+DEFAULT_SESSION = "default"
+
+
+def stream_caption(stats: Dict[str, Any]) -> str:
+    """Mesures d'une réponse streamée, sur une ligne (« – » si aucun fragment reçu)."""
+    ttft = stats.get("ttft")
+    return (
+        f"{'Réponse en cache · ' if stats.get('cached') else ''}"
+        f"Premier token : {'–' if ttft is None else f'{ttft:.2f} s'} · "
+        f"Réponse complète : {stats.get('total_time', 0.0):.2f} s · "
+        f"Prompt : {stats.get('prompt_tokens', 0)} tokens · "
+        f"Modèle : {stats.get('model_used')}"
+    )
 
 
 class NutritionChatbot:
     """Chatbot intelligent pour répondre aux questions nutritionnelles."""
 
-    def __init__(self, llm_manager: Optional[LLMManager] = None):
+    # Nombre de messages d'historique envoyés au modèle
+    HISTORY_WINDOW = 10
+
+    # Budget (tokens) du prompt complet envoyé au modèle
+    PROMPT_TOKEN_BUDGET = 1200
+
+    # Budget (tokens) des références CIQUAL jointes à la question
+    REFERENCE_TOKENS = 250
+
+    # Tours d'appels d'outils avant la réponse finale
+    MAX_TOOL_ROUNDS = 3
+
+    # Budget (tokens) du résultat de chaque appel d'outil
+    TOOL_RESULT_TOKENS = 500
+
+    def __init__(
+        self,
+        llm_manager: Optional[LLMManager] = None,
+        store: Optional[ConversationStore] = None,
+        cache: Optional[SemanticCache] = None,
+        tools: Optional[CatalogueTools] = None,
+        reference: Optional[CiqualIndex] = None
+    ):
         """
         Initialise le chatbot.
 
         Args:
             llm_manager: Instance du gestionnaire LLM
+            store: Stockage des historiques par session (une instance
+                peut être partagée entre plusieurs utilisateurs)
+            cache: Cache sémantique des réponses (désactivé si absent)
+            tools: Outils de recherche dans le catalogue et CIQUAL
+                proposés au modèle (désactivés si absents)
+            reference: Index CIQUAL dont les aliments pertinents sont
+                joints à chaque question (désactivé si absent)
         """
         self.llm = llm_manager or LLMManager()
         self.prompts = NutritionPrompts()
-        self.conversation_history: List[Dict[str, str]] = []
+        self.store = store or ConversationStore()
+        self.cache = cache
+        self.tools = tools
+        self.reference = reference
+
+    @property
+    def conversation_history(self) -> List[Dict[str, str]]:
+        """Historique de la session par défaut."""
+        return self.store.get(DEFAULT_SESSION)
+
+    @conversation_history.setter
+    def conversation_history(self, messages: List[Dict[str, str]]):
+        self.store.replace(DEFAULT_SESSION, messages)
+
+    def _build_messages(
+        self,
+        user_message: str,
+        context: Optional[Dict[str, Any]] = None,
+        session_id: str = DEFAULT_SESSION
+    ) -> List[Dict[str, str]]:
+        """Construit les messages envoyés au modèle (système, historique, question)."""
+        # Prépare le contexte
+        context_str = ""
+        if context and "current_product" in context:
+            product = context["current_product"]
+            context_str = (
+                f"\n\nProduit en consultation : {product.get('product_name', 'Inconnu')}"
+                f"\nNutri-Score : {product.get('nutriscore_grade', '?')}"
+                f"\nNOVA : {product.get('nova_group', '?')}"
+            )
+
+        # Aliments de référence pertinents pour la question
+        if self.reference is not None:
+            block = self.reference.context_block(user_message, max_tokens=self.REFERENCE_TOKENS)
+            if block:
+                context_str += "\n\n" + block
+
+        # Construit les messages
+        system_prompt = self.prompts.chatbot_system_prompt()
+        if self._tools_enabled():
+            system_prompt += " " + self.prompts.chatbot_tools_instructions()
+        system = {"role": "system", "content": system_prompt}
+        user = {
+            "role": "user",
+            "content": truncate_to_tokens(
+                user_message, self.PROMPT_TOKEN_BUDGET // 2
+            ) + context_str
+        }
+
+        # Historique limité en nombre de messages puis en tokens
+        history = fit_history(
+            self.store.get(session_id, last=self.HISTORY_WINDOW),
+            self.PROMPT_TOKEN_BUDGET - count_message_tokens([system, user])
+        )
+
+        return [system] + history + [user]
+
+    def _tools_enabled(self) -> bool:
+        return self.tools is not None and bool(self.tools.indexes) and self.llm.supports_tools()
+
+    def _run_tools(
+        self,
+        messages: List[Dict[str, Any]],
+        session_id: str
+    ) -> Tuple[List[Dict[str, Any]], Optional[str], List[Dict[str, Any]]]:
+        """
+        Laisse le modèle interroger les outils locaux.
+
+        Returns:
+            Messages complétés des appels et de leurs résultats, réponse
+            directe du modèle s'il n'a pas (ou plus) besoin d'outil, et
+            trace des appels (nom, arguments, nombre de résultats, durée)
+        """
+        trace: List[Dict[str, Any]] = []
+        if not self._tools_enabled():
+            return messages, None, trace
+
+        specs = self.tools.specs()
+        for _ in range(self.MAX_TOOL_ROUNDS):
+            try:
+                reply = self.llm.complete_message(
+                    messages=messages,
+                    tools=specs,
+                    temperature=0.2,
+                    max_tokens=400,
+                    caller="chatbot",
+                    session_id=session_id
+                )
+            except Exception:
+                # Outils refusés par le fournisseur : réponse sans outils
+                return messages, None, trace
+
+            if not reply["tool_calls"]:
+                return messages, reply["content"] or None, trace
+
+            messages = messages + [reply]
+            for call in reply["tool_calls"]:
+                start = time.perf_counter()
+                result = self.tools.execute(call["function"]["name"], call["function"]["arguments"])
+                trace.append({
+                    "name": call["function"]["name"],
+                    "arguments": call["function"]["arguments"],
+                    "result": result,
+                    "ms": 1000 * (time.perf_counter() - start),
+                })
+                messages.append({
+                    "role": "tool",
+                    "tool_call_id": call["id"],
+                    "content": truncate_to_tokens(result, self.TOOL_RESULT_TOKENS),
+                })
+
+        return messages, None, trace
+
+    def _record_exchange(self, session_id: str, user_message: str, response: str):
+        """Ajoute un échange complet à l'historique de la session."""
+        self.store.append(
+            session_id,
+            {"role": "user", "content": user_message},
+            {"role": "assistant", "content": response}
+        )
 
     def chat(
         self,
         user_message: str,
         context: Optional[Dict[str, Any]] = None,
-        stream: bool = False
+        stream: bool = False,
+        session_id: str = DEFAULT_SESSION,
+        exact_cache: bool = False
     ) -> Dict[str, Any]:
         """
         Répond à un message utilisateur.
@@ -32,62 +202,69 @@ class NutritionChatbot:
         Args:
             user_message: Message de l'utilisateur
             context: Contexte additionnel (produit en cours de consultation, etc.)
-            stream: Si True, retourne un générateur pour streaming
+            stream: Si True, retourne un générateur de fragments de texte
+                (clé "stream") et un dictionnaire de mesures (clé "stats")
+                complété au fil du streaming
+            session_id: Identifiant de la session (historique isolé)
+            exact_cache: Question gabarit, réutilisée seulement à l'identique
+                (voir ``SemanticCache``)
 
         Returns:
             Réponse du chatbot
         """
-        # Prépare le contexte
-        context_str = ""
-        if context and "current_product" in context:
-            product = context["current_product"]
-            context_str = (
-                f"\n\nProduit en consultation : {product.get('product_name', 'Inconnu')}"
-                f"\nNutri-Score : {product.get('nutriscore_grade', '?')}"
-                f"\nNOVA : {product.get('nova_group', '?')}"
-            )
-
-        # Construit les messages
-        messages = [
-            {"role": "system", "content": self.prompts.chatbot_system_prompt()}
-        ]
+        if stream:
+            stats: Dict[str, Any] = {}
+            return {
+                "success": True,
+                "stream": self.chat_stream(
+                    user_message, context, stats=stats, session_id=session_id,
+                    exact_cache=exact_cache
+                ),
+                "stats": stats,
+                "model_used": self.llm.default_model
+            }
 
-        # Historique limité
-        messages.extend(self.conversation_history[-10:])
+        # Une réponse en cache ignore l'historique : seulement en début de conversation
+        cacheable = self._cacheable(session_id)
+        cached = self._cached_answer(user_message, context, exact_cache) if cacheable else None
+        if cached is not None:
+            self._record_exchange(session_id, user_message, cached["answer"])
+            return {
+                "success": True,
+                "response": cached["answer"],
+                "model_used": "cache",
+                "cached": True,
+                "similarity": cached["similarity"],
+                "prompt_tokens": 0,
+                "message_count": len(self.store.get(session_id))
+            }
 
-        messages.append({
-            "role": "user",
-            "content": user_message + context_str
-        })
+        messages = self._build_messages(user_message, context, session_id)
 
         try:
-            response = self.llm.complete(
-                messages=messages,
-                temperature=0.7,
-                max_tokens=400,
-                stream=stream
-            )
-
-            if stream:
-                return {
-                    "success": True,
-                    "stream": response,
-                    "model_used": self.llm.default_model
-                }
+            messages, response, tool_calls = self._run_tools(messages, session_id)
+            if response is None:
+                response = self.llm.complete(
+                    messages=messages,
+                    temperature=0.7,
+                    max_tokens=400,
+                    caller="chatbot",
+                    session_id=session_id
+                )
 
-            # Mise à jour historique
-            self.conversation_history.append(
-                {"role": "user", "content": user_message}
-            )
-            self.conversation_history.append(
-                {"role": "assistant", "content": response}
-            )
+            # Mise à jour historique et cache
+            self._record_exchange(session_id, user_message, response)
+            if cacheable:
+                self.cache.add(user_message, response, context, exact=exact_cache)
 
             return {
                 "success": True,
                 "response": response,
                 "model_used": self.llm.default_model,
-                "message_count": len(self.conversation_history)
+                "cached": False,
+                "tool_calls": tool_calls,
+                "prompt_tokens": count_message_tokens(messages),
+                "message_count": len(self.store.get(session_id))
             }
 
         except Exception as e:
@@ -96,43 +273,167 @@ class NutritionChatbot:
                 "error": str(e)
             }
 
-    def clear_history(self):
-        """Efface l'historique de conversation."""
-        self.conversation_history = []
+    def chat_stream(
+        self,
+        user_message: str,
+        context: Optional[Dict[str, Any]] = None,
+        stats: Optional[Dict[str, Any]] = None,
+        session_id: str = DEFAULT_SESSION,
+        exact_cache: bool = False
+    ) -> Iterator[str]:
+        """
+        Répond à un message utilisateur en streaming.
+
+        Les fragments sont émis dès leur réception ; la réponse complète
+        n'est ajoutée à l'historique qu'une fois le flux terminé.
+
+        Args:
+            user_message: Message de l'utilisateur
+            context: Contexte additionnel (produit en cours de consultation, etc.)
+            stats: Dictionnaire complété avec les mesures du streaming :
+                success, ttft (secondes avant le premier fragment),
+                total_time, response, model_used, prompt_tokens,
+                cached, tool_calls, message_count, error
+            session_id: Identifiant de la session (historique isolé)
+            exact_cache: Question gabarit, réutilisée seulement à l'identique
+
+        Yields:
+            Fragments de texte de la réponse
+        """
+        stats = stats if stats is not None else {}
+        stats.update({
+            "success": False,
+            "ttft": None,
+            "cached": False,
+            "tool_calls": [],
+            "model_used": self.llm.default_model
+        })
+        start = time.perf_counter()
+
+        cacheable = self._cacheable(session_id)
+        cached = self._cached_answer(user_message, context, exact_cache) if cacheable else None
+        if cached is not None:
+            stats["ttft"] = time.perf_counter() - start
+            yield cached["answer"]
+            self._record_exchange(session_id, user_message, cached["answer"])
+            stats.update({
+                "success": True,
+                "cached": True,
+                "model_used": "cache",
+                "prompt_tokens": 0,
+                "response": cached["answer"],
+                "total_time": time.perf_counter() - start,
+                "message_count": len(self.store.get(session_id))
+            })
+            return
+
+        messages = self._build_messages(user_message, context, session_id)
+        parts: List[str] = []
+
+        try:
+            # Les tours d'outils ne sont pas streamés ; seule la réponse finale l'est
+            messages, answer, stats["tool_calls"] = self._run_tools(messages, session_id)
+            stats["prompt_tokens"] = count_message_tokens(messages)
+            tokens = iter([answer]) if answer is not None else self.llm.stream(
+                messages=messages,
+                temperature=0.7,
+                max_tokens=400,
+                caller="chatbot",
+                session_id=session_id
+            )
+            for token in tokens:
+                if stats["ttft"] is None:
+                    stats["ttft"] = time.perf_counter() - start
+                parts.append(token)
+                yield token
+
+        except Exception as e:
+            stats["error"] = str(e)
+            stats["total_time"] = time.perf_counter() - start
+            return
+
+        response = "".join(parts)
+        self._record_exchange(session_id, user_message, response)
+        if cacheable:
+            self.cache.add(user_message, response, context, exact=exact_cache)
 
-    def get_history(self) -> List[Dict[str, str]]:
-        """Retourne l'historique de conversation."""
-        return self.conversation_history.copy()
+        stats.update({
+            "success": True,
+            "response": response,
+            "total_time": time.perf_counter() - start,
+            "message_count": len(self.store.get(session_id))
+        })
+
+    def _cacheable(self, session_id: str) -> bool:
+        """Cache actif et session sans historique (la réponse ne dépend que de la question)."""
+        return self.cache is not None and not self.store.get(session_id)
+
+    def _cached_answer(
+        self,
+        question: str,
+        context: Optional[Dict[str, Any]] = None,
+        exact: bool = False
+    ) -> Optional[Dict[str, Any]]:
+        """Réponse en cache pour une question similaire, si le cache est actif."""
+        if self.cache is None:
+            return None
+        return self.cache.lookup(question, context, exact)
+
+    def clear_history(self, session_id: str = DEFAULT_SESSION):
+        """Efface l'historique de conversation d'une session."""
+        self.store.clear(session_id)
+
+    def get_history(self, session_id: str = DEFAULT_SESSION) -> List[Dict[str, str]]:
+        """Retourne l'historique de conversation d'une session."""
+        return self.store.get(session_id)
 
-    def ask_about_ingredient(self, ingredient: str) -> Dict[str, Any]:
+    def ask_about_ingredient(
+        self,
+        ingredient: str,
+        session_id: str = DEFAULT_SESSION
+    ) -> Dict[str, Any]:
         question = (
             f"Peux-tu m'expliquer ce qu'est {ingredient} "
             f"et s'il faut l'éviter d'un point de vue nutritionnel ?"
         )
-        return self.chat(question)
+        # Question gabarit : seul l'ingrédient change, la similarité ne le distingue pas
+        return self.chat(question, session_id=session_id, exact_cache=True)
 
-    def ask_about_allergen(self, allergen: str) -> Dict[str, Any]:
+    def ask_about_allergen(
+        self,
+        allergen: str,
+        session_id: str = DEFAULT_SESSION
+    ) -> Dict[str, Any]:
         question = (
             f"Je suis allergique au {allergen}. "
             f"Quels produits dois-je éviter et quelles alternatives existent ?"
         )
-        return self.chat(question)
+        return self.chat(question, session_id=session_id, exact_cache=True)
 
     def get_quick_answer(self, question: str) -> str:
+        cached = self._cached_answer(question)
+        if cached is not None:
+            return cached["answer"]
+
         messages = [
             {"role": "system", "content": self.prompts.chatbot_system_prompt()},
             {"role": "user", "content": question}
         ]
 
         try:
-            return self.llm.complete(
+            response = self.llm.complete(
                 messages=messages,
                 temperature=0.6,
-                max_tokens=200
+                max_tokens=200,
+                caller="chatbot"
             )
         except Exception as e:
             return f"Erreur : {str(e)}"
 
+        if self.cache is not None:
+            self.cache.add(question, response)
+        return response
+
     def suggest_questions(
         self,
         context: Optional[Dict[str, Any]] = None
@@ -154,7 +455,7 @@ class NutritionChatbot:
                     f"Pourquoi ce produit a un Nutri-Score {product['nutriscore_grade']} ?"
                 )
 
-            if product.get("additives_n", 0) > 0:
+            if (product.get("additives_n") or 0) > 0:
                 contextual.append(
                     "Les additifs de ce produit sont-ils préoccupants ?"
                 )
@@ -177,11 +478,12 @@ class NutritionChatbot:
         self,
         score_type: str,
         score_value: Any,
-        product_name: str = ""
+        product_name: str = "",
+        session_id: str = DEFAULT_SESSION
     ) -> Dict[str, Any]:
         product_str = f" pour {product_name}" if product_name else ""
         question = (
             f"Peux-tu m'expliquer le score {score_type.upper()} "
             f"{score_value}{product_str} ?"
         )
-        return self.chat(question)
+        return self.chat(question, session_id=session_id, exact_cache=True)
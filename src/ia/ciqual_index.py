@@ -0,0 +1,249 @@
+"""
+Index de recherche sur la table CIQUAL pour ancrer les réponses du chatbot.
+
+Chaque aliment est décrit par son nom et ses groupe et sous-groupe,
+projetés sur les n-grammes hachés du cache sémantique et pondérés par
+IDF. Les vecteurs sont rangés colonne par colonne (format CSC) : une
+question ne touche que les caractéristiques qu'elle contient, et le
+score de tous les aliments s'obtient par un seul ``np.bincount``.
+
+Les intentions nutritionnelles de la question (« riche en protéines »,
+« peu de sucre ») réordonnent les aliments pertinents selon leur rang
+dans la table pour ce nutriment.
+"""
+import re
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .prompt_budget import count_tokens, fit_lines, format_number
+from .semantic_cache import HashedNgramVectorizer, normalize_question
+
+NAME_COL = "alim_nom_fr"
+GROUP_COLS = ["alim_ssgrp_nom_fr", "alim_grp_nom_fr"]
+
+# Nutriments du profil : (libellé court, unité, colonne CIQUAL, mots-clés normalisés)
+PROFILE = [
+    ("énergie", "kcal", "energie, règlement ue n° 1169/2011 (kcal/100 g)", ("calori", "energ", "kcal")),
+    ("protéines", "g", "protéines, n x facteur de jones (g/100 g)", ("protein",)),
+    ("glucides", "g", "glucides (g/100 g)", ("glucid",)),
+    ("sucres", "g", "sucres (g/100 g)", ("sucre",)),
+    ("lipides", "g", "lipides (g/100 g)", ("lipid", "gras", "matiere grasse")),
+    ("AG saturés", "g", "ag saturés (g/100 g)", ("sature",)),
+    ("fibres", "g", "fibres alimentaires (g/100 g)", ("fibre",)),
+    ("sel", "g", "sel chlorure de sodium (g/100 g)", ("sel", "sale", "sodium")),
+    ("calcium", "mg", "calcium (mg/100 g)", ("calcium",)),
+    ("fer", "mg", "fer (mg/100 g)", ("fer",)),
+]
+
+# Expressions placées juste avant un nutriment : +1 teneur élevée, -1 faible
+_HIGH = r"riches? en|plus de|beaucoup de|source de|forte teneur en|le plus de|hyper|high"
+_LOW = r"pauvres? en|moins de|peu de|sans|faible teneur en|le moins de|allege en|light|low"
+
+# Mots des questions sans rapport avec l'aliment cherché
+QUESTION_WORDS = {
+    "a", "au", "aux", "avec", "ce", "combien", "contient", "contiennent", "d",
+    "dans", "de", "des", "du", "elle", "en", "est", "et", "g", "il", "kg", "l",
+    "la", "le", "les", "mg", "moins", "ont", "ou", "par", "plus", "pour", "qu",
+    "que", "quel", "quelle", "quelles", "quels", "qui", "sont", "t", "teneur",
+    "un", "une", "y", "aliment", "aliments", "produit", "produits",
+    # Expressions de teneur (traitées par nutrient_intents)
+    "allege", "beaucoup", "faible", "forte", "grasse", "matiere", "pauvre",
+    "pauvres", "peu", "riche", "riches", "sans", "source", "tres",
+}
+
+_KEYWORDS = tuple(k for *_, keywords in PROFILE for k in keywords)
+
+
+def nutrient_intents(question: str) -> Dict[str, int]:
+    """Nutriments demandés en teneur élevée (+1) ou faible (-1)."""
+    text = normalize_question(question)
+    intents: Dict[str, int] = {}
+    for label, _, _, keywords in PROFILE:
+        for keyword in keywords:
+            pattern = rf"\b({_HIGH}|{_LOW})\s+(?:\w+\s+){{0,3}}?{keyword}"
+            match = re.search(pattern, text)
+            if match:
+                intents[label] = -1 if re.fullmatch(_LOW, match.group(1)) else 1
+                break
+    return intents
+
+
+def food_terms(question: str) -> str:
+    """Partie de la question qui décrit l'aliment (sans nombres, nutriments ni mots outils)."""
+    return " ".join(
+        word for word in normalize_question(question).split()
+        if word not in QUESTION_WORDS
+        and not word.isdigit()
+        and not word.startswith(_KEYWORDS)
+    )
+
+
+class CiqualIndex:
+    """
+    Recherche des aliments CIQUAL les plus pertinents pour une question.
+
+    Construit une fois au chargement (~1 s pour la table complète), puis
+    interrogé en quelques millisecondes.
+    """
+
+    def __init__(
+        self,
+        df: pd.DataFrame,
+        vectorizer: Optional[HashedNgramVectorizer] = None,
+        group_weight: float = 0.5,
+        nutrient_weight: float = 0.3,
+        min_similarity: float = 0.15
+    ):
+        """
+        Args:
+            df: Table CIQUAL transformée
+            vectorizer: Vectoriseur des textes (n-grammes hachés)
+            group_weight: Poids du groupe et du sous-groupe face au nom
+            nutrient_weight: Poids du rang nutritionnel dans le score
+            min_similarity: Similarité textuelle minimale d'un résultat
+        """
+        self.df = df[df[NAME_COL].notna()].reset_index(drop=True)
+        self.vectorizer = vectorizer or HashedNgramVectorizer()
+        self.nutrient_weight = nutrient_weight
+        self.min_similarity = min_similarity
+        self.profile = [p for p in PROFILE if p[2] in self.df.columns]
+
+        self._build_text_index(group_weight)
+        self._build_profile()
+        self.counters = {"queries": 0, "seconds": 0.0}
+
+    # --------------------------------------------------
+    # Construction
+    # --------------------------------------------------
+    def _document_counts(self, row: Tuple, group_weight: float) -> Dict[int, float]:
+        counts = self.vectorizer.hash_counts(row[0])
+        for group in row[1:]:
+            if isinstance(group, str):
+                for index, count in self.vectorizer.hash_counts(group).items():
+                    counts[index] = counts.get(index, 0.0) + group_weight * count
+        return counts
+
+    def _build_text_index(self, group_weight: float):
+        n_features = self.vectorizer.n_features
+        cols = [NAME_COL] + [c for c in GROUP_COLS if c in self.df.columns]
+
+        rows, features, values = [], [], []
+        for i, row in enumerate(self.df[cols].itertuples(index=False, name=None)):
+            counts = self._document_counts(row, group_weight)
+            rows.extend([i] * len(counts))
+            features.extend(counts)
+            values.extend(counts.values())
+
+        rows = np.asarray(rows, dtype=np.int32)
+        features = np.asarray(features, dtype=np.int64)
+        values = np.asarray(values, dtype=np.float32)
+
+        # IDF : les n-grammes présents partout (« de », « cuit ») pèsent peu
+        document_frequency = np.bincount(features, minlength=n_features)
+        self.idf = (np.log((1 + len(self.df)) / (1 + document_frequency)) + 1).astype(np.float32)
+        values *= self.idf[features]
+        norms = np.sqrt(np.bincount(rows, weights=values.astype(np.float64) ** 2, minlength=len(self.df)))
+        values /= np.where(norms == 0, 1.0, norms)[rows].astype(np.float32)
+
+        order = np.argsort(features, kind="stable")
+        self.rows = rows[order]
+        self.weights = values[order]
+        self.indptr = np.concatenate([[0], np.cumsum(document_frequency)])
+
+    def _build_profile(self):
+        self.values = np.column_stack([
+            pd.to_numeric(self.df[col], errors="coerce").to_numpy(dtype=np.float64)
+            for _, _, col, _ in self.profile
+        ]) if self.profile else np.zeros((len(self.df), 0))
+        # Rang centile par nutriment (0.5 si inconnu)
+        ranks = pd.DataFrame(self.values).rank(pct=True).to_numpy()
+        self.ranks = np.where(np.isnan(ranks), 0.5, ranks).astype(np.float32)
+
+    # --------------------------------------------------
+    # Recherche
+    # --------------------------------------------------
+    def similarities(self, question: str) -> np.ndarray:
+        """Similarité cosinus (pondérée IDF) de la question avec chaque aliment."""
+        counts = self.vectorizer.hash_counts(question)
+        if not counts:
+            return np.zeros(len(self.df), dtype=np.float64)
+        features = np.fromiter(counts, dtype=np.int64, count=len(counts))
+        query = np.fromiter(counts.values(), dtype=np.float64, count=len(counts)) * self.idf[features]
+        query /= np.linalg.norm(query) or 1.0
+
+        starts, stops = self.indptr[features], self.indptr[features + 1]
+        lengths = stops - starts
+        if not lengths.sum():
+            return np.zeros(len(self.df), dtype=np.float64)
+        positions = np.repeat(stops - lengths.cumsum(), lengths) + np.arange(lengths.sum())
+        return np.bincount(
+            self.rows[positions],
+            weights=self.weights[positions] * np.repeat(query, lengths),
+            minlength=len(self.df)
+        )
+
+    def search(self, question: str, k: int = 5) -> pd.DataFrame:
+        """
+        Aliments les plus pertinents pour la question.
+
+        Returns:
+            ``k`` lignes au plus, avec les colonnes ``similarity`` et ``score``
+        """
+        start = time.perf_counter()
+        similarity = self.similarities(food_terms(question))
+        candidates = np.flatnonzero(similarity >= self.min_similarity)
+
+        score = similarity[candidates]
+        labels = [p[0] for p in self.profile]
+        for label, direction in nutrient_intents(question).items():
+            rank = self.ranks[candidates, labels.index(label)]
+            score = score + self.nutrient_weight * (rank if direction > 0 else 1 - rank)
+
+        if len(candidates) > k:
+            top = np.argpartition(-score, k)[:k]
+        else:
+            top = np.arange(len(candidates))
+        top = top[np.argsort(-score[top], kind="stable")]
+
+        result = self.df.iloc[candidates[top]].assign(
+            similarity=similarity[candidates[top]], score=score[top]
+        )
+        self.counters["queries"] += 1
+        self.counters["seconds"] += time.perf_counter() - start
+        return result
+
+    def context_block(self, question: str, k: int = 5, max_tokens: int = 250) -> str:
+        """
+        Bloc de contexte compact (une ligne par aliment, valeurs pour 100 g).
+
+        Returns:
+            Texte à joindre au prompt, vide si aucun aliment n'est pertinent
+        """
+        rows = self.search(question, k)
+        if rows.empty:
+            return ""
+
+        lines = []
+        for position in rows.index:
+            name = rows.at[position, NAME_COL]
+            values = self.values[position]
+            nutrients = ", ".join(
+                f"{label} {format_number(value)} {unit}"
+                for (label, unit, _, _), value in zip(self.profile, values)
+                if not np.isnan(value)
+            )
+            lines.append(f"- {name} : {nutrients or 'valeurs non renseignées'}")
+
+        head = "Références CIQUAL (pour 100 g) :"
+        return "\n".join([head] + fit_lines(lines, max_tokens - count_tokens(head) - 1))
+
+    def stats(self) -> Dict[str, Any]:
+        queries = self.counters["queries"]
+        return {
+            "foods": len(self.df),
+            "queries": queries,
+            "avg_ms": 1000 * self.counters["seconds"] / queries if queries else 0.0,
+        }
@@ -0,0 +1,131 @@
+"""
+Stockage des historiques de conversation par session utilisateur.
+"""
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Callable, Deque, Dict, List, Optional
+
+
+class ConversationStore:
+    """
+    Historiques de conversation indexés par session, bornés en mémoire.
+
+    Chaque session conserve au plus ``max_messages`` messages (tampon
+    circulaire). Les sessions inactives depuis plus de ``session_ttl``
+    secondes sont évincées, et le nombre total de sessions est plafonné
+    à ``max_sessions`` (la moins récemment utilisée part en premier).
+    Tous les accès sont protégés par un verrou : une même instance peut
+    être partagée entre les threads Streamlit.
+    """
+
+    def __init__(
+        self,
+        max_messages: int = 20,
+        session_ttl: float = 3600.0,
+        max_sessions: int = 1000,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        """
+        Initialise le stockage.
+
+        Args:
+            max_messages: Nombre maximal de messages conservés par session
+            session_ttl: Durée d'inactivité (secondes) avant éviction
+            max_sessions: Nombre maximal de sessions conservées
+            clock: Horloge monotone (injectable pour les tests)
+        """
+        self.max_messages = max_messages
+        self.session_ttl = session_ttl
+        self.max_sessions = max_sessions
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._sessions: "OrderedDict[str, Deque[Dict[str, str]]]" = OrderedDict()
+        self._last_access: Dict[str, float] = {}
+
+    # --------------------------------------------------
+    # Accès
+    # --------------------------------------------------
+    def get(self, session_id: str, last: Optional[int] = None) -> List[Dict[str, str]]:
+        """Retourne une copie de l'historique d'une session (les ``last`` derniers messages)."""
+        with self._lock:
+            self._evict_idle_locked()
+            history = self._sessions.get(session_id)
+            if history is None:
+                return []
+            self._touch_locked(session_id)
+            messages = list(history)
+
+        return messages[-last:] if last else messages
+
+    def append(self, session_id: str, *messages: Dict[str, str]):
+        """Ajoute un ou plusieurs messages à l'historique d'une session."""
+        with self._lock:
+            self._evict_idle_locked()
+            history = self._sessions.get(session_id)
+            if history is None:
+                history = deque(maxlen=self.max_messages)
+                self._sessions[session_id] = history
+            history.extend(messages)
+            self._touch_locked(session_id)
+
+            while len(self._sessions) > self.max_sessions:
+                oldest, _ = self._sessions.popitem(last=False)
+                self._last_access.pop(oldest, None)
+
+    def replace(self, session_id: str, messages: List[Dict[str, str]]):
+        """Remplace l'historique d'une session."""
+        with self._lock:
+            self._sessions.pop(session_id, None)
+            self._last_access.pop(session_id, None)
+        self.append(session_id, *messages)
+
+    def clear(self, session_id: str):
+        """Supprime l'historique d'une session."""
+        with self._lock:
+            self._sessions.pop(session_id, None)
+            self._last_access.pop(session_id, None)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._sessions)
+
+    def __contains__(self, session_id: str) -> bool:
+        with self._lock:
+            return session_id in self._sessions
+
+    # --------------------------------------------------
+    # Éviction
+    # --------------------------------------------------
+    def evict_idle(self) -> int:
+        """Évince les sessions inactives et retourne leur nombre."""
+        with self._lock:
+            return self._evict_idle_locked()
+
+    def _evict_idle_locked(self) -> int:
+        # Les sessions sont ordonnées du plus ancien au plus récent accès
+        deadline = self._clock() - self.session_ttl
+        evicted = 0
+        while self._sessions:
+            session_id = next(iter(self._sessions))
+            if self._last_access[session_id] > deadline:
+                break
+            del self._sessions[session_id]
+            del self._last_access[session_id]
+            evicted += 1
+        return evicted
+
+    def _touch_locked(self, session_id: str):
+        self._last_access[session_id] = self._clock()
+        self._sessions.move_to_end(session_id)
+
+    # --------------------------------------------------
+    # Utils
+    # --------------------------------------------------
+    def stats(self) -> Dict[str, int]:
+        """Nombre de sessions et de messages actuellement conservés."""
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "messages": sum(len(h) for h in self._sessions.values())
+            }
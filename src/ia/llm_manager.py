@@ -1,13 +1,28 @@
 """
 Gestionnaire centralisé pour les appels LiteLLM avec fallback intelligent.
 """
+import asyncio
 import os
-from typing import Dict, List, Optional, Any
+import time
+from contextlib import asynccontextmanager, contextmanager, nullcontext
+from typing import Dict, Iterator, List, Optional, Any
 import litellm
 from dotenv import load_dotenv
+from .ollama_runtime import DEFAULT_KEEP_ALIVE, OllamaRuntime, shared_runtime
+from .prompt_budget import count_message_tokens, count_tokens
+from .scheduler import SCHEDULER, LLMScheduler, priority_for
+from .singleflight import SingleFlight, request_key
+from .telemetry import TELEMETRY, LLMTelemetry, estimate_cost
 
 load_dotenv()
 
+# Serveur Ollama (surchargeable, ex. serveur factice des benchmarks)
+DEFAULT_OLLAMA_BASE = "http://localhost:11434"
+
+# Partagé par toutes les instances : chatbot, analyseur et recommandeur
+# ont chacun leur LLMManager mais interrogent les mêmes fournisseurs
+SHARED_FLIGHT = SingleFlight()
+
 
 class LLMManager:
     """Gestionnaire pour les appels aux modèles de langage via LiteLLM."""
@@ -27,8 +42,41 @@ class LLMManager:
         },
     }
 
-    def __init__(self):
+    # Ordre d'essai par défaut de complete_with_fallback
+    FALLBACK_MODELS = [
+        "ollama/mistral",
+        "gemini/gemini-2.5-flash-lite",
+        "openai/gpt-3.5-turbo",
+    ]
+
+    def __init__(
+        self,
+        flight: Optional[SingleFlight] = None,
+        telemetry: Optional[LLMTelemetry] = None,
+        warm_up: bool = True,
+        scheduler: Optional[LLMScheduler] = None
+    ):
+        """
+        Args:
+            flight: Regroupement des appels identiques en cours (par défaut
+                partagé entre toutes les instances du processus)
+            telemetry: Collecteur des mesures d'appels (par défaut partagé)
+            warm_up: Précharger en arrière-plan le modèle Ollama retenu
+            scheduler: File d'attente à priorités devant les fournisseurs
+                (par défaut partagée)
+        """
+        self.ollama_base = os.getenv("OLLAMA_API_BASE", DEFAULT_OLLAMA_BASE).rstrip("/")
+        self.ollama_keep_alive = os.getenv("OLLAMA_KEEP_ALIVE", DEFAULT_KEEP_ALIVE)
+        self.ollama_max_concurrency = int(os.getenv("OLLAMA_MAX_CONCURRENCY", "2"))
+        self.fallback_models = list(self.FALLBACK_MODELS)
         self.default_model = self._detect_best_model()
+        self.flight = flight or SHARED_FLIGHT
+        self.telemetry = telemetry or TELEMETRY
+        self.scheduler = scheduler or SCHEDULER
+
+        runtime = self._runtime(self.default_model)
+        if warm_up and runtime is not None:
+            runtime.warm_up_async()
 
     # --------------------------------------------------
     # Détection intelligente du modèle
@@ -51,13 +99,50 @@ class LLMManager:
             "➡️ Installe Ollama OU définis GEMINI_API_KEY / OPENAI_API_KEY."
         )
 
-    def _ollama_available(self) -> bool:
+    def _ollama_available(self, model: str = "ollama/mistral") -> bool:
+        """Serveur joignable et modèle effectivement téléchargé."""
+        return self._runtime(model).is_pulled()
+
+    def _runtime(self, model: str) -> Optional[OllamaRuntime]:
+        """Runtime partagé d'un modèle Ollama (None pour les autres fournisseurs)."""
+        if not model.startswith("ollama/"):
+            return None
+        return shared_runtime(
+            self.ollama_base,
+            model.split("/", 1)[1],
+            keep_alive=self.ollama_keep_alive,
+            max_concurrency=self.ollama_max_concurrency
+        )
+
+    def _provider(self, model: str) -> str:
+        if model in self.MODELS:
+            return self.MODELS[model]["provider"]
+        return model.split("/", 1)[0] if "/" in model else "openai"
+
+    @contextmanager
+    def _reserve(self, model: str, caller: str, priority: Optional[str], session_id: Optional[str]):
+        """Place dans la file du fournisseur, puis dans le runtime Ollama local."""
+        runtime = self._runtime(model)
+        with self.scheduler.slot(self._provider(model), priority_for(caller, priority), session_id):
+            with runtime.slot() if runtime is not None else nullcontext():
+                yield
+
+    @asynccontextmanager
+    async def _areserve(self, model: str, caller: str, priority: Optional[str], session_id: Optional[str]):
+        """Version asynchrone de ``_reserve`` (attentes dans la boucle d'événements)."""
+        provider = self._provider(model)
+        runtime = self._runtime(model)
+        await self.scheduler.acquire_async(provider, priority_for(caller, priority), session_id)
         try:
-            import requests
-            r = requests.get("http://localhost:11434/api/tags", timeout=1)
-            return r.status_code == 200
-        except Exception:
-            return False
+            if runtime is not None:
+                await runtime.acquire_async()
+            try:
+                yield
+            finally:
+                if runtime is not None:
+                    runtime.release()
+        finally:
+            self.scheduler.release(provider)
 
     # --------------------------------------------------
     # Appel principal
@@ -69,30 +154,281 @@ class LLMManager:
         temperature: float = 0.7,
         max_tokens: int = 1000,
         stream: bool = False,
+        caller: str = "default",
+        priority: Optional[str] = None,
+        session_id: Optional[str] = None,
         **kwargs
     ) -> str:
+        """
+        Appelle le modèle et retourne le texte de la réponse.
+
+        Les appels non streamés strictement identiques (modèle, messages,
+        paramètres, classe de priorité) lancés en même temps partagent une
+        seule requête au fournisseur : un appel de l'interface n'attend
+        jamais derrière une pré-génération identique. ``caller`` identifie le composant appelant dans la
+        télémétrie ; ``priority`` (par défaut déduite de ``caller``) et
+        ``session_id`` placent l'appel dans la file du fournisseur.
+        """
         model = model or self.default_model
 
-        try:
-            response = litellm.completion(
-                model=model,
-                messages=messages,
-                temperature=temperature,
-                max_tokens=max_tokens,
-                stream=stream,
-                **kwargs
+        if stream:
+            return self._completion(
+                model, messages, temperature, max_tokens, stream=True, caller=caller, **kwargs
             )
 
+        key = request_key(
+            model, messages, temperature=temperature, max_tokens=max_tokens,
+            priority=priority_for(caller, priority), **kwargs
+        )
+        return self.flight.do(
+            key, self._completion, model, messages, temperature, max_tokens,
+            caller=caller, priority=priority, session_id=session_id, **kwargs
+        )
+
+    def complete_message(
+        self,
+        messages: List[Dict[str, Any]],
+        tools: Optional[List[Dict[str, Any]]] = None,
+        model: Optional[str] = None,
+        temperature: float = 0.7,
+        max_tokens: int = 1000,
+        caller: str = "default",
+        priority: Optional[str] = None,
+        session_id: Optional[str] = None,
+        **kwargs
+    ) -> Dict[str, Any]:
+        """
+        Appelle le modèle en lui proposant des outils.
+
+        Returns:
+            Message assistant au format chat : ``content`` et ``tool_calls``
+            (liste vide si le modèle répond directement), réutilisable tel
+            quel dans l'historique envoyé au tour suivant
+        """
+        model = model or self.default_model
+        if tools:
+            kwargs["tools"] = tools
+        key = request_key(
+            model, messages, temperature=temperature, max_tokens=max_tokens, as_message=True,
+            priority=priority_for(caller, priority), **kwargs
+        )
+        return self.flight.do(
+            key, self._completion, model, messages, temperature, max_tokens,
+            caller=caller, priority=priority, session_id=session_id, as_message=True, **kwargs
+        )
+
+    def supports_tools(self, model: Optional[str] = None) -> bool:
+        """Vrai si LiteLLM sait transmettre des outils à ce modèle."""
+        try:
+            return bool(litellm.supports_function_calling(model or self.default_model))
+        except Exception:
+            return False
+
+    async def acomplete(
+        self,
+        messages: List[Dict[str, str]],
+        model: Optional[str] = None,
+        temperature: float = 0.7,
+        max_tokens: int = 1000,
+        caller: str = "default",
+        priority: Optional[str] = None,
+        session_id: Optional[str] = None,
+        **kwargs
+    ) -> str:
+        """Version asynchrone de ``complete`` (appels identiques regroupés)."""
+        model = model or self.default_model
+        key = request_key(
+            model, messages, temperature=temperature, max_tokens=max_tokens,
+            priority=priority_for(caller, priority), **kwargs
+        )
+        return await self.flight.ado(
+            key, self._acompletion, model, messages, temperature, max_tokens,
+            caller=caller, priority=priority, session_id=session_id, **kwargs
+        )
+
+    def _completion(
+        self, model, messages, temperature, max_tokens, stream=False, caller="default",
+        priority=None, session_id=None, as_message=False, **kwargs
+    ):
+        start = time.perf_counter()
+        # En streaming, la place est réservée par stream() pour toute la durée du flux
+        runtime = None if stream else self._runtime(model)
+        cold = None if runtime is None else not runtime.is_warm()
+        try:
+            with nullcontext() if stream else self._reserve(model, caller, priority, session_id):
+                response = litellm.completion(
+                    model=model,
+                    messages=messages,
+                    temperature=temperature,
+                    max_tokens=max_tokens,
+                    stream=stream,
+                    **kwargs
+                )
+
             if stream:
                 return response
 
-            return response.choices[0].message.content
+            message = response.choices[0].message
+            content = message.content
 
         except Exception as e:
+            self._record(model, caller, start, messages, success=False, cold=cold)
             raise Exception(
                 f"Erreur lors de l'appel au modèle {model} : {str(e)}"
             )
 
+        if runtime is not None:
+            runtime.mark_used()
+        self._record(
+            model, caller, start, messages, content,
+            usage=getattr(response, "usage", None), cold=cold
+        )
+        if as_message:
+            return {
+                "role": "assistant",
+                "content": content or "",
+                "tool_calls": [
+                    {
+                        "id": call.id,
+                        "type": "function",
+                        "function": {"name": call.function.name, "arguments": call.function.arguments},
+                    }
+                    for call in (getattr(message, "tool_calls", None) or [])
+                ],
+            }
+        return content
+
+    async def _acompletion(
+        self, model, messages, temperature, max_tokens, caller="default",
+        priority=None, session_id=None, **kwargs
+    ) -> str:
+        start = time.perf_counter()
+        runtime = self._runtime(model)
+        cold = None if runtime is None else not runtime.is_warm()
+        try:
+            async with self._areserve(model, caller, priority, session_id):
+                response = await litellm.acompletion(
+                    model=model,
+                    messages=messages,
+                    temperature=temperature,
+                    max_tokens=max_tokens,
+                    **kwargs
+                )
+            content = response.choices[0].message.content
+
+        except Exception as e:
+            self._record(model, caller, start, messages, success=False, cold=cold)
+            raise Exception(
+                f"Erreur lors de l'appel au modèle {model} : {str(e)}"
+            )
+
+        if runtime is not None:
+            runtime.mark_used()
+        self._record(
+            model, caller, start, messages, content,
+            usage=getattr(response, "usage", None), cold=cold
+        )
+        return content
+
+    def _record(
+        self,
+        model: str,
+        caller: str,
+        start: float,
+        messages: List[Dict[str, str]],
+        content: Optional[str] = None,
+        success: bool = True,
+        ttft: Optional[float] = None,
+        usage: Any = None,
+        cold: Optional[bool] = None
+    ):
+        """Enregistre un appel terminé (tokens du fournisseur, sinon comptés localement)."""
+        prompt_tokens = getattr(usage, "prompt_tokens", None)
+        completion_tokens = getattr(usage, "completion_tokens", None)
+        if not isinstance(prompt_tokens, int):
+            prompt_tokens = count_message_tokens(messages)
+        if not isinstance(completion_tokens, int):
+            completion_tokens = count_tokens(content or "")
+
+        self.telemetry.record(
+            model,
+            caller,
+            latency=time.perf_counter() - start,
+            success=success,
+            ttft=ttft,
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            cost_usd=estimate_cost(model, prompt_tokens, completion_tokens) if success else 0.0,
+            cold=cold
+        )
+
+    # --------------------------------------------------
+    # Streaming
+    # --------------------------------------------------
+    def stream(
+        self,
+        messages: List[Dict[str, str]],
+        model: Optional[str] = None,
+        temperature: float = 0.7,
+        max_tokens: int = 1000,
+        caller: str = "default",
+        priority: Optional[str] = None,
+        session_id: Optional[str] = None,
+        **kwargs
+    ) -> Iterator[str]:
+        """
+        Génère la réponse du modèle fragment par fragment.
+
+        Seuls les fragments de texte non vides sont émis, dans l'ordre
+        de réception. Le délai avant le premier fragment est enregistré
+        dans la télémétrie.
+        """
+        model = model or self.default_model
+        start = time.perf_counter()
+        runtime = self._runtime(model)
+        cold = None if runtime is None else not runtime.is_warm()
+
+        with self._reserve(model, caller, priority, session_id):
+            response = self.complete(
+                messages=messages,
+                model=model,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                stream=True,
+                caller=caller,
+                **kwargs
+            )
+
+            ttft = None
+            parts: List[str] = []
+            success = False
+            try:
+                for chunk in response:
+                    delta = chunk.choices[0].delta
+                    token = getattr(delta, "content", None)
+                    if token:
+                        if ttft is None:
+                            ttft = time.perf_counter() - start
+                        parts.append(token)
+                        yield token
+                success = True
+            except GeneratorExit:
+                # Lecture interrompue par le client : pas une erreur du modèle
+                success = True
+                raise
+            except Exception as e:
+                raise Exception(
+                    f"Erreur pendant le streaming du modèle "
+                    f"{model} : {str(e)}"
+                )
+            finally:
+                if success and runtime is not None:
+                    runtime.mark_used()
+                self._record(
+                    model, caller, start, messages, "".join(parts),
+                    success=success, ttft=ttft, cold=cold
+                )
+
     # --------------------------------------------------
     # Fallback multi-modèles
     # --------------------------------------------------
@@ -100,22 +436,22 @@ class LLMManager:
         self,
         messages: List[Dict[str, str]],
         models: Optional[List[str]] = None,
+        caller: str = "default",
         **kwargs
     ) -> tuple[str, str]:
 
-        models = models or [
-            "ollama/mistral",
-            "gemini/gemini-2.5-flash-lite",
-            "openai/gpt-3.5-turbo",
-        ]
+        models = models or self.fallback_models
 
         last_error = None
 
         for model in models:
+            if last_error is not None:
+                self.telemetry.record_retry(model, caller)
             try:
                 response = self.complete(
                     messages=messages,
                     model=model,
+                    caller=caller,
                     **kwargs
                 )
                 return response, model
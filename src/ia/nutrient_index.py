@@ -0,0 +1,178 @@
+"""
+Index des plus proches voisins nutritionnels pour la recherche d'alternatives.
+"""
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+# Profil nutritionnel utilisé pour la similarité (pour 100 g)
+NUTRIENT_FEATURES = [
+    "energy_kcal_100g",
+    "fat_100g",
+    "sugars_100g",
+    "salt_100g",
+    "fiber_100g",
+    "proteins_100g",
+]
+
+
+def category_path(categories: Any, depth: int) -> List[str]:
+    """Premiers niveaux (normalisés) d'une chaîne de catégories OFF."""
+    if not isinstance(categories, str):
+        return []
+    path = []
+    for part in categories.split(","):
+        part = part.strip().lower()
+        if ":" in part:
+            part = part.split(":", 1)[1]
+        if part:
+            path.append(part)
+        if len(path) == depth:
+            break
+    return path
+
+
+class NutrientIndex:
+    """
+    Plus proches voisins sur profils nutritionnels standardisés.
+
+    Les profils (énergie, lipides, sucres, sel, fibres, protéines) sont
+    centrés-réduits une fois pour toutes, les valeurs manquantes étant
+    remplacées par la médiane. Les produits sont partitionnés par préfixe
+    de catégorie à plusieurs profondeurs : une requête cherche d'abord
+    dans la partition la plus spécifique du produit et ne remonte vers
+    une catégorie plus large que s'il manque des candidats.
+    """
+
+    def __init__(
+        self,
+        df: pd.DataFrame,
+        features: Optional[List[str]] = None,
+        category_col: str = "categories",
+        score_col: str = "nutriscore_numeric",
+        max_depth: int = 3
+    ):
+        """
+        Construit l'index.
+
+        Args:
+            df: Catalogue produits (une ligne par produit)
+            features: Colonnes nutritionnelles utilisées pour la distance
+            category_col: Colonne des catégories (chaîne séparée par des virgules)
+            score_col: Score à améliorer (plus petit = meilleur)
+            max_depth: Profondeur maximale des partitions de catégories
+        """
+        self.df = df.reset_index(drop=True)
+        self.features = [f for f in (features or NUTRIENT_FEATURES) if f in df.columns]
+        self.category_col = category_col
+        self.score_col = score_col
+        self.max_depth = max_depth
+
+        if not self.features:
+            raise ValueError("Aucune colonne nutritionnelle disponible pour l'index")
+
+        raw = self.df[self.features].apply(pd.to_numeric, errors="coerce")
+        self.medians = raw.median().fillna(0.0).to_numpy(dtype=np.float64)
+        values = raw.to_numpy(dtype=np.float64)
+        values = np.where(np.isnan(values), self.medians, values)
+
+        self.means = values.mean(axis=0)
+        self.stds = values.std(axis=0)
+        self.stds[self.stds == 0] = 1.0
+        self.vectors = ((values - self.means) / self.stds).astype(np.float32)
+
+        self.scores = pd.to_numeric(
+            self.df.get(score_col, pd.Series(np.nan, index=self.df.index)),
+            errors="coerce"
+        ).to_numpy(dtype=np.float64)
+
+        self.partitions = self._build_partitions()
+
+    def _build_partitions(self) -> Dict[tuple, np.ndarray]:
+        members: Dict[tuple, List[int]] = {(): list(range(len(self.df)))}
+        if self.category_col in self.df.columns:
+            for i, categories in enumerate(self.df[self.category_col]):
+                path = category_path(categories, self.max_depth)
+                for depth in range(1, len(path) + 1):
+                    members.setdefault(tuple(path[:depth]), []).append(i)
+        return {key: np.asarray(idx, dtype=np.int64) for key, idx in members.items()}
+
+    def _vectorize(self, product: Dict[str, Any]) -> np.ndarray:
+        values = np.array(
+            [pd.to_numeric(product.get(f), errors="coerce") for f in self.features],
+            dtype=np.float64
+        )
+        values = np.where(np.isnan(values), self.medians, values)
+        return ((values - self.means) / self.stds).astype(np.float32)
+
+    def query(
+        self,
+        product: Dict[str, Any],
+        k: int = 5,
+        require_better_score: bool = True,
+        mask: Optional[np.ndarray] = None
+    ) -> pd.DataFrame:
+        """
+        Retourne les ``k`` produits les plus proches nutritionnellement.
+
+        Args:
+            product: Produit de référence (dict de colonnes)
+            k: Nombre de produits retournés
+            require_better_score: Ne garder que les produits dont le score
+                est strictement meilleur que celui du produit
+            mask: Masque booléen optionnel des produits éligibles, aligné
+                sur le catalogue (ex. ``ProductRecommender.healthier_mask``)
+
+        Returns:
+            Lignes du catalogue, de la partition la plus spécifique à la plus
+            large puis par distance croissante, avec les colonnes
+            ``distance`` et ``category_match`` (partition d'origine)
+        """
+        target = self._vectorize(product)
+        score = pd.to_numeric(product.get(self.score_col), errors="coerce")
+        code = product.get("code")
+        empty = self.df.iloc[[]].assign(distance=[], category_match=[])
+
+        if require_better_score and np.isnan(score):
+            return empty
+
+        allowed = np.ones(len(self.df), dtype=bool) if mask is None else np.array(mask, dtype=bool)
+        if require_better_score:
+            allowed &= self.scores < score
+        if code is not None and "code" in self.df.columns:
+            allowed &= self.df["code"].to_numpy() != code
+
+        # Remplit d'abord depuis la catégorie la plus spécifique, puis élargit
+        rows, distances, matches = [], [], []
+        path = category_path(product.get(self.category_col), self.max_depth)
+        for depth in range(len(path), -1, -1):
+            candidates = self.partitions.get(tuple(path[:depth]))
+            if candidates is None:
+                continue
+            candidates = candidates[allowed[candidates]]
+            if len(candidates) == 0:
+                continue
+
+            diff = self.vectors[candidates] - target
+            dist = np.einsum("ij,ij->i", diff, diff)
+
+            n = k - len(rows)
+            top = np.argpartition(dist, n)[:n] if len(candidates) > n else np.arange(len(candidates))
+            top = top[np.argsort(dist[top], kind="stable")]
+
+            rows.extend(candidates[top])
+            distances.extend(np.sqrt(dist[top]))
+            matches.extend([" > ".join(path[:depth]) or "toutes"] * len(top))
+            allowed[candidates[top]] = False
+
+            if len(rows) >= k:
+                break
+
+        if not rows:
+            return empty
+
+        result = self.df.iloc[rows].copy()
+        result["distance"] = distances
+        result["category_match"] = matches
+        return result
@@ -0,0 +1,325 @@
+"""
+Gestion du runtime Ollama local.
+
+Sur une machine sans GPU, le chargement du modèle en mémoire domine la
+latence de la première requête après une période d'inactivité. Ce module :
+
+    - vérifie que le modèle est réellement téléchargé (``/api/tags``)
+      et s'il est chargé en mémoire (``/api/ps``)
+    - précharge le modèle au démarrage (requête sans prompt)
+    - entretient sa résidence en mémoire (``keep_alive`` renvoyé peu après
+      chaque période d'activité)
+    - limite le nombre de requêtes simultanées, les suivantes attendant
+      leur tour dans une file FIFO
+"""
+import asyncio
+import re
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+from .scheduler import AsyncGrant
+
+DEFAULT_KEEP_ALIVE = "30m"
+
+# Durée de résidence appliquée par Ollama aux requêtes sans keep_alive
+SERVER_DEFAULT_KEEP_ALIVE = 300.0
+
+_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+def model_tag(name: str) -> str:
+    """Nom complet d'un modèle Ollama (``mistral`` → ``mistral:latest``)."""
+    return name if ":" in name else f"{name}:latest"
+
+
+def parse_keep_alive(value: Any) -> float:
+    """Durée ``keep_alive`` Ollama en secondes (négative : illimitée)."""
+    if isinstance(value, (int, float)):
+        seconds = float(value)
+    else:
+        text = str(value).strip()
+        match = re.fullmatch(r"(-?\d+(?:\.\d+)?)(ms|s|m|h)?", text)
+        if match is None:
+            raise ValueError(f"Durée keep_alive invalide : {value!r}")
+        seconds = float(match.group(1)) * _UNITS[match.group(2) or "s"]
+    return float("inf") if seconds < 0 else seconds
+
+
+class OllamaRuntime:
+    """
+    Présence, préchargement et accès concurrent à un modèle Ollama.
+
+    Une seule instance par (serveur, modèle) doit exister dans le
+    processus pour que la limite de concurrence soit globale : utiliser
+    ``shared_runtime``.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        model: str = "mistral",
+        keep_alive: Any = DEFAULT_KEEP_ALIVE,
+        max_concurrency: int = 2,
+        touch_interval: float = 60.0,
+        load_timeout: float = 300.0,
+        clock=time.monotonic
+    ):
+        """
+        Args:
+            base_url: URL du serveur Ollama
+            model: Nom du modèle (sans préfixe ``ollama/``)
+            keep_alive: Durée de résidence demandée à Ollama
+            max_concurrency: Requêtes simultanées maximales vers le modèle
+            touch_interval: Délai maximal entre une activité et le
+                renouvellement du keep_alive (doit rester inférieur à la
+                résidence par défaut du serveur)
+            load_timeout: Délai maximal de chargement du modèle (secondes)
+            clock: Horloge monotone (injectable pour les tests)
+        """
+        self.base_url = base_url.rstrip("/")
+        self.model = model_tag(model)
+        self.keep_alive = keep_alive
+        self.keep_alive_seconds = parse_keep_alive(keep_alive)
+        self.max_concurrency = max_concurrency
+        self.touch_interval = touch_interval
+        self.load_timeout = load_timeout
+        self._clock = clock
+
+        self._lock = threading.Lock()
+        self._warm_until = float("-inf")
+        self._last_used = float("-inf")
+        self._last_touch = float("-inf")
+        self._warming: Optional[threading.Thread] = None
+        self._keeper: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+        # Attentes servies dans l'ordre d'arrivée (Event ou AsyncGrant)
+        self._queue_lock = threading.Lock()
+        self._queue: deque = deque()
+        self._active = 0
+
+        self.counters = {
+            "warmups": 0,
+            "warmup_failures": 0,
+            "touches": 0,
+            "last_load_seconds": None,
+            "requests": 0,
+            "queued": 0,
+            "max_queue_depth": 0,
+            "queue_wait_seconds": 0.0,
+        }
+
+    # --------------------------------------------------
+    # Présence du modèle
+    # --------------------------------------------------
+    def _get(self, path: str, timeout: float = 1.0) -> Dict[str, Any]:
+        import requests
+        r = requests.get(f"{self.base_url}{path}", timeout=timeout)
+        r.raise_for_status()
+        return r.json()
+
+    def installed_models(self) -> List[str]:
+        """Modèles téléchargés sur le serveur (vide si injoignable)."""
+        try:
+            return [model_tag(m.get("name", "")) for m in self._get("/api/tags").get("models", [])]
+        except Exception:
+            return []
+
+    def loaded_models(self) -> List[str]:
+        """Modèles actuellement chargés en mémoire (vide si injoignable)."""
+        try:
+            return [model_tag(m.get("name", "")) for m in self._get("/api/ps").get("models", [])]
+        except Exception:
+            return []
+
+    def is_pulled(self) -> bool:
+        return self.model in self.installed_models()
+
+    def is_resident(self) -> bool:
+        return self.model in self.loaded_models()
+
+    # --------------------------------------------------
+    # Préchargement et maintien en mémoire
+    # --------------------------------------------------
+    def warm_up(self) -> Optional[float]:
+        """
+        Charge le modèle en mémoire (requête sans prompt) et renouvelle
+        son keep_alive.
+
+        Returns:
+            Durée de la requête en secondes, None en cas d'échec
+        """
+        import requests
+
+        start = self._clock()
+        try:
+            r = requests.post(
+                f"{self.base_url}/api/generate",
+                json={"model": self.model, "prompt": "", "keep_alive": self.keep_alive, "stream": False},
+                timeout=self.load_timeout
+            )
+            r.raise_for_status()
+        except Exception:
+            with self._lock:
+                self.counters["warmup_failures"] += 1
+            return None
+
+        duration = self._clock() - start
+        with self._lock:
+            now = self._clock()
+            self._warm_until = now + self.keep_alive_seconds
+            self._last_touch = now
+        self._start_keeper()
+        return duration
+
+    def warm_up_async(self) -> Optional[threading.Thread]:
+        """Précharge en arrière-plan (une seule fois par runtime)."""
+        with self._lock:
+            if self._warming is not None:
+                return self._warming
+            self._warming = threading.Thread(target=self._initial_warm_up, daemon=True)
+        self._warming.start()
+        return self._warming
+
+    def _initial_warm_up(self):
+        duration = self.warm_up()
+        with self._lock:
+            if duration is not None:
+                self.counters["warmups"] += 1
+                self.counters["last_load_seconds"] = duration
+
+    def _start_keeper(self):
+        with self._lock:
+            if self._keeper is not None or self.keep_alive_seconds == 0:
+                return
+            self._keeper = threading.Thread(target=self._keep_alive_loop, daemon=True)
+        self._keeper.start()
+
+    def _keep_alive_loop(self):
+        # Les requêtes LiteLLM n'envoient pas de keep_alive : Ollama leur
+        # applique sa durée par défaut. On renouvelle la nôtre après chaque
+        # période d'activité.
+        while not self._stop.wait(self.touch_interval):
+            with self._lock:
+                pending = self._last_used > self._last_touch
+            if pending and self.warm_up() is not None:
+                with self._lock:
+                    self.counters["touches"] += 1
+
+    def close(self):
+        """Arrête l'entretien du keep_alive."""
+        self._stop.set()
+
+    def is_warm(self) -> bool:
+        """Vrai si le modèle est supposé résident (préchargé ou utilisé récemment)."""
+        with self._lock:
+            return self._clock() < self._warm_until
+
+    def mark_used(self):
+        """Signale une requête terminée (le modèle est résident)."""
+        with self._lock:
+            now = self._clock()
+            self._last_used = now
+            self._warm_until = max(self._warm_until, now + SERVER_DEFAULT_KEEP_ALIVE)
+        self._start_keeper()
+
+    # --------------------------------------------------
+    # Limitation de concurrence
+    # --------------------------------------------------
+    def _enter(self, granted) -> bool:
+        """Place immédiate (True) ou mise en file de ``granted`` (False)."""
+        with self._queue_lock:
+            if not self._queue and self._active < self.max_concurrency:
+                self._active += 1
+                self.counters["requests"] += 1
+                return True
+            self._queue.append(granted)
+            self.counters["queued"] += 1
+            self.counters["max_queue_depth"] = max(self.counters["max_queue_depth"], len(self._queue))
+            return False
+
+    def _served(self, start: float) -> float:
+        waited = self._clock() - start
+        with self._queue_lock:
+            self.counters["requests"] += 1
+            self.counters["queue_wait_seconds"] += waited
+        return waited
+
+    def acquire(self) -> float:
+        """Attend une place (ordre d'arrivée) ; retourne le temps d'attente."""
+        start = self._clock()
+        granted = threading.Event()
+        if self._enter(granted):
+            return 0.0
+        granted.wait()
+        return self._served(start)
+
+    async def acquire_async(self) -> float:
+        """Version asynchrone d'``acquire`` (annulation : place rendue ou attente retirée)."""
+        start = self._clock()
+        granted = AsyncGrant(asyncio.get_running_loop())
+        if self._enter(granted):
+            return 0.0
+        try:
+            await granted.wait()
+        except asyncio.CancelledError:
+            with self._queue_lock:
+                withdrawn = not granted.is_set()
+                if withdrawn:
+                    self._queue.remove(granted)
+            if not withdrawn:
+                self.release()
+            raise
+        return self._served(start)
+
+    def release(self):
+        with self._queue_lock:
+            self._active -= 1
+            while self._queue and self._active < self.max_concurrency:
+                self._active += 1
+                self._queue.popleft().set()
+
+    @contextmanager
+    def slot(self) -> Iterator[float]:
+        """Contexte d'exécution d'une requête vers le modèle."""
+        waited = self.acquire()
+        try:
+            yield waited
+        finally:
+            self.release()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._queue_lock:
+            queue = {"active": self._active, "queue_depth": len(self._queue)}
+        with self._lock:
+            return {
+                "model": self.model,
+                "max_concurrency": self.max_concurrency,
+                "keep_alive": self.keep_alive,
+                "warm": self._clock() < self._warm_until,
+                **queue,
+                **self.counters,
+            }
+
+
+_RUNTIMES: Dict[tuple, OllamaRuntime] = {}
+_RUNTIMES_LOCK = threading.Lock()
+
+
+def shared_runtime(base_url: str, model: str, **kwargs) -> OllamaRuntime:
+    """Runtime unique du processus pour un (serveur, modèle)."""
+    key = (base_url.rstrip("/"), model_tag(model))
+    with _RUNTIMES_LOCK:
+        runtime = _RUNTIMES.get(key)
+        if runtime is None:
+            runtime = _RUNTIMES[key] = OllamaRuntime(base_url, model, **kwargs)
+        return runtime
+
+
+def runtimes() -> List[OllamaRuntime]:
+    """Runtimes créés dans le processus (page de diagnostics)."""
+    with _RUNTIMES_LOCK:
+        return list(_RUNTIMES.values())
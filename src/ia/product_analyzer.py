@@ -3,21 +3,46 @@ Analyse nutritionnelle automatisée d'un produit.
 """
 
 from typing import Dict, Any, Optional
+from ..enricher.nutriscore import nutriscore_breakdown
+from ..enricher.percentiles import PercentileTables
 from .llm_manager import LLMManager
+from .prompt_budget import count_message_tokens
 from .prompts import NutritionPrompts
 
 
 class ProductAnalyzer:
     """Analyse un produit alimentaire via IA."""
 
-    def __init__(self, llm_manager: Optional[LLMManager] = None):
+    def __init__(
+        self,
+        llm_manager: Optional[LLMManager] = None,
+        priority: str = "analysis",
+        percentiles: Optional[PercentileTables] = None
+    ):
+        """
+        Args:
+            llm_manager: Gestionnaire LLM (créé si absent)
+            priority: Classe de priorité des appels (``batch`` pour la
+                pré-génération hors ligne)
+            percentiles: Tables de centiles par catégorie (position du
+                produit ajoutée au prompt, sans parcours du catalogue)
+        """
         self.llm = llm_manager or LLMManager()
         self.prompts = NutritionPrompts()
+        self.priority = priority
+        self.percentiles = percentiles
+
+    def category_ranking(self, product: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Centiles du produit dans sa catégorie (``None`` sans tables)."""
+        if self.percentiles is None:
+            return None
+        return self.percentiles.rank_product(product)
 
     def analyze(
         self,
         product: Dict[str, Any],
-        model: str = "gpt-3.5-turbo"
+        model: str = "gpt-3.5-turbo",
+        session_id: Optional[str] = None
     ) -> Dict[str, Any]:
         """
         Analyse complète d'un produit alimentaire.
@@ -25,6 +50,7 @@ class ProductAnalyzer:
         Args:
             product: Données OpenFoodFacts du produit
             model: Modèle LLM à utiliser
+            session_id: Session à l'origine de la demande (file équitable)
 
         Returns:
             Résultat d'analyse structuré
@@ -36,13 +62,20 @@ class ProductAnalyzer:
             },
             {
                 "role": "user",
-                "content": self.prompts.product_analysis_user_prompt(product)
+                "content": self.prompts.product_analysis_user_prompt(
+                    product, ranking=self.category_ranking(product)
+                )
             }
         ]
 
+        prompt_tokens = count_message_tokens(messages)
+
         try:
             response, model_used = self.llm.complete_with_fallback(
                 messages=messages,
+                caller="analyzer",
+                priority=self.priority,
+                session_id=session_id,
                 temperature=0.6,
                 max_tokens=500
             )
@@ -51,6 +84,7 @@ class ProductAnalyzer:
                 "success": True,
                 "analysis": response,
                 "model_used": model_used,
+                "prompt_tokens": prompt_tokens,
                 "nutriscore": product.get("nutriscore_grade"),
                 "nova_group": product.get("nova_group"),
                 "product_name": product.get("product_name")
@@ -74,3 +108,49 @@ class ProductAnalyzer:
             f"(Nutri-Score {product.get('nutriscore_grade', '?').upper()}, "
             f"NOVA {product.get('nova_group', '?')})"
         )
+
+    def score_breakdown(
+        self,
+        product: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """
+        Analyse instantanée sans IA : Nutri-Score recalculé localement.
+
+        Returns:
+            Résultat au même format que ``analyze`` (``model_used`` vaut
+            "local"), avec le détail des points dans ``breakdown``
+        """
+        breakdown = nutriscore_breakdown(product)
+        if not breakdown["computable"]:
+            return {
+                "success": False,
+                "error": "Nutriments insuffisants pour recalculer le Nutri-Score"
+            }
+
+        points = breakdown["points"]
+        lines = [
+            f"**Nutri-Score recalculé : {breakdown['grade'].upper()}** "
+            f"(score {breakdown['score']})",
+            "",
+            f"- Points négatifs : {breakdown['negative_points']} "
+            f"(énergie {points['energy']}, sucres {points['sugars']}, "
+            f"AGS {points['saturated_fat']}, sodium {points['sodium']})",
+            f"- Points positifs : {breakdown['positive_points']} "
+            f"(fibres {points['fiber']}, protéines {points['proteins']}"
+            f"{'' if breakdown['proteins_counted'] else ' non comptées'})",
+        ]
+        if breakdown["mismatch"]:
+            lines.append(
+                f"- ⚠️ Grade affiché : {str(breakdown['stored_grade']).upper()} "
+                f"(calcul officiel plus récent ou données incomplètes)"
+            )
+
+        return {
+            "success": True,
+            "analysis": "\n".join(lines),
+            "model_used": "local",
+            "breakdown": breakdown,
+            "nutriscore": product.get("nutriscore_grade"),
+            "nova_group": product.get("nova_group"),
+            "product_name": product.get("product_name")
+        }
@@ -0,0 +1,118 @@
+"""
+Comptage local des tokens et respect d'un budget par prompt.
+"""
+from functools import lru_cache
+from typing import Dict, List
+
+# Surcoût approximatif par message (rôle + séparateurs du format chat)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+@lru_cache(maxsize=1)
+def _encoding():
+    """Encodeur cl100k embarqué par LiteLLM (aucun accès réseau)."""
+    try:
+        from litellm.litellm_core_utils.default_encoding import encoding
+        return encoding
+    except Exception:
+        return None
+
+
+def count_tokens(text: str) -> int:
+    """Compte les tokens d'un texte (estimation 4 caractères/token sans encodeur)."""
+    if not text:
+        return 0
+    encoding = _encoding()
+    if encoding is None:
+        return max(1, len(text) // 4)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def count_message_tokens(messages: List[Dict[str, str]]) -> int:
+    """Compte les tokens d'une liste de messages au format chat."""
+    return sum(
+        count_tokens(m.get("content") or "") + MESSAGE_OVERHEAD_TOKENS
+        for m in messages
+    )
+
+
+def truncate_to_tokens(text: str, max_tokens: int, suffix: str = "…") -> str:
+    """Tronque un texte pour qu'il tienne dans ``max_tokens`` tokens."""
+    if max_tokens <= 0:
+        return ""
+    if count_tokens(text) <= max_tokens:
+        return text
+
+    encoding = _encoding()
+    keep = max(0, max_tokens - count_tokens(suffix))
+    if encoding is None:
+        return text[:keep * 4].rstrip() + suffix
+    tokens = encoding.encode(text, disallowed_special=())
+    return encoding.decode(tokens[:keep]).rstrip() + suffix
+
+
+def fit_lines(lines: List[str], max_tokens: int, overflow: str = "… (+{n} autres)") -> List[str]:
+    """
+    Garde les premières lignes tant qu'elles tiennent dans le budget.
+
+    Les lignes écartées sont signalées par une ligne ``overflow``.
+    """
+    kept: List[str] = []
+    used = 0
+    for i, line in enumerate(lines):
+        cost = count_tokens(line) + 1
+        if used + cost > max_tokens:
+            kept.append(overflow.format(n=len(lines) - i))
+            break
+        kept.append(line)
+        used += cost
+    return kept
+
+
+def fit_history(
+    history: List[Dict[str, str]],
+    max_tokens: int,
+    summary_tokens: int = 60
+) -> List[Dict[str, str]]:
+    """
+    Réduit un historique de conversation à un budget de tokens.
+
+    Les messages les plus récents sont conservés en priorité. Les plus
+    anciens sont remplacés par un court résumé des questions posées
+    (message système), lui-même borné à ``summary_tokens``.
+    """
+    if count_message_tokens(history) <= max_tokens:
+        return list(history)
+
+    available = max(0, max_tokens - summary_tokens - MESSAGE_OVERHEAD_TOKENS)
+    kept: List[Dict[str, str]] = []
+    used = 0
+    for message in reversed(history):
+        cost = count_message_tokens([message])
+        if used + cost > available:
+            break
+        kept.append(message)
+        used += cost
+    kept.reverse()
+
+    # Une réponse sans sa question n'a pas de sens pour le modèle
+    if kept and kept[0]["role"] == "assistant":
+        kept = kept[1:]
+
+    dropped = history[:len(history) - len(kept)]
+    questions = [m["content"] for m in dropped if m["role"] == "user"]
+    if not questions:
+        return kept
+
+    summary = truncate_to_tokens(
+        "Questions précédentes : " + " | ".join(questions),
+        summary_tokens
+    )
+    return [{"role": "system", "content": summary}] + kept
+
+
+def format_number(value: float) -> str:
+    """Formate une valeur nutritionnelle de façon compacte et déterministe."""
+    value = float(value)
+    digits = 1 if abs(value) >= 1 else 2
+    return f"{round(value, digits):g}"
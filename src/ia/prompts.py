@@ -1,10 +1,124 @@
 """
 Prompts IA centralisés pour NutriScan.
 """
+import math
+from typing import Any, Dict, List, Optional
+
+from .prompt_budget import count_tokens, fit_lines, format_number, truncate_to_tokens
+
+# (libellé, unité, clés possibles : colonnes aplaties ou dict "nutriments")
+NUTRIENT_FIELDS = [
+    ("Énergie", "kcal", ["energy_kcal_100g", "energy-kcal_100g", "energy_100g"]),
+    ("Matières grasses", "g", ["fat_100g"]),
+    ("dont saturées", "g", ["saturated_fat_100g", "saturated-fat_100g"]),
+    ("Glucides", "g", ["carbohydrates_100g"]),
+    ("dont sucres", "g", ["sugars_100g"]),
+    ("Fibres", "g", ["fiber_100g"]),
+    ("Protéines", "g", ["proteins_100g"]),
+    ("Sel", "g", ["salt_100g"]),
+]
+
+# Nombre maximal d'additifs listés avant résumé
+MAX_ADDITIVES = 8
+
+# Libellés des colonnes classées par catégorie (tables de centiles)
+RANKING_LABELS = {keys[0]: label for label, _, keys in NUTRIENT_FIELDS}
+RANKING_LABELS.update({"additives_n": "Additifs", "ns_score": "Score Nutri-Score (points)"})
+
+# Libellés des préférences acceptées par le recommandeur
+PREFERENCE_LABELS = {
+    "bio": "bio",
+    "vegan": "vegan",
+    "sans_gluten": "sans gluten",
+    "sans gluten": "sans gluten",
+}
+
+
+def _lookup(product: dict, keys: List[str]) -> Optional[float]:
+    """Cherche une valeur numérique dans le produit ou son dict ``nutriments``."""
+    nutriments = product.get("nutriments") or {}
+    for key in keys:
+        for source in (product, nutriments):
+            value = source.get(key)
+            try:
+                value = float(value)
+            except (TypeError, ValueError):
+                continue
+            if math.isfinite(value):
+                return value
+    return None
+
 
 class NutritionPrompts:
     """Collection de prompts pour les fonctionnalités IA NutriScan."""
 
+    # Budgets (tokens) des prompts utilisateur
+    PRODUCT_PROMPT_BUDGET = 350
+    RECOMMENDATION_PROMPT_BUDGET = 400
+
+    # --------------------------------------------------
+    # Rendu compact des données produit
+    # --------------------------------------------------
+    @staticmethod
+    def nutrient_table(product: dict) -> str:
+        """Tableau des nutriments pour 100 g, ordre fixe, valeurs absentes omises."""
+        rows = []
+        for label, unit, keys in NUTRIENT_FIELDS:
+            value = _lookup(product, keys)
+            if value is not None:
+                rows.append(f"{label} : {format_number(value)} {unit}")
+        return "\n".join(rows) if rows else "Non renseignés"
+
+    @staticmethod
+    def additives_summary(product: dict) -> str:
+        """Liste courte des additifs (codes E) ou leur nombre à défaut."""
+        tags = product.get("additives_tags")
+        if not isinstance(tags, str) and hasattr(tags, "__len__") and len(tags) > 0:
+            codes = sorted({str(t).split(":")[-1].upper() for t in tags})
+            shown = ", ".join(codes[:MAX_ADDITIVES])
+            if len(codes) > MAX_ADDITIVES:
+                shown += f" (+{len(codes) - MAX_ADDITIVES})"
+            return shown
+
+        count = _lookup(product, ["additives_n"])
+        if count is None:
+            return "Non renseignés"
+        return f"{int(count)} additif(s)" if count else "Aucun"
+
+    @staticmethod
+    def ranking_summary(ranking: Optional[Dict[str, Any]]) -> str:
+        """Position du produit dans sa catégorie (centiles), une ligne par colonne."""
+        if not ranking or not ranking.get("percentiles"):
+            return ""
+        lines = [f"Position parmi {ranking['category']} ({ranking['count']} produits) :"]
+        for column, percent in ranking["percentiles"].items():
+            line = f"{RANKING_LABELS.get(column, column)} : {int(round(percent))}e centile"
+            if percent >= 90:
+                line += " (10 % les plus élevés)"
+            elif percent <= 10:
+                line += " (10 % les plus bas)"
+            lines.append(line)
+        return "\n".join(lines)
+
+    @staticmethod
+    def preferences_summary(preferences: Optional[Dict[str, Any]]) -> str:
+        """Préférences actives sous forme de liste courte."""
+        active = []
+        for key, value in sorted((preferences or {}).items()):
+            if value is True:
+                active.append(PREFERENCE_LABELS.get(key, key.replace("_", " ")))
+            elif value not in (None, False, "", [], {}):
+                active.append(f"{key.replace('_', ' ')} : {value}")
+        return ", ".join(active) if active else "Aucune"
+
+    @staticmethod
+    def _grade(product: dict, key: str = "nutriscore_grade") -> str:
+        value = product.get(key)
+        return str(value).upper() if isinstance(value, str) and value else "?"
+
+    # --------------------------------------------------
+    # Analyse produit
+    # --------------------------------------------------
     @staticmethod
     def product_analysis_system_prompt() -> str:
         return (
@@ -14,30 +128,49 @@ class NutritionPrompts:
         )
 
     @staticmethod
-    def product_analysis_user_prompt(product: dict) -> str:
-        return f"""
-Analyse le produit alimentaire suivant :
-
-Nom : {product.get("product_name", "Inconnu")}
-Marque : {product.get("brands", "Inconnue")}
-Nutri-Score : {product.get("nutriscore_grade", "?" )}
-NOVA : {product.get("nova_group", "?" )}
-
-Nutriments (pour 100g) :
-{product.get("nutriments", {})}
-
-Additifs :
-{product.get("additives_tags", [])}
+    def product_analysis_user_prompt(
+        product: dict,
+        max_tokens: Optional[int] = None,
+        ranking: Optional[Dict[str, Any]] = None
+    ) -> str:
+        max_tokens = max_tokens or NutritionPrompts.PRODUCT_PROMPT_BUDGET
+        nova = _lookup(product, ["nova_group"])
 
-Explique :
-1. La qualité nutritionnelle globale
-2. Les points positifs
-3. Les points négatifs
-4. Pour quel type de consommation ce produit est adapté
+        header = (
+            "Analyse le produit alimentaire suivant :\n\n"
+            f"Nom : {product.get('product_name') or 'Inconnu'}\n"
+            f"Marque : {product.get('brands') or 'Inconnue'}\n"
+            f"Nutri-Score : {NutritionPrompts._grade(product)}\n"
+            f"NOVA : {int(nova) if nova is not None else '?'}\n"
+        )
+        details = (
+            "\nNutriments (pour 100g) :\n"
+            f"{NutritionPrompts.nutrient_table(product)}\n"
+            "\nAdditifs :\n"
+            f"{NutritionPrompts.additives_summary(product)}\n"
+        )
+        position = NutritionPrompts.ranking_summary(ranking)
+        if position:
+            details += f"\n{position}\n"
+        instructions = (
+            "\nExplique :\n"
+            "1. La qualité nutritionnelle globale\n"
+            "2. Les points positifs\n"
+            "3. Les points négatifs\n"
+            "4. Pour quel type de consommation ce produit est adapté\n"
+            "\nRéponds en français, de façon synthétique et structurée.\n"
+        )
 
-Réponds en français, de façon synthétique et structurée.
-"""
+        # Les consignes sont toujours conservées, les données sont tronquées
+        data = truncate_to_tokens(
+            header + details,
+            max_tokens - count_tokens(instructions)
+        )
+        return data + instructions
 
+    # --------------------------------------------------
+    # Recommandations
+    # --------------------------------------------------
     @staticmethod
     def recommendation_system_prompt() -> str:
         return (
@@ -50,22 +183,37 @@ Réponds en français, de façon synthétique et structurée.
     def recommendation_user_prompt(
         original_product: dict,
         candidate_products: list,
-        preferences: dict
+        preferences: dict,
+        max_tokens: Optional[int] = None
     ) -> str:
-        return f"""
-Produit initial :
-{original_product.get("product_name")}
+        max_tokens = max_tokens or NutritionPrompts.RECOMMENDATION_PROMPT_BUDGET
 
-Préférences utilisateur :
-{preferences}
+        head = (
+            "Produit initial :\n"
+            f"{original_product.get('product_name') or 'Inconnu'} "
+            f"(Nutri-Score {NutritionPrompts._grade(original_product)})\n"
+            "\nPréférences utilisateur :\n"
+            f"{NutritionPrompts.preferences_summary(preferences)}\n"
+            "\nProduits alternatifs possibles :\n"
+        )
+        tail = (
+            "\nSélectionne 3 alternatives maximum, plus saines que le produit initial.\n"
+            "Explique brièvement chaque recommandation.\n"
+        )
 
-Produits alternatifs possibles :
-{[p.get("product_name") for p in candidate_products]}
+        candidates = [
+            f"- {truncate_to_tokens(str(p.get('product_name') or 'Inconnu'), 20)} "
+            f"(Nutri-Score {NutritionPrompts._grade(p)})"
+            for p in candidate_products
+        ]
+        budget = max_tokens - count_tokens(head) - count_tokens(tail)
+        lines = fit_lines(candidates, budget) if candidates else ["Aucun"]
 
-Sélectionne 3 alternatives maximum, plus saines que le produit initial.
-Explique brièvement chaque recommandation.
-"""
+        return head + "\n".join(lines) + "\n" + tail
 
+    # --------------------------------------------------
+    # Chatbot
+    # --------------------------------------------------
     @staticmethod
     def chatbot_system_prompt() -> str:
         return (
@@ -73,3 +221,12 @@ Explique brièvement chaque recommandation.
             "Tu réponds de façon fiable, pédagogique et bienveillante. "
             "Tu n'établis pas de diagnostic médical."
         )
+
+    @staticmethod
+    def chatbot_tools_instructions() -> str:
+        return (
+            "Pour toute question sur des produits, des aliments ou des teneurs "
+            "précises, interroge d'abord les outils de recherche (catalogue "
+            "OpenFoodFacts, table CIQUAL) et appuie ta réponse sur leurs "
+            "résultats, sans inventer de valeurs."
+        )
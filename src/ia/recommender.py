@@ -2,8 +2,16 @@
 Système de recommandation de produits alternatifs.
 """
 
+import re
 from typing import List, Dict, Any, Optional
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
 from .llm_manager import LLMManager
+from .prompt_budget import count_message_tokens
 from .prompts import NutritionPrompts
 
 
@@ -19,7 +27,8 @@ class ProductRecommender:
         original_product: Dict[str, Any],
         candidate_products: List[Dict[str, Any]],
         preferences: Optional[Dict[str, Any]] = None,
-        model: str = "gpt-3.5-turbo"
+        model: str = "gpt-3.5-turbo",
+        session_id: Optional[str] = None
     ) -> Dict[str, Any]:
         """
         Recommande des alternatives à un produit.
@@ -29,6 +38,7 @@ class ProductRecommender:
             candidate_products: Produits comparables (OpenFoodFacts)
             preferences: Préférences utilisateur (bio, vegan, sans gluten…)
             model: Modèle LLM
+            session_id: Session à l'origine de la demande (file équitable)
 
         Returns:
             Recommandations IA
@@ -50,9 +60,13 @@ class ProductRecommender:
             }
         ]
 
+        prompt_tokens = count_message_tokens(messages)
+
         try:
             response, model_used = self.llm.complete_with_fallback(
                 messages=messages,
+                caller="recommender",
+                session_id=session_id,
                 temperature=0.7,
                 max_tokens=400
             )
@@ -60,7 +74,8 @@ class ProductRecommender:
             return {
                 "success": True,
                 "recommendations": response,
-                "model_used": model_used
+                "model_used": model_used,
+                "prompt_tokens": prompt_tokens
             }
 
         except Exception as e:
@@ -76,12 +91,196 @@ class ProductRecommender:
     ) -> List[Dict[str, Any]]:
         """
         Filtrage simple sans IA (pré-traitement).
+
+        Les produits sans grade ou avec un grade inattendu
+        ("unknown", "not-applicable"…) sont écartés.
         """
         allowed = ["A", "B", "C", "D", "E"]
-        threshold = allowed.index(max_nutriscore)
+        threshold = allowed.index(max_nutriscore.upper())
 
         return [
             p for p in products
-            if p.get("nutriscore_grade")
-            and allowed.index(p["nutriscore_grade"].upper()) <= threshold
+            if isinstance(p.get("nutriscore_grade"), str)
+            and p["nutriscore_grade"].upper() in allowed[:threshold + 1]
         ]
+
+    @staticmethod
+    def healthier_mask(
+        df: pd.DataFrame,
+        max_nutriscore: Optional[str] = "B",
+        max_nova: Optional[int] = None,
+        max_additives: Optional[int] = None,
+        exclude_allergens: Optional[List[str]] = None,
+        categories: Optional[List[str]] = None,
+        preferences: Optional[Dict[str, Any]] = None,
+        exclude_additives: Optional[List[str]] = None,
+        bitmap: Optional[Any] = None,
+        taxonomy: Optional[Any] = None
+    ) -> np.ndarray:
+        """
+        Masque booléen des produits respectant toutes les contraintes.
+
+        Toutes les conditions sont évaluées colonne par colonne sur le
+        catalogue complet (NumPy / Arrow), sans boucle Python par produit :
+        les colonnes texte sont factorisées et seules leurs valeurs
+        distinctes sont évaluées. Une valeur manquante ne satisfait
+        jamais une contrainte.
+
+        Avec ``bitmap`` (``src.enricher.bitmap_index.BitmapIndex`` aligné
+        sur ``df``), les exclusions d'allergènes et d'additifs sont des
+        opérations bit à bit sur l'index au lieu de recherches de
+        sous-chaînes ; les allergènes sont alors comparés exactement
+        (« nuts » n'exclut plus « peanuts »). De même, avec ``taxonomy``
+        (``src.enricher.taxonomy.Taxonomy`` du même catalogue), les
+        contraintes de catégorie passent par l'appartenance des produits
+        aux catégories dont le nom contient un des termes.
+
+        Args:
+            df: Catalogue produits
+            max_nutriscore: Grade Nutri-Score maximal accepté (A à E)
+            max_nova: Groupe NOVA maximal accepté
+            max_additives: Nombre maximal d'additifs
+            exclude_allergens: Allergènes à exclure ("gluten", "en:milk"…)
+            categories: Catégories acceptées (au moins une doit correspondre)
+            preferences: Préférences utilisateur (bio, vegan, sans_gluten)
+            exclude_additives: Additifs à exclure ("E330", "e471"…)
+            bitmap: Index bitmap allergènes / additifs aligné sur ``df``
+            taxonomy: Taxonomie des catégories alignée sur ``df``
+
+        Returns:
+            Tableau booléen aligné sur les lignes de ``df``
+        """
+        mask = np.ones(len(df), dtype=bool)
+        exclude = [a.split(":")[-1].lower() for a in exclude_allergens or []]
+        preferences = preferences or {}
+
+        if max_nutriscore is not None:
+            threshold = NUTRISCORE_GRADES.index(max_nutriscore.lower())
+            codes, uniques = pd.factorize(df["nutriscore_grade"])
+            ranks = np.array(
+                [_grade_rank(g) for g in uniques] + [-1], dtype=np.int8
+            )
+            grades = ranks[codes]
+            mask &= (grades >= 0) & (grades <= threshold)
+
+        if max_nova is not None:
+            mask &= _numeric(df, "nova_group") <= max_nova
+
+        if max_additives is not None:
+            mask &= _numeric(df, "additives_n") <= max_additives
+
+        if preferences.get("sans_gluten") or preferences.get("sans gluten"):
+            exclude.append("gluten")
+
+        if preferences.get("vegan"):
+            exclude.extend(ANIMAL_ALLERGENS)
+            animal = _in_categories(df, ANIMAL_CATEGORY_TERMS, taxonomy, whole_words=True)
+            plant_based = _in_categories(df, PLANT_BASED_CATEGORY_TERMS, taxonomy, whole_words=True)
+            mask &= ~animal | plant_based
+
+        if preferences.get("bio"):
+            mask &= _contains_any(df, ORGANIC_COLUMNS, ORGANIC_TERMS, whole_words=True)
+
+        if bitmap is not None:
+            mask &= bitmap.exclude(exclude + list(exclude_additives or []))
+        else:
+            if exclude:
+                mask &= ~_contains_any(df, "allergens", sorted(set(exclude)))
+            if exclude_additives:
+                additives = [re.sub(r"[\s-]", "", a.lower()) for a in exclude_additives]
+                mask &= ~_contains_any(df, "ingredients_text", additives, additive_numbers=True)
+
+        if categories:
+            mask &= _in_categories(df, categories, taxonomy)
+
+        return mask
+
+    @staticmethod
+    def filter_healthier_frame(df: pd.DataFrame, **constraints) -> pd.DataFrame:
+        """
+        Version vectorisée de ``filter_healthier_products`` pour un DataFrame.
+
+        Accepte les mêmes contraintes que ``healthier_mask``.
+        """
+        return df[ProductRecommender.healthier_mask(df, **constraints)]
+
+
+# ============================================================
+# Utils filtrage vectorisé
+# ============================================================
+NUTRISCORE_GRADES = ["a", "b", "c", "d", "e"]
+
+# Allergènes OFF d'origine animale (exclus pour la préférence vegan)
+ANIMAL_ALLERGENS = ["milk", "eggs", "fish", "crustaceans", "molluscs"]
+
+# Catégories d'origine animale (mots entiers : « eggplant » n'est pas un œuf)
+ANIMAL_CATEGORY_TERMS = [
+    "viande", "viandes", "meat", "meats", "poisson", "poissons", "fish",
+    "charcuterie", "charcuteries", "produits laitiers", "dairies",
+    "fromage", "fromages", "cheese", "cheeses", "yaourt", "yaourts",
+    "yogurt", "yogurts", "oeuf", "oeufs", "egg", "eggs",
+]
+
+# Catégories végétales qui lèvent l'exclusion (« Yaourts de soja » d'un
+# produit vegan, « Substituts de produits laitiers », « Meat analogues »…)
+PLANT_BASED_CATEGORY_TERMS = [
+    "vegan", "veganes", "végétalien", "végétaliens", "végétalienne",
+    "végétaliennes", "substitut", "substituts", "substitutes", "analogues",
+]
+
+ORGANIC_COLUMNS = ["labels", "categories", "product_name"]
+ORGANIC_TERMS = ["bio", "organic", "biologique"]
+
+
+def _numeric(df: pd.DataFrame, col: str) -> np.ndarray:
+    if col not in df.columns:
+        return np.full(len(df), np.nan)
+    return pd.to_numeric(df[col], errors="coerce").to_numpy(dtype=np.float64)
+
+
+def _contains_any(
+    df: pd.DataFrame,
+    cols,
+    terms: List[str],
+    whole_words: bool = False,
+    additive_numbers: bool = False
+) -> np.ndarray:
+    """Vrai si une des colonnes contient un des termes (insensible à la casse)."""
+    cols = [cols] if isinstance(cols, str) else cols
+    pattern = "|".join(re.escape(t) for t in terms)
+    if additive_numbers:
+        # Numéros E écrits « E330 », « e 330 » ou « E-330 »
+        pattern = "|".join(rf"\b{re.escape(t[0])}[\s-]?{re.escape(t[1:])}\b" for t in terms)
+    elif whole_words:
+        pattern = rf"\b(?:{pattern})\b"
+    found = np.zeros(len(df), dtype=bool)
+
+    for col in cols:
+        if col not in df.columns:
+            continue
+        # Les valeurs texte se répètent : on évalue chaque valeur distincte une fois
+        codes, uniques = pd.factorize(df[col])
+        values = pa.array([str(u) for u in uniques], type=pa.string())
+        matches = pc.match_substring_regex(values, pattern, ignore_case=True)
+        hits = np.append(pc.fill_null(matches, False).to_numpy(zero_copy_only=False), False)
+        found |= hits[codes]
+
+    return found
+
+
+def _in_categories(
+    df: pd.DataFrame,
+    terms: List[str],
+    taxonomy: Optional[Any] = None,
+    whole_words: bool = False
+) -> np.ndarray:
+    """Vrai si une des catégories du produit contient un des termes."""
+    if taxonomy is None:
+        return _contains_any(df, "categories", terms, whole_words=whole_words)
+    return taxonomy.mask(taxonomy.matching(terms, whole_words=whole_words))
+
+
+def _grade_rank(grade: Any) -> int:
+    """Rang d'un grade Nutri-Score (0 pour A), -1 s'il est inattendu."""
+    grade = str(grade).strip().lower()
+    return NUTRISCORE_GRADES.index(grade) if grade in NUTRISCORE_GRADES else -1
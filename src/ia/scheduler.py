@@ -0,0 +1,298 @@
+"""
+Ordonnancement des appels LLM par priorité.
+
+Toutes les requêtes vers un fournisseur passent par une file unique qui
+limite le nombre d'appels simultanés (par fournisseur) et sert les
+places libérées :
+
+    1. par classe de priorité : ``interactive`` (chat) avant ``analysis``
+       (analyse ou recommandation demandée depuis l'interface) avant
+       ``batch`` (pré-génération hors ligne)
+    2. à priorité égale, à tour de rôle entre les sessions, pour qu'un
+       utilisateur qui enchaîne les requêtes ne bloque pas les autres
+"""
+import asyncio
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+
+PRIORITIES = ("interactive", "analysis", "batch")
+
+# Priorité par défaut selon le composant appelant
+CALLER_PRIORITIES = {
+    "chatbot": "interactive",
+    "analyzer": "analysis",
+    "recommender": "analysis",
+}
+
+# Appels simultanés par fournisseur (Ollama : ce que le runtime local supporte)
+DEFAULT_LIMITS = {
+    "ollama": int(os.getenv("OLLAMA_MAX_CONCURRENCY", "2")),
+    "gemini": 8,
+    "openai": 8,
+}
+
+
+class AsyncGrant:
+    """
+    Attribution d'une place à une attente asynchrone.
+
+    ``set`` est appelé sous le verrou de la file par le thread qui libère la
+    place ; la coroutine en attente est réveillée dans sa propre boucle, sans
+    occuper de thread pendant l'attente.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self._loop = loop
+        self._future = loop.create_future()
+        self._granted = False
+
+    def set(self):
+        self._granted = True
+        try:
+            self._loop.call_soon_threadsafe(self._wake)
+        except RuntimeError:
+            pass  # boucle fermée : l'attente a déjà été abandonnée
+
+    def _wake(self):
+        if not self._future.done():
+            self._future.set_result(None)
+
+    def is_set(self) -> bool:
+        return self._granted
+
+    async def wait(self):
+        await self._future
+
+
+class _ProviderQueue:
+    """File d'attente et compteurs d'un fournisseur."""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.active = 0
+        # priorité -> session -> attentes de cette session (ordre d'arrivée)
+        self.waiting: Dict[str, "OrderedDict[str, deque]"] = {p: OrderedDict() for p in PRIORITIES}
+        self.depth = {p: 0 for p in PRIORITIES}
+        self.max_depth = 0
+        self.served = {p: 0 for p in PRIORITIES}
+        self.wait_seconds = {p: 0.0 for p in PRIORITIES}
+
+    def total_depth(self) -> int:
+        return sum(self.depth.values())
+
+
+class LLMScheduler:
+    """
+    File d'attente à priorités devant les fournisseurs LLM.
+
+    Une place est réservée avec ``slot(provider, priority, session_id)``
+    (ou ``acquire``/``release``, ``acquire_async`` depuis une coroutine) ;
+    au-delà de la limite du fournisseur, l'appelant attend que
+    l'ordonnanceur lui attribue une place libérée.
+    """
+
+    def __init__(
+        self,
+        limits: Optional[Dict[str, int]] = None,
+        default_limit: int = 4,
+        clock=time.perf_counter
+    ):
+        """
+        Args:
+            limits: Appels simultanés maximaux par fournisseur
+            default_limit: Limite des fournisseurs non listés
+            clock: Horloge (injectable pour les tests)
+        """
+        self.limits = dict(DEFAULT_LIMITS if limits is None else limits)
+        self.default_limit = default_limit
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._queues: Dict[str, _ProviderQueue] = {}
+
+    def _queue(self, provider: str) -> _ProviderQueue:
+        queue = self._queues.get(provider)
+        if queue is None:
+            limit = self.limits.get(provider, self.default_limit)
+            queue = self._queues[provider] = _ProviderQueue(limit)
+        return queue
+
+    def set_limit(self, provider: str, limit: int):
+        """Modifie la limite d'un fournisseur (places libérées immédiatement servies)."""
+        with self._lock:
+            self.limits[provider] = limit
+            queue = self._queue(provider)
+            queue.limit = limit
+            self._dispatch(queue)
+
+    # --------------------------------------------------
+    # Réservation
+    # --------------------------------------------------
+    def _enter(self, provider: str, priority: str, session_id: Optional[str], granted) -> bool:
+        """Place immédiate (True) ou mise en file de ``granted`` (False)."""
+        if priority not in PRIORITIES:
+            raise ValueError(f"Priorité inconnue : {priority} (attendu : {', '.join(PRIORITIES)})")
+
+        with self._lock:
+            queue = self._queue(provider)
+            if queue.active < queue.limit and not queue.total_depth():
+                queue.active += 1
+                queue.served[priority] += 1
+                return True
+
+            queue.waiting[priority].setdefault(session_id or "", deque()).append(granted)
+            queue.depth[priority] += 1
+            queue.max_depth = max(queue.max_depth, queue.total_depth())
+            return False
+
+    def _served(self, provider: str, priority: str, start: float) -> float:
+        waited = self._clock() - start
+        with self._lock:
+            queue = self._queues[provider]
+            queue.served[priority] += 1
+            queue.wait_seconds[priority] += waited
+        return waited
+
+    def _withdraw(self, provider: str, priority: str, session_id: Optional[str], granted) -> bool:
+        """Retire une attente abandonnée ; False si la place lui était déjà attribuée."""
+        with self._lock:
+            if granted.is_set():
+                return False
+            queue = self._queues[provider]
+            sessions = queue.waiting[priority]
+            waiters = sessions[session_id or ""]
+            waiters.remove(granted)
+            if not waiters:
+                del sessions[session_id or ""]
+            queue.depth[priority] -= 1
+            return True
+
+    def acquire(
+        self,
+        provider: str,
+        priority: str = "interactive",
+        session_id: Optional[str] = None
+    ) -> float:
+        """
+        Attend une place chez ``provider``.
+
+        Returns:
+            Temps d'attente en secondes
+        """
+        start = self._clock()
+        granted = threading.Event()
+        if self._enter(provider, priority, session_id, granted):
+            return 0.0
+        granted.wait()
+        return self._served(provider, priority, start)
+
+    async def acquire_async(
+        self,
+        provider: str,
+        priority: str = "interactive",
+        session_id: Optional[str] = None
+    ) -> float:
+        """
+        Version asynchrone d'``acquire`` : l'attente se fait dans la boucle
+        d'événements. Une attente annulée quitte la file, ou rend la place
+        si elle venait de lui être attribuée.
+        """
+        start = self._clock()
+        granted = AsyncGrant(asyncio.get_running_loop())
+        if self._enter(provider, priority, session_id, granted):
+            return 0.0
+        try:
+            await granted.wait()
+        except asyncio.CancelledError:
+            if not self._withdraw(provider, priority, session_id, granted):
+                self.release(provider)
+            raise
+        return self._served(provider, priority, start)
+
+    def release(self, provider: str):
+        """Libère une place et la donne à l'attente la plus prioritaire."""
+        with self._lock:
+            queue = self._queue(provider)
+            queue.active -= 1
+            self._dispatch(queue)
+
+    def _dispatch(self, queue: _ProviderQueue):
+        while queue.active < queue.limit:
+            priority = next((p for p in PRIORITIES if queue.waiting[p]), None)
+            if priority is None:
+                return
+            sessions = queue.waiting[priority]
+            # Tour de rôle : la session servie repasse en fin de file
+            session, waiters = sessions.popitem(last=False)
+            granted = waiters.popleft()
+            if waiters:
+                sessions[session] = waiters
+            queue.depth[priority] -= 1
+            queue.active += 1
+            granted.set()
+
+    @contextmanager
+    def slot(
+        self,
+        provider: str,
+        priority: str = "interactive",
+        session_id: Optional[str] = None
+    ) -> Iterator[float]:
+        """Contexte d'exécution d'un appel (rend le temps d'attente)."""
+        waited = self.acquire(provider, priority, session_id)
+        try:
+            yield waited
+        finally:
+            self.release(provider)
+
+    # --------------------------------------------------
+    # Métriques
+    # --------------------------------------------------
+    def stats(self) -> Dict[str, Dict]:
+        """État des files par fournisseur."""
+        with self._lock:
+            return {
+                provider: {
+                    "limit": q.limit,
+                    "active": q.active,
+                    "queue_depth": dict(q.depth),
+                    "max_queue_depth": q.max_depth,
+                    "served": dict(q.served),
+                    "avg_wait_seconds": {
+                        p: q.wait_seconds[p] / q.served[p] if q.served[p] else 0.0
+                        for p in PRIORITIES
+                    },
+                }
+                for provider, q in sorted(self._queues.items())
+            }
+
+    def to_prometheus(self, prefix: str = "nutriscan_llm_scheduler") -> str:
+        """Profondeur des files et attentes au format texte Prometheus."""
+        stats = self.stats()
+        lines = [
+            f"# HELP {prefix}_queue_depth Requêtes en attente",
+            f"# TYPE {prefix}_queue_depth gauge",
+        ]
+        for provider, s in stats.items():
+            for p in PRIORITIES:
+                lines.append(f'{prefix}_queue_depth{{provider="{provider}",priority="{p}"}} {s["queue_depth"][p]}')
+        lines += [f"# HELP {prefix}_active Appels en cours", f"# TYPE {prefix}_active gauge"]
+        for provider, s in stats.items():
+            lines.append(f'{prefix}_active{{provider="{provider}"}} {s["active"]}')
+        lines += [f"# HELP {prefix}_served_total Appels servis", f"# TYPE {prefix}_served_total counter"]
+        for provider, s in stats.items():
+            for p in PRIORITIES:
+                lines.append(f'{prefix}_served_total{{provider="{provider}",priority="{p}"}} {s["served"][p]}')
+        return "\n".join(lines) + "\n"
+
+
+def priority_for(caller: str, priority: Optional[str] = None) -> str:
+    """Priorité explicite, sinon celle du composant appelant (``analysis`` par défaut)."""
+    return priority or CALLER_PRIORITIES.get(caller, "analysis")
+
+
+# Instance partagée par tous les LLMManager du processus
+SCHEDULER = LLMScheduler()
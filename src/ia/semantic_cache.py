@@ -0,0 +1,242 @@
+"""
+Cache sémantique local des réponses du chatbot.
+
+Les questions sont projetées sur des vecteurs de n-grammes de caractères
+hachés (aucun modèle ni accès réseau) ; une nouvelle question dont la
+similarité cosinus avec une question déjà traitée dépasse un seuil reçoit
+directement la réponse mise en cache, à condition d'employer les mêmes
+mots de contenu : la similarité ne couvre que les variations de
+formulation (ordre des mots, mots outils, accents, ponctuation).
+"""
+import re
+import threading
+import time
+import unicodedata
+import zlib
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+
+# Lettres isolées issues des élisions ("l'additif", "qu'un"…), sans valeur distinctive
+ELISIONS = {"l", "d", "s", "n", "c", "j", "m", "t", "qu"}
+
+# Mots outils (normalisés) qui ne changent pas le sens d'une question ;
+# les négations et quantificateurs (« pas », « sans », « plus »…) n'en font pas partie
+STOPWORDS = ELISIONS | {
+    "a", "au", "aux", "ce", "ces", "cet", "cette", "de", "des", "du", "elle", "en",
+    "est", "et", "il", "je", "la", "le", "les", "leur", "ma", "mes", "mon", "nous",
+    "on", "ou", "par", "pour", "quel", "quelle", "quelles", "quels", "que", "qui",
+    "quoi", "sa", "se", "ses", "son", "sont", "sur", "un", "une", "vous", "y",
+    "comment", "pourquoi", "dans", "avec", "moi", "me", "ca",
+    "an", "and", "are", "do", "does", "for", "how", "in", "is", "it", "of", "on",
+    "or", "the", "this", "to", "what", "which", "why",
+}
+
+
+def normalize_question(text: str) -> str:
+    """Minuscules, sans accents, emojis ni ponctuation, espaces simplifiés."""
+    text = unicodedata.normalize("NFKD", str(text).lower())
+    text = text.encode("ascii", errors="ignore").decode("ascii")
+    text = re.sub(r"[^a-z0-9]+", " ", text)
+    return text.strip()
+
+
+def exact_terms(text: str) -> str:
+    """
+    Termes qui doivent être identiques pour réutiliser une réponse.
+
+    Tous les mots hors mots outils : un seul mot de contenu (« sel » /
+    « sucre », « végétariens » / « végétaliens »), un nombre ou un grade
+    Nutri-Score change le sens d'une question tout en pesant peu dans la
+    similarité.
+    """
+    terms = {w for w in normalize_question(text).split() if w not in STOPWORDS}
+    return " ".join(sorted(terms))
+
+
+class HashedNgramVectorizer:
+    """
+    Vectorisation par hachage de n-grammes de caractères et de mots.
+
+    Déterministe d'un processus à l'autre (CRC32, pas ``hash()``), de
+    dimension fixe et sans vocabulaire à apprendre.
+    """
+
+    def __init__(self, n_features: int = 4096, ngram_range: tuple = (3, 5)):
+        self.n_features = n_features
+        self.ngram_range = ngram_range
+
+    def _features(self, text: str) -> List[str]:
+        words = normalize_question(text).split()
+        features = [f"w:{w}" for w in words]
+        for word in words:
+            padded = f" {word} "
+            for n in range(self.ngram_range[0], self.ngram_range[1] + 1):
+                features.extend(padded[i:i + n] for i in range(len(padded) - n + 1))
+        return features
+
+    def hash_counts(self, text: str) -> Dict[int, float]:
+        """Comptes signés (non normalisés) par indice de caractéristique."""
+        counts: Dict[int, float] = {}
+        for feature in self._features(text):
+            h = zlib.crc32(feature.encode("utf-8"))
+            index = h % self.n_features
+            counts[index] = counts.get(index, 0.0) + (1.0 if (h >> 31) & 1 else -1.0)
+        return counts
+
+    def transform_one(self, text: str) -> np.ndarray:
+        """Vecteur L2-normalisé (float32) d'un texte."""
+        vector = np.zeros(self.n_features, dtype=np.float32)
+        for index, count in self.hash_counts(text).items():
+            vector[index] = count
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def transform(self, texts: List[str]) -> np.ndarray:
+        """Matrice (n_textes, n_features) des vecteurs normalisés."""
+        if not texts:
+            return np.zeros((0, self.n_features), dtype=np.float32)
+        return np.vstack([self.transform_one(t) for t in texts])
+
+
+def context_key(context: Optional[Dict[str, Any]]) -> str:
+    """Clé de contexte : le produit consulté (code, sinon nom) ou rien."""
+    if not context or not context.get("current_product"):
+        return ""
+    product = context["current_product"]
+    return str(product.get("code") or product.get("product_name") or "")
+
+
+class SemanticCache:
+    """
+    Cache question → réponse par similarité, borné et thread-safe.
+
+    Une réponse n'est réutilisée que dans le même contexte (même produit
+    consulté, ou aucun produit) et si la question emploie les mêmes mots de
+    contenu (voir ``exact_terms``) : la similarité départage seulement des
+    formulations. Les questions gabarits (« Je suis allergique au
+    {allergène}… ») sont mises en cache avec ``exact=True`` et retrouvées
+    sur la question normalisée entière. Au-delà de ``max_entries`` les
+    entrées les plus anciennes sont remplacées.
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.85,
+        max_entries: int = 2000,
+        vectorizer: Optional[HashedNgramVectorizer] = None
+    ):
+        """
+        Initialise le cache.
+
+        Args:
+            threshold: Similarité cosinus minimale pour un succès
+            max_entries: Nombre maximal de réponses conservées
+            vectorizer: Vectoriseur des questions
+        """
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.vectorizer = vectorizer or HashedNgramVectorizer()
+
+        self._lock = threading.Lock()
+        self._vectors = np.zeros((max_entries, self.vectorizer.n_features), dtype=np.float32)
+        self._keys = np.full(max_entries, None, dtype=object)
+        self._entries: List[Optional[Dict[str, Any]]] = [None] * max_entries
+        self._size = 0
+        self._next = 0
+
+        self._hits = 0
+        self._misses = 0
+        self._lookup_seconds = 0.0
+
+    def __len__(self) -> int:
+        return self._size
+
+    @staticmethod
+    def _key(question: str, context: Optional[Dict[str, Any]], exact: bool = False) -> str:
+        if exact:
+            return f"{context_key(context)}|={normalize_question(question)}"
+        return f"{context_key(context)}|{exact_terms(question)}"
+
+    def lookup(
+        self,
+        question: str,
+        context: Optional[Dict[str, Any]] = None,
+        exact: bool = False
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Cherche une réponse pour une question similaire.
+
+        Args:
+            question: Question posée
+            context: Contexte (produit consulté)
+            exact: Question gabarit : seule la même question normalisée convient
+
+        Returns:
+            Dict ``question``, ``answer``, ``similarity`` ou None
+        """
+        start = time.perf_counter()
+        key = self._key(question, context, exact)
+
+        with self._lock:
+            match = None
+            if self._size and exact:
+                found = np.flatnonzero(self._keys[:self._size] == key)
+                if len(found):
+                    match = dict(self._entries[found[-1]], similarity=1.0)
+            elif self._size:
+                vector = self.vectorizer.transform_one(question)
+                similarities = self._vectors[:self._size] @ vector
+                similarities[self._keys[:self._size] != key] = -1.0
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.threshold:
+                    match = dict(self._entries[best], similarity=float(similarities[best]))
+
+            if match is None:
+                self._misses += 1
+            else:
+                self._hits += 1
+            self._lookup_seconds += time.perf_counter() - start
+
+        return match
+
+    def add(
+        self,
+        question: str,
+        answer: str,
+        context: Optional[Dict[str, Any]] = None,
+        exact: bool = False
+    ):
+        """Met en cache la réponse à une question (réponse vide ignorée)."""
+        if not answer or not answer.strip():
+            return
+        vector = self.vectorizer.transform_one(question)
+        with self._lock:
+            slot = self._next
+            self._vectors[slot] = vector
+            self._keys[slot] = self._key(question, context, exact)
+            self._entries[slot] = {"question": question, "answer": answer}
+            self._next = (slot + 1) % self.max_entries
+            self._size = min(self._size + 1, self.max_entries)
+
+    def clear(self):
+        """Vide le cache (les métriques sont conservées)."""
+        with self._lock:
+            self._keys[:] = None
+            self._entries = [None] * self.max_entries
+            self._size = 0
+            self._next = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Taux de succès et latence moyenne de recherche."""
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "entries": self._size,
+                "lookups": lookups,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": self._hits / lookups if lookups else 0.0,
+                "avg_lookup_ms": 1000 * self._lookup_seconds / lookups if lookups else 0.0,
+            }
@@ -0,0 +1,142 @@
+"""
+Regroupement des appels LLM identiques en cours (« single-flight »).
+
+Quand plusieurs utilisateurs déclenchent au même moment exactement la même
+requête (même modèle, mêmes messages, mêmes paramètres), un seul appel est
+envoyé au fournisseur : les appels concurrents attendent son résultat (ou
+son erreur) et le partagent. Rien n'est conservé une fois l'appel terminé,
+ce n'est pas un cache.
+"""
+import asyncio
+import hashlib
+import json
+import threading
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+
+def request_key(model: str, messages: Any, **params) -> str:
+    """Empreinte stable d'une requête LLM (modèle, messages, paramètres)."""
+    payload = json.dumps(
+        {"model": model, "messages": messages, "params": params},
+        sort_keys=True,
+        ensure_ascii=False,
+        default=str
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class _Call:
+    """Appel synchrone en cours et son résultat."""
+
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class _AsyncCall:
+    """Appel asynchrone en cours : tâche partagée et nombre d'appelants en attente."""
+
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Exécute au plus un appel à la fois par clé.
+
+    ``do`` sert les appels synchrones (threads Streamlit, pool de
+    pré-génération), ``ado`` les appels asynchrones d'une même boucle
+    d'événements. Le premier appelant d'une clé exécute la fonction, les
+    suivants attendent et reçoivent le même résultat ou la même exception.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[str, _Call] = {}
+        self._async_calls: Dict[Tuple[Any, str], _AsyncCall] = {}
+        self._executions = 0
+        self._shared = 0
+
+    def do(self, key: str, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """Appelle ``fn(*args, **kwargs)`` ou attend l'appel identique en cours."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self._executions += 1
+            else:
+                self._shared += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn(*args, **kwargs)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    async def ado(self, key: str, fn: Callable[..., Awaitable[Any]], *args, **kwargs) -> Any:
+        """
+        Version asynchrone de ``do`` (regroupement par boucle d'événements).
+
+        L'appel s'exécute dans une tâche qui n'appartient à aucun appelant :
+        l'annulation de l'un d'eux, premier compris, n'affecte pas les
+        autres. La tâche n'est annulée que si tous ses appelants le sont.
+        """
+        loop = asyncio.get_running_loop()
+        async_key = (loop, key)
+
+        with self._lock:
+            call = self._async_calls.get(async_key)
+            if call is None:
+                call = self._async_calls[async_key] = _AsyncCall(loop.create_task(fn(*args, **kwargs)))
+                call.task.add_done_callback(lambda _: self._forget(async_key, call))
+                self._executions += 1
+            else:
+                self._shared += 1
+            call.waiters += 1
+
+        try:
+            return await asyncio.shield(call.task)
+        except asyncio.CancelledError:
+            with self._lock:
+                call.waiters -= 1
+                abandoned = call.waiters == 0
+            if abandoned:
+                call.task.cancel()
+            raise
+
+    def _forget(self, async_key: Tuple[Any, str], call: _AsyncCall):
+        with self._lock:
+            if self._async_calls.get(async_key) is call:
+                del self._async_calls[async_key]
+
+    def in_flight(self) -> int:
+        """Nombre d'appels distincts actuellement en cours."""
+        with self._lock:
+            return len(self._calls) + len(self._async_calls)
+
+    def stats(self) -> Dict[str, int]:
+        """Appels exécutés et appels servis par un appel déjà en cours."""
+        with self._lock:
+            return {
+                "executions": self._executions,
+                "shared": self._shared,
+                "in_flight": len(self._calls) + len(self._async_calls),
+            }
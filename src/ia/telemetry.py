@@ -0,0 +1,265 @@
+"""
+Télémétrie des appels LLM : latences, premier token, tokens, coût, échecs.
+
+Les mesures sont agrégées en mémoire par (modèle, appelant) — l'appelant
+étant le composant à l'origine de la requête : ``analyzer``,
+``recommender``, ``chatbot``… — et exportables au format texte
+Prometheus ou en instantané JSON (page Streamlit « Diagnostics »).
+"""
+import bisect
+import json
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+# Bornes hautes (secondes) des histogrammes de latence
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0)
+
+METRIC_PREFIX = "nutriscan_llm"
+
+
+class Histogram:
+    """Histogramme cumulatif à bornes fixes (sémantique Prometheus)."""
+
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # dernière case : +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def cumulative(self) -> List[int]:
+        total, result = 0, []
+        for c in self.counts:
+            total += c
+            result.append(total)
+        return result
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Estimation d'un quantile par interpolation linéaire dans les classes."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        lower, seen = 0.0, 0
+        for bound, c in zip(self.buckets + (float("inf"),), self.counts):
+            if seen + c >= rank and c:
+                if bound == float("inf"):
+                    return lower
+                return lower + (bound - lower) * (rank - seen) / c
+            seen += c
+            lower = bound
+        return lower
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "avg": round(self.sum / self.count, 6) if self.count else None,
+            "p50": self.quantile(0.50),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+            "buckets": dict(zip([str(b) for b in self.buckets] + ["+Inf"], self.cumulative())),
+        }
+
+
+class _Series:
+    """Compteurs d'un couple (modèle, appelant)."""
+
+    def __init__(self):
+        self.requests = 0
+        self.failures = 0
+        self.retries = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cost_usd = 0.0
+        self.latency = Histogram()
+        self.ttft = Histogram()
+        # Modèles locaux : latence selon que le modèle était déjà en mémoire
+        self.cold = Histogram()
+        self.warm = Histogram()
+
+
+class LLMTelemetry:
+    """Agrégateur thread-safe des mesures d'appels LLM."""
+
+    def __init__(self, clock=time.time):
+        self._lock = threading.Lock()
+        self._series: Dict[Tuple[str, str], _Series] = {}
+        self._clock = clock
+        self.started_at = clock()
+
+    def _get(self, model: str, caller: str) -> _Series:
+        key = (model, caller or "unknown")
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = _Series()
+        return series
+
+    def record(
+        self,
+        model: str,
+        caller: str,
+        latency: float,
+        success: bool = True,
+        ttft: Optional[float] = None,
+        prompt_tokens: int = 0,
+        completion_tokens: int = 0,
+        cost_usd: float = 0.0,
+        cold: Optional[bool] = None
+    ):
+        """
+        Enregistre un appel terminé.
+
+        Args:
+            model: Modèle interrogé
+            caller: Composant appelant
+            latency: Durée totale de l'appel (secondes)
+            success: False si l'appel a échoué
+            ttft: Délai avant le premier fragment (appels streamés)
+            prompt_tokens: Tokens envoyés
+            completion_tokens: Tokens générés
+            cost_usd: Coût estimé de l'appel
+            cold: Modèle local non résident en mémoire au départ de
+                l'appel (None si sans objet)
+        """
+        with self._lock:
+            series = self._get(model, caller)
+            series.requests += 1
+            series.failures += 0 if success else 1
+            series.latency.observe(latency)
+            if ttft is not None:
+                series.ttft.observe(ttft)
+            series.prompt_tokens += prompt_tokens
+            series.completion_tokens += completion_tokens
+            series.cost_usd += cost_usd
+            if cold is not None:
+                (series.cold if cold else series.warm).observe(latency)
+
+    def record_retry(self, model: str, caller: str):
+        """Compte une nouvelle tentative (modèle de repli après un échec)."""
+        with self._lock:
+            self._get(model, caller).retries += 1
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+            self.started_at = self._clock()
+
+    # --------------------------------------------------
+    # Exports
+    # --------------------------------------------------
+    def snapshot(self) -> Dict[str, Any]:
+        """Instantané sérialisable en JSON, une entrée par (modèle, appelant)."""
+        with self._lock:
+            series = [
+                {
+                    "model": model,
+                    "caller": caller,
+                    "requests": s.requests,
+                    "failures": s.failures,
+                    "retries": s.retries,
+                    "prompt_tokens": s.prompt_tokens,
+                    "completion_tokens": s.completion_tokens,
+                    "cost_usd": round(s.cost_usd, 6),
+                    "latency_seconds": s.latency.summary(),
+                    "ttft_seconds": s.ttft.summary(),
+                    "cold_start_seconds": s.cold.summary(),
+                    "warm_start_seconds": s.warm.summary(),
+                }
+                for (model, caller), s in sorted(self._series.items())
+            ]
+            return {
+                "started_at": self.started_at,
+                "generated_at": self._clock(),
+                "series": series,
+            }
+
+    def to_json(self, indent: Optional[int] = 2) -> str:
+        return json.dumps(self.snapshot(), indent=indent, ensure_ascii=False)
+
+    def to_prometheus(self) -> str:
+        """Export au format texte d'exposition Prometheus."""
+        counters = [
+            ("requests_total", "Appels LLM terminés", lambda s: s.requests),
+            ("failures_total", "Appels LLM en échec", lambda s: s.failures),
+            ("retries_total", "Tentatives sur un modèle de repli", lambda s: s.retries),
+            ("cost_usd_total", "Coût estimé (USD)", lambda s: round(s.cost_usd, 6)),
+        ]
+        histograms = [
+            ("request_duration_seconds", "Durée totale des appels", lambda s: s.latency),
+            ("time_to_first_token_seconds", "Délai avant le premier fragment", lambda s: s.ttft),
+        ]
+
+        with self._lock:
+            items = sorted(self._series.items())
+            lines: List[str] = []
+
+            for name, help_text, value in counters:
+                lines += [f"# HELP {METRIC_PREFIX}_{name} {help_text}",
+                          f"# TYPE {METRIC_PREFIX}_{name} counter"]
+                for (model, caller), s in items:
+                    lines.append(f"{METRIC_PREFIX}_{name}{_labels(model, caller)} {value(s)}")
+
+            name = f"{METRIC_PREFIX}_tokens_total"
+            lines += [f"# HELP {name} Tokens envoyés et générés",
+                      f"# TYPE {name} counter"]
+            for (model, caller), s in items:
+                lines.append(f"{name}{_labels(model, caller, type='prompt')} {s.prompt_tokens}")
+                lines.append(f"{name}{_labels(model, caller, type='completion')} {s.completion_tokens}")
+
+            for name, help_text, hist in histograms:
+                name = f"{METRIC_PREFIX}_{name}"
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+                for (model, caller), s in items:
+                    h = hist(s)
+                    bounds = [str(b) for b in h.buckets] + ["+Inf"]
+                    for bound, count in zip(bounds, h.cumulative()):
+                        lines.append(f"{name}_bucket{_labels(model, caller, le=bound)} {count}")
+                    lines.append(f"{name}_sum{_labels(model, caller)} {h.sum:.6f}")
+                    lines.append(f"{name}_count{_labels(model, caller)} {h.count}")
+
+            name = f"{METRIC_PREFIX}_request_duration_by_start_seconds"
+            lines += [f"# HELP {name} Durée des appels aux modèles locaux, à froid ou à chaud",
+                      f"# TYPE {name} histogram"]
+            for (model, caller), s in items:
+                for start, h in (("cold", s.cold), ("warm", s.warm)):
+                    if not h.count:
+                        continue
+                    bounds = [str(b) for b in h.buckets] + ["+Inf"]
+                    for bound, count in zip(bounds, h.cumulative()):
+                        lines.append(f"{name}_bucket{_labels(model, caller, start=start, le=bound)} {count}")
+                    lines.append(f"{name}_sum{_labels(model, caller, start=start)} {h.sum:.6f}")
+                    lines.append(f"{name}_count{_labels(model, caller, start=start)} {h.count}")
+
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(model: str, caller: str, **extra) -> str:
+    labels = {"model": model, "caller": caller, **extra}
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + "}"
+
+
+def estimate_cost(model: str, prompt_tokens: int, completion_tokens: int) -> float:
+    """Coût estimé via la table de prix de LiteLLM (0 si modèle inconnu ou local)."""
+    try:
+        import litellm
+        prompt_cost, completion_cost = litellm.cost_per_token(
+            model=model,
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens
+        )
+        return float(prompt_cost + completion_cost)
+    except Exception:
+        return 0.0
+
+
+# Instance partagée par tous les LLMManager du processus
+TELEMETRY = LLMTelemetry()
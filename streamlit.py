@@ -1,10 +1,24 @@
+import os
 import streamlit as st
 import pandas as pd
 import numpy as np
 from pathlib import Path
-from src.ia.chatbot import NutritionChatbot
+from uuid import uuid4
+from src.ia.catalogue_tools import CatalogueTools
+from src.ia.chatbot import NutritionChatbot, stream_caption
+from src.ia.ciqual_index import CiqualIndex
+from src.ia.semantic_cache import SemanticCache
 from src.ia.product_analyzer import ProductAnalyzer
 from src.ia.recommender import ProductRecommender
+from src.ia.nutrient_index import NUTRIENT_FEATURES, NutrientIndex
+from src.ia.prompts import RANKING_LABELS
+from src.enricher.pregenerate_analyses import analyses_by_code, code_key, start_background
+from src.enricher.arrow_store import load_frame
+from src.enricher.ciqual_join import attach_ciqual
+from src.enricher.bitmap_index import load_index
+from src.enricher.percentiles import load_tables
+from src.enricher.sketches import load_sketches
+from src.enricher.taxonomy import load_taxonomy
 
 # ============================================================
 # Configuration
@@ -16,8 +30,17 @@ DATASETS = {
     "CIQUAL (transformé)": Path("data/processed/ciqual_transformed.parquet"),
 }
 
+ENRICHED_PATH = Path("data/enriched/off_enriched.parquet")
+CIQUAL_LOOKUP_PATH = Path("data/enriched/ciqual_lookup.parquet")
+
+BITMAP_PATH = Path("data/processed/off_bitmap.parquet")
+TAXONOMY_PATH = Path("data/processed/off_taxonomy.parquet")
+PERCENTILES_PATH = Path("data/enriched/category_percentiles.parquet")
+SKETCHES_PATH = Path("data/processed/off_sketches.parquet")
+
 HIDDEN_COLUMNS = {
     "code",
+    "ingredients_parsed",
     "join_key",
     "_dataset",
     "_source_file",
@@ -27,41 +50,61 @@ HIDDEN_COLUMNS = {
 # ============================================================
 # Utils chargement
 # ============================================================
-@st.cache_data
-def load_parquet(path: Path) -> pd.DataFrame:
+@st.cache_resource
+def load_dataset(path: Path) -> pd.DataFrame:
+    # Fichier Arrow projeté en mémoire s'il a été publié (partagé entre
+    # processus), sinon Parquet au schéma compact. cache_resource renvoie
+    # le même objet à chaque appel, sans copie : il ne doit pas être modifié.
     try:
-        return pd.read_parquet(path)
+        return load_frame(path)
     except Exception as e:
         return pd.DataFrame({"_load_error": [str(e)]})
 
 
-def normalize_text(s: pd.Series) -> pd.Series:
-    return (
-        s.fillna("")
-        .str.lower()
-        .str.normalize("NFKD")
-        .str.encode("ascii", errors="ignore")
-        .str.decode("utf-8")
-        .str.replace(r"[^a-z0-9 ]", "", regex=True)
-        .str.strip()
-    )
-
-
-@st.cache_data
+@st.cache_resource
 def load_joined_data():
-    off = load_parquet(DATASETS["OpenFoodFacts (transformé)"])
-    ciqual = load_parquet(DATASETS["CIQUAL (transformé)"])
+    # Produits enrichis appariés à CIQUAL (clé entière alim_code) et colonnes
+    # projetées de la table de référence, rattachées sans fusion de tables
+    off = load_dataset(ENRICHED_PATH)
+    try:
+        lookup = pd.read_parquet(CIQUAL_LOOKUP_PATH)
+    except Exception:
+        return pd.DataFrame()
 
-    if off.empty or ciqual.empty:
+    if off.empty or "alim_code" not in off.columns:
         return pd.DataFrame()
 
-    off = off.copy()
-    ciqual = ciqual.copy()
+    matched = off[off["alim_code"].notna()]
+    return attach_ciqual(matched, lookup).reset_index(drop=True)
 
-    off["join_key"] = normalize_text(off["product_name"])
-    ciqual["join_key"] = normalize_text(ciqual["alim_nom_fr"])
 
-    return off.merge(ciqual, on="join_key", how="inner", suffixes=("_off", "_ciqual"))
+@st.cache_resource
+def load_bitmap_index():
+    # Bitsets allergènes / additifs alignés sur les lignes d'OpenFoodFacts
+    off = load_dataset(DATASETS["OpenFoodFacts (transformé)"])
+    try:
+        return load_index(BITMAP_PATH, off)
+    except Exception:
+        return None
+
+
+@st.cache_resource
+def load_category_taxonomy():
+    # Catégories OFF : identifiants, hiérarchie et produits de chaque catégorie
+    off = load_dataset(DATASETS["OpenFoodFacts (transformé)"])
+    try:
+        return load_taxonomy(TAXONOMY_PATH, off)
+    except Exception:
+        return None
+
+
+@st.cache_resource
+def load_stat_sketches():
+    # Esquisses par partition (catégorie racine × Nutri-Score) pour le panneau Statistiques
+    try:
+        return load_sketches(SKETCHES_PATH)
+    except Exception:
+        return None
 
 
 # ============================================================
@@ -75,9 +118,9 @@ mode = st.sidebar.radio(
 )
 
 if mode == "OpenFoodFacts":
-    df = load_parquet(DATASETS["OpenFoodFacts (transformé)"])
+    df = load_dataset(DATASETS["OpenFoodFacts (transformé)"])
 elif mode == "CIQUAL":
-    df = load_parquet(DATASETS["CIQUAL (transformé)"])
+    df = load_dataset(DATASETS["CIQUAL (transformé)"])
 else:
     df = load_joined_data()
 
@@ -87,6 +130,10 @@ if df.empty:
 
 st.sidebar.success("Données transformées uniquement")
 
+bitmap = load_bitmap_index() if mode == "OpenFoodFacts" else None
+taxonomy = load_category_taxonomy() if mode == "OpenFoodFacts" else None
+sketches = load_stat_sketches() if mode == "OpenFoodFacts" else None
+
 # Colonnes autorisées UI
 UI_COLUMNS = [c for c in df.columns if c not in HIDDEN_COLUMNS]
 
@@ -130,33 +177,83 @@ text_search = st.sidebar.text_input("Recherche texte")
 
 num_filters = {}
 for c in [c for c in num_cols if c in UI_COLUMNS][:6]:
-    col = pd.to_numeric(df[c], errors="coerce")
+    col = pd.to_numeric(df[c], errors="coerce").astype(float)
     mn, mx = float(np.nanmin(col)), float(np.nanmax(col))
     if np.isfinite(mn) and np.isfinite(mx) and mn != mx:
         lo, hi = st.sidebar.slider(c, mn, mx, (mn, mx))
-        num_filters[c] = (lo, hi)
+        # Curseur laissé sur toute la plage : pas de filtre (les valeurs manquantes restent)
+        if (lo, hi) != (mn, mx):
+            num_filters[c] = (lo, hi)
+
+selected_grades = []
+if "nutriscore_grade" in df.columns:
+    grades = (
+        sketches.partitions["nutriscore_grade"].unique() if sketches is not None
+        else df["nutriscore_grade"].astype("string").str.lower().fillna("unknown").unique()
+    )
+    selected_grades = st.sidebar.multiselect("Nutri-Score", sorted(grades))
+
+selected_category = None
+if taxonomy is not None and len(taxonomy):
+    # Catégories les plus fournies d'abord
+    category_sizes = taxonomy.counts()
+    selected_category = st.sidebar.selectbox(
+        "Catégorie (sous-catégories incluses)",
+        [None] + np.argsort(-category_sizes, kind="stable").tolist(),
+        format_func=lambda c: "Toutes" if c is None else f"{taxonomy.labels[c]} ({category_sizes[c]})"
+    )
+
+excluded_allergens, excluded_additives = [], []
+if bitmap is not None:
+    excluded_allergens = st.sidebar.multiselect("Exclure les allergènes", bitmap.allergens)
+    excluded_additives = st.sidebar.multiselect("Exclure les additifs", bitmap.additives)
 
 
 def apply_filters(df):
-    out = df.copy()
+    # Masque calculé sur la table partagée (lecture seule), une seule sélection
+    keep = np.ones(len(df), dtype=bool)
 
     if text_search:
-        mask = pd.Series(False, index=out.index)
-        for c in out.select_dtypes(include="object").columns:
+        found = pd.Series(False, index=df.index)
+        for c in df.select_dtypes(include=["object", "string", "category"]).columns:
             if c in HIDDEN_COLUMNS:
                 continue
-            mask |= out[c].astype(str).str.contains(text_search, case=False, na=False)
-        out = out[mask]
+            found |= df[c].astype(str).str.contains(text_search, case=False, na=False)
+        keep &= found.to_numpy()
 
     for c, (lo, hi) in num_filters.items():
-        out[c] = pd.to_numeric(out[c], errors="coerce")
-        out = out[(out[c] >= lo) & (out[c] <= hi)]
+        col = pd.to_numeric(df[c], errors="coerce").astype(float).to_numpy()
+        keep &= (col >= lo) & (col <= hi)
+
+    if selected_grades:
+        grades = df["nutriscore_grade"].astype("string").str.lower().fillna("unknown")
+        keep &= grades.isin(selected_grades).to_numpy()
 
-    return out
+    if selected_category is not None:
+        members = np.zeros(len(df), dtype=bool)
+        members[taxonomy.members(selected_category, descendants=True)] = True
+        keep &= members
+
+    if excluded_allergens or excluded_additives:
+        keep &= bitmap.exclude(excluded_allergens + excluded_additives)
+
+    return df if keep.all() else df[keep]
 
 
 df_f = apply_filters(df)
 
+# Statistiques approchées : esquisses des partitions retenues fusionnées, sans
+# parcourir les lignes. Seuls les filtres alignés sur les partitions (grade
+# Nutri-Score) le permettent ; sinon, ou à la demande, calcul exact.
+exact_stats = sketches is None or st.sidebar.toggle("Statistiques exactes", value=False)
+sketch_view = None
+if not exact_stats and not (text_search or num_filters or selected_category is not None
+                            or excluded_allergens or excluded_additives):
+    sketch_view = sketches.merge({"nutriscore_grade": selected_grades})
+    if sketch_view.rows != len(df_f):
+        # Esquisses d'une autre version du fichier
+        sketch_view = None
+
 
 # ============================================================
 # Main UI
@@ -178,26 +275,79 @@ with left:
 
     if num_cols:
         st.subheader(f"Histogramme – {num_cols[0]}")
-        st.bar_chart(df_f[num_cols[0]].dropna().value_counts().head(40))
+        histogram = sketch_view.histogram(num_cols[0]) if sketch_view is not None else None
+        if histogram is None or histogram.empty:
+            histogram = df_f[num_cols[0]].dropna().value_counts().head(40)
+        st.bar_chart(histogram)
 
     csv = df_f[show_cols].to_csv(index=False).encode("utf-8")
     st.download_button("Télécharger CSV", csv, "export.csv", "text/csv")
 
 with right:
     st.subheader("Statistiques")
-    st.write(df_f[show_cols].describe(include="all").transpose())
+    if sketch_view is not None:
+        st.caption("Statistiques approchées (esquisses par partition)")
+        st.write(sketch_view.describe(show_cols))
+    else:
+        st.write(df_f[show_cols].describe(include="all").transpose())
 
 
 # ============================================================
 # IA
 # ============================================================
+@st.cache_resource
+def load_category_percentiles():
+    # Centiles par catégorie précalculés : classement sans parcours du catalogue
+    try:
+        return load_tables(PERCENTILES_PATH)
+    except Exception:
+        return None
+
+
 @st.cache_resource
 def init_ai():
-    return NutritionChatbot(), ProductAnalyzer(), ProductRecommender()
+    # Index de recherche des outils du chatbot, construits une fois par processus
+    ciqual = load_dataset(DATASETS["CIQUAL (transformé)"])
+    tools = CatalogueTools(
+        products=load_dataset(DATASETS["OpenFoodFacts (transformé)"]),
+        ciqual=ciqual
+    )
+    reference = CiqualIndex(ciqual) if "alim_nom_fr" in ciqual.columns else None
+    return (
+        NutritionChatbot(cache=SemanticCache(), tools=tools, reference=reference),
+        ProductAnalyzer(percentiles=load_category_percentiles()),
+        ProductRecommender()
+    )
 
 
 chatbot, analyzer, recommender = init_ai()
 
+
+@st.cache_resource
+def start_pregeneration():
+    # Une fois par processus, si demandé par le pipeline : les analyses
+    # passent par la même file LLM que les sessions, en priorité batch
+    limit = os.getenv("PREGENERATE_LIMIT")
+    if not limit:
+        return None
+    return start_background(
+        limit=int(limit),
+        concurrency=int(os.getenv("PREGENERATE_CONCURRENCY", "4")),
+        analyzer=ProductAnalyzer(priority="batch", percentiles=load_category_percentiles())
+    )
+
+
+start_pregeneration()
+
+
+@st.cache_resource
+def build_nutrient_index():
+    # Index construit une fois par processus, partagé entre sessions
+    data = load_dataset(DATASETS["OpenFoodFacts (transformé)"])
+    if data.empty or not set(NUTRIENT_FEATURES) & set(data.columns):
+        return None
+    return NutrientIndex(data)
+
 # ============================================================
 # Produit actif
 # ============================================================
@@ -222,13 +372,58 @@ current_product = df[df[product_col] == selected_product].iloc[0].to_dict()
 # ============================================================
 st.header("Analyse nutritionnelle IA")
 
+# Les modèles sont partagés entre les utilisateurs : chaque session Streamlit
+# dispose de son propre historique côté chatbot et de sa place dans la file
+# d'attente des appels LLM.
+if "session_id" not in st.session_state:
+    st.session_state.session_id = uuid4().hex
+
+local_result = analyzer.score_breakdown(current_product)
+if local_result["success"]:
+    st.markdown(local_result["analysis"])
+
+ranking = analyzer.category_ranking(current_product)
+if ranking and ranking["percentiles"]:
+    st.markdown(f"**Position parmi {ranking['category']}** ({ranking['count']} produits)")
+    st.dataframe(
+        pd.DataFrame({
+            "Nutriment / score": [RANKING_LABELS.get(c, c) for c in ranking["percentiles"]],
+            "Centile": [round(p) for p in ranking["percentiles"].values()],
+        }),
+        hide_index=True
+    )
+
+
+@st.cache_data(ttl=60)
+def load_pregenerated_analyses():
+    # Relu périodiquement : la pré-génération peut tourner en arrière-plan
+    try:
+        return analyses_by_code()
+    except Exception:
+        return {}
+
+
 if st.button("Analyser ce produit"):
-    with st.spinner("Analyse en cours..."):
-        result = analyzer.analyze(current_product)
+    result = None
+    pregenerated = load_pregenerated_analyses().get(code_key(current_product.get("code")))
+
+    if pregenerated is not None:
+        result = {
+            "success": True,
+            "analysis": pregenerated["analysis"],
+            "model_used": f"{pregenerated['model_used']} (pré-générée)",
+            "prompt_tokens": pregenerated["prompt_tokens"],
+        }
+    else:
+        with st.spinner("Analyse en cours..."):
+            result = analyzer.analyze(current_product, session_id=st.session_state.session_id)
 
     if result["success"]:
         st.markdown(result["analysis"])
-        st.caption(f"Modèle utilisé : {result['model_used']}")
+        st.caption(
+            f"Modèle utilisé : {result['model_used']} · "
+            f"Prompt : {result['prompt_tokens']} tokens"
+        )
     else:
         st.error(result["error"])
 
@@ -241,27 +436,56 @@ st.header("Chat nutritionnel")
 if "chat_history" not in st.session_state:
     st.session_state.chat_history = []
 
-with st.form("chat_form"):
-    user_message = st.text_area("Votre question")
-    submitted = st.form_submit_button("Envoyer")
 
-    if submitted and user_message.strip():
-        response = chatbot.chat(
-            user_message=user_message,
-            context={"current_product": current_product}
-        )
+def stream_answer(question: str):
+    """Affiche la réponse du chatbot au fil de l'eau et l'ajoute à l'historique."""
+    response = chatbot.chat(
+        user_message=question,
+        context={"current_product": current_product},
+        stream=True,
+        session_id=st.session_state.session_id
+    )
+    stats = response["stats"]
+
+    st.markdown(f"**Vous :** {question}")
+    st.write_stream(response["stream"])
+
+    if stats["success"] and not stats["response"].strip():
+        st.warning("Réponse vide : le modèle n'a renvoyé aucun texte.")
+        st.caption(stream_caption(stats))
+    elif stats["success"]:
+        st.session_state.chat_history.extend([
+            ("Vous", question),
+            ("NutriScan", stats["response"]),
+        ])
+        if stats["tool_calls"]:
+            with st.expander(f"Recherches locales ({len(stats['tool_calls'])})"):
+                for call in stats["tool_calls"]:
+                    st.caption(f"{call['name']} · {call['ms']:.1f} ms")
+                    st.code(call["arguments"], language="json")
+        st.caption(stream_caption(stats))
+    else:
+        st.error(stats.get("error", "Réponse vide"))
 
-        if response["success"]:
-            st.session_state.chat_history.extend([
-                ("Vous", user_message),
-                ("NutriScan", response["response"]),
-            ])
-        else:
-            st.error(response["error"])
 
 for role, msg in st.session_state.chat_history:
     st.markdown(f"**{role} :** {msg}")
 
+if chatbot.cache is not None:
+    cache_stats = chatbot.cache.stats()
+    st.caption(
+        f"Cache de questions : {cache_stats['hit_rate']:.0%} de succès "
+        f"({cache_stats['hits']}/{cache_stats['lookups']}) · "
+        f"recherche {cache_stats['avg_lookup_ms']:.2f} ms"
+    )
+
+with st.form("chat_form"):
+    user_message = st.text_area("Votre question")
+    submitted = st.form_submit_button("Envoyer")
+
+    if submitted and user_message.strip():
+        stream_answer(user_message)
+
 
 # ============================================================
 # Suggestions
@@ -273,12 +497,7 @@ suggestions = chatbot.suggest_questions(context={"current_product": current_prod
 cols = st.columns(2)
 for i, q in enumerate(suggestions):
     if cols[i % 2].button(q):
-        response = chatbot.chat(q, context={"current_product": current_product})
-        if response["success"]:
-            st.session_state.chat_history.extend([
-                ("Vous", q),
-                ("NutriScan", response["response"]),
-            ])
+        stream_answer(q)
 
 
 # ============================================================
@@ -286,16 +505,42 @@ for i, q in enumerate(suggestions):
 # ============================================================
 st.header("Produits alternatifs plus sains")
 
+PREFERENCE_OPTIONS = {"Bio": "bio", "Vegan": "vegan", "Sans gluten": "sans_gluten"}
+
+selected_preferences = st.multiselect("Préférences", list(PREFERENCE_OPTIONS))
+preferences = {PREFERENCE_OPTIONS[p]: True for p in selected_preferences}
+
 if st.button("Suggérer des alternatives"):
-    candidates = df.sample(min(10, len(df))).to_dict(orient="records")
+    nutrient_index = build_nutrient_index() if mode == "OpenFoodFacts" else None
+
+    if nutrient_index is not None:
+        # Les filtres d'exclusion de l'explorateur s'appliquent aussi aux alternatives
+        eligible = ProductRecommender.healthier_mask(
+            nutrient_index.df, max_nutriscore=None, preferences=preferences,
+            exclude_allergens=excluded_allergens, exclude_additives=excluded_additives,
+            bitmap=bitmap, taxonomy=taxonomy
+        )
+        shortlist = nutrient_index.query(current_product, k=5, mask=eligible)
+        if shortlist.empty:
+            st.info("Aucun produit similaire avec un meilleur Nutri-Score.")
+            st.stop()
+        st.caption(f"Catégorie la plus proche : {shortlist['category_match'].iloc[0]}")
+        candidates = shortlist.drop(columns=["distance", "category_match"]).to_dict(orient="records")
+    else:
+        candidates = df.sample(min(10, len(df))).to_dict(orient="records")
 
     result = recommender.recommend(
         original_product=current_product,
-        candidate_products=candidates
+        candidate_products=candidates,
+        preferences=preferences,
+        session_id=st.session_state.session_id
     )
 
     if result["success"]:
         st.markdown(result["recommendations"])
-        st.caption(f"Modèle utilisé : {result['model_used']}")
+        st.caption(
+            f"Modèle utilisé : {result['model_used']} · "
+            f"Prompt : {result['prompt_tokens']} tokens"
+        )
     else:
         st.error(result["error"])
@@ -0,0 +1,693 @@
+import os
+import warnings
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.enricher.arrow_store import ipc_path, load_frame, open_ipc, publish_ipc
+from src.enricher.bitmap_index import BitmapIndex, load_index
+from src.enricher.ciqual_join import attach_ciqual, ciqual_lookup, match_ciqual
+from src.enricher.dataset_store import category_root, read_dataset, scan_plan, write_dataset
+from src.enricher.enrich_data import enrich_off_with_ciqual
+from src.enricher.nutriscore import compute_nutriscore
+from src.enricher.pregenerate_analyses import (
+    analyses_by_code,
+    code_key,
+    compact,
+    pregenerate,
+    single_run,
+)
+from src.enricher.percentiles import CATALOGUE, PercentileTables, load_tables
+from src.enricher.schema import apply_schema, memory_report
+from src.enricher.sketches import HyperLogLog, SketchStore, TDigest, load_sketches, value_hashes
+from src.enricher.taxonomy import NO_PARENT, Taxonomy, load_taxonomy
+from src.enricher.text import normalize_name, normalize_series
+from utils import transformer
+from utils.transformer import INGREDIENTS_TYPE, ingredients_table, parse_ingredients, parse_ingredients_column
+
+# ============================================================================
+# FIXTURES
+# ============================================================================
+
+@pytest.fixture
+def off_sample():
+    return pd.DataFrame([
+        {"product_name": "Nutella", "categories": "Produits à tartiner",
+         "nutriscore_grade": "e", "energy_kcal_100g": 539, "sugars_100g": 56.3,
+         "saturated_fat_100g": 10.6, "salt_100g": 0.107, "fiber_100g": None,
+         "proteins_100g": 6.3},
+        {"product_name": "Flocons d'avoine", "categories": "Aliments et boissons à base de végétaux,Céréales",
+         "nutriscore_grade": "a", "energy_kcal_100g": 370, "sugars_100g": 1.1,
+         "saturated_fat_100g": 1.3, "salt_100g": 0.01, "fiber_100g": 10,
+         "proteins_100g": 13},
+        {"product_name": "Jus d'orange", "categories": "Boissons,Jus de fruits",
+         "nutriscore_grade": "c", "energy_kcal_100g": 45, "sugars_100g": 9,
+         "saturated_fat_100g": 0, "salt_100g": 0, "fiber_100g": None,
+         "proteins_100g": 0.7},
+        {"product_name": "Eau", "categories": "Boissons,Eaux minérales",
+         "nutriscore_grade": "a", "energy_kcal_100g": 0, "sugars_100g": 0,
+         "saturated_fat_100g": 0, "salt_100g": 0, "fiber_100g": None,
+         "proteins_100g": 0},
+        {"product_name": "Incomplet", "categories": "Snacks",
+         "nutriscore_grade": "unknown", "energy_kcal_100g": None, "sugars_100g": 10,
+         "saturated_fat_100g": 1, "salt_100g": 0.2, "fiber_100g": None,
+         "proteins_100g": 2},
+    ])
+
+
+# ============================================================================
+# TESTS : Nutri-Score local
+# ============================================================================
+
+class TestNutriScore:
+
+    def test_points_and_grades(self, off_sample):
+        result = compute_nutriscore(off_sample)
+
+        assert list(result["ns_score"].iloc[:4]) == [26, -5, 13, 0]
+        assert list(result["ns_grade_computed"].iloc[:4]) == ["e", "a", "e", "a"]
+        assert result["ns_points_energy"].iloc[0] == 6
+        assert not result["ns_proteins_counted"].iloc[0]
+        assert result["ns_proteins_counted"].iloc[1]
+
+    def test_mismatch_flags(self, off_sample):
+        result = compute_nutriscore(off_sample)
+        assert list(result["ns_grade_mismatch"]) == [False, False, True, False, False]
+
+    def test_missing_nutrients(self, off_sample):
+        result = compute_nutriscore(off_sample)
+        assert np.isnan(result["ns_score"].iloc[4])
+        assert result["ns_grade_computed"].iloc[4] is pd.NA
+        assert result["ns_grade_computed"].dtype == "string"
+        assert result["ns_points_sugars"].isna().iloc[4]
+
+
+# ============================================================================
+# TESTS : Pré-génération des analyses
+# ============================================================================
+
+class FakeAnalyzer:
+
+    def __init__(self, fail_codes=()):
+        self.calls = []
+        self.fail_codes = set(fail_codes)
+
+    def analyze(self, product):
+        self.calls.append(product["code"])
+        if product["code"] in self.fail_codes:
+            return {"success": False, "error": "Erreur IA"}
+        return {
+            "success": True,
+            "analysis": f"Analyse de {product['product_name']}",
+            "model_used": "fake",
+            "prompt_tokens": 10,
+        }
+
+
+class TestPregenerateAnalyses:
+
+    def test_code_key(self):
+        assert code_key(3017620422003.0) == "3017620422003"
+        assert code_key("0012345") == "0012345"
+        assert code_key(float("nan")) is None
+
+    def test_resume_and_compact(self, tmp_path):
+        path, parts = tmp_path / "analyses.parquet", tmp_path / "parts"
+        products = pd.DataFrame({
+            "code": [str(i) for i in range(5)],
+            "product_name": [f"Produit {i}" for i in range(5)],
+        })
+
+        first = FakeAnalyzer(fail_codes={"3"})
+        stats = pregenerate(products, first, concurrency=2, checkpoint_every=2,
+                            path=path, parts_dir=parts)
+        assert stats == {"generated": 4, "skipped": 0, "failed": 1, "total": 5}
+        assert len(list(parts.glob("part-*.parquet"))) == 2
+
+        # Reprise : seul le produit en échec est retenté
+        second = FakeAnalyzer()
+        stats = pregenerate(products, second, path=path, parts_dir=parts)
+        assert second.calls == ["3"]
+        assert stats["skipped"] == 4
+
+        assert compact(path, parts) == 5
+        assert not parts.exists()
+        analyses = analyses_by_code(path, parts)
+        assert analyses["3"]["analysis"] == "Analyse de Produit 3"
+
+    def test_compact_after_interrupted_write(self, tmp_path):
+        path, parts = tmp_path / "analyses.parquet", tmp_path / "parts"
+        products = pd.DataFrame({"code": ["1", "2", "3"], "product_name": ["A", "B", "C"]})
+
+        # Temporaires d'écritures interrompues (dans et à côté du dossier des lots)
+        parts.mkdir()
+        (parts / "part-00000.tmp").write_bytes(b"partiel")
+        (tmp_path / ".part-interrompu.tmp").write_bytes(b"partiel")
+
+        pregenerate(products, FakeAnalyzer(), checkpoint_every=1, path=path, parts_dir=parts)
+        assert len(list(parts.glob("part-*.parquet"))) == 3
+
+        assert compact(path, parts) == 3
+        assert not parts.exists() and not list(tmp_path.glob(".*.tmp"))
+
+    def test_single_run_lock(self, tmp_path):
+        lock = tmp_path / "analyses.lock"
+        with single_run(lock):
+            assert lock.read_text() == str(os.getpid())
+            with pytest.raises(RuntimeError, match=str(os.getpid())):
+                with single_run(lock):
+                    pass
+
+        # Verrou rendu à la sortie ; un pid resté dans le fichier ne bloque rien
+        lock.write_text("999999999")
+        with single_run(lock):
+            assert lock.read_text() == str(os.getpid())
+
+
+# ============================================================================
+# TESTS : Jeu Parquet partitionné
+# ============================================================================
+
+class TestDatasetStore:
+
+    @pytest.fixture
+    def catalogue(self, off_sample):
+        rng = np.random.default_rng(0)
+        df = off_sample.iloc[rng.integers(0, len(off_sample), 400)].reset_index(drop=True)
+        df["sugars_100g"] = rng.uniform(0, 60, len(df)).round(1)
+        return df
+
+    def test_category_root(self, off_sample):
+        roots = category_root(off_sample["categories"], max_partitions=1)
+        assert list(roots) == ["autres", "autres", "boissons", "boissons", "autres"]
+        assert category_root(pd.Series(["Produits laitiers,Yaourts", None]))[0] == "produits-laitiers"
+
+    def test_roundtrip_and_pruning(self, catalogue, tmp_path):
+        root = tmp_path / "off"
+        written = write_dataset(catalogue, root, row_group_size=20)
+        assert written["rows"] == 400
+        assert (root / "category_root=boissons" / "nutriscore_grade=a").is_dir()
+
+        filters = [("nutriscore_grade", "in", ["a"]), ("sugars_100g", "<=", 10)]
+        result = read_dataset(root, filters)
+        expected = catalogue[(catalogue["nutriscore_grade"] == "a") & (catalogue["sugars_100g"] <= 10)]
+        assert len(result) == len(expected)
+        assert sorted(result["product_name"]) == sorted(expected["product_name"])
+
+        plan = scan_plan(root, filters)
+        assert plan["files_scanned"] < plan["files"]
+        # Lignes triées par sucres : les groupes au-delà de 10 g sont écartés
+        assert plan["row_groups_scanned"] < scan_plan(root, filters[:1])["row_groups_scanned"]
+
+    def test_rewrite_replaces_partitions(self, catalogue, tmp_path):
+        root = tmp_path / "off"
+        write_dataset(catalogue, root)
+        write_dataset(catalogue[catalogue["nutriscore_grade"] == "a"], root)
+
+        assert len(read_dataset(root)) == (catalogue["nutriscore_grade"] == "a").sum()
+        with pytest.raises(ValueError):
+            read_dataset(root, [("sugars_100g", "~", 1)])
+
+
+# ============================================================================
+# TESTS : Schéma compact
+# ============================================================================
+
+class TestSchema:
+
+    def test_apply_schema_types(self, off_sample):
+        df = off_sample.assign(
+            code=[3017620425035.0, None, 76, 42, 1],
+            nova_group=[4, None, 1, 1, 3],
+            additives_n=[1.0, 0.0, None, 0.0, 2.0],
+            brands=["Ferrero", None, "Tropicana", "Evian", "X"],
+        )
+        compact = apply_schema(df)
+
+        assert compact["code"].tolist()[:1] == ["3017620425035"]
+        assert compact["code"].isna().sum() == 1
+        assert compact["sugars_100g"].dtype == np.float32
+        assert str(compact["nova_group"].dtype) == "Int8"
+        assert compact["nova_group"].isna().sum() == 1
+        assert str(compact["additives_n"].dtype) == "Int16"
+        assert compact["nutriscore_grade"].dtype == "category"
+        # Marques et catégories quasi uniques : chaînes, pas de dictionnaire
+        assert compact["brands"].dtype == compact["categories"].dtype == compact["code"].dtype
+        assert compact.iloc[1].to_dict()["nova_group"] is None
+        # Colonnes inconnues et déjà typées laissées telles quelles
+        assert apply_schema(compact.assign(other=[1] * 5))["other"].dtype == np.int64
+
+    def test_memory_report(self, off_sample):
+        df = pd.concat([off_sample] * 200, ignore_index=True)
+        report = memory_report(df, apply_schema(df))
+        assert report.loc["TOTAL", "bytes_after"] < report.loc["TOTAL", "bytes_before"]
+        assert report.loc["sugars_100g", "bytes_after"] == 4
+
+    def test_nutriscore_unchanged_on_float32(self, off_sample):
+        # 3.7 g de fibres : pile sur un seuil, float32(3.7) vaut 3.7000000477
+        df = off_sample.assign(fiber_100g=[3.7, 2.8, 0.9, None, 1.9])
+        expected = compute_nutriscore(df)
+        result = compute_nutriscore(apply_schema(df))
+        pd.testing.assert_series_equal(result["ns_score"], expected["ns_score"])
+        assert list(result["ns_points_fiber"]) == list(expected["ns_points_fiber"])
+
+
+# ============================================================================
+# TESTS : Arrow IPC partagé
+# ============================================================================
+
+class TestArrowStore:
+
+    def test_roundtrip_matches_schema(self, off_sample, tmp_path):
+        path = tmp_path / "off.arrow"
+        assert publish_ipc(off_sample, path)["rows"] == 5
+
+        shared = open_ipc(path)
+        pd.testing.assert_frame_equal(shared, apply_schema(off_sample), check_categorical=False)
+        assert shared["fiber_100g"].isna().sum() == 4
+
+    def test_zero_copy_columns(self, off_sample, tmp_path):
+        path = tmp_path / "off.arrow"
+        publish_ipc(off_sample, path)
+        sugars = open_ipc(path)["sugars_100g"].to_numpy()
+        # Buffer du fichier projeté : lecture seule, pas de copie
+        assert not sugars.flags.writeable
+
+    def test_load_frame_prefers_fresh_arrow(self, off_sample, tmp_path):
+        parquet = tmp_path / "off.parquet"
+        off_sample.to_parquet(parquet, index=False)
+        assert load_frame(parquet)["sugars_100g"].dtype == np.float32
+
+        publish_ipc(off_sample.head(2), ipc_path(parquet))
+        assert len(load_frame(parquet)) == 2
+
+
+# ============================================================================
+# TESTS : Normalisation des noms
+# ============================================================================
+
+class TestTextNormalization:
+
+    def test_normalize_name(self):
+        assert normalize_name("Pâte à tartiner, 13% !") == "pate a tartiner 13"
+        assert normalize_name("  Crème   fraîche ") == "creme fraiche"
+
+    def test_series_by_unique_value(self):
+        names = pd.Series(["Pâté", None, "PATE", "Pâté"] * 50, index=range(100, 300))
+        normalize_name.cache_clear()
+        keys = normalize_series(names)
+
+        assert keys.index.equals(names.index)
+        assert list(keys[:4]) == ["pate", "", "pate", "pate"]
+        assert normalize_name.cache_info().misses == 2
+        assert normalize_series(names.astype("category")).equals(keys)
+
+
+# ============================================================================
+# TESTS : Jointure OFF × CIQUAL
+# ============================================================================
+
+class TestCiqualJoin:
+
+    @pytest.fixture
+    def ciqual_sample(self):
+        return pd.DataFrame({
+            "alim_code": [7111, 2074, 2075, 11090],
+            "alim_nom_fr": ["Pain de mie, complet", "Jus de pomme, pur jus", "Jus de pomme pur jus", None],
+            "alim_grp_nom_fr": ["céréales", "boissons", "boissons", "condiments"],
+            "sucres (g/100 g)": [4.5, 9.8, 10.1, 0.4],
+            "eau (g/100 g)": [35.0, 88.0, 87.5, 93.0],
+            "cendres (g/100 g)": [1.8, 0.3, 0.3, 0.5],
+        })
+
+    def test_match_by_normalized_name(self, ciqual_sample):
+        names = pd.Series(["PAIN DE MIE COMPLET", "Jus de pomme pur jus", "Nutella", None] * 3)
+        ids = match_ciqual(names, ciqual_sample)
+
+        assert str(ids.dtype) == "Int32"
+        # Deux aliments de même clé : le premier est retenu
+        assert list(ids[:2]) == [7111, 2074]
+        assert ids[2:4].isna().all()
+        assert ids.notna().sum() == 6
+
+    def test_lookup_is_projected_and_attached(self, off_sample, ciqual_sample):
+        off = off_sample.assign(product_name=["Pain de mie complet"] + list(off_sample["product_name"][1:]))
+        enriched, lookup = enrich_off_with_ciqual(off, ciqual_sample, nutrients=["sucres (g/100 g)"])
+
+        assert len(enriched) == len(off)
+        assert not set(ciqual_sample.columns) - {"alim_code"} & set(enriched.columns)
+        assert list(lookup.columns) == ["alim_code", "alim_nom_fr", "alim_grp_nom_fr", "sucres (g/100 g)"]
+        # Seuls les aliments appariés sont conservés
+        assert list(lookup["alim_code"]) == list(enriched["alim_code"].dropna())
+
+        attached = attach_ciqual(enriched, lookup, ["sucres (g/100 g)"])
+        assert attached["sucres (g/100 g)"].iloc[0] == 4.5
+        assert attached["sucres (g/100 g)"].iloc[1:].isna().all()
+        assert list(ciqual_lookup(ciqual_sample)["alim_code"]) == [2074, 2075, 7111, 11090]
+
+    def test_protein_ratio_missing_values(self, off_sample, ciqual_sample):
+        off = off_sample.assign(proteins_100g=[6.3, None, 0.7, 0, 2])
+        enriched, _ = enrich_off_with_ciqual(off, ciqual_sample)
+        ratio = enriched["protein_ratio"]
+
+        assert ratio.iloc[0] == pytest.approx(6.3 / 539)
+        # Protéines inconnues, énergie nulle ou absente : ratio manquant, pas 0
+        assert ratio.iloc[[1, 3, 4]].isna().all()
+        assert ratio.iloc[2] == pytest.approx(0.7 / 45)
+
+
+# ============================================================================
+# TESTS : Analyse des ingrédients
+# ============================================================================
+
+class TestIngredientParser:
+
+    TEXT = ("Céréale 50 % (Farine de blé 34,8 %, farine d'orge), sucre, "
+            "émulsifiants: lécithines [SOJA]. Peut contenir des traces de lait.")
+
+    def test_nested_percentages(self):
+        parsed = parse_ingredients(self.TEXT)
+
+        assert [i["text"] for i in parsed] == ["Céréale", "sucre", "émulsifiants"]
+        assert parsed[0]["percent"] == 50.0
+        assert parsed[0]["ingredients"][0] == {"text": "Farine de blé", "percent": 34.8, "ingredients": []}
+        # « Peut contenir » n'est pas un ingrédient
+        assert not any("contenir" in i["text"].lower() for i in parsed)
+
+    def test_colon_and_bracket_nesting(self):
+        additives = parse_ingredients(self.TEXT)[2]
+
+        assert additives["ingredients"][0]["text"] == "lécithines"
+        assert additives["ingredients"][0]["ingredients"][0]["text"] == "SOJA"
+        assert parse_ingredients(None) == [] and parse_ingredients("") == []
+
+    def test_colon_list_runs_to_end_of_sentence(self):
+        parsed = parse_ingredients(
+            "Pâte 60 % (farine de blé, eau), garniture 40 % : tomate, mozzarella (lait, sel), origan. Sel"
+        )
+
+        assert [i["text"] for i in parsed] == ["Pâte", "garniture", "Sel"]
+        assert parsed[1]["percent"] == 40.0
+        assert [i["text"] for i in parsed[1]["ingredients"]] == ["tomate", "mozzarella", "origan"]
+        assert [i["text"] for i in parsed[1]["ingredients"][1]["ingredients"]] == ["lait", "sel"]
+
+        # Une nouvelle sous-liste ferme la précédente
+        classes = parse_ingredients("acidifiant : acide citrique, conservateur : sorbate de potassium")
+        assert [i["text"] for i in classes] == ["acidifiant", "conservateur"]
+
+    def test_percentage_annotation_belongs_to_parent(self):
+        parsed = parse_ingredients("lait (3,5% MG), crème (30 % de matière grasse), sauce (tomates 40%)")
+
+        assert parsed[0] == {"text": "lait", "percent": 3.5, "ingredients": []}
+        assert parsed[1] == {"text": "crème", "percent": 30.0, "ingredients": []}
+        # Un vrai sous-ingrédient garde son pourcentage
+        assert parsed[2]["percent"] is None
+        assert parsed[2]["ingredients"] == [{"text": "tomates", "percent": 40.0, "ingredients": []}]
+
+    def test_column_is_memoized(self):
+        transformer._PARSE_CACHE.clear()
+        texts = pd.Series([self.TEXT, "Eau, sucre 10%", None, self.TEXT])
+        parsed = parse_ingredients_column(texts)
+
+        assert len(transformer._PARSE_CACHE) == 2
+        assert parsed[0] is parsed[3]
+        assert parsed[2] == []
+        assert parsed[1][1]["percent"] == 10.0
+        assert parse_ingredients_column(texts)[0] is parsed[0]
+
+    def test_transform_parses_without_copy_warning(self, tmp_path, monkeypatch):
+        pd.DataFrame({
+            "code": ["0123", "4567"],
+            "product_name": ["Pâte à tartiner", ""],
+            "nutriscore_grade": ["E", "a"],
+            "ecoscore_grade": ["d", None],
+            "ingredients_text": [self.TEXT, "eau"],
+        }).to_csv(tmp_path / "openfoodfacts_products.csv", index=False)
+        monkeypatch.setattr(transformer, "RAW_DIR", tmp_path)
+
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter("always")
+            df = transformer.transform_openfoodfacts()
+
+        assert not [w for w in caught if w.category.__name__ == "SettingWithCopyWarning"]
+
+        assert list(df["code"]) == ["0123"]
+        assert df["ingredients_parsed"].iloc[0] == parse_ingredients(self.TEXT)
+
+    def test_arrow_table_type(self):
+        df = pd.DataFrame({"code": ["1", "2"], "ingredients_text": [self.TEXT, None]})
+        df["ingredients_parsed"] = parse_ingredients_column(df["ingredients_text"])
+        table = ingredients_table(df)
+
+        assert table.schema.field("ingredients_parsed").type == INGREDIENTS_TYPE
+        assert table.column("ingredients_parsed").to_pylist()[0][0]["percent"] == 50.0
+
+
+# ============================================================================
+# TESTS : Index bitmap allergènes / additifs
+# ============================================================================
+
+class TestBitmapIndex:
+
+    @pytest.fixture
+    def products(self):
+        return pd.DataFrame({
+            "code": ["1", "2", "3", "4"],
+            "allergens": ["en:gluten,en:milk", "en:milk", None, "en:peanuts"],
+            "ingredients_text": ["Farine, lait, E 322", "Lait, acidifiant : e330", "Eau", "Arachides, E322, E471"],
+        }).astype({"allergens": "category"})
+
+    def test_vocabulary_and_queries(self, products):
+        index = BitmapIndex.from_frame(products)
+
+        assert index.allergens == ["gluten", "milk", "peanuts"]
+        assert index.additives == ["e322", "e330", "e471"]
+        assert list(index.exclude(["en:milk"])) == [False, False, True, True]
+        assert list(index.exclude(["gluten", "E-471"])) == [False, True, True, False]
+        assert list(index.include(["milk", "e322"])) == [True, False, False, False]
+        # Un terme inconnu n'exclut rien et n'est contenu nulle part
+        assert index.exclude(["nuts"]).all() and not index.include(["nuts"]).any()
+        assert index.counts()["milk"] == 2
+        assert index.terms(3) == ["peanuts", "e322", "e471"]
+
+    def test_many_terms_span_words(self):
+        df = pd.DataFrame({"code": ["a", "b"], "ingredients_text": [
+            ", ".join(f"E{n}" for n in range(100, 200)), "E199"]})
+        index = BitmapIndex.from_frame(df)
+
+        assert index.bits.shape == (2, 2)
+        assert list(index.exclude(["e199"])) == [False, False]
+        assert list(index.exclude(["e150"])) == [False, True]
+
+    def test_save_load_and_align(self, products, tmp_path):
+        index = BitmapIndex.from_frame(products)
+        index.save(tmp_path / "bitmap.parquet")
+
+        # Ordre différent, et un code absent de l'index (aucun bit)
+        shuffled = products.iloc[[2, 0, 3, 1]].assign(code=["3", "1", "4", "9"])
+        loaded = load_index(tmp_path / "bitmap.parquet", shuffled)
+
+        assert loaded.vocabulary == index.vocabulary
+        assert list(loaded.exclude(["milk", "peanuts"])) == [True, False, False, True]
+        assert list(load_index(tmp_path / "absent.parquet", products).exclude(["milk"])) == [False, False, True, True]
+
+
+# ============================================================================
+# TESTS : Taxonomie des catégories
+# ============================================================================
+
+class TestTaxonomy:
+
+    @pytest.fixture
+    def products(self):
+        return pd.DataFrame({
+            "code": ["1", "2", "3", "4", "5"],
+            "categories": [
+                "Snacks,Snacks sucrés,Biscuits",
+                "Snacks, Snacks sucrés, Biscuits, Biscuits au chocolat",
+                "en:Snacks,Snacks sucrés,Chocolats",
+                "Boissons,Jus de fruits",
+                None,
+            ],
+            "sugars_100g": [20.0, 30.0, 50.0, 10.0, 5.0],
+        })
+
+    def test_hierarchy(self, products):
+        taxonomy = Taxonomy.from_frame(products)
+        snacks, biscuits = taxonomy.id_of("Snacks"), taxonomy.id_of("en:biscuits")
+
+        assert len(taxonomy) == 7
+        assert taxonomy.parents[snacks] == NO_PARENT
+        assert [taxonomy.labels[c] for c in taxonomy.path(biscuits)] == ["Snacks", "Snacks sucrés", "Biscuits"]
+        assert [taxonomy.labels[c] for c in taxonomy.children(taxonomy.id_of("snacks sucres"))] == \
+            ["Biscuits", "Chocolats"]
+        assert taxonomy.frame().set_index("label").loc["Biscuits au chocolat", "depth"] == 3
+
+    def test_membership_and_aggregates(self, products):
+        taxonomy = Taxonomy.from_frame(products)
+        snacks, biscuits = taxonomy.id_of("Snacks"), taxonomy.id_of("Biscuits")
+
+        assert list(taxonomy.members(biscuits)) == [0, 1]
+        assert list(taxonomy.members(snacks, descendants=True)) == [0, 1, 2]
+        assert list(taxonomy.mask(taxonomy.matching(["jus"]))) == [False, False, False, True, False]
+        # Mots entiers : « biscuit » ne couvre pas « biscuits »
+        assert taxonomy.matching(["biscuit"], whole_words=True) == []
+        assert len(taxonomy.matching(["biscuits"], whole_words=True)) == 2
+        assert [taxonomy.labels[c] for c in taxonomy.categories_of(2)] == ["Chocolats", "Snacks", "Snacks sucrés"]
+        assert len(taxonomy.categories_of(4)) == 0
+
+        means = taxonomy.aggregate(products["sugars_100g"].to_numpy())
+        assert means[biscuits] == 25.0 and means[snacks] == pytest.approx(100 / 3)
+        assert taxonomy.aggregate(products["sugars_100g"].to_numpy(), how="count")[snacks] == 3
+
+    def test_save_and_reload(self, products, tmp_path):
+        taxonomy = Taxonomy.from_frame(products)
+        taxonomy.save(tmp_path / "taxonomy.parquet")
+        loaded = load_taxonomy(tmp_path / "taxonomy.parquet", products)
+
+        assert loaded.keys == taxonomy.keys
+        assert list(loaded.parents) == list(taxonomy.parents)
+        assert list(loaded.indices) == list(taxonomy.indices)
+
+        # Catalogue réordonné : l'empreinte diffère, la taxonomie est reconstruite
+        rebuilt = load_taxonomy(tmp_path / "taxonomy.parquet", products.iloc[::-1])
+        assert list(rebuilt.members(rebuilt.id_of("Biscuits"))) == [3, 4]
+
+
+# ============================================================================
+# TESTS : Centiles par catégorie
+# ============================================================================
+
+class TestPercentileTables:
+
+    @pytest.fixture
+    def products(self):
+        rng = np.random.default_rng(0)
+        n = 3000
+        categories = np.where(np.arange(n) % 3 == 0, "Snacks,Chocolats", "Snacks,Biscuits")
+        categories[-5:] = "Boissons"
+        return pd.DataFrame({
+            "code": np.arange(n).astype(str),
+            "categories": categories,
+            "sugars_100g": np.where(np.arange(n) % 3 == 0, rng.uniform(40, 60, n), rng.uniform(10, 30, n)),
+            "additives_n": rng.integers(0, 4, n),
+        })
+
+    def test_reference_category(self, products):
+        tables = PercentileTables.from_frame(products)
+
+        assert tables.columns == ["sugars_100g", "additives_n"]
+        assert tables.label(tables.category_of("en:Snacks,Chocolats")) == "Chocolats"
+        assert tables.label(tables.category_of("Snacks,Inconnue")) == "Snacks"
+        # Moins de MIN_PRODUCTS produits : catalogue entier
+        assert tables.category_of("Boissons") == CATALOGUE
+        assert tables.label(CATALOGUE) == "tout le catalogue"
+
+    def test_rank_matches_scan(self, products):
+        tables = PercentileTables.from_frame(products)
+        categories = tables.categories_for(products["categories"])
+        ranks = tables.rank("sugars_100g", products["sugars_100g"], categories)
+
+        sugars = products["sugars_100g"].to_numpy()
+        for category in np.unique(categories):
+            members = categories == category
+            pool = sugars if category == CATALOGUE else sugars[members]
+            exact = (sugars[members][:, None] > pool[None, :]).mean(axis=1) * 100
+            assert np.abs(ranks[members] - exact).max() < 1.5
+
+        single = tables.rank("sugars_100g", products["sugars_100g"].iloc[7], categories[7])
+        assert single[0] == ranks[7]
+
+    def test_ties_bounds_and_missing(self, products):
+        tables = PercentileTables.from_frame(products)
+        snacks = tables.category_of("Snacks")
+
+        # Scores entiers : rang moyen des centiles égaux
+        shares = products["additives_n"].value_counts(normalize=True).sort_index()
+        assert tables.rank("additives_n", 0, snacks)[0] == pytest.approx(shares[0] * 50, abs=1)
+        assert list(tables.rank("sugars_100g", [-1, 1000, np.nan], snacks)[:2]) == [0, 100]
+        assert np.isnan(tables.rank("sugars_100g", np.nan, snacks)[0])
+        assert np.isnan(tables.rank("salt_100g", 1.0, snacks)[0])
+
+        ranking = tables.rank_product({"categories": "Snacks,Chocolats", "sugars_100g": 60.0, "additives_n": None})
+        assert ranking["category"] == "Chocolats" and ranking["count"] == 999
+        assert ranking["percentiles"] == {"sugars_100g": 100.0}
+
+    def test_save_and_load(self, products, tmp_path):
+        tables = PercentileTables.from_frame(products)
+        tables.save(tmp_path / "percentiles.parquet")
+        loaded = load_tables(tmp_path / "percentiles.parquet")
+
+        assert loaded.labels == tables.labels and loaded.columns == tables.columns
+        np.testing.assert_array_equal(loaded.quantiles, tables.quantiles)
+        assert load_tables(tmp_path / "absent.parquet") is None
+
+
+class TestSketches:
+
+    @pytest.fixture
+    def products(self):
+        rng = np.random.default_rng(0)
+        n = 20000
+        return pd.DataFrame({
+            "code": np.arange(n).astype(str),
+            "product_name": rng.choice([f"Produit {i}" for i in range(500)], n),
+            "categories": rng.choice(["Snacks,Biscuits", "Boissons", "Desserts"], n),
+            "nutriscore_grade": rng.choice(["a", "b", "c", "d", "e", None], n),
+            "sugars_100g": np.where(rng.random(n) < 0.05, np.nan, rng.gamma(2.0, 8.0, n)),
+            "additives_n": rng.integers(0, 6, n),
+        })
+
+    def test_describe_matches_exact(self, products):
+        stats = SketchStore.from_frame(products).merge().describe(["sugars_100g", "product_name"])
+        exact = products[["sugars_100g", "product_name"]].describe(include="all").transpose()
+
+        for field in ["count", "mean", "std", "min", "max"]:
+            assert stats.loc["sugars_100g", field] == pytest.approx(exact.loc["sugars_100g", field])
+        for field in ["25%", "50%", "75%"]:
+            assert stats.loc["sugars_100g", field] == pytest.approx(exact.loc["sugars_100g", field], rel=0.02)
+        assert stats.loc["product_name", "count"] == exact.loc["product_name", "count"]
+        assert abs(stats.loc["product_name", "unique"] - 500) <= 15
+
+    def test_merge_selected_partitions(self, products):
+        store = SketchStore.from_frame(products)
+        view = store.merge({"nutriscore_grade": ["A", "unknown"]})
+        subset = products[products["nutriscore_grade"].isin(["a"]) | products["nutriscore_grade"].isna()]
+
+        assert view.rows == len(subset)
+        stats = view.describe(["sugars_100g"])
+        assert stats.loc["sugars_100g", "mean"] == pytest.approx(subset["sugars_100g"].mean())
+        assert stats.loc["sugars_100g", "50%"] == pytest.approx(subset["sugars_100g"].median(), rel=0.03)
+        # Histogramme à bornes communes : la somme des partitions est celle de la vue
+        assert view.histogram("sugars_100g").sum() == subset["sugars_100g"].notna().sum()
+        assert store.merge({"nutriscore_grade": ["z"]}).rows == 0
+
+    def test_sketches_are_mergeable(self):
+        rng = np.random.default_rng(1)
+        values = rng.normal(0, 1, 50000)
+        parts = np.array_split(values, 7)
+
+        merged = TDigest.merge_all(TDigest.from_values(p) for p in parts)
+        assert merged.total == len(values) and len(merged.means) <= 100
+        np.testing.assert_allclose(
+            merged.quantile([0.1, 0.5, 0.9]), np.quantile(values, [0.1, 0.5, 0.9]), atol=0.02
+        )
+
+        # Même registres quel que soit le découpage (entiers hachés comme des flottants)
+        ids = pd.Series(rng.integers(0, 30000, 50000))
+        whole = HyperLogLog.from_hashes(value_hashes(ids))
+        split = HyperLogLog.merge_all(
+            HyperLogLog.from_hashes(value_hashes(pd.Series(p, dtype=float))) for p in np.array_split(ids.to_numpy(), 5)
+        )
+        np.testing.assert_array_equal(whole.registers, split.registers)
+        assert whole.estimate() == pytest.approx(ids.nunique(), rel=0.05)
+
+    def test_save_and_load(self, products, tmp_path):
+        store = SketchStore.from_frame(products)
+        store.save(tmp_path / "sketches.parquet")
+        loaded = load_sketches(tmp_path / "sketches.parquet")
+
+        pd.testing.assert_frame_equal(loaded.partitions, store.partitions)
+        pd.testing.assert_frame_equal(loaded.merge().describe(), store.merge().describe())
+        assert load_sketches(tmp_path / "absent.parquet") is None
@@ -1,3 +1,9 @@
+import asyncio
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 import pytest
 from unittest.mock import Mock, patch
 
@@ -5,8 +11,20 @@ from src.ia import (
     LLMManager,
     ProductAnalyzer,
     NutritionChatbot,
-    NutritionPrompts
+    NutritionPrompts,
+    ConversationStore,
+    NutrientIndex,
+    ProductRecommender,
+    SemanticCache,
+    SingleFlight
 )
+from src.ia.catalogue_tools import CatalogueTools
+from src.ia.chatbot import stream_caption
+from src.ia.ciqual_index import CiqualIndex, nutrient_intents
+from src.ia.ollama_runtime import OllamaRuntime, model_tag, parse_keep_alive
+from src.ia.scheduler import LLMScheduler
+from src.ia.telemetry import LLMTelemetry
+from src.ia.prompt_budget import count_message_tokens, count_tokens, fit_history
 
 # ============================================================================
 # FIXTURES
@@ -51,6 +69,61 @@ class TestNutritionPrompts:
         assert "Nutri-Score" in prompt
         assert "NOVA" in prompt
 
+    def test_nutrient_table_is_compact_and_ordered(self, sample_product):
+        table = NutritionPrompts.nutrient_table(sample_product)
+        assert table.splitlines() == [
+            "Énergie : 539 kcal",
+            "Matières grasses : 30.9 g",
+            "dont sucres : 56.3 g",
+            "Sel : 0.11 g",
+        ]
+        assert NutritionPrompts.additives_summary(sample_product) == "E322, E476"
+
+    def test_product_prompt_respects_budget(self, sample_product):
+        product = dict(sample_product, brands="Ferrero " * 500)
+        prompt = NutritionPrompts.product_analysis_user_prompt(product, max_tokens=120)
+
+        assert count_tokens(prompt) <= 120
+        assert "Réponds en français" in prompt
+
+    def test_product_prompt_includes_category_ranking(self, sample_product):
+        ranking = {"category": "Pâtes à tartiner", "count": 120,
+                   "percentiles": {"sugars_100g": 94.6, "fiber_100g": 3.0, "salt_100g": 50.0}}
+        prompt = NutritionPrompts.product_analysis_user_prompt(sample_product, ranking=ranking)
+
+        assert "Position parmi Pâtes à tartiner (120 produits) :" in prompt
+        assert "dont sucres : 95e centile (10 % les plus élevés)" in prompt
+        assert "Fibres : 3e centile (10 % les plus bas)" in prompt
+        assert "Sel : 50e centile\n" in prompt
+        assert "Position" not in NutritionPrompts.product_analysis_user_prompt(sample_product)
+
+    def test_recommendation_prompt_respects_budget(self, sample_product):
+        candidates = [
+            {"product_name": f"Pâte à tartiner n°{i}", "nutriscore_grade": "c"}
+            for i in range(200)
+        ]
+        prompt = NutritionPrompts.recommendation_user_prompt(
+            sample_product, candidates, {"bio": True, "vegan": False}, max_tokens=200
+        )
+
+        assert count_tokens(prompt) <= 200
+        assert "Préférences utilisateur :\nbio\n" in prompt
+        assert "autres)" in prompt
+
+    def test_fit_history_summarizes_old_messages(self):
+        history = []
+        for i in range(10):
+            history.append({"role": "user", "content": f"Question {i} " + "mot " * 40})
+            history.append({"role": "assistant", "content": "Réponse " + "mot " * 40})
+
+        fitted = fit_history(history, max_tokens=300)
+
+        assert count_message_tokens(fitted) <= 300
+        assert fitted[0]["role"] == "system"
+        assert fitted[0]["content"].startswith("Questions précédentes")
+        assert fitted[1]["role"] == "user"
+        assert fitted[-1] == history[-1]
+
     def test_chatbot_system_prompt(self):
         prompt = NutritionPrompts.chatbot_system_prompt()
         assert isinstance(prompt, str)
@@ -85,6 +158,486 @@ class TestLLMManager:
         assert response == mock_llm_response
         assert model_used == "gpt-3.5-turbo"
 
+    @patch("src.ia.llm_manager.litellm.completion")
+    def test_stream(self, mock_completion):
+        chunks = []
+        for content in ["Bon", None, "jour"]:
+            chunk = Mock()
+            chunk.choices = [Mock()]
+            chunk.choices[0].delta.content = content
+            chunks.append(chunk)
+
+        mock_completion.return_value = iter(chunks)
+
+        llm = LLMManager()
+        tokens = list(llm.stream(messages=[{"role": "user", "content": "Test"}]))
+
+        assert tokens == ["Bon", "jour"]
+
+    @patch("src.ia.llm_manager.litellm.completion")
+    def test_identical_concurrent_calls_are_coalesced(self, mock_completion, mock_llm_response):
+        release = threading.Event()
+
+        def slow_completion(**kwargs):
+            release.wait(timeout=5)
+            response = Mock()
+            response.choices = [Mock()]
+            response.choices[0].message.content = mock_llm_response
+            return response
+
+        mock_completion.side_effect = slow_completion
+        llm = LLMManager(flight=SingleFlight())
+        messages = [{"role": "user", "content": "Test"}]
+
+        with ThreadPoolExecutor(max_workers=5) as pool:
+            futures = [pool.submit(llm.complete, messages) for _ in range(5)]
+            while llm.flight.stats()["shared"] < 4:
+                time.sleep(0.01)
+            release.set()
+            results = [f.result() for f in futures]
+
+        assert results == [mock_llm_response] * 5
+        assert mock_completion.call_count == 1
+        assert llm.flight.stats() == {"executions": 1, "shared": 4, "in_flight": 0}
+
+        # Paramètres différents : requêtes distinctes
+        llm.complete(messages, temperature=0.1)
+        assert mock_completion.call_count == 2
+
+    def test_coalesced_error_reaches_every_caller(self):
+        flight = SingleFlight()
+        release = threading.Event()
+        calls = []
+
+        def failing():
+            calls.append(1)
+            release.wait(timeout=5)
+            raise ValueError("panne")
+
+        def caller():
+            try:
+                flight.do("k", failing)
+            except ValueError as e:
+                return str(e)
+
+        with ThreadPoolExecutor(max_workers=3) as pool:
+            futures = [pool.submit(caller) for _ in range(3)]
+            while flight.stats()["shared"] < 2:
+                time.sleep(0.01)
+            release.set()
+            assert [f.result() for f in futures] == ["panne"] * 3
+
+        assert len(calls) == 1
+        assert flight.in_flight() == 0
+
+    @patch("src.ia.llm_manager.litellm.acompletion")
+    def test_acomplete_coalesces(self, mock_acompletion, mock_llm_response):
+        async def slow_acompletion(**kwargs):
+            await asyncio.sleep(0.05)
+            response = Mock()
+            response.choices = [Mock()]
+            response.choices[0].message.content = mock_llm_response
+            return response
+
+        mock_acompletion.side_effect = slow_acompletion
+        llm = LLMManager(flight=SingleFlight())
+        messages = [{"role": "user", "content": "Test"}]
+
+        async def run():
+            return await asyncio.gather(*(llm.acomplete(messages) for _ in range(4)))
+
+        assert asyncio.run(run()) == [mock_llm_response] * 4
+        assert mock_acompletion.call_count == 1
+
+    def test_cancelled_async_leader_does_not_cancel_followers(self):
+        flight = SingleFlight()
+        calls = []
+
+        async def slow():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return "ok"
+
+        async def run():
+            leader = asyncio.create_task(flight.ado("k", slow))
+            await asyncio.sleep(0)
+            followers = [asyncio.create_task(flight.ado("k", slow)) for _ in range(2)]
+            await asyncio.sleep(0.01)
+            leader.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await leader
+            return await asyncio.gather(*followers)
+
+        assert asyncio.run(run()) == ["ok", "ok"]
+        assert len(calls) == 1 and flight.in_flight() == 0
+
+    @patch("src.ia.llm_manager.litellm.completion")
+    def test_different_priorities_are_not_coalesced(self, mock_completion, mock_llm_response):
+        release = threading.Event()
+
+        def slow_completion(**kwargs):
+            release.wait(timeout=5)
+            return Mock(choices=[Mock(message=Mock(content=mock_llm_response))])
+
+        mock_completion.side_effect = slow_completion
+        llm = LLMManager(flight=SingleFlight(), scheduler=LLMScheduler())
+        messages = [{"role": "user", "content": "Analyse"}]
+
+        # Un appel de l'interface ne rejoint pas une pré-génération identique
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            batch = pool.submit(llm.complete, messages, caller="analyzer", priority="batch")
+            while llm.flight.in_flight() < 1:
+                time.sleep(0.01)
+            ui = pool.submit(llm.complete, messages, caller="analyzer")
+            while llm.flight.in_flight() < 2:
+                time.sleep(0.01)
+            release.set()
+            assert batch.result() == ui.result() == mock_llm_response
+
+        assert llm.flight.stats()["shared"] == 0
+        assert mock_completion.call_count == 2
+
+
+# ============================================================================
+# TESTS : LLMTelemetry
+# ============================================================================
+
+class TestLLMTelemetry:
+
+    @patch("src.ia.llm_manager.litellm.completion")
+    def test_fallback_records_failures_and_retries(self, mock_completion, mock_llm_response):
+        ok = Mock()
+        ok.choices = [Mock()]
+        ok.choices[0].message.content = mock_llm_response
+        ok.usage.prompt_tokens = 12
+        ok.usage.completion_tokens = 7
+        mock_completion.side_effect = [RuntimeError("indisponible"), ok]
+
+        telemetry = LLMTelemetry()
+        llm = LLMManager(flight=SingleFlight(), telemetry=telemetry)
+        _, model_used = llm.complete_with_fallback(
+            messages=[{"role": "user", "content": "Test"}],
+            models=["ollama/mistral", "openai/gpt-3.5-turbo"],
+            caller="analyzer"
+        )
+
+        series = {(s["model"], s["caller"]): s for s in telemetry.snapshot()["series"]}
+        failed = series[("ollama/mistral", "analyzer")]
+        served = series[(model_used, "analyzer")]
+
+        assert failed["failures"] == 1 and failed["requests"] == 1
+        assert served["failures"] == 0 and served["retries"] == 1
+        assert served["prompt_tokens"] == 12 and served["completion_tokens"] == 7
+        assert served["cost_usd"] > 0
+        assert served["latency_seconds"]["count"] == 1
+
+    @patch("src.ia.llm_manager.litellm.completion")
+    def test_stream_records_ttft(self, mock_completion):
+        chunk = Mock()
+        chunk.choices = [Mock()]
+        chunk.choices[0].delta.content = "Bonjour"
+        mock_completion.return_value = iter([chunk])
+
+        telemetry = LLMTelemetry()
+        llm = LLMManager(telemetry=telemetry)
+        list(llm.stream(messages=[{"role": "user", "content": "Test"}], caller="chatbot"))
+
+        (series,) = telemetry.snapshot()["series"]
+        assert series["caller"] == "chatbot"
+        assert series["ttft_seconds"]["count"] == 1
+        assert series["completion_tokens"] > 0
+
+    def test_exports(self):
+        telemetry = LLMTelemetry()
+        for latency in (0.05, 0.3, 0.4, 3.0):
+            telemetry.record("ollama/mistral", "chatbot", latency, prompt_tokens=10)
+        telemetry.record("ollama/mistral", "chatbot", 1.0, success=False)
+
+        text = telemetry.to_prometheus()
+        labels = 'model="ollama/mistral",caller="chatbot"'
+        assert f"nutriscan_llm_requests_total{{{labels}}} 5" in text
+        assert f"nutriscan_llm_failures_total{{{labels}}} 1" in text
+        assert f'nutriscan_llm_request_duration_seconds_bucket{{{labels},le="0.5"}} 3' in text
+        assert f'nutriscan_llm_request_duration_seconds_bucket{{{labels},le="+Inf"}} 5' in text
+        assert f'nutriscan_llm_tokens_total{{{labels},type="prompt"}} 40' in text
+
+        snapshot = json.loads(telemetry.to_json())
+        latency = snapshot["series"][0]["latency_seconds"]
+        assert latency["count"] == 5
+        assert 0.25 <= latency["p50"] <= 0.5
+
+
+# ============================================================================
+# TESTS : serveur LLM factice (hors ligne)
+# ============================================================================
+
+class TestFakeLLMServer:
+
+    @pytest.fixture
+    def fake_llm(self, monkeypatch):
+        from benchmarks.fake_llm_server import FakeLLMConfig, FakeLLMServer
+
+        config = FakeLLMConfig(latency=0.0, jitter=0.0, token_rate=0, completion_tokens=5)
+        with FakeLLMServer(config) as server:
+            monkeypatch.setenv("OLLAMA_API_BASE", server.url)
+            yield server
+
+    def test_complete_and_stream_through_litellm(self, fake_llm):
+        llm = LLMManager(flight=SingleFlight(), telemetry=LLMTelemetry())
+        messages = [{"role": "user", "content": "Bonjour"}]
+
+        assert llm.default_model == "ollama/mistral"
+        text = llm.complete(messages, max_tokens=50)
+        tokens = list(llm.stream(messages, max_tokens=50))
+
+        assert text == "".join(tokens) == "Ce produit présente un profil"
+        assert fake_llm.stats()["requests"] == 2
+        assert fake_llm.stats()["streamed"] == 1
+
+    def test_error_injection(self, fake_llm):
+        fake_llm.config.error_rate = 1.0
+        telemetry = LLMTelemetry()
+        llm = LLMManager(flight=SingleFlight(), telemetry=telemetry)
+
+        with pytest.raises(Exception, match="Erreur lors de l'appel"):
+            llm.complete([{"role": "user", "content": "Bonjour"}])
+
+        assert fake_llm.stats()["errors"] >= 1
+        assert telemetry.snapshot()["series"][0]["failures"] == 1
+
+    def test_load_harness(self, fake_llm):
+        from benchmarks.load_test import build_llm, run_load
+
+        report = run_load(build_llm(fake_llm.url), users=3, requests_per_user=2)
+
+        assert report["requests"] == 6
+        total = report["scenarios"]["total"]
+        assert total["success_rate"] == 1.0
+        assert total["p50_s"] <= total["p95_s"] <= total["p99_s"]
+
+
+# ============================================================================
+# TESTS : runtime Ollama (préchargement, résidence, concurrence)
+# ============================================================================
+
+class TestOllamaRuntime:
+
+    @pytest.fixture
+    def slow_loading_ollama(self, monkeypatch):
+        from benchmarks.fake_llm_server import FakeLLMConfig, FakeLLMServer
+
+        config = FakeLLMConfig(latency=0.0, jitter=0.0, token_rate=0, completion_tokens=3,
+                               load_time=0.3)
+        with FakeLLMServer(config) as server:
+            monkeypatch.setenv("OLLAMA_API_BASE", server.url)
+            yield server
+
+    def test_parse_keep_alive(self):
+        assert parse_keep_alive("30m") == 1800
+        assert parse_keep_alive("1h") == 3600
+        assert parse_keep_alive(45) == 45
+        assert parse_keep_alive("-1") == float("inf")
+        assert model_tag("mistral") == "mistral:latest"
+
+    def test_pulled_and_resident(self, slow_loading_ollama):
+        runtime = OllamaRuntime(slow_loading_ollama.url, "mistral")
+        assert runtime.is_pulled()
+        assert not OllamaRuntime(slow_loading_ollama.url, "phi3").is_pulled()
+
+        assert not runtime.is_resident()
+        assert runtime.warm_up() >= 0.3
+        assert runtime.is_resident() and runtime.is_warm()
+        runtime.close()
+
+    def test_cold_then_warm_latency(self, slow_loading_ollama):
+        telemetry = LLMTelemetry()
+        llm = LLMManager(flight=SingleFlight(), telemetry=telemetry, warm_up=False)
+        messages = [{"role": "user", "content": "Bonjour"}]
+
+        llm.complete(messages)
+        llm.complete(messages, temperature=0.1)
+
+        (series,) = telemetry.snapshot()["series"]
+        assert series["cold_start_seconds"]["count"] == 1
+        assert series["warm_start_seconds"]["count"] == 1
+        assert series["cold_start_seconds"]["sum"] >= 0.3 > series["warm_start_seconds"]["sum"]
+        assert 'start="cold"' in telemetry.to_prometheus()
+        assert slow_loading_ollama.stats()["loads"] == 1
+
+    def test_warm_up_at_startup(self, slow_loading_ollama):
+        telemetry = LLMTelemetry()
+        llm = LLMManager(flight=SingleFlight(), telemetry=telemetry)
+        llm._runtime(llm.default_model).warm_up_async().join()
+
+        llm.complete([{"role": "user", "content": "Bonjour"}])
+
+        (series,) = telemetry.snapshot()["series"]
+        assert series["cold_start_seconds"]["count"] == 0
+        assert slow_loading_ollama.stats()["load_requests"] == 1
+
+    def test_many_concurrent_async_calls(self, slow_loading_ollama):
+        # Plus d'appels simultanés que de threads d'un exécuteur par défaut
+        scheduler = LLMScheduler(limits={"ollama": 2})
+        llm = LLMManager(flight=SingleFlight(), telemetry=LLMTelemetry(), warm_up=False,
+                         scheduler=scheduler)
+
+        async def run():
+            calls = (
+                llm.acomplete([{"role": "user", "content": f"Question {i}"}], caller="analyzer",
+                              session_id=f"s{i % 4}")
+                for i in range(40)
+            )
+            return await asyncio.wait_for(asyncio.gather(*calls), timeout=30)
+
+        assert all(asyncio.run(run()))
+        runtime = llm._runtime(llm.default_model)
+        assert scheduler.stats()["ollama"]["active"] == 0
+        assert runtime.stats()["active"] == 0 and runtime.stats()["queue_depth"] == 0
+        assert runtime.stats()["requests"] == 40
+
+    def test_keep_alive_renewed_after_activity(self, slow_loading_ollama):
+        runtime = OllamaRuntime(slow_loading_ollama.url, "mistral", touch_interval=0.05)
+        runtime.mark_used()
+        deadline = time.time() + 5
+        while runtime.stats()["touches"] == 0 and time.time() < deadline:
+            time.sleep(0.05)
+        runtime.close()
+
+        assert runtime.stats()["touches"] >= 1
+        assert slow_loading_ollama.stats()["load_requests"] >= 1
+
+    def test_concurrency_cap_queues_requests(self):
+        runtime = OllamaRuntime("http://127.0.0.1:9", "mistral", max_concurrency=2)
+        lock = threading.Lock()
+        active, peak, order = [0], [0], []
+
+        def request(i):
+            with runtime.slot():
+                with lock:
+                    active[0] += 1
+                    peak[0] = max(peak[0], active[0])
+                    order.append(i)
+                time.sleep(0.05)
+                with lock:
+                    active[0] -= 1
+
+        with ThreadPoolExecutor(max_workers=6) as pool:
+            list(pool.map(request, range(6)))
+
+        stats = runtime.stats()
+        assert peak[0] == 2
+        assert stats["requests"] == 6 and stats["active"] == 0 and stats["queue_depth"] == 0
+        assert stats["max_queue_depth"] >= 1 and stats["queue_wait_seconds"] > 0
+
+
+# ============================================================================
+# TESTS : LLMScheduler
+# ============================================================================
+
+class TestLLMScheduler:
+
+    @staticmethod
+    def queue_in_order(scheduler, requests):
+        """Met en file les requêtes (priorité, session) dans l'ordre donné ; rend l'ordre de service."""
+        served, threads = [], []
+
+        def wait(i, priority, session):
+            with scheduler.slot("ollama", priority, session):
+                served.append(i)
+
+        for i, (priority, session) in enumerate(requests):
+            t = threading.Thread(target=wait, args=(i, priority, session))
+            t.start()
+            threads.append(t)
+            deadline = time.time() + 2
+            while sum(scheduler.stats()["ollama"]["queue_depth"].values()) < i + 1:
+                assert time.time() < deadline
+                time.sleep(0.001)
+        return served, threads
+
+    def test_interactive_jumps_ahead_of_batch(self):
+        scheduler = LLMScheduler(limits={"ollama": 1})
+        scheduler.acquire("ollama", "batch")
+        served, threads = self.queue_in_order(
+            scheduler, [("batch", "s1"), ("analysis", "s2"), ("interactive", "s3")]
+        )
+        scheduler.release("ollama")
+        for t in threads:
+            t.join()
+
+        assert served == [2, 1, 0]
+        stats = scheduler.stats()["ollama"]
+        assert stats["max_queue_depth"] == 3 and stats["active"] == 0
+        assert stats["served"] == {"interactive": 1, "analysis": 1, "batch": 2}
+
+    def test_round_robin_between_sessions(self):
+        scheduler = LLMScheduler(limits={"ollama": 1})
+        scheduler.acquire("ollama")
+        served, threads = self.queue_in_order(
+            scheduler, [("analysis", "a"), ("analysis", "a"), ("analysis", "a"), ("analysis", "b")]
+        )
+        scheduler.release("ollama")
+        for t in threads:
+            t.join()
+
+        # La session b passe avant la fin de la rafale de la session a
+        assert served == [0, 3, 1, 2]
+
+    def test_provider_limit(self):
+        scheduler = LLMScheduler(limits={"ollama": 2, "openai": 8})
+        lock = threading.Lock()
+        active, peak = [0], [0]
+
+        def request(i):
+            with scheduler.slot("ollama", "interactive", f"s{i % 3}"):
+                with lock:
+                    active[0] += 1
+                    peak[0] = max(peak[0], active[0])
+                time.sleep(0.02)
+                with lock:
+                    active[0] -= 1
+
+        with ThreadPoolExecutor(max_workers=6) as pool:
+            list(pool.map(request, range(6)))
+
+        assert peak[0] == 2
+        assert "nutriscan_llm_scheduler_queue_depth" in scheduler.to_prometheus()
+        with pytest.raises(ValueError):
+            scheduler.acquire("ollama", "urgent")
+
+    def test_cancelled_async_wait_releases_slot(self):
+        scheduler = LLMScheduler(limits={"openai": 1})
+        llm = LLMManager(flight=SingleFlight(), telemetry=LLMTelemetry(), scheduler=scheduler)
+
+        async def reserve():
+            async with llm._areserve("gpt-4o-mini", "chatbot", None, "s1"):
+                pass
+
+        scheduler.acquire("openai")
+        for _ in range(3):
+            with pytest.raises(asyncio.TimeoutError):
+                asyncio.run(asyncio.wait_for(reserve(), timeout=0.05))
+
+        # Les attentes annulées quittent la file sans garder de place
+        assert sum(scheduler.stats()["openai"]["queue_depth"].values()) == 0
+        scheduler.release("openai")
+        assert scheduler.stats()["openai"]["active"] == 0
+        asyncio.run(asyncio.wait_for(reserve(), timeout=1))
+        assert scheduler.stats()["openai"]["active"] == 0
+
+    @patch("src.ia.llm_manager.litellm.completion")
+    def test_llm_manager_goes_through_scheduler(self, mock_completion, mock_llm_response):
+        mock_completion.return_value = Mock(choices=[Mock(message=Mock(content=mock_llm_response))])
+        scheduler = LLMScheduler()
+        llm = LLMManager(flight=SingleFlight(), telemetry=LLMTelemetry(), scheduler=scheduler)
+
+        ProductAnalyzer(llm, priority="batch").analyze({"product_name": "Test"})
+        NutritionChatbot(llm).chat("Bonjour", session_id="s1")
+
+        stats = scheduler.stats().values()
+        assert sum(s["served"]["batch"] for s in stats) == 1
+        assert sum(s["served"]["interactive"] for s in stats) == 1
+
 
 # ============================================================================
 # TESTS : ProductAnalyzer
@@ -110,6 +663,24 @@ class TestProductAnalyzer:
         assert result["nutriscore"] == "e"
         assert result["nova_group"] == 4
 
+    @patch.object(LLMManager, "complete_with_fallback")
+    def test_analyze_with_percentiles(self, mock_complete, sample_product, mock_llm_response):
+        import pandas as pd
+        from src.enricher.percentiles import PercentileTables
+
+        mock_complete.return_value = (mock_llm_response, "gpt-3.5-turbo")
+        catalogue = pd.DataFrame({
+            "code": [str(i) for i in range(20)],
+            "categories": ["Pâtes à tartiner"] * 20,
+            "sugars_100g": [float(i) for i in range(20)],
+        })
+        analyzer = ProductAnalyzer(percentiles=PercentileTables.from_frame(catalogue))
+        analyzer.analyze(dict(sample_product, categories="Petit-déjeuners,Pâtes à tartiner"))
+
+        prompt = mock_complete.call_args.kwargs["messages"][1]["content"]
+        assert "Position parmi Pâtes à tartiner (20 produits) :" in prompt
+        assert "dont sucres : 100e centile" in prompt
+
     @patch.object(LLMManager, "complete_with_fallback")
     def test_analyze_failure(self, mock_complete, sample_product):
         mock_complete.side_effect = Exception("Erreur IA")
@@ -120,6 +691,31 @@ class TestProductAnalyzer:
         assert result["success"] is False
         assert "Erreur IA" in result["error"]
 
+    def test_score_breakdown(self, sample_product):
+        product = dict(
+            sample_product,
+            energy_kcal_100g=539,
+            sugars_100g=56.3,
+            saturated_fat_100g=10.6,
+            salt_100g=0.107,
+            proteins_100g=6.3,
+        )
+
+        analyzer = ProductAnalyzer()
+        result = analyzer.score_breakdown(product)
+
+        assert result["success"] is True
+        assert result["model_used"] == "local"
+        assert result["breakdown"]["grade"] == "e"
+        assert result["breakdown"]["score"] == 26
+        assert result["breakdown"]["proteins_counted"] is False
+        assert "Nutri-Score recalculé : E" in result["analysis"]
+
+    def test_score_breakdown_missing_nutrients(self):
+        analyzer = ProductAnalyzer()
+        result = analyzer.score_breakdown({"product_name": "Inconnu"})
+        assert result["success"] is False
+
     def test_quick_summary(self, sample_product):
         analyzer = ProductAnalyzer()
         summary = analyzer.quick_summary(sample_product)
@@ -150,8 +746,51 @@ class TestNutritionChatbot:
 
         assert result["success"] is True
         assert result["response"] == mock_llm_response
+        assert result["prompt_tokens"] > 0
         assert len(chatbot.conversation_history) == 2
 
+    @patch.object(LLMManager, "stream")
+    def test_chat_stream(self, mock_stream):
+        mock_stream.return_value = iter(["Le Nutri-Score ", "est un ", "logo."])
+
+        chatbot = NutritionChatbot()
+        result = chatbot.chat("C'est quoi le Nutri-Score ?", stream=True)
+
+        assert chatbot.conversation_history == []
+        tokens = list(result["stream"])
+
+        assert tokens == ["Le Nutri-Score ", "est un ", "logo."]
+        assert result["stats"]["success"] is True
+        assert result["stats"]["response"] == "Le Nutri-Score est un logo."
+        assert result["stats"]["ttft"] is not None
+        assert result["stats"]["ttft"] <= result["stats"]["total_time"]
+        assert chatbot.conversation_history[-1]["content"] == "Le Nutri-Score est un logo."
+
+    @patch.object(LLMManager, "stream")
+    def test_chat_stream_failure(self, mock_stream):
+        mock_stream.side_effect = Exception("Erreur IA")
+
+        chatbot = NutritionChatbot()
+        stats = {}
+        tokens = list(chatbot.chat_stream("Question", stats=stats))
+
+        assert tokens == []
+        assert stats["success"] is False
+        assert "Erreur IA" in stats["error"]
+        assert chatbot.conversation_history == []
+
+    @patch.object(LLMManager, "stream")
+    def test_chat_stream_empty(self, mock_stream):
+        mock_stream.return_value = iter([])
+
+        chatbot = NutritionChatbot()
+        stats = {}
+        assert list(chatbot.chat_stream("Question", stats=stats)) == []
+
+        assert stats["success"] is True and stats["response"] == ""
+        assert stats["ttft"] is None
+        assert "Premier token : – ·" in stream_caption(stats)
+
     def test_clear_history(self):
         chatbot = NutritionChatbot()
         chatbot.conversation_history = [
@@ -169,3 +808,467 @@ class TestNutritionChatbot:
         assert isinstance(questions, list)
         assert len(questions) >= 5
         assert all(isinstance(q, str) for q in questions)
+
+    @patch.object(LLMManager, "complete")
+    def test_sessions_are_isolated(self, mock_complete, mock_llm_response):
+        mock_complete.return_value = mock_llm_response
+
+        chatbot = NutritionChatbot()
+        chatbot.chat("Question A", session_id="alice")
+        chatbot.chat("Question B", session_id="bob")
+
+        assert [m["content"] for m in chatbot.get_history("alice")] == [
+            "Question A", mock_llm_response
+        ]
+        assert chatbot.get_history("bob")[0]["content"] == "Question B"
+        assert chatbot.conversation_history == []
+
+        # Le prompt de bob ne contient pas l'historique d'alice
+        sent = mock_complete.call_args.kwargs["messages"]
+        assert all("Question A" not in m["content"] for m in sent)
+
+
+# ============================================================================
+# TESTS : ConversationStore
+# ============================================================================
+
+class TestConversationStore:
+
+    def test_ring_buffer(self):
+        store = ConversationStore(max_messages=4)
+        for i in range(10):
+            store.append("s", {"role": "user", "content": str(i)})
+
+        assert [m["content"] for m in store.get("s")] == ["6", "7", "8", "9"]
+        assert [m["content"] for m in store.get("s", last=2)] == ["8", "9"]
+
+    def test_idle_eviction(self):
+        now = [0.0]
+        store = ConversationStore(session_ttl=60, clock=lambda: now[0])
+        store.append("old", {"role": "user", "content": "a"})
+        now[0] = 30
+        store.append("recent", {"role": "user", "content": "b"})
+
+        now[0] = 70
+        assert store.evict_idle() == 1
+        assert "old" not in store
+        assert "recent" in store
+
+    def test_max_sessions(self):
+        store = ConversationStore(max_sessions=2)
+        for session_id in ["a", "b", "c"]:
+            store.append(session_id, {"role": "user", "content": session_id})
+
+        assert len(store) == 2
+        assert "a" not in store
+
+    def test_concurrent_appends(self):
+
+        store = ConversationStore(max_messages=1000)
+
+        def worker(session_id):
+            for i in range(200):
+                store.append(session_id, {"role": "user", "content": str(i)})
+
+        threads = [
+            threading.Thread(target=worker, args=(f"s{i % 4}",)) for i in range(8)
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        assert store.stats() == {"sessions": 4, "messages": 4 * 400}
+
+
+# ============================================================================
+# TESTS : NutrientIndex
+# ============================================================================
+
+@pytest.fixture
+def catalogue():
+    import pandas as pd
+
+    return pd.DataFrame([
+        {"code": "1", "product_name": "Pâte choco E", "categories": "Snacks,Pâtes à tartiner",
+         "energy_kcal_100g": 540, "fat_100g": 31, "sugars_100g": 56, "salt_100g": 0.1,
+         "fiber_100g": 3, "proteins_100g": 6, "nutriscore_numeric": 5},
+        {"code": "2", "product_name": "Pâte choco D", "categories": "Snacks,Pâtes à tartiner",
+         "energy_kcal_100g": 530, "fat_100g": 30, "sugars_100g": 48, "salt_100g": 0.1,
+         "fiber_100g": 4, "proteins_100g": 7, "nutriscore_numeric": 4},
+        {"code": "3", "product_name": "Biscuit B", "categories": "Snacks,Biscuits",
+         "energy_kcal_100g": 450, "fat_100g": 15, "sugars_100g": 20, "salt_100g": 0.5,
+         "fiber_100g": 6, "proteins_100g": 8, "nutriscore_numeric": 2},
+        {"code": "4", "product_name": "Eau A", "categories": "Boissons,Eaux",
+         "energy_kcal_100g": 0, "fat_100g": 0, "sugars_100g": 0, "salt_100g": 0,
+         "fiber_100g": None, "proteins_100g": 0, "nutriscore_numeric": 1},
+    ])
+
+
+class TestNutrientIndex:
+
+    def test_query_prefers_same_category_and_better_score(self, catalogue):
+        index = NutrientIndex(catalogue)
+        result = index.query(catalogue.iloc[0].to_dict(), k=2)
+
+        assert list(result["product_name"]) == ["Pâte choco D", "Biscuit B"]
+        assert result["category_match"].iloc[0] == "snacks > pâtes à tartiner"
+        assert result["category_match"].iloc[1] == "snacks"
+        assert (result["nutriscore_numeric"] < 5).all()
+
+    def test_query_excludes_product_and_worse_scores(self, catalogue):
+        index = NutrientIndex(catalogue)
+        result = index.query(catalogue.iloc[3].to_dict(), k=3)
+
+        assert result.empty
+
+
+# ============================================================================
+# TESTS : ProductRecommender (filtrage)
+# ============================================================================
+
+class TestProductRecommenderFilter:
+
+    def test_list_filter_ignores_unexpected_grades(self):
+        products = [
+            {"product_name": "A", "nutriscore_grade": "a"},
+            {"product_name": "Inconnu", "nutriscore_grade": "unknown"},
+            {"product_name": "Vide", "nutriscore_grade": None},
+            {"product_name": "D", "nutriscore_grade": "d"},
+        ]
+        result = ProductRecommender.filter_healthier_products(products)
+        assert [p["product_name"] for p in result] == ["A"]
+
+    def test_frame_filter_matches_list_filter(self, catalogue):
+        import pandas as pd
+
+        df = pd.concat([
+            catalogue,
+            pd.DataFrame([{"product_name": "NA", "nutriscore_grade": "not-applicable"}])
+        ], ignore_index=True)
+        df["nutriscore_grade"] = ["e", "d", "B", "a", "not-applicable"]
+
+        frame = ProductRecommender.filter_healthier_frame(df, max_nutriscore="B")
+        listed = ProductRecommender.filter_healthier_products(df.to_dict(orient="records"))
+
+        assert list(frame["product_name"]) == [p["product_name"] for p in listed]
+
+    def test_frame_filter_constraints(self, catalogue):
+        df = catalogue.assign(
+            nutriscore_grade=["c", "b", "a", "a"],
+            nova_group=[4, 3, 2, 1],
+            additives_n=[3, 1, 0, 0],
+            allergens=["en:milk", "en:nuts", "en:gluten", ""],
+            product_name=["Choco", "Choco bio", "Biscuit", "Eau"],
+        )
+
+        def names(**constraints):
+            return list(ProductRecommender.filter_healthier_frame(df, **constraints)["product_name"])
+
+        assert names(max_nutriscore="C", max_nova=3) == ["Choco bio", "Biscuit", "Eau"]
+        assert names(max_nutriscore="E", exclude_allergens=["en:milk"],
+                     preferences={"sans_gluten": True}) == ["Choco bio", "Eau"]
+        assert names(max_nutriscore=None, preferences={"bio": True}) == ["Choco bio"]
+        assert names(max_nutriscore=None, categories=["biscuits"]) == ["Biscuit"]
+        assert names(max_nutriscore=None, max_additives=0) == ["Biscuit", "Eau"]
+
+    def test_frame_filter_with_bitmap(self, catalogue):
+        from src.enricher.bitmap_index import BitmapIndex
+
+        df = catalogue.assign(
+            allergens=["en:milk", "en:nuts", "en:gluten", None],
+            ingredients_text=["Sucre, E322", "Sucre, e 330", "Farine", None],
+        )
+        bitmap = BitmapIndex.from_frame(df)
+
+        for constraints in [
+            {"exclude_allergens": ["en:milk"], "preferences": {"sans_gluten": True}},
+            {"exclude_additives": ["E330"]},
+            {"preferences": {"vegan": True}, "exclude_additives": ["e322", "E-330"]},
+        ]:
+            scanned = ProductRecommender.healthier_mask(df, max_nutriscore=None, **constraints)
+            indexed = ProductRecommender.healthier_mask(df, max_nutriscore=None, bitmap=bitmap, **constraints)
+            assert list(scanned) == list(indexed)
+
+    def test_frame_filter_with_taxonomy(self, catalogue):
+        from src.enricher.taxonomy import Taxonomy
+
+        df = catalogue.assign(nutriscore_grade=["c", "b", "a", "a"])
+        taxonomy = Taxonomy.from_frame(df)
+
+        for constraints in [
+            {"categories": ["biscuits"]},
+            {"categories": ["Pâtes", "eaux"]},
+            {"preferences": {"vegan": True}},
+        ]:
+            scanned = ProductRecommender.healthier_mask(df, **constraints)
+            indexed = ProductRecommender.healthier_mask(df, taxonomy=taxonomy, **constraints)
+            assert list(scanned) == list(indexed)
+
+    def test_vegan_keeps_plant_based_categories(self):
+        import pandas as pd
+        from src.enricher.taxonomy import Taxonomy
+
+        df = pd.DataFrame({
+            "code": ["1", "2", "3", "4", "5"],
+            "categories": [
+                "Substituts de produits laitiers,Produits veganes,Desserts végétaliens,Yaourts de soja",
+                "Légumes,Eggplants",
+                "Produits laitiers,Yaourts",
+                "Meat analogues",
+                "Viandes,Volailles",
+            ],
+            "nutriscore_grade": ["a"] * 5,
+        })
+        taxonomy = Taxonomy.from_frame(df)
+
+        for index in (None, taxonomy):
+            mask = ProductRecommender.healthier_mask(df, preferences={"vegan": True}, taxonomy=index)
+            assert list(mask) == [True, True, False, True, False]
+
+
+# ============================================================================
+# TESTS : SemanticCache
+# ============================================================================
+
+class TestSemanticCache:
+
+    def test_similar_question_hits(self):
+        cache = SemanticCache()
+        cache.add("🍎 C'est quoi le Nutri-Score exactement ?", "Un logo nutritionnel.")
+
+        match = cache.lookup("C'est quoi exactement le Nutri-Score ?")
+        assert match["answer"] == "Un logo nutritionnel."
+        assert cache.lookup("Qu'est-ce qu'un allergène alimentaire ?") is None
+
+        stats = cache.stats()
+        assert stats["hits"] == 1 and stats["misses"] == 1
+        assert stats["hit_rate"] == 0.5
+
+    def test_exact_terms_must_match(self):
+        cache = SemanticCache()
+        cache.add("Que signifie le groupe NOVA 4 ?", "Ultra-transformé.")
+
+        assert cache.lookup("Que signifie le groupe NOVA 3 ?") is None
+        assert cache.lookup("Que signifie le groupe NOVA 4 ?") is not None
+
+    def test_one_content_word_changes_the_question(self):
+        cache = SemanticCache()
+        product = {"current_product": {"code": "1", "product_name": "Nutella"}}
+        cache.add("Ce produit est-il riche en sucre ?", "Oui, très sucré.", product)
+        cache.add("Ce produit convient-il aux végétariens ?", "Oui.", product)
+        cache.add("Combien de calories dans 100 g de pomme ?", "Environ 52 kcal.")
+        cache.add("Le chocolat noir est-il bon pour la santé ?", "Avec modération.")
+
+        assert cache.lookup("Ce produit est-il riche en sel ?", product) is None
+        assert cache.lookup("Ce produit convient-il aux végétaliens ?", product) is None
+        assert cache.lookup("Combien de calories dans 100 g de poire ?") is None
+        assert cache.lookup("Combien de calories dans 100 g de riz ?") is None
+        assert cache.lookup("Le chocolat blanc est-il bon pour la santé ?") is None
+        assert cache.lookup("Le chocolat au lait est-il bon pour la santé ?") is None
+        # Seule la formulation change : réponse réutilisée
+        assert cache.lookup("Combien de calories pour 100 g de pomme ?")["answer"] == "Environ 52 kcal."
+
+    def test_context_aware_keys(self):
+        cache = SemanticCache()
+        nutella = {"current_product": {"code": "1", "product_name": "Nutella"}}
+        kiri = {"current_product": {"code": "2", "product_name": "Kiri"}}
+        cache.add("Quels allergènes contient ce produit ?", "Lait, noisettes.", nutella)
+
+        assert cache.lookup("Quels allergènes contient ce produit ?", kiri) is None
+        assert cache.lookup("Quels allergènes contient ce produit ?") is None
+        assert cache.lookup("Quels allergènes contient ce produit ?", nutella) is not None
+
+    def test_bounded_entries(self):
+        cache = SemanticCache(max_entries=2)
+        for i in range(5):
+            cache.add(f"Question numéro {i}", f"Réponse {i}")
+        assert len(cache) == 2
+        assert cache.lookup("Question numéro 0") is None
+        assert cache.lookup("Question numéro 4")["answer"] == "Réponse 4"
+
+    def test_templated_questions_are_keyed_exactly(self):
+        cache = SemanticCache()
+        lait = "Je suis allergique au lait. Quels produits dois-je éviter et quelles alternatives existent ?"
+        arachide = "Je suis allergique au arachide. Quels produits dois-je éviter et quelles alternatives existent ?"
+        cache.add(lait, "Évitez les produits laitiers.", exact=True)
+
+        # Assez proches pour la similarité : seule la clé exacte les sépare
+        assert cache.vectorizer.transform_one(lait) @ cache.vectorizer.transform_one(arachide) > cache.threshold
+        assert cache.lookup(arachide, exact=True) is None
+        assert cache.lookup(lait) is None
+        assert cache.lookup(lait, exact=True)["answer"] == "Évitez les produits laitiers."
+
+    @patch.object(LLMManager, "complete")
+    def test_chatbot_templated_helpers(self, mock_complete):
+        mock_complete.side_effect = ["Réponse lait", "Réponse arachide", "Réponse aspartame", "Réponse sucre"]
+        chatbot = NutritionChatbot(cache=SemanticCache())
+
+        assert chatbot.ask_about_allergen("lait", session_id="a")["response"] == "Réponse lait"
+        arachide = chatbot.ask_about_allergen("arachide", session_id="b")
+        assert arachide["cached"] is False and arachide["response"] == "Réponse arachide"
+
+        chatbot.ask_about_ingredient("aspartame", session_id="c")
+        sucre = chatbot.ask_about_ingredient("sucre", session_id="d")
+        assert sucre["cached"] is False and sucre["response"] == "Réponse sucre"
+
+        again = chatbot.ask_about_allergen("lait", session_id="e")
+        assert again["cached"] is True and again["response"] == "Réponse lait"
+        assert mock_complete.call_count == 4
+
+    @patch.object(LLMManager, "complete")
+    def test_chatbot_uses_cache(self, mock_complete, mock_llm_response):
+        mock_complete.return_value = mock_llm_response
+        chatbot = NutritionChatbot(cache=SemanticCache())
+
+        first = chatbot.chat("C'est quoi le Nutri-Score ?", session_id="alice")
+        second = chatbot.chat("c'est quoi le nutri-score", session_id="bob")
+
+        assert first["cached"] is False
+        assert second["cached"] is True
+        assert second["response"] == mock_llm_response
+        assert mock_complete.call_count == 1
+        assert len(chatbot.get_history("bob")) == 2
+
+    @patch.object(LLMManager, "complete")
+    def test_cache_skipped_with_history(self, mock_complete):
+        mock_complete.side_effect = ["Moins de sucre.", "Pour les enfants : pas de boissons sucrées."]
+        chatbot = NutritionChatbot(cache=SemanticCache())
+        chatbot.cache.add("Et pour les enfants ?", "Réponse d'une autre conversation.")
+
+        chatbot.chat("Comment réduire le sucre ?", session_id="alice")
+        follow_up = chatbot.chat("Et pour les enfants ?", session_id="alice")
+
+        # La relance dépend de l'historique : ni lue ni écrite dans le cache
+        assert follow_up["cached"] is False
+        assert follow_up["response"] == "Pour les enfants : pas de boissons sucrées."
+        assert len(chatbot.cache) == 2
+
+    @patch.object(LLMManager, "stream")
+    def test_empty_answer_not_cached(self, mock_stream):
+        mock_stream.side_effect = [iter([]), iter(["  "]), iter(["Un logo."])]
+        chatbot = NutritionChatbot(cache=SemanticCache())
+
+        for session in ["a", "b"]:
+            list(chatbot.chat_stream("C'est quoi le Nutri-Score ?", session_id=session))
+        assert len(chatbot.cache) == 0
+
+        stats = {}
+        assert list(chatbot.chat_stream("C'est quoi le Nutri-Score ?", stats=stats, session_id="c")) == ["Un logo."]
+        assert stats["cached"] is False
+
+
+# ============================================================================
+# TESTS : CatalogueTools
+# ============================================================================
+
+class TestCatalogueTools:
+
+    def test_search_combines_text_category_and_ranges(self, catalogue):
+        tools = CatalogueTools(products=catalogue)
+        result = json.loads(tools.execute(
+            "search_products",
+            '{"category": "snacks", "max": {"sugars": 50}, "sort_by": "sugars"}'
+        ))
+
+        assert result["count"] == 2
+        assert [r["product_name"] for r in result["results"]] == ["Biscuit B", "Pâte choco D"]
+        assert result["results"][0]["sugars"] == 20
+
+        result = json.loads(tools.execute("search_products", {"query": "pâtes choco"}))
+        assert result["count"] == 2
+
+    def test_errors_are_returned_to_the_model(self, catalogue):
+        tools = CatalogueTools(products=catalogue)
+
+        assert "error" in json.loads(tools.execute("search_ciqual", {}))
+        assert "error" in json.loads(tools.execute("search_products", {"max": {"sodium": 1}}))
+        assert tools.stats()["errors"] == 2
+        assert [t["function"]["name"] for t in tools.specs()] == ["search_products"]
+
+    @patch.object(LLMManager, "supports_tools", return_value=True)
+    @patch.object(LLMManager, "complete")
+    @patch.object(LLMManager, "complete_message")
+    def test_chatbot_tool_loop(self, mock_message, mock_complete, _, catalogue):
+        call = {
+            "id": "call_1",
+            "type": "function",
+            "function": {"name": "search_products", "arguments": '{"max": {"sugars": 1}}'},
+        }
+        mock_message.side_effect = [
+            {"role": "assistant", "content": "", "tool_calls": [call]},
+            {"role": "assistant", "content": "L'eau A ne contient pas de sucre.", "tool_calls": []},
+        ]
+        chatbot = NutritionChatbot(tools=CatalogueTools(products=catalogue))
+
+        result = chatbot.chat("Quels produits ont moins de 1 g de sucre ?")
+
+        assert result["success"] is True
+        assert result["response"] == "L'eau A ne contient pas de sucre."
+        assert [c["name"] for c in result["tool_calls"]] == ["search_products"]
+        mock_complete.assert_not_called()
+
+        second_round = mock_message.call_args_list[1].kwargs["messages"]
+        assert second_round[-1]["role"] == "tool"
+        assert json.loads(second_round[-1]["content"])["results"][0]["product_name"] == "Eau A"
+
+
+# ============================================================================
+# TESTS : CiqualIndex
+# ============================================================================
+
+@pytest.fixture
+def ciqual():
+    import pandas as pd
+
+    rows = [
+        ("Yaourt nature", "produits laitiers frais", 4.5, 4.0, 1.0),
+        ("Yaourt aux fruits, sucré", "produits laitiers frais", 13.0, 3.5, 2.5),
+        ("Yaourt à la grecque", "produits laitiers frais", 4.0, 6.0, 10.0),
+        ("Saumon, cru", "poissons crus", 0.0, 21.0, 12.0),
+        ("Lentille, cuite", "légumineuses", 0.5, 9.0, 0.5),
+        ("Pain, baguette", "pains", 3.0, 9.0, 1.0),
+    ]
+    return pd.DataFrame([
+        {"alim_nom_fr": name, "alim_ssgrp_nom_fr": group, "alim_grp_nom_fr": None,
+         "sucres (g/100 g)": sugars, "protéines, n x facteur de jones (g/100 g)": proteins,
+         "lipides (g/100 g)": fat}
+        for name, group, sugars, proteins, fat in rows
+    ])
+
+
+class TestCiqualIndex:
+
+    def test_nutrient_intents(self):
+        assert nutrient_intents("Quels yaourts ont moins de 5 g de sucre ?") == {"sucres": -1}
+        assert nutrient_intents("Aliments riches en protéines") == {"protéines": 1}
+        assert nutrient_intents("C'est quoi le Nutri-Score ?") == {}
+
+    def test_search_ranks_by_name_then_nutrient_intent(self, ciqual):
+        index = CiqualIndex(ciqual)
+
+        result = index.search("Quels yaourts ont le moins de sucre ?", k=3)
+        assert list(result["alim_nom_fr"]) == [
+            "Yaourt à la grecque", "Yaourt nature", "Yaourt aux fruits, sucré"
+        ]
+        assert index.search("saumon", k=3)["alim_nom_fr"].iloc[0] == "Saumon, cru"
+        assert index.search("Bonjour !").empty
+
+    def test_context_block_is_compact(self, ciqual):
+        index = CiqualIndex(ciqual)
+        block = index.context_block("Le saumon est-il gras ?", k=2, max_tokens=60)
+
+        assert block.startswith("Références CIQUAL (pour 100 g) :")
+        assert "- Saumon, cru : protéines 21 g, sucres 0 g, lipides 12 g" in block
+        assert count_tokens(block) <= 60
+        assert index.stats()["queries"] == 1
+
+    @patch.object(LLMManager, "complete")
+    def test_chatbot_grounds_prompt(self, mock_complete, ciqual, mock_llm_response):
+        mock_complete.return_value = mock_llm_response
+        chatbot = NutritionChatbot(reference=CiqualIndex(ciqual))
+
+        chatbot.chat("Combien de protéines dans les lentilles ?")
+
+        prompt = mock_complete.call_args.kwargs["messages"][-1]["content"]
+        assert "- Lentille, cuite : protéines 9 g, sucres 0.5 g" in prompt
@@ -1,16 +1,250 @@
+import hashlib
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
+from typing import Any, Dict, List, Optional
+
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 
 RAW_DIR = Path("data/raw")
 PROCESSED_DIR = Path("data/processed")
 
+# Liste d'ingrédients structurée (colonne liste Parquet), jointe par code-barres
+INGREDIENTS_FILE = PROCESSED_DIR / "off_ingredients.parquet"
+
+
+# ============================================================
+# Ingrédients
+# ============================================================
+# Profondeur des sous-ingrédients conservée en structure ; au-delà, le
+# détail reste dans le texte de l'ingrédient
+MAX_DEPTH = 3
+
+# En-dessous, l'analyse reste dans le processus (démarrage du pool trop coûteux)
+MIN_PARALLEL_TEXTS = 2000
+
+_OPEN, _CLOSE = "([{", ")]}"
+_PERCENT = re.compile(r"(\d+(?:[.,]\d+)?)\s*%")
+_MARKERS = re.compile(r"[*#†_]+")
+# Mots qui précisent un pourcentage entre parenthèses (« lait (3,5 % MG) »)
+_PERCENT_QUALIFIERS = frozenset({
+    "mg", "m", "g", "de", "d", "en", "matière", "matières", "matiere", "matieres",
+    "grasse", "grasses", "min", "minimum", "max", "maximum", "environ", "dans",
+    "le", "produit", "fini", "fat",
+})
+# Mentions qui terminent la liste (« Peut contenir œuf. », « Traces de lait »)
+_STATEMENT = re.compile(
+    r"(?:^|(?<=[.,;]))\s*(?:peut contenir|traces?\b|may contain|contains? traces|sans gluten)",
+    re.IGNORECASE
+)
+
+# Analyses déjà faites dans ce processus, par empreinte du texte
+_PARSE_CACHE: Dict[str, List[Dict[str, Any]]] = {}
+
+
+def _is_decimal(text: str, i: int) -> bool:
+    """Virgule décimale (« 34,8 % ») plutôt que séparateur."""
+    return 0 < i < len(text) - 1 and text[i - 1].isdigit() and text[i + 1].isdigit()
+
+
+def _top_level_colon(text: str) -> int:
+    depth = 0
+    for i, ch in enumerate(text):
+        if ch in _OPEN:
+            depth += 1
+        elif ch in _CLOSE:
+            depth = max(depth - 1, 0)
+        elif ch == ":" and depth == 0:
+            return i
+    return -1
+
+
+def _split_top_level(text: str) -> List[str]:
+    """
+    Découpe sur , ; et . (hors décimales) en dehors des parenthèses.
+
+    Après un « : », les virgules restent dans l'élément (« garniture :
+    tomate, mozzarella ») jusqu'au prochain ; ou . ou jusqu'à un élément
+    qui ouvre lui-même une sous-liste (« acidifiant : acide citrique,
+    conservateur : sorbate de potassium »).
+    """
+    segments, current, depth = [], [], 0
+    for i, ch in enumerate(text):
+        if ch in _OPEN:
+            depth += 1
+        elif ch in _CLOSE:
+            depth = max(depth - 1, 0)
+        elif depth == 0 and (
+            ch == ";"
+            or (ch == "," and not _is_decimal(text, i))
+            or (ch == "." and (i + 1 == len(text) or text[i + 1].isspace()))
+        ):
+            segments.append(("".join(current), ch))
+            current = []
+            continue
+        current.append(ch)
+    segments.append(("".join(current), ""))
+
+    parts, colon_open = [], False
+    for segment, separator in segments:
+        segment = segment.strip()
+        if segment:
+            if colon_open and _top_level_colon(segment) < 0:
+                parts[-1] += ", " + segment
+            else:
+                parts.append(segment)
+                colon_open = _top_level_colon(segment) >= 0
+        if separator != ",":
+            colon_open = False
+    return parts
+
+
+def _annotation_percent(group: str) -> Optional[float]:
+    """Pourcentage d'une parenthèse qui ne fait que préciser le parent (« 3,5 % MG »)."""
+    match = _PERCENT.search(group)
+    if match is None:
+        return None
+    rest = group[:match.start()] + group[match.end():]
+    if not re.fullmatch(r"[\w\s.'’]*", rest):
+        return None
+    if not all(word in _PERCENT_QUALIFIERS for word in re.findall(r"\w+", rest.lower())):
+        return None
+    return float(match.group(1).replace(",", "."))
+
+
+def _parse_item(item: str, depth: int) -> Optional[Dict[str, Any]]:
+    sub_texts = []
+    # « émulsifiant : lécithines [soja] » -> émulsifiant, sous-ingrédient lécithines
+    colon = _top_level_colon(item)
+    if colon >= 0:
+        item, rest = item[:colon], item[colon + 1:]
+        sub_texts.append(rest)
+
+    name, groups, current, level = [], [], [], 0
+    for ch in item:
+        if ch in _OPEN:
+            if level > 0:
+                current.append(ch)
+            level += 1
+        elif ch in _CLOSE and level > 0:
+            level -= 1
+            if level == 0:
+                groups.append("".join(current))
+                current = []
+            else:
+                current.append(ch)
+        elif level > 0:
+            current.append(ch)
+        else:
+            name.append(ch)
+    if current:
+        groups.append("".join(current))
+    name = "".join(name)
+
+    percent = None
+    for group in groups:
+        annotated = _annotation_percent(group) if percent is None else None
+        if annotated is not None:
+            percent = annotated
+        else:
+            sub_texts.append(group)
+
+    match = _PERCENT.search(name)
+    if match:
+        percent = float(match.group(1).replace(",", "."))
+        name = name[:match.start()] + name[match.end():]
+    name = re.sub(r"\s+", " ", _MARKERS.sub(" ", name)).strip(" .:-")
+
+    if depth == MAX_DEPTH:
+        # Niveau le plus profond : sous-ingrédients laissés dans le texte
+        if sub_texts:
+            name = f"{name} ({', '.join(t.strip() for t in sub_texts)})".strip()
+        return {"text": name, "percent": percent} if name else None
+
+    ingredients = [i for t in sub_texts for i in _parse_list(t, depth + 1)]
+    if not name and not ingredients:
+        return None
+    return {"text": name, "percent": percent, "ingredients": ingredients}
+
+
+def _parse_list(text: str, depth: int) -> List[Dict[str, Any]]:
+    items = (_parse_item(part, depth) for part in _split_top_level(text))
+    return [item for item in items if item is not None]
+
+
+def parse_ingredients(text: Any) -> List[Dict[str, Any]]:
+    """
+    Liste structurée d'un texte d'ingrédients OFF.
+
+    « Céréale 50 % (Farine de blé 34,8 %, ...), sucre » ->
+    [{"text": "Céréale", "percent": 50.0, "ingredients": [...]},
+     {"text": "sucre", "percent": None, "ingredients": []}]
+    """
+    if not isinstance(text, str) or not text.strip():
+        return []
+    statement = _STATEMENT.search(text)
+    if statement:
+        text = text[:statement.start()]
+    return _parse_list(text, 1)
+
+
+def _ingredient_type(depth: int = 1) -> pa.DataType:
+    fields = [("text", pa.string()), ("percent", pa.float32())]
+    if depth < MAX_DEPTH:
+        fields.append(("ingredients", pa.list_(_ingredient_type(depth + 1))))
+    return pa.struct(fields)
+
+
+# Type Arrow de la colonne ``ingredients_parsed``
+INGREDIENTS_TYPE = pa.list_(_ingredient_type())
+
+
+def _text_hash(text: str) -> str:
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def parse_ingredients_column(texts: pd.Series, workers: Optional[int] = None) -> pd.Series:
+    """
+    Analyse une colonne de textes d'ingrédients.
+
+    Chaque texte distinct n'est analysé qu'une fois (mémoïsation par
+    empreinte, conservée entre les appels) ; les textes nouveaux sont
+    répartis sur un pool de processus quand ils sont nombreux.
+    """
+    codes, uniques = pd.factorize(texts)
+    hashes = [_text_hash(t) if isinstance(t, str) else "" for t in uniques]
+
+    missing = {h: t for h, t in zip(hashes, uniques) if h and h not in _PARSE_CACHE}
+    if len(missing) >= MIN_PARALLEL_TEXTS and (workers or os.cpu_count() or 1) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            parsed = pool.map(parse_ingredients, missing.values(), chunksize=256)
+            _PARSE_CACHE.update(zip(missing, parsed))
+    else:
+        _PARSE_CACHE.update((h, parse_ingredients(t)) for h, t in missing.items())
+
+    # Dernière case : textes manquants (code -1)
+    results = [_PARSE_CACHE[h] if h else [] for h in hashes] + [[]]
+    return pd.Series([results[c] for c in codes], index=texts.index, dtype=object)
+
+
+def ingredients_table(df: pd.DataFrame) -> pa.Table:
+    """Code-barres et ingrédients structurés (colonne liste typée)."""
+    return pa.table({
+        "code": pa.array(df["code"].astype("string"), type=pa.string()),
+        "ingredients_parsed": pa.array(df["ingredients_parsed"].tolist(), type=INGREDIENTS_TYPE),
+    })
+
 
 # ============================================================
 # OpenFoodFacts
 # ============================================================
 def transform_openfoodfacts() -> pd.DataFrame:
     file_path = RAW_DIR / "openfoodfacts_products.csv"
-    df = pd.read_csv(file_path)
+    # Code-barres lu comme texte : les zéros de tête font partie du code
+    df = pd.read_csv(file_path, dtype={"code": str})
 
     # Normalisation des noms de colonnes
     df.columns = (
@@ -58,7 +292,8 @@ def transform_openfoodfacts() -> pd.DataFrame:
     # Suppression des produits sans nom
     df = df[df["product_name"] != ""]
 
-    return df
+    # Ingrédients structurés (ingrédient, pourcentage, sous-ingrédients)
+    return df.assign(ingredients_parsed=parse_ingredients_column(df["ingredients_text"]))
 
 
 # ============================================================
@@ -106,8 +341,11 @@ def run_transformations():
     print("\n[1/2] Transformation OpenFoodFacts")
     df_off = transform_openfoodfacts()
     off_out = PROCESSED_DIR / "openfoodfacts_products_clean.csv"
-    df_off.to_csv(off_out, index=False, encoding="utf-8")
+    # La liste structurée ne tient pas en CSV : Parquet à part, joint par code
+    df_off.drop(columns="ingredients_parsed").to_csv(off_out, index=False, encoding="utf-8")
     print(f"  -> Sauvegardé: {off_out} ({len(df_off)} lignes)")
+    pq.write_table(ingredients_table(df_off), INGREDIENTS_FILE)
+    print(f"  -> Ingrédients structurés: {INGREDIENTS_FILE}")
 
     # CIQUAL
     print("\n[2/2] Transformation CIQUAL")